@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
 from typing import Optional
+from app.services.geometry import GeometryService
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 # TODO: Import actual models and services
-# from app.services.geometry import GeometryService
 # from app.api.v1.endpoints.auth import get_current_user
 
 class GeometryOptimizeRequest(BaseModel):
@@ -24,6 +27,27 @@ class UVUnwrapRequest(BaseModel):
 class UVUnwrapResponse(BaseModel):
     unwrapped_mesh_url: str
     uv_map_url: str
+    stats: dict = {}
+
+class TangentsRequest(BaseModel):
+    mesh_url: str
+    options: Optional[dict] = {}
+
+class TangentsResponse(BaseModel):
+    mesh_url: str
+    stats: dict
+
+class ReconstructRequest(BaseModel):
+    field_url: str
+    options: Optional[dict] = {}
+
+class ReconstructResponse(BaseModel):
+    mesh_url: str
+    stats: dict
+
+class PointCloudReconstructRequest(BaseModel):
+    points_url: str
+    options: Optional[dict] = {}
 
 @router.post("/optimize", response_model=GeometryOptimizeResponse)
 async def optimize_mesh(
@@ -31,22 +55,24 @@ async def optimize_mesh(
     # current_user = Depends(get_current_user)
 ):
     """Optimize mesh for target platform."""
-    # TODO: Implement mesh optimization logic
-    # result = await GeometryService.optimize_mesh(
-    #     mesh_url=request.mesh_url,
-    #     target=request.target,
-    #     options=request.options
-    # )
-    
-    # Mock response for now
-    return GeometryOptimizeResponse(
-        optimized_mesh_url="https://storage.voxelverve.com/meshes/optimized_123.glb",
-        stats={
-            "original_triangles": 10000,
-            "optimized_triangles": 2000,
-            "compression_ratio": 0.8
-        }
-    )
+    try:
+        result = await GeometryService().optimize_mesh(
+            mesh_url=request.mesh_url,
+            target=request.target,
+            options=request.options
+        )
+        return GeometryOptimizeResponse(**result)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Failed to optimize mesh {request.mesh_url}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to optimize mesh"
+        )
 
 @router.post("/uv-unwrap", response_model=UVUnwrapResponse)
 async def uv_unwrap_mesh(
@@ -54,35 +80,49 @@ async def uv_unwrap_mesh(
     # current_user = Depends(get_current_user)
 ):
     """Generate UV maps for mesh."""
-    # TODO: Implement UV unwrapping logic
-    # result = await GeometryService.uv_unwrap_mesh(
-    #     mesh_url=request.mesh_url,
-    #     options=request.options
-    # )
-    
-    # Mock response for now
-    return UVUnwrapResponse(
-        unwrapped_mesh_url="https://storage.voxelverve.com/meshes/unwrapped_123.glb",
-        uv_map_url="https://storage.voxelverve.com/uv_maps/uv_123.png"
-    )
+    try:
+        result = await GeometryService().uv_unwrap_mesh(
+            mesh_url=request.mesh_url,
+            options=request.options
+        )
+        return UVUnwrapResponse(**result)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Failed to unwrap mesh {request.mesh_url}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to unwrap mesh"
+        )
 
 @router.post("/validate")
 async def validate_mesh(
     mesh_url: str,
+    repair: bool = False,
+    rewrap: bool = False,
     # current_user = Depends(get_current_user)
 ):
-    """Validate mesh for watertightness and manifold properties."""
-    # TODO: Implement mesh validation logic
-    # result = await GeometryService.validate_mesh(mesh_url)
-    
-    # Mock response for now
-    return {
-        "is_watertight": True,
-        "is_manifold": True,
-        "triangle_count": 5000,
-        "vertex_count": 2500,
-        "issues": []
-    }
+    """Validate mesh for watertightness and manifold properties.
+
+    With repair set, the mesh is also repaired.
+    """
+    try:
+        options = {"rewrap": rewrap}
+        return await GeometryService().validate_mesh(mesh_url, repair, options)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Failed to validate mesh {mesh_url}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to validate mesh"
+        )
 
 @router.post("/remesh")
 async def remesh_geometry(
@@ -91,15 +131,88 @@ async def remesh_geometry(
     # current_user = Depends(get_current_user)
 ):
     """Remesh geometry to target triangle count."""
-    # TODO: Implement remeshing logic
-    # result = await GeometryService.remesh_geometry(
-    #     mesh_url=mesh_url,
-    #     target_triangles=target_triangles
-    # )
-    
-    # Mock response for now
-    return {
-        "remeshed_mesh_url": "https://storage.voxelverve.com/meshes/remeshed_123.glb",
-        "actual_triangles": target_triangles,
-        "quality_score": 0.95
-    }
+    try:
+        return await GeometryService().remesh_mesh(mesh_url, target_triangles)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Failed to remesh {mesh_url}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to remesh mesh"
+        )
+
+@router.post("/tangents", response_model=TangentsResponse)
+async def generate_tangents(
+    request: TangentsRequest,
+    # current_user = Depends(get_current_user)
+):
+    """Weld seam vertices and generate tangents for normal mapping."""
+    try:
+        result = await GeometryService().tangent_mesh(
+            mesh_url=request.mesh_url,
+            options=request.options
+        )
+        return TangentsResponse(**result)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Failed to generate tangents for {request.mesh_url}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to generate tangents"
+        )
+
+@router.post("/reconstruct", response_model=ReconstructResponse)
+async def reconstruct_mesh(
+    request: ReconstructRequest,
+    # current_user = Depends(get_current_user)
+):
+    """Extract a watertight mesh from a signed distance field."""
+    try:
+        result = await GeometryService().reconstruct_mesh(
+            field_url=request.field_url,
+            options=request.options
+        )
+        return ReconstructResponse(**result)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Failed to reconstruct mesh from {request.field_url}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to reconstruct mesh"
+        )
+
+@router.post("/reconstruct-points", response_model=ReconstructResponse)
+async def reconstruct_points(
+    request: PointCloudReconstructRequest,
+    # current_user = Depends(get_current_user)
+):
+    """Mesh a point cloud, estimating normals when it has none."""
+    try:
+        result = await GeometryService().reconstruct_points(
+            points_url=request.points_url,
+            options=request.options
+        )
+        return ReconstructResponse(**result)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Failed to reconstruct mesh from {request.points_url}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to reconstruct mesh"
+        )
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
 from typing import List, Optional
+from app.services.texture import TextureService
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 # TODO: Import actual models and services
-# from app.services.texture import TextureService
 # from app.api.v1.endpoints.auth import get_current_user
 
 class TextureBakeRequest(BaseModel):
@@ -17,6 +20,12 @@ class TextureBakeResponse(BaseModel):
     texture_urls: dict
     bake_stats: dict
 
+class TexturePackRequest(BaseModel):
+    texture_urls: dict  # {"ao": url, ...}, or {"material": {"ao": url, ...}, ...}
+    packing_method: str = "orm"  # "orm", "separate", "custom"
+    # custom only: {"r": "ao", "g": "roughness.g", "b": 0.0}
+    channels: Optional[dict] = None
+
 class TextureOptimizeRequest(BaseModel):
     texture_urls: dict
     target: str  # "web", "mobile", "desktop"
@@ -24,6 +33,7 @@ class TextureOptimizeRequest(BaseModel):
 
 class TextureOptimizeResponse(BaseModel):
     optimized_texture_urls: dict
+    mip_urls: dict = {}
     optimization_stats: dict
 
 @router.post("/bake", response_model=TextureBakeResponse)
@@ -32,26 +42,27 @@ async def bake_textures(
     # current_user = Depends(get_current_user)
 ):
     """Bake PBR textures from high-poly mesh."""
-    # TODO: Implement texture baking logic
-    # result = await TextureService.bake_textures(
-    #     mesh_url=request.mesh_url,
-    #     textures=request.textures,
-    #     options=request.options
-    # )
-    
-    # Mock response for now
-    texture_urls = {}
-    for texture_type in request.textures:
-        texture_urls[texture_type] = f"https://storage.voxelverve.com/textures/baked_{texture_type}_123.png"
-    
-    return TextureBakeResponse(
-        texture_urls=texture_urls,
-        bake_stats={
-            "resolution": 2048,
-            "samples": 64,
-            "bake_time": 45.2
-        }
-    )
+    try:
+        result = await TextureService().bake_textures(
+            mesh_url=request.mesh_url,
+            textures=request.textures,
+            options=request.options
+        )
+        return TextureBakeResponse(
+            texture_urls=result["texture_urls"],
+            bake_stats=result["stats"]
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Failed to bake textures for {request.mesh_url}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to bake textures"
+        )
 
 @router.post("/optimize", response_model=TextureOptimizeResponse)
 async def optimize_textures(
@@ -59,49 +70,52 @@ async def optimize_textures(
     # current_user = Depends(get_current_user)
 ):
     """Optimize textures for target platform."""
-    # TODO: Implement texture optimization logic
-    # result = await TextureService.optimize_textures(
-    #     texture_urls=request.texture_urls,
-    #     target=request.target,
-    #     options=request.options
-    # )
-    
-    # Mock response for now
-    optimized_urls = {}
-    for texture_type, url in request.texture_urls.items():
-        optimized_urls[texture_type] = url.replace("textures/", "textures/optimized_")
-    
-    return TextureOptimizeResponse(
-        optimized_texture_urls=optimized_urls,
-        optimization_stats={
-            "compression_ratio": 0.7,
-            "file_size_reduction": 0.3,
-            "quality_score": 0.95
-        }
-    )
+    try:
+        result = await TextureService().optimize_textures(
+            texture_urls=request.texture_urls,
+            target=request.target,
+            options=request.options
+        )
+        return TextureOptimizeResponse(
+            optimized_texture_urls=result["optimized_texture_urls"],
+            mip_urls=result["mip_urls"],
+            optimization_stats=result["stats"]
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Failed to optimize textures: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to optimize textures"
+        )
 
 @router.post("/pack")
 async def pack_textures(
-    texture_urls: dict,
-    packing_method: str = "orm",  # "orm", "separate"
+    request: TexturePackRequest,
     # current_user = Depends(get_current_user)
 ):
     """Pack multiple textures into optimized formats."""
-    # TODO: Implement texture packing logic
-    # result = await TextureService.pack_textures(
-    #     texture_urls=texture_urls,
-    #     packing_method=packing_method
-    # )
-    
-    # Mock response for now
-    return {
-        "packed_texture_url": "https://storage.voxelverve.com/textures/packed_123.png",
-        "packing_map": {
-            "r": "roughness",
-            "g": "occlusion", 
-            "b": "metallic"
-        }
-    }
+    try:
+        return await TextureService().pack_textures(
+            texture_urls=request.texture_urls,
+            packing_method=request.packing_method,
+            channels=request.channels
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Failed to pack textures: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to pack textures"
+        )
 
 @router.post("/generate")
 async def generate_textures(
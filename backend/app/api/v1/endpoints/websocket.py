@@ -1,93 +1,163 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import Dict
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
+from typing import Optional
+from app.services.websocket import (
+    StudioFilter,
+    connections,
+    hub,
+    negotiate_format,
+    parse_last_seq,
+    preview_topic,
+    run_topic,
+    studio,
+    studio_topic,
+)
+import logging
 
-router = APIRouter()
-
-# TODO: Import actual services
-# from app.services.websocket import WebSocketService
-# from app.services.run import RunService
+logger = logging.getLogger(__name__)
 
-# Store active connections
-active_connections: Dict[str, WebSocket] = {}
+router = APIRouter()
 
 @router.websocket("/runs/{run_id}")
 async def websocket_run_updates(websocket: WebSocket, run_id: str):
-    """WebSocket endpoint for real-time generation updates."""
-    await websocket.accept()
-    active_connections[run_id] = websocket
-    
+    """WebSocket endpoint for real-time generation updates.
+
+    Clients opt into the delta protocol with ``?v=2`` and may request
+    ``&encoding=msgpack`` for binary frames. A v2 client reconnecting with
+    ``&last_seq=N`` receives only the events it missed when they are still
+    buffered, and a snapshot otherwise.
+    """
+    if not await connections.admit(websocket):
+        return
+    fmt = negotiate_format(websocket.query_params)
+    last_seq = parse_last_seq(websocket.query_params)
+
+    subscriber = None
+    try:
+        # The connection message is followed by the missed events or a snapshot
+        # of the run, if known
+        subscriber = await hub.subscribe(
+            run_topic(run_id),
+            websocket,
+            fmt,
+            last_seq=last_seq,
+            greeting={
+                "type": "connected",
+                "data": {
+                    "run_id": run_id,
+                    "message": "Connected to generation updates",
+                    "protocol": fmt.version,
+                    "encoding": fmt.encoding,
+                },
+            },
+        )
+
+        # Keep connection alive and handle messages
+        async for _ in connections.messages(websocket, subscriber):
+            pass
+
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"WebSocket error for run {run_id}: {e}")
+    finally:
+        if subscriber is not None:
+            await hub.unsubscribe(subscriber)
+        connections.release()
+
+@router.websocket("/runs/{run_id}/preview")
+async def websocket_run_preview(websocket: WebSocket, run_id: str):
+    """Binary WebSocket endpoint streaming progressive mesh preview buffers."""
+    if not await connections.admit(websocket):
+        return
+    subscriber = None
     try:
-        # TODO: Implement WebSocket connection logic
-        # await WebSocketService.handle_run_connection(websocket, run_id)
-        
-        # Send initial connection message
-        await websocket.send_json({
+        subscriber = await hub.subscribe(preview_topic(run_id), websocket, greeting={
             "type": "connected",
             "data": {
                 "run_id": run_id,
-                "message": "Connected to generation updates"
+                "message": "Connected to mesh previews",
             }
         })
-        
-        # Keep connection alive and handle messages
-        while True:
-            # TODO: Implement message handling logic
-            # message = await websocket.receive_json()
-            # await WebSocketService.handle_message(websocket, run_id, message)
-            
-            # For now, just keep connection alive
-            await websocket.receive_text()
-            
+
+        async for _ in connections.messages(websocket, subscriber):
+            pass
+
     except WebSocketDisconnect:
-        # TODO: Handle disconnection cleanup
-        # await WebSocketService.handle_disconnection(run_id)
-        if run_id in active_connections:
-            del active_connections[run_id]
+        pass
     except Exception as e:
-        # TODO: Handle errors properly
-        print(f"WebSocket error for run {run_id}: {e}")
-        if run_id in active_connections:
-            del active_connections[run_id]
+        logger.error(f"Preview WebSocket error for run {run_id}: {e}")
+    finally:
+        if subscriber is not None:
+            await hub.unsubscribe(subscriber)
+        connections.release()
 
 @router.websocket("/studio/{user_id}")
 async def websocket_studio_updates(websocket: WebSocket, user_id: str):
-    """WebSocket endpoint for studio-wide updates."""
-    await websocket.accept()
-    
+    """WebSocket endpoint for studio-wide updates.
+
+    Events arrive batched once per tick. The initial filter comes from the
+    ``view``, ``types`` and ``run_ids`` query parameters and can be changed
+    by sending ``{"type": "filter", "data": {...}}`` with the same fields.
+    """
+    try:
+        studio_topic(user_id)
+        filter = StudioFilter.from_params(websocket.query_params)
+    except ValueError as e:
+        await websocket.accept()
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e))
+        return
+
+    if not await connections.admit(websocket):
+        return
+
+    connection = None
     try:
-        # TODO: Implement studio WebSocket logic
-        # await WebSocketService.handle_studio_connection(websocket, user_id)
-        
-        # Send initial connection message
-        await websocket.send_json({
+        connection = await studio.connect(websocket, user_id, filter, greeting={
             "type": "connected",
             "data": {
                 "user_id": user_id,
                 "message": "Connected to studio updates"
             }
         })
-        
-        # Keep connection alive
-        while True:
-            await websocket.receive_text()
-            
+
+        async for payload in connections.messages(websocket, connection.subscriber):
+            if isinstance(payload, dict) and payload.get("type") == "filter":
+                params = payload.get("data") or {}
+                try:
+                    studio.set_filter(connection, StudioFilter.from_params(params))
+                    reply = {"type": "filter_updated", "data": params}
+                except ValueError as e:
+                    reply = {"type": "error", "data": {"message": str(e)}}
+                connection.subscriber.send(reply)
+
     except WebSocketDisconnect:
-        # TODO: Handle disconnection cleanup
         pass
     except Exception as e:
-        print(f"Studio WebSocket error for user {user_id}: {e}")
+        logger.error(f"Studio WebSocket error for user {user_id}: {e}")
+    finally:
+        if connection is not None:
+            await studio.disconnect(connection)
+        connections.release()
+
+@router.get("/metrics")
+async def websocket_metrics():
+    """Queue depth and drop counters for connected subscribers."""
+    return {
+        **hub.metrics(),
+        "studio": studio.metrics(),
+        "connections": connections.metrics(),
+    }
 
-# TODO: Add helper functions for sending messages to specific connections
 async def send_run_update(run_id: str, message: dict):
-    """Send update to specific run connection."""
-    if run_id in active_connections:
-        try:
-            await active_connections[run_id].send_json(message)
-        except Exception as e:
-            print(f"Error sending message to run {run_id}: {e}")
-            del active_connections[run_id]
-
-async def broadcast_studio_update(message: dict):
-    """Broadcast message to all studio connections."""
-    # TODO: Implement studio-wide broadcasting
-    pass
+    """Fan out an update to every subscriber of a run without waiting on slow sockets.
+
+    Run updates are sequenced and buffered so reconnecting clients can replay them.
+    """
+    await hub.publish(run_topic(run_id), message, sequenced=True)
+
+async def broadcast_studio_update(message: dict, user_id: Optional[str] = None):
+    """Send an event to one user's studio connections.
+
+    With no user given, the event goes to every studio connection.
+    """
+    await studio.publish(message, user_id)
@@ -8,6 +8,7 @@ class Settings(BaseSettings):
     VERSION: str = "1.0.0"
     API_V1_STR: str = "/api/v1"
     ENVIRONMENT: str = "development"
+    DEBUG: bool = False  # echo SQL statements
     
     # Security
     SECRET_KEY: str = "your-secret-key-here"
@@ -37,13 +38,43 @@ class Settings(BaseSettings):
     AWS_SECRET_ACCESS_KEY: Optional[str] = None
     AWS_REGION: str = "us-east-1"
     S3_BUCKET: str = "voxelverve-assets"
+    STORAGE_PUBLIC_URL: str = "https://storage.voxelverve.com"  # base of asset URLs
+    STORAGE_LOCAL_PATH: Optional[str] = None  # keep assets on local disk instead of S3
+    STORAGE_MAX_FETCH_BYTES: int = 536870912  # largest asset downloaded for processing
+    STORAGE_FETCH_HOSTS: List[str] = []  # other hosts assets are fetched from (CDN)
     
     # GPU Workers
     GPU_WORKER_URL: str = "http://localhost:8001"
     MAX_CONCURRENT_JOBS: int = 4
     
+    # Geometry
+    UV_UNWRAP_WORKERS: int = 4  # processes charting mesh components in parallel
+    UV_CHART_CACHE_SIZE: int = 32  # charted meshes kept for re-packing
+    MESH_RECON_WORKERS: int = 4  # processes extracting iso-surface blocks in parallel
+    GEOMETRY_CACHE_PATH: Optional[str] = None  # result cache directory; temp if unset
+    GEOMETRY_CACHE_MEMORY_BYTES: int = 67108864  # results kept in memory
+    GEOMETRY_CACHE_DISK_BYTES: int = 1073741824  # results kept on disk; 0 disables it
+    BVH_CACHE_PATH: Optional[str] = None  # BVHs shared by later stages; temp if unset
+    BVH_CACHE_SIZE: int = 8  # BVHs kept in memory
+    BVH_CACHE_DISK_BYTES: int = 4294967296  # BVH files on disk; 0 disables them
+    
+    # Textures
+    TEXTURE_BAKE_WORKERS: int = 4  # processes baking texture tiles in parallel
+    TEXTURE_PACK_CONCURRENCY: int = 4  # materials of a pack request packed at once
+    TEXTURE_ENCODE_THREADS: int = 4  # threads encoding optimized texture levels
+    TEXTURE_TILE_SIZE: int = 256  # texels per side of the tiles of tiled texture images
+    TEXTURE_TILE_PATH: Optional[str] = None  # working tiled images; temp dir if unset
+    TEXTURE_TILE_CACHE_BYTES: int = 268435456  # resident tiles per process, LRU evicted
+    
     # WebSocket
     WS_MESSAGE_QUEUE_URL: str = "redis://localhost:6379/1"
+    WS_SEND_QUEUE_SIZE: int = 64  # per-connection outbound messages before dropping
+    WS_PREVIEW_CHUNK_BYTES: int = 65536  # payload size of binary mesh preview frames
+    WS_STUDIO_TICK_MS: int = 100  # studio events are batched into one frame per tick
+    WS_REPLAY_BUFFER_SIZE: int = 256  # sequenced events kept per run for replay
+    WS_MAX_CONNECTIONS: int = 10000  # per process; further sockets are told to retry
+    WS_HEARTBEAT_INTERVAL_SECONDS: float = 20.0  # ping quiet sockets this often
+    WS_IDLE_TIMEOUT_SECONDS: float = 60.0  # close sockets silent for this long
     
     @validator("DATABASE_URL", pre=True)
     def assemble_db_connection(cls, v: Optional[str], values: dict) -> str:
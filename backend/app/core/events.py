@@ -0,0 +1,21 @@
+from typing import Callable
+from fastapi import FastAPI
+from app.services.websocket import hub
+import logging
+
+logger = logging.getLogger(__name__)
+
+def create_start_app_handler(app: FastAPI) -> Callable:
+    async def start_app() -> None:
+        # Connect the cross-process WebSocket relay
+        await hub.start()
+        logger.info("Application startup complete")
+
+    return start_app
+
+def create_stop_app_handler(app: FastAPI) -> Callable:
+    async def stop_app() -> None:
+        await hub.stop()
+        logger.info("Application shutdown complete")
+
+    return stop_app
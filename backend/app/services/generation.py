@@ -6,6 +6,7 @@ from app.models.generation_run import GenerationRun, GenerationStatus
 from app.models.prompt import Prompt
 from app.schemas.generation import GenerationRunCreate, GenerationRunUpdate, GenerationProgressUpdate
 from app.core.config import settings
+from app.services.websocket import hub, run_topic, studio
 import uuid
 import asyncio
 import logging
@@ -42,6 +43,16 @@ class GenerationService:
         self.db.add(run)
         await self.db.commit()
         await self.db.refresh(run)
+
+        await studio.publish({
+            "type": "run_created",
+            "data": {
+                "run_id": run.id,
+                "prompt_id": run.prompt_id,
+                "status": run.status.value,
+            },
+        }, user_id)
+        await self._publish_stats(user_id)
         
         # Start generation process
         asyncio.create_task(self._start_generation(run.id))
@@ -92,6 +103,15 @@ class GenerationService:
         
         result = await self.db.execute(stmt)
         await self.db.commit()
+
+        # Push the change to connected clients as a delta
+        await hub.publish_state(
+            run_topic(run_id), progress_update.model_dump(mode="json")
+        )
+
+        run = await self._load_run(run_id)
+        if run is not None:
+            await self._publish_run_event("run_updated", run)
         return result.rowcount > 0
 
     async def complete_generation(self, run_id: str, result: Dict[str, Any]) -> bool:
@@ -110,6 +130,8 @@ class GenerationService:
         
         result = await self.db.execute(stmt)
         await self.db.commit()
+
+        await self._finish_run(run_id, "run_completed")
         return result.rowcount > 0
 
     async def fail_generation(self, run_id: str, error: str) -> bool:
@@ -127,6 +149,8 @@ class GenerationService:
         
         result = await self.db.execute(stmt)
         await self.db.commit()
+
+        await self._finish_run(run_id, "run_failed")
         return result.rowcount > 0
 
     async def cancel_generation(self, run_id: str, user_id: str) -> bool:
@@ -150,6 +174,8 @@ class GenerationService:
         
         result = await self.db.execute(stmt)
         await self.db.commit()
+
+        await self._finish_run(run_id, "run_cancelled")
         return result.rowcount > 0
 
     async def retry_generation(self, run_id: str, user_id: str, parameters: Optional[Dict[str, Any]] = None) -> Optional[GenerationRun]:
@@ -169,6 +195,42 @@ class GenerationService:
         
         return await self.create_generation_run(user_id, new_run_data)
 
+    async def _load_run(self, run_id: str) -> Optional[GenerationRun]:
+        query = select(GenerationRun).where(GenerationRun.id == run_id)
+        result = await self.db.execute(query)
+        return result.scalar_one_or_none()
+
+    async def _finish_run(self, run_id: str, event_type: str):
+        """Push a run's terminal state to run subscribers and the owner's studio"""
+        run = await self._load_run(run_id)
+        if run is None:
+            return
+        await hub.publish_state(run_topic(run_id), {
+            "run_id": run.id,
+            "status": run.status.value,
+            "progress": run.progress,
+            "current_stage": run.current_stage,
+            "stages": run.stages or [],
+            "estimated_time_remaining": run.estimated_time_remaining,
+        })
+        await self._publish_run_event(event_type, run)
+        await self._publish_stats(str(run.user_id))
+
+    async def _publish_run_event(self, event_type: str, run: GenerationRun):
+        data = {
+            "run_id": run.id,
+            "status": run.status.value,
+            "progress": run.progress,
+            "current_stage": run.current_stage,
+        }
+        if run.error:
+            data["error"] = run.error
+        await studio.publish({"type": event_type, "data": data}, str(run.user_id))
+
+    async def _publish_stats(self, user_id: str):
+        stats = await self.get_generation_statistics(user_id)
+        await studio.publish({"type": "stats_updated", "data": stats}, user_id)
+
     def _get_default_stages(self) -> List[Dict[str, Any]]:
         """Get default generation stages"""
         return [
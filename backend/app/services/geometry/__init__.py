@@ -0,0 +1,253 @@
+from .mesh import (
+    MESH_FILE_TYPES,
+    Mesh,
+    compact_mesh,
+    export_mesh,
+    load_mesh,
+    mesh_content_hash,
+    mesh_file_type,
+    take_vertices,
+    weld_attributes,
+    weld_positions,
+    widen_mesh,
+)
+from .validation import (
+    EdgeTopology,
+    MeshAnalysis,
+    analyze_mesh,
+    edge_topology,
+    union_find,
+    validate_mesh,
+    validation_report,
+)
+from .decimation import (
+    DECIMATION_PRESETS,
+    CollapseSequence,
+    DecimationResult,
+    collapse_sequence,
+    decimate_mesh,
+    decimation_target,
+    replay_collapses,
+)
+from .reorder import (
+    VERTEX_CACHE_SIZE,
+    cache_stats,
+    fetch_order,
+    optimize_triangle_order,
+    optimize_vertex_order,
+    overdraw_order,
+    tipsify,
+)
+from .lod import (
+    DEFAULT_LOD_RATIOS,
+    LodChain,
+    LodLevel,
+    build_lod_chain,
+    lod_ratios,
+    reorder_lod_chain,
+)
+from .spatial import SpatialHashGrid, closest_points_on_triangles
+from .remesh import RemeshResult, quality_report, remesh, triangle_quality
+from .uv import (
+    UV_PACK_DEFAULTS,
+    ChartCache,
+    ChartSet,
+    UvAtlas,
+    attach_array,
+    chart_cache,
+    chart_mesh,
+    pack_charts,
+    share_array,
+    unwrap_mesh,
+)
+from .compression import (
+    COMPRESSION_PRESETS,
+    CompressionSettings,
+    compression_report,
+    compression_settings,
+    compression_targets,
+    decode_index_sequence,
+    decode_vertex_buffer,
+    encode_index_sequence,
+    encode_vertex_buffer,
+    quantize_positions,
+)
+from .tangents import (
+    WELD_TOLERANCE,
+    compute_tangents,
+    position_clusters,
+    tangent_space,
+    vertex_normals,
+    weld_vertices,
+)
+from .reconstruction import (
+    RECONSTRUCTION_DEFAULTS,
+    FunctionField,
+    VolumeField,
+    extract_block,
+    extract_surface,
+    occupied_blocks,
+    reconstruction_options,
+)
+from .points import (
+    POINT_CLOUD_DEFAULTS,
+    KdTree,
+    PointCloudField,
+    load_points,
+    orient_normals,
+    pca_normals,
+    point_cloud_options,
+    reconstruct_surface,
+)
+from .repair import (
+    REPAIR_DEFAULTS,
+    GridField,
+    advancing_front,
+    boundary_loops,
+    fill_hole,
+    fill_holes,
+    loop_area_vector,
+    repair_diff,
+    repair_mesh,
+    repair_options,
+    rewrap_mesh,
+    split_non_manifold_vertices,
+)
+from .bvh import (
+    BVH_FORMAT_VERSION,
+    Bvh,
+    BvhCache,
+    RayHits,
+    build_bvh,
+    bvh_cache,
+    bvh_key,
+)
+from .cache import (
+    GEOMETRY_ENGINE_VERSION,
+    ResultCache,
+    canonical_options,
+    result_cache,
+    result_key,
+)
+from .gltf import GltfBuilder, encode_glb, lod_chain_glb, mesh_glb
+from .gltf_reader import GltfAsset, load_glb
+from .service import GeometryService
+
+__all__ = [
+    "MESH_FILE_TYPES",
+    "Mesh",
+    "load_mesh",
+    "mesh_content_hash",
+    "mesh_file_type",
+    "compact_mesh",
+    "export_mesh",
+    "take_vertices",
+    "weld_attributes",
+    "weld_positions",
+    "widen_mesh",
+    "EdgeTopology",
+    "MeshAnalysis",
+    "analyze_mesh",
+    "edge_topology",
+    "union_find",
+    "validate_mesh",
+    "validation_report",
+    "DECIMATION_PRESETS",
+    "DecimationResult",
+    "decimate_mesh",
+    "decimation_target",
+    "CollapseSequence",
+    "collapse_sequence",
+    "replay_collapses",
+    "VERTEX_CACHE_SIZE",
+    "cache_stats",
+    "fetch_order",
+    "optimize_triangle_order",
+    "optimize_vertex_order",
+    "overdraw_order",
+    "tipsify",
+    "DEFAULT_LOD_RATIOS",
+    "LodChain",
+    "LodLevel",
+    "build_lod_chain",
+    "lod_ratios",
+    "reorder_lod_chain",
+    "SpatialHashGrid",
+    "closest_points_on_triangles",
+    "RemeshResult",
+    "quality_report",
+    "remesh",
+    "triangle_quality",
+    "UV_PACK_DEFAULTS",
+    "ChartCache",
+    "ChartSet",
+    "UvAtlas",
+    "attach_array",
+    "chart_cache",
+    "chart_mesh",
+    "pack_charts",
+    "share_array",
+    "unwrap_mesh",
+    "COMPRESSION_PRESETS",
+    "CompressionSettings",
+    "compression_report",
+    "compression_settings",
+    "compression_targets",
+    "decode_index_sequence",
+    "decode_vertex_buffer",
+    "encode_index_sequence",
+    "encode_vertex_buffer",
+    "quantize_positions",
+    "WELD_TOLERANCE",
+    "compute_tangents",
+    "position_clusters",
+    "tangent_space",
+    "vertex_normals",
+    "weld_vertices",
+    "RECONSTRUCTION_DEFAULTS",
+    "FunctionField",
+    "VolumeField",
+    "extract_block",
+    "extract_surface",
+    "occupied_blocks",
+    "reconstruction_options",
+    "POINT_CLOUD_DEFAULTS",
+    "KdTree",
+    "PointCloudField",
+    "load_points",
+    "orient_normals",
+    "pca_normals",
+    "point_cloud_options",
+    "reconstruct_surface",
+    "REPAIR_DEFAULTS",
+    "GridField",
+    "advancing_front",
+    "boundary_loops",
+    "fill_hole",
+    "fill_holes",
+    "loop_area_vector",
+    "repair_diff",
+    "repair_mesh",
+    "repair_options",
+    "rewrap_mesh",
+    "split_non_manifold_vertices",
+    "BVH_FORMAT_VERSION",
+    "Bvh",
+    "BvhCache",
+    "RayHits",
+    "build_bvh",
+    "bvh_cache",
+    "bvh_key",
+    "GEOMETRY_ENGINE_VERSION",
+    "ResultCache",
+    "canonical_options",
+    "result_cache",
+    "result_key",
+    "GltfBuilder",
+    "encode_glb",
+    "lod_chain_glb",
+    "mesh_glb",
+    "GltfAsset",
+    "load_glb",
+    "GeometryService",
+]
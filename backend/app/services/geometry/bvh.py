@@ -0,0 +1,532 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import NamedTuple, Optional, Tuple, Union
+from app.core.config import settings
+from app.services.geometry.mesh import Mesh, mesh_content_hash
+import logging
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the stored layout changes, so older files are rebuilt instead of read
+BVH_FORMAT_VERSION = 1
+
+# Split candidates per axis in the binned SAH sweep
+SAH_BINS = 16
+
+# Cost of a ray-box test relative to a ray-triangle test
+TRAVERSAL_COST = 1.0
+
+# Leaves never hold more triangles than this, whatever the SAH prefers
+MAX_LEAF_SIZE = 8
+
+# Rays traversed together; bounds the (ray, node) pairs held at once
+RAY_BATCH = 65536
+
+# Slab exits are pushed out by this factor so rounding never culls a box a ray
+# grazes (Ize 2013)
+SLAB_TOLERANCE = 1.0 + 4.0 * float(np.finfo(np.float64).eps)
+
+class RayHits(NamedTuple):
+    """Closest hit of each ray"""
+
+    distances: np.ndarray  # (R,) float64; inf where the ray missed
+    triangles: np.ndarray  # (R,) int64; -1 where the ray missed
+    # (R, 2) float64 weights of the hit triangle's second and third corners
+    barycentrics: np.ndarray
+
+def _surface_area(low: np.ndarray, high: np.ndarray) -> np.ndarray:
+    extent = np.maximum(high - low, 0.0)
+    return 2.0 * (
+        extent[..., 0] * extent[..., 1]
+        + extent[..., 1] * extent[..., 2]
+        + extent[..., 2] * extent[..., 0]
+    )
+
+def _cross(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.stack(
+        [
+            a[:, 1] * b[:, 2] - a[:, 2] * b[:, 1],
+            a[:, 2] * b[:, 0] - a[:, 0] * b[:, 2],
+            a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0],
+        ],
+        axis=1,
+    )
+
+def _dot(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.einsum("ij,ij->i", a, b)
+
+class Bvh:
+    """Bounding volume hierarchy over a triangle mesh, stored as flat node arrays
+
+    Nodes are numbered breadth first and a node's children are adjacent, so
+    an internal node only stores its first child. Every node covers one
+    contiguous run of the triangle permutation. Rays are traced in packets
+    that walk the tree in lockstep: each step pops one node from every live
+    ray's stack and tests them all at once, visiting nearer children first
+    so later boxes are culled by the closest hit so far.
+    """
+
+    def __init__(
+        self,
+        vertices: np.ndarray,
+        faces: np.ndarray,
+        low: np.ndarray,
+        high: np.ndarray,
+        child: np.ndarray,
+        start: np.ndarray,
+        count: np.ndarray,
+        order: np.ndarray,
+    ):
+        self.vertices = np.asarray(vertices, dtype=np.float64)
+        self.faces = np.asarray(faces, dtype=np.int64)
+        self.low = low
+        self.high = high
+        self.child = child  # first child, or -1 for leaves
+        self.start = start
+        self.count = count
+        self.order = order
+        # Triangles in leaf order as one corner and two edges, ready for intersection
+        corners = self.vertices[self.faces[order]]
+        self._origin = corners[:, 0]
+        self._edge1 = corners[:, 1] - corners[:, 0]
+        self._edge2 = corners[:, 2] - corners[:, 0]
+        self.depth = 0
+        level = np.array([0])
+        while len(level):
+            inner = self.child[level]
+            level = (inner[inner >= 0][:, None] + np.arange(2)).reshape(-1)
+            self.depth += 1
+
+    @property
+    def node_count(self) -> int:
+        return len(self.child)
+
+    def intersect(
+        self,
+        origins: np.ndarray,
+        directions: np.ndarray,
+        min_distance: float = 0.0,
+        max_distance: float = np.inf,
+    ) -> RayHits:
+        """Closest hit of every ray between min_distance and max_distance
+
+        Distances are in units of each ray's direction, so unit directions
+        give world distances. Both faces of a triangle are hit.
+        """
+        return self._trace(
+            origins, directions, min_distance, max_distance, any_hit=False
+        )
+
+    def occluded(
+        self,
+        origins: np.ndarray,
+        directions: np.ndarray,
+        min_distance: float = 0.0,
+        max_distance: float = np.inf,
+    ) -> np.ndarray:
+        """Whether each ray hits anything between min_distance and max_distance
+
+        Rays stop at their first hit, so this is cheaper than intersect for
+        visibility and ambient occlusion.
+        """
+        hits = self._trace(
+            origins, directions, min_distance, max_distance, any_hit=True
+        )
+        return hits.triangles >= 0
+
+    def _trace(
+        self,
+        origins: np.ndarray,
+        directions: np.ndarray,
+        min_distance: float,
+        max_distance: float,
+        any_hit: bool,
+    ) -> RayHits:
+        origins = np.ascontiguousarray(origins, dtype=np.float64).reshape(-1, 3)
+        directions = np.ascontiguousarray(directions, dtype=np.float64).reshape(-1, 3)
+        if len(origins) != len(directions):
+            raise ValueError("Every ray needs one origin and one direction")
+        distances = np.full(len(origins), float(max_distance))
+        triangles = np.full(len(origins), -1, dtype=np.int64)
+        barycentrics = np.zeros((len(origins), 2))
+        if not len(self.faces):
+            return RayHits(np.full(len(origins), np.inf), triangles, barycentrics)
+
+        # Zero components would turn the slab test into 0 * inf
+        tiny = np.copysign(1e-300, directions)
+        inverse = 1.0 / np.where(directions == 0.0, tiny, directions)
+        for begin in range(0, len(origins), RAY_BATCH):
+            rays = np.arange(begin, min(begin + RAY_BATCH, len(origins)))
+            # Per-ray stacks of nodes still to visit and where the ray enters them
+            stack = np.zeros((len(rays), self.depth + 1), dtype=np.int64)
+            entries = np.zeros((len(rays), self.depth + 1))
+            root = np.zeros(len(rays), dtype=np.int64)
+            entries[:, 0], hit = self._slab(
+                origins, inverse, rays, root, min_distance, distances
+            )
+            size = hit.astype(np.int64)
+            active = np.flatnonzero(hit)
+            while len(active):
+                # Pop one node per ray; nodes behind a closer hit found meanwhile are
+                # dropped
+                size[active] -= 1
+                node = stack[active, size[active]]
+                ray = rays[active]
+                live = entries[active, size[active]] <= distances[ray]
+                local, ray, node = active[live], ray[live], node[live]
+
+                leaf = self.child[node] < 0
+                if leaf.any():
+                    self._intersect_leaves(
+                        origins,
+                        directions,
+                        ray[leaf],
+                        node[leaf],
+                        min_distance,
+                        distances,
+                        triangles,
+                        barycentrics,
+                    )
+                    if any_hit:
+                        size[local[leaf][triangles[ray[leaf]] >= 0]] = 0
+                local, ray, first = local[~leaf], ray[~leaf], self.child[node[~leaf]]
+                near_first, hit_first = self._slab(
+                    origins, inverse, ray, first, min_distance, distances
+                )
+                near_second, hit_second = self._slab(
+                    origins, inverse, ray, first + 1, min_distance, distances
+                )
+                # Push the farther child first so the nearer one is visited next
+                swap = near_second < near_first
+                farther = (
+                    np.where(swap, first, first + 1),
+                    np.where(swap, near_first, near_second),
+                    np.where(swap, hit_first, hit_second),
+                )
+                nearer = (
+                    np.where(swap, first + 1, first),
+                    np.where(swap, near_second, near_first),
+                    np.where(swap, hit_second, hit_first),
+                )
+                for child, near, hit in (farther, nearer):
+                    target = local[hit]
+                    stack[target, size[target]] = child[hit]
+                    entries[target, size[target]] = near[hit]
+                    size[target] += 1
+                active = active[size[active] > 0]
+
+        distances[triangles < 0] = np.inf
+        return RayHits(distances, triangles, barycentrics)
+
+    def _slab(
+        self,
+        origins: np.ndarray,
+        inverse: np.ndarray,
+        ray: np.ndarray,
+        node: np.ndarray,
+        min_distance: float,
+        distances: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Entry distance of each ray into each node's box
+
+        Also whether the ray enters the box before its closest hit so far.
+        """
+        near_side = (self.low[node] - origins[ray]) * inverse[ray]
+        far_side = (self.high[node] - origins[ray]) * inverse[ray]
+        near = np.minimum(near_side, far_side).max(axis=1)
+        far = np.maximum(near_side, far_side).min(axis=1) * SLAB_TOLERANCE
+        return near, (near <= far) & (far >= min_distance) & (near <= distances[ray])
+
+    def _intersect_leaves(
+        self,
+        origins: np.ndarray,
+        directions: np.ndarray,
+        ray: np.ndarray,
+        node: np.ndarray,
+        min_distance: float,
+        distances: np.ndarray,
+        triangles: np.ndarray,
+        barycentrics: np.ndarray,
+    ) -> None:
+        """Moller-Trumbore against the triangles of the leaves, keeping closest hits"""
+        counts = self.count[node]
+        ray = np.repeat(ray, counts)
+        shift = np.repeat(self.start[node] - np.cumsum(counts) + counts, counts)
+        slot = np.arange(int(counts.sum())) + shift
+        direction = directions[ray]
+        edge1, edge2 = self._edge1[slot], self._edge2[slot]
+        normal = _cross(direction, edge2)
+        determinant = _dot(edge1, normal)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inverse = 1.0 / determinant
+            offset = origins[ray] - self._origin[slot]
+            u = _dot(offset, normal) * inverse
+            turned = _cross(offset, edge1)
+            v = _dot(direction, turned) * inverse
+            t = _dot(edge2, turned) * inverse
+            inside = (determinant != 0) & (u >= 0) & (v >= 0) & (u + v <= 1)
+            valid = inside & (t >= min_distance) & (t < distances[ray])
+        if not valid.any():
+            return
+        ray, slot, t, u, v = ray[valid], slot[valid], t[valid], u[valid], v[valid]
+        # Closest candidate per ray
+        ranked = np.lexsort((t, ray))
+        first = ranked[np.r_[True, ray[ranked][1:] != ray[ranked][:-1]]]
+        target = ray[first]
+        distances[target] = t[first]
+        triangles[target] = self.order[slot[first]]
+        barycentrics[target] = np.stack([u[first], v[first]], axis=1)
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Write the BVH as .npz, atomically so readers never see a partial file"""
+        directory = Path(path).parent
+        directory.mkdir(parents=True, exist_ok=True)
+        handle, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as output:
+                np.savez(
+                    output,
+                    version=np.int64(BVH_FORMAT_VERSION),
+                    vertices=self.vertices,
+                    faces=self.faces,
+                    low=self.low,
+                    high=self.high,
+                    child=self.child,
+                    start=self.start,
+                    count=self.count,
+                    order=self.order,
+                )
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "Bvh":
+        """Read a BVH written by save"""
+        with np.load(path, allow_pickle=False) as data:
+            if "version" not in data or int(data["version"]) != BVH_FORMAT_VERSION:
+                raise ValueError(f"{path} is not a version {BVH_FORMAT_VERSION} BVH")
+            names = (
+                "vertices", "faces", "low", "high", "child", "start", "count", "order",
+            )
+            return cls(**{name: data[name] for name in names})
+
+def build_bvh(vertices: np.ndarray, faces: np.ndarray) -> Bvh:
+    """Build a BVH top down with a binned surface area heuristic
+
+    All nodes of a level are split together: triangle centroids are binned
+    along each axis of their node's centroid bounds, and each node takes
+    the cheapest of the SAH_BINS - 1 planes per axis, or becomes a leaf when
+    testing its triangles directly is cheaper. Nodes whose centroids all
+    coincide are halved instead.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    corners = vertices[faces]
+    box_low = corners.min(axis=1)
+    box_high = corners.max(axis=1)
+    centroid = (box_low + box_high) / 2.0
+    order = np.arange(len(faces))
+
+    levels = []
+    starts = np.array([0], dtype=np.int64)
+    counts = np.array([len(faces)], dtype=np.int64)
+    next_id = 1
+    while len(starts):
+        nodes = len(starts)
+        heads = np.cumsum(counts) - counts
+        rank = np.repeat(np.arange(nodes), counts)
+        shift = np.repeat(starts - heads, counts)
+        position = np.arange(int(counts.sum())) + shift
+        triangle = order[position]
+        if len(triangle):
+            low = np.minimum.reduceat(box_low[triangle], heads, axis=0)
+            high = np.maximum.reduceat(box_high[triangle], heads, axis=0)
+            centroid_low = np.minimum.reduceat(centroid[triangle], heads, axis=0)
+            centroid_high = np.maximum.reduceat(centroid[triangle], heads, axis=0)
+        else:
+            low = high = centroid_low = centroid_high = np.zeros((nodes, 3))
+
+        # Cheapest binned split of every node, over all three axes
+        best_cost = np.full(nodes, np.inf)
+        best_axis = np.zeros(nodes, dtype=np.int64)
+        best_bin = np.zeros(nodes, dtype=np.int64)
+        splittable = counts > 1
+        for axis in range(3):
+            extent = centroid_high[:, axis] - centroid_low[:, axis]
+            width = np.where(extent > 0, extent, 1.0)
+            scale = np.where(extent > 0, SAH_BINS / width, 0.0)
+            along = (centroid[triangle, axis] - centroid_low[rank, axis]) * scale[rank]
+            bins = np.minimum(along.astype(np.int64), SAH_BINS - 1)
+            key = rank * SAH_BINS + bins
+            bin_count = np.bincount(key, minlength=nodes * SAH_BINS)
+            bin_count = bin_count.reshape(nodes, SAH_BINS)
+            bin_low = np.full((nodes * SAH_BINS, 3), np.inf)
+            bin_high = np.full((nodes * SAH_BINS, 3), -np.inf)
+            np.minimum.at(bin_low, key, box_low[triangle])
+            np.maximum.at(bin_high, key, box_high[triangle])
+            bin_low = bin_low.reshape(nodes, SAH_BINS, 3)
+            bin_high = bin_high.reshape(nodes, SAH_BINS, 3)
+            # Plane i puts bins 0..i on the left
+            left = np.cumsum(bin_count, axis=1)[:, :-1]
+            right = counts[:, None] - left
+            left_area = _surface_area(
+                np.minimum.accumulate(bin_low, axis=1),
+                np.maximum.accumulate(bin_high, axis=1),
+            )[:, :-1]
+            right_area = _surface_area(
+                np.minimum.accumulate(bin_low[:, ::-1], axis=1)[:, ::-1],
+                np.maximum.accumulate(bin_high[:, ::-1], axis=1)[:, ::-1],
+            )[:, 1:]
+            both = (left > 0) & (right > 0)
+            cost = np.where(both, left_area * left + right_area * right, np.inf)
+            choice = np.argmin(cost, axis=1)
+            cost = cost[np.arange(nodes), choice]
+            better = cost < best_cost
+            best_cost[better] = cost[better]
+            best_axis[better] = axis
+            best_bin[better] = choice[better]
+
+        area = _surface_area(low, high)
+        area = np.maximum(area, np.finfo(np.float64).tiny)
+        split_cost = TRAVERSAL_COST + best_cost / area
+        split = splittable & ((split_cost < counts) | (counts > MAX_LEAF_SIZE))
+        halve = split & ~np.isfinite(best_cost)
+
+        child = np.full(nodes, -1, dtype=np.int64)
+        split_nodes = np.flatnonzero(split)
+        child[split_nodes] = next_id + 2 * np.arange(len(split_nodes))
+        next_id += 2 * len(split_nodes)
+        levels.append((low, high, child, starts, counts))
+        if not len(split_nodes):
+            break
+
+        # Stable partition of every split node's run: left side first
+        moving = np.flatnonzero(split[rank])
+        owner = rank[moving]
+        axis = best_axis[owner]
+        extent = centroid_high[owner, axis] - centroid_low[owner, axis]
+        along = centroid[triangle[moving], axis] - centroid_low[owner, axis]
+        along = along * SAH_BINS / np.where(extent > 0, extent, 1.0)
+        bins = np.minimum(along.astype(np.int64), SAH_BINS - 1)
+        side = bins > best_bin[owner]
+        offset = position[moving] - starts[owner]
+        side = np.where(halve[owner], offset >= counts[owner] // 2, side)
+        order[position[moving]] = triangle[moving][np.lexsort((side, owner))]
+        left_counts = np.bincount(owner, weights=~side, minlength=nodes)
+        left_counts = left_counts.astype(np.int64)[split_nodes]
+
+        starts, counts = starts[split_nodes], counts[split_nodes]
+        starts = np.stack([starts, starts + left_counts], axis=1).reshape(-1)
+        counts = np.stack([left_counts, counts - left_counts], axis=1).reshape(-1)
+
+    low, high, child, start, count = (np.concatenate(arrays) for arrays in zip(*levels))
+    return Bvh(vertices, faces, low, high, child, start, count, order)
+
+def bvh_key(mesh: Mesh) -> str:
+    """Cache key of a mesh's BVH; only positions and faces matter"""
+    shape = Mesh(mesh.vertices, mesh.faces)
+    return mesh_content_hash(shape, {"bvh": BVH_FORMAT_VERSION})
+
+class BvhCache:
+    """BVHs of recently traced meshes, in memory and as files on local disk
+
+    A BVH is built once per mesh and stored under its geometry hash, so the
+    later stages of a run, in this or another process, load it instead of
+    rebuilding it. Files beyond disk_bytes are evicted least recently used
+    first.
+    """
+
+    def __init__(self, path: Optional[str], max_entries: int, disk_bytes: int):
+        self.path = Path(path) if path else None
+        self.max_entries = max_entries
+        self.disk_bytes = disk_bytes if self.path is not None else 0
+        self._entries: "OrderedDict[str, Bvh]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _file(self, key: str) -> Path:
+        if self.path is None:
+            raise ValueError("BVH cache has no directory")
+        return self.path / f"{key}.npz"
+
+    def _remember(self, key: str, bvh: Bvh) -> None:
+        with self._lock:
+            self._entries[key] = bvh
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_build(self, mesh: Mesh) -> Tuple[Bvh, bool]:
+        """BVH of a mesh and whether it was reused rather than built"""
+        key = bvh_key(mesh)
+        with self._lock:
+            bvh = self._entries.get(key)
+            if bvh is not None:
+                self._entries.move_to_end(key)
+                return bvh, True
+        if self.disk_bytes:
+            file = self._file(key)
+            try:
+                bvh = Bvh.load(str(file))
+                os.utime(file)
+            except FileNotFoundError:
+                bvh = None
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Ignoring unreadable BVH {file}: {str(e)}")
+                bvh = None
+            if bvh is not None:
+                self._remember(key, bvh)
+                return bvh, True
+
+        started = time.perf_counter()
+        bvh = build_bvh(mesh.vertices, mesh.faces)
+        logger.info(
+            f"Built BVH of {len(mesh.faces)} triangles: {bvh.node_count} nodes in "
+            f"{time.perf_counter() - started:.2f}s"
+        )
+        self._remember(key, bvh)
+        if self.disk_bytes:
+            try:
+                bvh.save(str(self._file(key)))
+                self._evict()
+            except OSError as e:
+                logger.warning(f"Could not store BVH {key}: {str(e)}")
+        return bvh, False
+
+    def _evict(self) -> None:
+        """Delete the least recently used files until the directory fits disk_bytes"""
+        if self.path is None:
+            return
+        entries = []
+        for file in self.path.glob("*.npz"):
+            try:
+                info = file.stat()
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, file))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        # The newest file always stays, however large
+        for _, size, file in entries[:-1]:
+            if total <= self.disk_bytes:
+                break
+            try:
+                file.unlink()
+            except OSError:
+                continue
+            total -= size
+
+def _cache_path() -> str:
+    default = os.path.join(tempfile.gettempdir(), "voxelverve-bvh")
+    return settings.BVH_CACHE_PATH or default
+
+bvh_cache = BvhCache(
+    _cache_path(), settings.BVH_CACHE_SIZE, settings.BVH_CACHE_DISK_BYTES
+)
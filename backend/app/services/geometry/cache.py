@@ -0,0 +1,218 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from app.core.config import settings
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever an operation's output changes, so older results are not served
+GEOMETRY_ENGINE_VERSION = 1
+
+def canonical_options(value: Any) -> Any:
+    """Options in a form that compares equal when they mean the same thing
+
+    Unset (None) keys are dropped, tuples become lists and integral floats
+    become ints, so {"ratio": 1.0, "seed": None} and {"ratio": 1} match.
+    """
+    if isinstance(value, dict):
+        return {
+            str(key): canonical_options(item)
+            for key, item in value.items()
+            if item is not None
+        }
+    if isinstance(value, (list, tuple)):
+        return [canonical_options(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def result_key(
+    content_hash: str,
+    operation: str,
+    options: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Cache key of an operation on a mesh with the given options"""
+    options = canonical_options(options or {})
+    payload = [GEOMETRY_ENGINE_VERSION, operation, content_hash, options]
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+class ResultCache:
+    """Results of geometry operations, keyed by mesh content and options
+
+    Results are kept as JSON in a small in-memory LRU in front of a larger
+    directory on local disk; both tiers evict least recently used entries by
+    bytes. Output assets stay in storage, so a result only holds their URLs.
+    Concurrent requests for the same key share one computation.
+
+    Several processes may share the directory: entries are written
+    atomically and read even if this process did not write them, but each
+    process only evicts the entries it knows about.
+    """
+
+    def __init__(self, path: Optional[str], memory_bytes: int, disk_bytes: int):
+        self.path = Path(path) if path else None
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes if self.path is not None else 0
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        self._disk: Optional["OrderedDict[str, int]"] = None  # loaded on first use
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, "asyncio.Future[bytes]"] = {}
+
+    def _file(self, key: str) -> Path:
+        if self.path is None:
+            raise ValueError("Result cache has no directory")
+        return self.path / key[:2] / f"{key}.json"
+
+    def _disk_index(self) -> "OrderedDict[str, int]":
+        """Entries on disk, least recently used first; called with the lock held"""
+        if self._disk is None:
+            entries = []
+            if self.path is not None and self.path.is_dir():
+                for file in self.path.glob("*/*.json"):
+                    try:
+                        info = file.stat()
+                    except OSError:
+                        continue
+                    entries.append((info.st_mtime, file.stem, info.st_size))
+            entries.sort()
+            self._disk = OrderedDict((key, size) for _, key, size in entries)
+            self._disk_size = sum(size for _, _, size in entries)
+        return self._disk
+
+    def _remember(self, key: str, data: bytes) -> None:
+        """Add an entry to the memory tier; called with the lock held"""
+        if len(data) > self.memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_size -= len(previous)
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Cached result as JSON, or None"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+        if not self.disk_bytes:
+            return None
+        file = self._file(key)
+        try:
+            data = file.read_bytes()
+            os.utime(file)
+        except OSError:
+            return None
+        with self._lock:
+            index = self._disk_index()
+            if key not in index:
+                index[key] = len(data)
+                self._disk_size += len(data)
+            index.move_to_end(key)
+            self._remember(key, data)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        with self._lock:
+            self._remember(key, data)
+        if not self.disk_bytes or len(data) > self.disk_bytes:
+            return
+        file = self._file(key)
+        try:
+            file.parent.mkdir(parents=True, exist_ok=True)
+            # Write under a temporary name so readers never see a partial entry
+            handle, temporary = tempfile.mkstemp(dir=file.parent, suffix=".tmp")
+            with os.fdopen(handle, "wb") as output:
+                output.write(data)
+            os.replace(temporary, file)
+        except OSError as e:
+            logger.warning(f"Could not write geometry cache entry {key}: {str(e)}")
+            return
+
+        with self._lock:
+            index = self._disk_index()
+            self._disk_size += len(data) - index.pop(key, 0)
+            index[key] = len(data)
+            evicted = []
+            while self._disk_size > self.disk_bytes and len(index) > 1:
+                old_key, size = index.popitem(last=False)
+                self._disk_size -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                self._file(old_key).unlink()
+            except OSError:
+                pass
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Cached result for key, computing it at most once across concurrent callers
+
+        Returns the result and whether it came from the cache or another
+        caller's computation. Every caller gets its own copy. Failures are
+        not cached; they reach every caller waiting on that computation.
+        """
+        loop = asyncio.get_running_loop()
+        flight = self._inflight.get(key)
+        shared = flight is not None
+        if flight is None:
+            data = await loop.run_in_executor(None, self.get, key)
+            if data is not None:
+                return json.loads(data), True
+            # Another caller may have started while the disk was read
+            flight = self._inflight.get(key)
+            shared = flight is not None
+            if flight is None:
+                flight = asyncio.ensure_future(self._compute(key, compute))
+                self._inflight[key] = flight
+                flight.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded so a disconnecting client does not cancel the others' result
+        data = await asyncio.shield(flight)
+        return json.loads(data), shared
+
+    async def _compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> bytes:
+        result = await compute()
+        data = json.dumps(result, default=_json_default).encode("utf-8")
+        await asyncio.get_running_loop().run_in_executor(None, self.put, key, data)
+        return data
+
+def _cache_path() -> str:
+    default = os.path.join(tempfile.gettempdir(), "voxelverve-geometry-cache")
+    return settings.GEOMETRY_CACHE_PATH or default
+
+result_cache = ResultCache(
+    _cache_path(),
+    settings.GEOMETRY_CACHE_MEMORY_BYTES,
+    settings.GEOMETRY_CACHE_DISK_BYTES,
+)
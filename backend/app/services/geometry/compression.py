@@ -0,0 +1,437 @@
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from app.services.geometry.mesh import Mesh
+import time
+import numpy as np
+
+COMPRESSION_MODES = ("none", "quantize", "meshopt")
+
+# Attribute bit depths per optimize target; options may override any of them
+COMPRESSION_PRESETS = {
+    "web": {"position_bits": 14, "normal_bits": 8, "uv_bits": 12},
+    "mobile": {"position_bits": 12, "normal_bits": 8, "uv_bits": 10},
+    "desktop": {"position_bits": 16, "normal_bits": 12, "uv_bits": 14},
+}
+
+# meshopt codec stream layout (vertex codec version 0, index sequence codec version 1)
+VERTEX_HEADER = 0xA0
+INDEX_HEADER = 0xD1
+BYTE_GROUP = 16
+VERTEX_BLOCK_BYTES = 8192
+VERTEX_BLOCK_MAX = 256
+VERTEX_TAIL = 32
+INDEX_TAIL = 4
+
+# Header codes of the group encodings, in the order the reference encoder tries
+# them (8, 0, 2, 4 bits)
+GROUP_CODES = np.array([3, 0, 1, 2], dtype=np.uint8)
+
+class CompressionSettings(NamedTuple):
+    mode: str  # "quantize" or "meshopt"
+    position_bits: int
+    normal_bits: int
+    uv_bits: int
+
+def compression_settings(
+    target: str,
+    options: Optional[Dict[str, Any]] = None,
+) -> Optional[CompressionSettings]:
+    """Validated compression settings for a target, or None without compression"""
+    options = options or {}
+    mode = options.get("compression") or "none"
+    if mode not in COMPRESSION_MODES:
+        raise ValueError(
+            f"Unsupported compression: {mode}; "
+            f"expected one of {', '.join(COMPRESSION_MODES)}"
+        )
+    if mode == "none":
+        return None
+    if target not in COMPRESSION_PRESETS:
+        raise ValueError(
+            f"Unknown optimize target: {target}; "
+            f"expected one of {', '.join(COMPRESSION_PRESETS)}"
+        )
+    defaults = COMPRESSION_PRESETS[target]
+    preset = {**defaults, **{k: v for k, v in options.items() if k in defaults}}
+    for name, value in preset.items():
+        if (
+            not isinstance(value, int)
+            or isinstance(value, bool)
+            or not 2 <= value <= 16
+        ):
+            raise ValueError(f"{name} must be an integer between 2 and 16")
+    return CompressionSettings(mode=mode, **preset)
+
+def _padded_rows(values: np.ndarray) -> np.ndarray:
+    # Vertex attributes start on 4-byte boundaries, so rows are padded with zero
+    # components
+    row_bytes = values.shape[1] * values.itemsize
+    padding = (-row_bytes % 4) // values.itemsize
+    if padding:
+        zeros = np.zeros((len(values), padding), dtype=values.dtype)
+        values = np.concatenate([values, zeros], axis=1)
+    return np.ascontiguousarray(values)
+
+def quantize_positions(
+    vertices: np.ndarray,
+    bits: int,
+) -> Tuple[np.ndarray, np.ndarray, float]:
+    """Positions on an integer grid of 2**bits steps along the longest axis
+
+    Returns the padded integer rows with the offset and uniform scale that
+    map them back (the node transform of KHR_mesh_quantization). One scale
+    for all axes keeps normals valid under that transform.
+    """
+    low = vertices.min(axis=0) if len(vertices) else np.zeros(3)
+    extent = float((vertices.max(axis=0) - low).max()) if len(vertices) else 0.0
+    scale = extent / ((1 << bits) - 1) if extent > 0 else 1.0
+    dtype = np.uint8 if bits <= 8 else np.uint16
+    grid = np.rint((vertices - low) / scale).astype(dtype)
+    return _padded_rows(grid), low, scale
+
+def quantize_snorm(values: np.ndarray, bits: int) -> np.ndarray:
+    """Values in [-1, 1] rounded to bits and stored as normalized int8 or int16"""
+    dtype = np.int8 if bits <= 8 else np.int16
+    levels = (1 << (bits - 1)) - 1
+    stored = np.iinfo(dtype).max
+    snapped = np.rint(np.clip(values, -1.0, 1.0) * levels)
+    return _padded_rows(np.rint(snapped * (stored / levels)).astype(dtype))
+
+def quantize_unorm(values: np.ndarray, bits: int) -> np.ndarray:
+    """Values in [0, 1] rounded to bits and stored as normalized uint8 or uint16"""
+    dtype = np.uint8 if bits <= 8 else np.uint16
+    levels = (1 << bits) - 1
+    stored = np.iinfo(dtype).max
+    snapped = np.rint(np.clip(values, 0.0, 1.0) * levels)
+    return _padded_rows(np.rint(snapped * (stored / levels)).astype(dtype))
+
+def encode_varint(values: np.ndarray) -> np.ndarray:
+    """LEB128 bytes of unsigned integers, 7 bits per byte; the high bit continues"""
+    values = np.asarray(values, dtype=np.uint64)
+    shifts = np.arange(5, dtype=np.uint64) * np.uint64(7)
+    groups = (values[:, None] >> shifts) & np.uint64(0x7F)
+    lengths = 1 + (values[:, None] >= (np.uint64(1) << shifts[1:])).sum(axis=1)
+    used = np.arange(5) < lengths[:, None]
+    more = np.arange(5) < (lengths - 1)[:, None]
+    return (groups.astype(np.uint8) | (more * 0x80).astype(np.uint8))[used]
+
+def decode_varint(data: np.ndarray, count: int) -> Tuple[np.ndarray, int]:
+    """The first count LEB128 values of data and the number of bytes they take"""
+    data = np.asarray(data, dtype=np.uint8)
+    ends = np.flatnonzero(data < 0x80)
+    if len(ends) < count:
+        raise ValueError("Truncated varint stream")
+    if not count:
+        return np.zeros(0, dtype=np.uint64), 0
+    used = int(ends[count - 1]) + 1
+    data = data[:used]
+    starts = np.r_[0, ends[:count - 1] + 1]
+    position = np.arange(used) - np.repeat(starts, np.diff(np.r_[starts, used]))
+    if position.max() > 4:
+        raise ValueError("Varint longer than 32 bits")
+    shifts = position.astype(np.uint64) * np.uint64(7)
+    parts = (data & 0x7F).astype(np.uint64) << shifts
+    return np.add.reduceat(parts, starts), used
+
+def encode_index_sequence(indices: np.ndarray) -> bytes:
+    """Index data in the meshopt index sequence format, mode INDICES
+
+    Every index is stored as the zigzag varint of its delta from the
+    previous one. The format lets each delta pick one of two baselines;
+    this encoder always uses the first, which any decoder accepts.
+    """
+    indices = np.asarray(indices, dtype=np.int64).ravel()
+    deltas = np.diff(indices, prepend=0).astype(np.int32).astype(np.int64)
+    zigzag = ((deltas << 1) ^ (deltas >> 31)) & 0xFFFFFFFF
+    body = encode_varint((zigzag << 1) & 0xFFFFFFFF)
+    return bytes([INDEX_HEADER]) + body.tobytes() + bytes(INDEX_TAIL)
+
+def decode_index_sequence(buffer: Any, count: int) -> np.ndarray:
+    """uint32 indices from a meshopt index sequence"""
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    if (
+        len(data) < 1 + count + INDEX_TAIL
+        or data[0] & 0xF0 != 0xD0
+        or data[0] & 0x0F > 1
+    ):
+        raise ValueError("Invalid meshopt index sequence")
+    values, _ = decode_varint(data[1:len(data) - INDEX_TAIL], count)
+    baseline = (values & np.uint64(1)).astype(bool)
+    zigzag = (values >> np.uint64(1)).astype(np.int64)
+    deltas = (zigzag >> 1) ^ -(zigzag & 1)
+    # Each baseline accumulates only the deltas that refer to it
+    indices = np.empty(count, dtype=np.int64)
+    for selected in (~baseline, baseline):
+        indices[selected] = np.cumsum(deltas[selected])
+    return (indices & 0xFFFFFFFF).astype(np.uint32)
+
+def vertex_block_size(stride: int) -> int:
+    return min((VERTEX_BLOCK_BYTES // stride) & ~(BYTE_GROUP - 1), VERTEX_BLOCK_MAX)
+
+def _zigzag8(deltas: np.ndarray) -> np.ndarray:
+    return (deltas << 1) ^ np.where(deltas & 0x80, 0xFF, 0).astype(np.uint8)
+
+def _encode_segments(columns: np.ndarray) -> np.ndarray:
+    """Byte streams of (segments, length) zigzag deltas
+
+    A 2-bit code per 16-byte group comes first, then the groups.
+    """
+    segments = len(columns)
+    groups = columns.reshape(segments, -1, BYTE_GROUP)
+    group_count = groups.shape[1]
+
+    # Group sizes with 8, 0, 2 and 4 bits per value; out-of-range values follow as
+    # escape bytes
+    escapes2 = groups >= 3
+    escapes4 = groups >= 15
+    sizes = np.stack([
+        np.full(groups.shape[:2], BYTE_GROUP),
+        np.where(groups.any(axis=2), np.iinfo(np.int64).max, 0),
+        4 + escapes2.sum(axis=2),
+        8 + escapes4.sum(axis=2),
+    ])
+    choice = np.argmin(sizes, axis=0)
+
+    rows = np.zeros((segments, group_count, 2 * BYTE_GROUP), dtype=np.uint8)
+    mask = np.zeros(rows.shape, dtype=bool)
+    raw = choice == 0
+    rows[raw, :BYTE_GROUP] = groups[raw]
+    mask[raw, :BYTE_GROUP] = True
+    for index, bits, escapes in ((2, 2, escapes2), (3, 4, escapes4)):
+        selected = choice == index
+        per_byte = 8 // bits
+        fields = np.minimum(groups[selected], (1 << bits) - 1)
+        fields = fields.reshape(-1, BYTE_GROUP // per_byte, per_byte)
+        shifts = (bits * np.arange(per_byte - 1, -1, -1)).astype(np.uint8)
+        packed = np.bitwise_or.reduce(fields << shifts, axis=2)
+        rows[selected, :packed.shape[1]] = packed
+        mask[selected, :packed.shape[1]] = True
+        rows[selected, BYTE_GROUP:] = groups[selected]
+        mask[selected, BYTE_GROUP:] = escapes[selected]
+
+    # Header: four 2-bit codes per byte, first group in the low bits
+    header_size = (group_count + 3) // 4
+    codes = np.zeros((segments, header_size * 4), dtype=np.uint8)
+    codes[:, :group_count] = GROUP_CODES[choice]
+    shifts = np.array([0, 2, 4, 6], dtype=np.uint8)
+    header = np.bitwise_or.reduce(
+        codes.reshape(segments, header_size, 4) << shifts, axis=2
+    )
+    header_row = np.zeros((segments, 1, 2 * BYTE_GROUP), dtype=np.uint8)
+    header_row[:, 0, :header_size] = header
+    header_mask = np.zeros(header_row.shape, dtype=bool)
+    header_mask[:, 0, :header_size] = True
+
+    rows = np.concatenate([header_row, rows], axis=1)
+    mask = np.concatenate([header_mask, mask], axis=1)
+    return rows[mask]
+
+def encode_vertex_buffer(data: np.ndarray) -> bytes:
+    """Vertex rows in the meshopt vertex codec format, mode ATTRIBUTES
+
+    Each byte of a vertex is delta coded against the same byte of the
+    previous vertex; blocks of vertices then store every byte position as
+    16-byte groups of 0, 2, 4 or 8 bits per delta, whichever is smallest.
+    """
+    data = np.ascontiguousarray(data, dtype=np.uint8)
+    count, stride = data.shape
+    if stride % 4 or not 0 < stride <= 256:
+        raise ValueError("Vertex stride must be a multiple of 4 up to 256 bytes")
+    parts = [bytes([VERTEX_HEADER])]
+    if count:
+        deltas = _zigzag8(np.diff(data, axis=0, prepend=data[:1]))
+        block = vertex_block_size(stride)
+        full = count // block
+        if full:
+            columns = deltas[:full * block].reshape(full, block, stride)
+            columns = columns.transpose(0, 2, 1).reshape(full * stride, block)
+            parts.append(_encode_segments(columns).tobytes())
+        rest = count - full * block
+        if rest:
+            width = (rest + BYTE_GROUP - 1) & ~(BYTE_GROUP - 1)
+            columns = np.zeros((stride, width), dtype=np.uint8)
+            columns[:, :rest] = deltas[full * block:].T
+            parts.append(_encode_segments(columns).tobytes())
+    # The first vertex closes the stream, padded to the tail size
+    first = data[0].tobytes() if count else bytes(stride)
+    parts.append(bytes(max(VERTEX_TAIL - stride, 0)) + first)
+    return b"".join(parts)
+
+# Out-of-range field counts of every byte value for 2-bit and 4-bit groups
+_SENTINELS = {
+    2: [sum((byte >> shift) & 3 == 3 for shift in (0, 2, 4, 6)) for byte in range(256)],
+    4: [sum((byte >> shift) & 15 == 15 for shift in (0, 4)) for byte in range(256)],
+}
+
+def decode_vertex_buffer(buffer: Any, count: int, stride: int) -> np.ndarray:
+    """(count, stride) uint8 vertex rows from a meshopt vertex stream
+
+    Group offsets depend on the escape bytes of every earlier group, so
+    they are found in one pass over the stream; the groups are then
+    unpacked together.
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    tail = max(VERTEX_TAIL, stride)
+    if len(data) < 1 + tail or data[0] != VERTEX_HEADER:
+        raise ValueError("Invalid meshopt vertex stream")
+    raw = bytes(data)
+    end = len(raw) - tail
+    first = data[len(data) - stride:]
+    block = vertex_block_size(stride)
+
+    group_offsets: List[int] = []
+    group_codes: List[int] = []
+    position = 1
+    for start in range(0, count, block):
+        group_count = (min(block, count - start) + BYTE_GROUP - 1) // BYTE_GROUP
+        for _ in range(stride):
+            header = raw[position:position + (group_count + 3) // 4]
+            position += len(header)
+            for group in range(group_count):
+                code = (header[group // 4] >> (2 * (group % 4))) & 3
+                group_offsets.append(position)
+                group_codes.append(code)
+                if code == 1:
+                    escapes = raw[position:position + 4]
+                    position += 4 + sum(_SENTINELS[2][value] for value in escapes)
+                elif code == 2:
+                    escapes = raw[position:position + 8]
+                    position += 8 + sum(_SENTINELS[4][value] for value in escapes)
+                elif code == 3:
+                    position += BYTE_GROUP
+            if position > end:
+                raise ValueError("Truncated meshopt vertex stream")
+
+    offsets = np.array(group_offsets, dtype=np.int64)
+    codes = np.array(group_codes, dtype=np.uint8)
+    padded = np.concatenate([data, np.zeros(2 * BYTE_GROUP, dtype=np.uint8)])
+    groups = np.zeros((len(codes), BYTE_GROUP), dtype=np.uint8)
+    verbatim = codes == 3
+    groups[verbatim] = padded[offsets[verbatim, None] + np.arange(BYTE_GROUP)]
+    for code, bits in ((1, 2), (2, 4)):
+        selected = np.flatnonzero(codes == code)
+        per_byte = 8 // bits
+        fixed = BYTE_GROUP // per_byte
+        packed = padded[offsets[selected, None] + np.arange(fixed)]
+        shifts = (bits * np.arange(per_byte - 1, -1, -1)).astype(np.uint8)
+        fields = (packed[:, :, None] >> shifts) & ((1 << bits) - 1)
+        fields = fields.reshape(-1, BYTE_GROUP)
+        # Sentinel fields take the next escape byte after the fixed part, in order
+        escaped = fields == (1 << bits) - 1
+        rank = np.cumsum(escaped, axis=1) - 1
+        rows, columns = np.nonzero(escaped)
+        escaped_at = offsets[selected][rows] + fixed + rank[rows, columns]
+        fields[rows, columns] = padded[escaped_at]
+        groups[selected] = fields
+
+    # Back to (vertex, byte) order, then undo zigzag and delta coding
+    full = count // block
+    zigzag = np.empty((count, stride), dtype=np.uint8)
+    split = full * stride * (block // BYTE_GROUP)
+    if full:
+        blocks = groups[:split].reshape(full, stride, block)
+        zigzag[:full * block] = blocks.transpose(0, 2, 1).reshape(-1, stride)
+    rest = count - full * block
+    if rest:
+        zigzag[full * block:] = groups[split:].reshape(stride, -1)[:, :rest].T
+    deltas = (zigzag >> 1) ^ np.where(zigzag & 1, 0xFF, 0).astype(np.uint8)
+    return np.cumsum(np.vstack([first[None], deltas]), axis=0, dtype=np.uint8)[1:]
+
+def uvs_quantizable(uvs: np.ndarray) -> bool:
+    """Normalized integers only cover [0, 1]; wrapped UVs stay float"""
+    return not len(uvs) or (uvs.min() >= 0.0 and uvs.max() <= 1.0)
+
+def quantized_streams(
+    mesh: Mesh,
+    settings: CompressionSettings,
+) -> Dict[str, np.ndarray]:
+    """Padded vertex rows per glTF attribute, as written to the buffer"""
+    positions, _, _ = quantize_positions(mesh.vertices, settings.position_bits)
+    streams = {"POSITION": positions}
+    if mesh.normals is not None:
+        streams["NORMAL"] = quantize_snorm(mesh.normals, settings.normal_bits)
+    if mesh.tangents is not None:
+        streams["TANGENT"] = quantize_snorm(mesh.tangents, settings.normal_bits)
+    if mesh.uvs is not None:
+        # glTF puts the texture origin at the top left
+        uvs = np.c_[mesh.uvs[:, 0], 1.0 - mesh.uvs[:, 1]]
+        if uvs_quantizable(uvs):
+            streams["TEXCOORD_0"] = quantize_unorm(uvs, settings.uv_bits)
+        else:
+            streams["TEXCOORD_0"] = uvs.astype(np.float32)
+    return streams
+
+def compression_report(mesh: Mesh, settings: CompressionSettings) -> Dict[str, Any]:
+    """Buffer sizes, quantization error and codec timings of a mesh under settings
+
+    Sizes compare float32 attributes and 32-bit indices with the quantized
+    buffers (what the GPU receives) and, for meshopt, the encoded streams
+    (what is downloaded). Decode time is that of the numpy reference
+    decoder, which scales like the client's.
+    """
+    streams = quantized_streams(mesh, settings)
+    index_bytes = (2 if mesh.vertex_count <= 0xFFFF else 4) * 3 * mesh.triangle_count
+    optional = (mesh.normals, 3), (mesh.tangents, 4), (mesh.uvs, 2)
+    components = 3 + sum(size for values, size in optional if values is not None)
+    raw = 4 * (components * mesh.vertex_count + 3 * mesh.triangle_count)
+    quantized = sum(values.nbytes for values in streams.values()) + index_bytes
+    report: Dict[str, Any] = {
+        "mode": settings.mode,
+        "position_bits": settings.position_bits,
+        "normal_bits": settings.normal_bits,
+        "uv_bits": settings.uv_bits,
+        "raw_bytes": raw,
+        "quantized_bytes": quantized,
+    }
+
+    # Largest errors after decoding; positions relative to the longest side of the
+    # bounding box
+    grid, offset, scale = quantize_positions(mesh.vertices, settings.position_bits)
+    extent = scale * ((1 << settings.position_bits) - 1)
+    restored = grid[:, :3] * scale + offset
+    error = np.abs(restored - mesh.vertices).max() / extent if len(grid) else 0.0
+    report["position_error"] = float(error)
+    if "NORMAL" in streams and mesh.normals is not None:
+        tiny = np.finfo(np.float64).tiny
+        stored = streams["NORMAL"][:, :3].astype(np.float64)
+        stored /= np.maximum(np.linalg.norm(stored, axis=1), tiny)[:, None]
+        lengths = np.maximum(np.linalg.norm(mesh.normals, axis=1), tiny)
+        source = mesh.normals / lengths[:, None]
+        cosine = np.clip(np.einsum("ij,ij->i", stored, source), -1.0, 1.0)
+        error = np.degrees(np.arccos(cosine.min())) if len(cosine) else 0.0
+        report["normal_error_degrees"] = float(error)
+    if "TEXCOORD_0" in streams and mesh.uvs is not None:
+        uvs = streams["TEXCOORD_0"][:, :2]
+        restored = uvs / np.iinfo(uvs.dtype).max if uvs.dtype != np.float32 else uvs
+        source = np.c_[mesh.uvs[:, 0], 1.0 - mesh.uvs[:, 1]]
+        error = np.abs(restored - source).max() if len(uvs) else 0.0
+        report["uv_error"] = float(error)
+
+    downloaded = quantized
+    if settings.mode == "meshopt":
+        rows = {
+            name: values.view(np.uint8).reshape(len(values), -1)
+            for name, values in streams.items()
+        }
+        started = time.perf_counter()
+        encoded = {name: encode_vertex_buffer(values) for name, values in rows.items()}
+        indices = encode_index_sequence(mesh.faces)
+        report["encode_seconds"] = time.perf_counter() - started
+        started = time.perf_counter()
+        for name, values in rows.items():
+            decode_vertex_buffer(encoded[name], len(values), values.shape[1])
+        decode_index_sequence(indices, 3 * mesh.triangle_count)
+        report["decode_seconds"] = time.perf_counter() - started
+        downloaded = sum(len(stream) for stream in encoded.values()) + len(indices)
+        report["encoded_bytes"] = downloaded
+    report["compression_ratio"] = raw / max(downloaded, 1)
+    return report
+
+def compression_targets(mesh: Mesh, mode: str) -> Dict[str, Dict[str, Any]]:
+    """compression_report for every preset target
+
+    Compares size against precision and decode time.
+    """
+    return {
+        target: compression_report(mesh, CompressionSettings(mode=mode, **preset))
+        for target, preset in COMPRESSION_PRESETS.items()
+    }
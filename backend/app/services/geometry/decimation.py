@@ -0,0 +1,526 @@
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from app.services.geometry.mesh import (
+    Mesh, compact_mesh, weld_attributes, weld_positions, widen_mesh,
+)
+from app.services.geometry.validation import (
+    bounding_diagonal, edge_topology, face_cross_products,
+)
+import heapq
+import math
+import numpy as np
+
+# Decimation targets per GeometryOptimizeRequest.target. The triangle budget is
+# the smaller of ratio * input triangles and max_triangles; max_error caps the
+# RMS distance a collapse may move the surface, relative to the bounding diagonal.
+DECIMATION_PRESETS = {
+    "web": {"ratio": 0.25, "max_triangles": 100000, "max_error": 0.01},
+    "mobile": {"ratio": 0.1, "max_triangles": 30000, "max_error": 0.02},
+    "desktop": {"ratio": 0.5, "max_triangles": 500000, "max_error": 0.005},
+}
+
+# Weight of the constraint planes along open boundaries and UV seams
+BOUNDARY_WEIGHT = 100.0
+SEAM_WEIGHT = 10.0
+
+# A collapse may not turn any remaining face by more than 90 degrees
+MIN_NORMAL_COSINE = 0.0
+
+TINY = np.finfo(np.float64).tiny
+
+# Collapses whose neighbourhoods are re-costed together; a batch also ends
+# when the next edge touches a position that is waiting for new costs
+UPDATE_BATCH = 64
+
+class DecimationResult(NamedTuple):
+    mesh: Mesh
+    collapses: int
+    error: float  # largest collapse error, relative to the bounding diagonal
+
+class CollapseSequence(NamedTuple):
+    """Progressive mesh: a base mesh and the vertex remaps of every collapse in order
+
+    Replaying the first k collapses means redirecting sources[:remap_counts[k - 1]]
+    to their targets; faces whose corners then coincide are gone.
+    """
+
+    mesh: Mesh
+    sources: np.ndarray  # (R,) vertex removed by each remap
+    targets: np.ndarray  # (R,) vertex it is merged into
+    remap_counts: np.ndarray  # (C,) remaps applied after each collapse
+    face_counts: np.ndarray  # (C,) triangles left after each collapse
+    errors: np.ndarray  # (C,) largest error so far, relative to the bounding diagonal
+
+def decimation_target(
+    target: str,
+    triangle_count: int,
+    options: Optional[Dict[str, Any]] = None,
+) -> Tuple[int, float]:
+    """Triangle budget and relative error limit for an optimize target
+
+    options may override max_triangles, ratio and max_error of the preset.
+    """
+    if target not in DECIMATION_PRESETS:
+        raise ValueError(
+            f"Unknown optimize target: {target}; "
+            f"expected one of {', '.join(DECIMATION_PRESETS)}"
+        )
+    preset = {
+        **DECIMATION_PRESETS[target],
+        **{k: v for k, v in (options or {}).items() if k in DECIMATION_PRESETS[target]},
+    }
+    ratio = float(preset["ratio"])
+    max_error = float(preset["max_error"])
+    if not 0 < ratio <= 1:
+        raise ValueError("ratio must be in (0, 1]")
+    if max_error < 0:
+        raise ValueError("max_error must not be negative")
+    max_triangles = int(preset["max_triangles"])
+    if max_triangles < 1:
+        raise ValueError("max_triangles must be positive")
+    return min(max_triangles, max(1, int(triangle_count * ratio))), max_error
+
+def vertex_quadrics(
+    positions: np.ndarray,
+    faces: np.ndarray,
+    seam_half_edges: np.ndarray,
+    boundary_half_edges: np.ndarray,
+) -> np.ndarray:
+    """(P, 11) area-weighted plane quadrics per position
+
+    Columns are the upper triangle of the 4x4 quadric (aa ab ac ad bb bc bd cc
+    cd dd) followed by the total weight. Half-edges along boundaries and UV
+    seams add a plane through the edge perpendicular to its face, so collapses
+    that move those edges sideways are expensive.
+    """
+    cross, v0 = face_cross_products(positions, faces)
+    doubled_area = np.sqrt(np.einsum("ij,ij->i", cross, cross))
+    normals = cross / np.maximum(doubled_area, TINY)[:, None]
+
+    plane_normals = [np.repeat(normals, 3, axis=0)]
+    plane_points = [np.repeat(v0, 3, axis=0)]
+    plane_weights = [np.repeat(doubled_area / 2.0, 3)]
+    plane_vertices = [faces.ravel()]
+
+    half_edges = faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    for selected, weight in (
+        (boundary_half_edges, BOUNDARY_WEIGHT),
+        (seam_half_edges, SEAM_WEIGHT),
+    ):
+        if not len(selected):
+            continue
+        start = positions[half_edges[selected, 0]]
+        edge = positions[half_edges[selected, 1]] - start
+        normal = np.cross(edge, normals[selected // 3])
+        length = np.linalg.norm(normal, axis=1)
+        unit = normal / np.maximum(length, TINY)[:, None]
+        plane_normals.append(np.repeat(unit, 2, axis=0))
+        plane_points.append(np.repeat(start, 2, axis=0))
+        plane_weights.append(np.repeat(weight * np.einsum("ij,ij->i", edge, edge), 2))
+        plane_vertices.append(half_edges[selected].ravel())
+
+    n = np.concatenate(plane_normals)
+    d = -np.einsum("ij,ij->i", n, np.concatenate(plane_points))
+    w = np.concatenate(plane_weights)
+    target = np.concatenate(plane_vertices)
+    a, b, c = n[:, 0], n[:, 1], n[:, 2]
+    columns = (a * a, a * b, a * c, a * d, b * b, b * c, b * d, c * c, c * d, d * d)
+    quadrics = np.empty((len(positions), 11))
+    for column, values in enumerate(columns):
+        quadrics[:, column] = np.bincount(
+            target, weights=w * values, minlength=len(positions)
+        )
+    quadrics[:, 10] = np.bincount(target, weights=w, minlength=len(positions))
+    return quadrics
+
+def quadric_monomials(points: np.ndarray) -> np.ndarray:
+    """(N, 10) monomials of (x, y, z, 1) matching the quadric columns
+
+    Off-diagonal terms are doubled, so a quadric's dot product with them is
+    the weighted squared plane distance of the point.
+    """
+    x, y, z = points[:, 0], points[:, 1], points[:, 2]
+    return np.stack(
+        (
+            x * x, 2 * x * y, 2 * x * z, 2 * x, y * y,
+            2 * y * z, 2 * y, z * z, 2 * z, np.ones(len(points)),
+        ),
+        axis=1,
+    )
+
+def quadric_errors(quadrics: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """Mean squared plane distance of each point under its quadric"""
+    return _mean_errors(quadrics, quadric_monomials(points))
+
+def _mean_errors(quadrics: np.ndarray, monomials: np.ndarray) -> np.ndarray:
+    error = np.einsum("ij,ij->i", quadrics[:, :10], monomials)
+    return np.maximum(error, 0.0) / np.maximum(quadrics[:, 10], TINY)
+
+class _Decimator:
+    """Half-edge collapse simplifier over a position-welded mesh
+
+    Every collapse moves one position onto a neighbouring one, so no new
+    vertices are created and UVs stay exact. Vertices split along UV seams
+    are collapsed together, and only along the seam, so charts stay intact.
+    """
+
+    def __init__(self, mesh: Mesh):
+        positions, attribute_position = weld_positions(mesh.vertices)
+        face_positions = attribute_position[mesh.faces]
+        position_count = len(positions)
+
+        topology = edge_topology(face_positions, position_count)
+        attribute_topology = edge_topology(mesh.faces, len(mesh.vertices))
+        counts = topology.face_counts[topology.half_edge_edge]
+        boundary_half_edges = np.flatnonzero(counts == 1)
+        # Faces come in the same order for both topologies, so half-edge h is
+        # the same edge in each; seams are open in UV space but closed in space
+        seam_half_edges = np.flatnonzero(
+            (attribute_topology.face_counts[attribute_topology.half_edge_edge] == 1)
+            & (counts == 2)
+        )
+
+        boundary = np.zeros(position_count, dtype=bool)
+        boundary[topology.half_edges[boundary_half_edges].ravel()] = True
+        locked = np.zeros(position_count, dtype=bool)
+        locked[topology.edges[topology.face_counts > 2].ravel()] = True
+
+        self.diagonal = bounding_diagonal(positions)
+        self.position_count = position_count
+        self.monomials = quadric_monomials(positions)
+        self.positions = [tuple(p) for p in positions.tolist()]
+        self.quadrics = vertex_quadrics(
+            positions, face_positions, seam_half_edges, boundary_half_edges
+        )
+        self.boundary = boundary
+        self.locked = locked
+        self.face_attributes = mesh.faces.tolist()
+        self.face_positions = face_positions.tolist()
+        self.face_count = len(mesh.faces)
+        self.alive = [True] * self.face_count
+        self.sources: List[int] = []
+        self.targets: List[int] = []
+        self.remap_counts: List[int] = []
+        self.face_counts: List[int] = []
+        self.errors: List[float] = []
+        self.position_faces: List[set] = [set() for _ in range(position_count)]
+        for face, corners in enumerate(self.face_positions):
+            for position in corners:
+                self.position_faces[position].add(face)
+        # Heap entries are (cost, stamp, edge key); an entry is stale once its
+        # stamp no longer matches the direction stored for the edge
+        self.directions: Dict[int, Tuple[int, int, Optional[float], int]] = {}
+        self.heap: List[Tuple[float, int, int]] = []
+        self.stamp = 0
+        self._initial_heap(topology)
+
+    def _initial_heap(self, topology):
+        low, high = topology.edges[:, 0], topology.edges[:, 1]
+        quadrics, monomials = self.quadrics, self.monomials
+        boundary, locked = self.boundary, self.locked
+        merged = quadrics[low] + quadrics[high]
+        boundary_edge = topology.face_counts == 1
+        manifold_edge = topology.face_counts <= 2
+        # Removing a boundary vertex is only allowed along its boundary
+        remove_low = ~locked[low] & (~boundary[low] | boundary_edge) & manifold_edge
+        remove_high = ~locked[high] & (~boundary[high] | boundary_edge) & manifold_edge
+        cost_low = np.where(remove_low, _mean_errors(merged, monomials[high]), np.inf)
+        cost_high = np.where(remove_high, _mean_errors(merged, monomials[low]), np.inf)
+
+        best_low = cost_low <= cost_high
+        cost = np.where(best_low, cost_low, cost_high)
+        alternative = np.where(best_low, cost_high, cost_low)
+        valid = np.flatnonzero(np.isfinite(cost))
+        valid = valid[np.argsort(cost[valid], kind="stable")]
+
+        keys = (low[valid] * self.position_count + high[valid]).tolist()
+        for stamp, (key, is_low, first, second, other) in enumerate(
+            zip(
+                keys,
+                best_low[valid].tolist(),
+                low[valid].tolist(),
+                high[valid].tolist(),
+                alternative[valid].tolist(),
+            )
+        ):
+            other = other if other != math.inf else None
+            self.directions[key] = (
+                (first, second, other, stamp)
+                if is_low
+                else (second, first, other, stamp)
+            )
+        # Sorted by cost and then stamp, which is already a valid heap
+        self.heap = list(zip(cost[valid].tolist(), range(len(keys)), keys))
+        self.stamp = len(keys)
+
+    def _push(self, key: int, remove: int, keep: int, cost: float, other: float):
+        stamp = self.stamp
+        self.stamp += 1
+        self.directions[key] = (
+            remove, keep, other if other != math.inf else None, stamp
+        )
+        heapq.heappush(self.heap, (cost, stamp, key))
+
+    def run(self, target_triangles: int, max_error: float) -> Tuple[int, float]:
+        limit = (max_error * self.diagonal) ** 2
+        heap = self.heap
+        directions = self.directions
+        collapses = 0
+        worst = 0.0
+        # Positions whose edges still carry costs from before their last collapse
+        pending: Dict[int, None] = {}
+        while self.face_count > target_triangles and heap:
+            cost, stamp, key = heap[0]
+            direction = directions.get(key)
+            if direction is None or direction[3] != stamp:
+                heapq.heappop(heap)
+                continue
+            remove, keep, alternative, _ = direction
+            if len(pending) >= UPDATE_BATCH or remove in pending or keep in pending:
+                self._update_rings(list(pending))
+                pending.clear()
+                continue
+            if cost > limit:
+                break
+            heapq.heappop(heap)
+            mapping = self._check_collapse(remove, keep)
+            if mapping is None:
+                # Try the other direction before giving up on this edge
+                if alternative is not None:
+                    self._push(key, keep, remove, alternative, math.inf)
+                else:
+                    del directions[key]
+                continue
+            self._collapse(remove, keep, mapping)
+            pending[keep] = None
+            collapses += 1
+            worst = max(worst, cost)
+            self.sources.extend(mapping)
+            self.targets.extend(mapping.values())
+            self.remap_counts.append(len(self.sources))
+            self.face_counts.append(self.face_count)
+            self.errors.append(worst)
+        return collapses, self._relative_error(worst)
+
+    def _relative_error(self, cost: float) -> float:
+        return math.sqrt(cost) / self.diagonal if self.diagonal else 0.0
+
+    def _ring(self, position: int) -> set:
+        ring = set()
+        face_positions = self.face_positions
+        for face in self.position_faces[position]:
+            ring.update(face_positions[face])
+        ring.discard(position)
+        return ring
+
+    def _check_collapse(self, remove: int, keep: int) -> Optional[Dict[int, int]]:
+        """Attribute remapping for collapsing remove onto keep
+
+        None if the collapse is not allowed.
+        """
+        faces_remove = self.position_faces[remove]
+        shared = faces_remove & self.position_faces[keep]
+        if not shared:
+            return None
+
+        # Link condition: the two rings may only meet at the faces being removed
+        ring_remove = self._ring(remove)
+        ring_keep = self._ring(keep)
+        opposite = set()
+        for face in shared:
+            opposite.update(self.face_positions[face])
+        opposite.discard(remove)
+        opposite.discard(keep)
+        if (ring_remove & ring_keep) != opposite or len(ring_remove | ring_keep) <= 4:
+            return None
+
+        # Each attribute vertex of remove must map onto the one of keep it
+        # shares a face with; a vertex split by a seam crossing the edge cannot
+        mapping: Dict[int, int] = {}
+        for face in shared:
+            corners = self.face_positions[face]
+            attributes = self.face_attributes[face]
+            source = attributes[corners.index(remove)]
+            target = attributes[corners.index(keep)]
+            if mapping.setdefault(source, target) != target:
+                return None
+
+        px, py, pz = self.positions[keep]
+        positions = self.positions
+        for face in faces_remove:
+            if face in shared:
+                continue
+            corners = self.face_positions[face]
+            slot = corners.index(remove)
+            if self.face_attributes[face][slot] not in mapping:
+                return None
+            a = positions[corners[slot - 2]]
+            b = positions[corners[slot - 1]]
+            old = positions[remove]
+            # Normals of (old, a, b) and (keep, a, b); the winding matches the face
+            ux, uy, uz = a[0] - old[0], a[1] - old[1], a[2] - old[2]
+            vx, vy, vz = b[0] - old[0], b[1] - old[1], b[2] - old[2]
+            n0 = (uy * vz - uz * vy, uz * vx - ux * vz, ux * vy - uy * vx)
+            ux, uy, uz = a[0] - px, a[1] - py, a[2] - pz
+            vx, vy, vz = b[0] - px, b[1] - py, b[2] - pz
+            n1 = (uy * vz - uz * vy, uz * vx - ux * vz, ux * vy - uy * vx)
+            square0 = n0[0] ** 2 + n0[1] ** 2 + n0[2] ** 2
+            square1 = n1[0] ** 2 + n1[1] ** 2 + n1[2] ** 2
+            length = math.sqrt(square0 * square1)
+            dot = n0[0] * n1[0] + n0[1] * n1[1] + n0[2] * n1[2]
+            if length == 0.0 or dot <= MIN_NORMAL_COSINE * length:
+                return None
+        return mapping
+
+    def _collapse(self, remove: int, keep: int, mapping: Dict[int, int]):
+        position_faces = self.position_faces
+        faces_remove = position_faces[remove]
+        ring_remove = self._ring(remove)
+        for face in faces_remove:
+            corners = self.face_positions[face]
+            if keep in corners:
+                self.alive[face] = False
+                self.face_count -= 1
+                for position in corners:
+                    if position != remove:
+                        position_faces[position].discard(face)
+            else:
+                slot = corners.index(remove)
+                corners[slot] = keep
+                attributes = self.face_attributes[face]
+                attributes[slot] = mapping[attributes[slot]]
+                position_faces[keep].add(face)
+        position_faces[remove] = set()
+        self.quadrics[keep] += self.quadrics[remove]
+
+        count = self.position_count
+        for other in ring_remove:
+            key = remove * count + other if remove < other else other * count + remove
+            self.directions.pop(key, None)
+
+    def _update_rings(self, keeps: List[int]):
+        """Re-cost every edge around the collapsed-onto positions in one batch"""
+        corners: List[List[int]] = []
+        centers: List[int] = []
+        face_positions = self.face_positions
+        for keep in keeps:
+            faces = self.position_faces[keep]
+            corners.extend([face_positions[face] for face in faces])
+            centers.extend([keep] * len(faces))
+        if not centers:
+            return
+        count = self.position_count
+        center = np.repeat(np.array(centers, dtype=np.int64), 3)
+        corner = np.array(corners, dtype=np.int64).ravel()
+        # Faces around each center that contain each neighbour; one is a boundary
+        pairs, shared = np.unique(
+            center[corner != center] * count + corner[corner != center],
+            return_counts=True,
+        )
+        center, other = np.divmod(pairs, count)
+        boundary_edge = shared == 1
+
+        merged = self.quadrics[center] + self.quadrics[other]
+        weight = np.maximum(merged[:, 10], TINY)
+        # The center is the merged side, so the other position is usually removed
+        cost = np.einsum("ij,ij->i", merged[:, :10], self.monomials[center])
+        cost = np.maximum(cost, 0.0) / weight
+        reverse = np.einsum("ij,ij->i", merged[:, :10], self.monomials[other])
+        reverse = np.maximum(reverse, 0.0) / weight
+        # Removing a boundary vertex is only allowed along its boundary
+        boundary, locked = self.boundary, self.locked
+        cost[locked[other] | (boundary[other] & ~boundary_edge)] = np.inf
+        reverse[locked[center] | (boundary[center] & ~boundary_edge)] = np.inf
+
+        keys = (np.minimum(center, other) * count + np.maximum(center, other)).tolist()
+        for key, keep, neighbour, forward, backward in zip(
+            keys, center.tolist(), other.tolist(), cost.tolist(), reverse.tolist()
+        ):
+            if forward == math.inf and backward == math.inf:
+                self.directions.pop(key, None)
+            elif forward <= backward:
+                self._push(key, neighbour, keep, forward, backward)
+            else:
+                self._push(key, keep, neighbour, backward, forward)
+
+    def faces(self) -> np.ndarray:
+        alive = [
+            corners for corners, alive in zip(self.face_attributes, self.alive) if alive
+        ]
+        return np.array(alive, dtype=np.int64).reshape(-1, 3)
+
+    def sequence(self, mesh: Mesh) -> CollapseSequence:
+        errors = np.sqrt(np.array(self.errors, dtype=np.float64))
+        return CollapseSequence(
+            mesh=mesh,
+            sources=np.array(self.sources, dtype=np.int64),
+            targets=np.array(self.targets, dtype=np.int64),
+            remap_counts=np.array(self.remap_counts, dtype=np.int64),
+            face_counts=np.array(self.face_counts, dtype=np.int64),
+            errors=errors / self.diagonal if self.diagonal else np.zeros(len(errors)),
+        )
+
+def prepare_mesh(mesh: Mesh) -> Mesh:
+    """Merge identical vertices and drop faces that repeat a position"""
+    mesh = weld_attributes(widen_mesh(mesh))
+    _, attribute_position = weld_positions(mesh.vertices)
+    corners = attribute_position[mesh.faces]
+    proper = (
+        (corners[:, 0] != corners[:, 1])
+        & (corners[:, 1] != corners[:, 2])
+        & (corners[:, 2] != corners[:, 0])
+    )
+    return compact_mesh(mesh._replace(faces=mesh.faces[proper]))
+
+def decimate_mesh(
+    mesh: Mesh,
+    target_triangles: int,
+    max_error: float = 1.0,
+) -> DecimationResult:
+    """Quadric error metric edge-collapse decimation
+
+    Collapses the cheapest edge until the mesh has at most target_triangles
+    triangles or the next collapse would exceed max_error. Open boundaries
+    only collapse along themselves and UV seams keep their charts.
+    """
+    mesh = prepare_mesh(mesh)
+    if mesh.triangle_count <= target_triangles:
+        return DecimationResult(mesh, 0, 0.0)
+    decimator = _Decimator(mesh)
+    collapses, error = decimator.run(target_triangles, max_error)
+    return DecimationResult(
+        compact_mesh(mesh._replace(faces=decimator.faces())), collapses, error
+    )
+
+def collapse_sequence(
+    mesh: Mesh,
+    target_triangles: int,
+    max_error: float = 1.0,
+) -> CollapseSequence:
+    """Record the collapses that decimate a mesh, for cutting LODs out of one run"""
+    mesh = prepare_mesh(mesh)
+    decimator = _Decimator(mesh) if mesh.triangle_count > target_triangles else None
+    if decimator is None:
+        empty = np.zeros(0, dtype=np.int64)
+        return CollapseSequence(mesh, empty, empty, empty, empty, np.zeros(0))
+    decimator.run(target_triangles, max_error)
+    return decimator.sequence(mesh)
+
+def replay_collapses(sequence: CollapseSequence, collapses: int) -> np.ndarray:
+    """Faces of the base mesh after its first collapses, in base vertex indices"""
+    remap = np.arange(len(sequence.mesh.vertices))
+    if collapses > 0:
+        count = sequence.remap_counts[collapses - 1]
+        remap[sequence.sources[:count]] = sequence.targets[:count]
+        # Later collapses can move a target again; follow the chains to the end
+        while True:
+            jumped = remap[remap]
+            if np.array_equal(jumped, remap):
+                break
+            remap = jumped
+    faces = remap[sequence.mesh.faces]
+    proper = (
+        (faces[:, 0] != faces[:, 1])
+        & (faces[:, 1] != faces[:, 2])
+        & (faces[:, 2] != faces[:, 0])
+    )
+    return faces[proper]
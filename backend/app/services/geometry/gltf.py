@@ -0,0 +1,322 @@
+from typing import Any, Dict, List, Optional, Set, Tuple
+from app.services.geometry.compression import (
+    CompressionSettings,
+    encode_index_sequence,
+    encode_vertex_buffer,
+    quantize_positions,
+    quantize_snorm,
+    quantize_unorm,
+    uvs_quantizable,
+)
+from app.services.geometry.lod import LodChain
+from app.services.geometry.mesh import Mesh
+import json
+import math
+import struct
+import numpy as np
+
+GLB_MAGIC = 0x46546C67  # "glTF"
+GLB_VERSION = 2
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+# glTF component types and buffer view targets
+BYTE = 5120
+UNSIGNED_BYTE = 5121
+SHORT = 5122
+FLOAT = 5126
+UNSIGNED_SHORT = 5123
+UNSIGNED_INT = 5125
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+COMPONENT_TYPES = {
+    np.dtype(np.int8): BYTE,
+    np.dtype(np.uint8): UNSIGNED_BYTE,
+    np.dtype(np.int16): SHORT,
+    np.dtype(np.uint16): UNSIGNED_SHORT,
+    np.dtype(np.uint32): UNSIGNED_INT,
+    np.dtype(np.float32): FLOAT,
+}
+
+KHR_MESH_QUANTIZATION = "KHR_mesh_quantization"
+EXT_MESHOPT_COMPRESSION = "EXT_meshopt_compression"
+
+# Textures are bound later in the pipeline; loaders need a material to keep UVs
+DEFAULT_MATERIAL = {
+    "name": "default",
+    "pbrMetallicRoughness": {"metallicFactor": 0.0, "roughnessFactor": 1.0},
+}
+
+def _padded(data: bytes, fill: bytes) -> bytes:
+    return data + fill * (-len(data) % 4)
+
+def encode_glb(document: Dict[str, Any], binary: bytes) -> bytes:
+    """Pack a glTF JSON document and its binary buffer into a GLB file"""
+    json_chunk = _padded(
+        json.dumps(document, separators=(",", ":")).encode("utf-8"), b" "
+    )
+    chunks = struct.pack("<II", len(json_chunk), CHUNK_JSON) + json_chunk
+    if binary:
+        bin_chunk = _padded(binary, b"\0")
+        chunks += struct.pack("<II", len(bin_chunk), CHUNK_BIN) + bin_chunk
+    return struct.pack("<III", GLB_MAGIC, GLB_VERSION, 12 + len(chunks)) + chunks
+
+class GltfBuilder:
+    """Accumulates buffer views and accessors over a single binary buffer
+
+    With meshopt=True vertex and index views are stored compressed
+    (EXT_meshopt_compression); their uncompressed layout refers to a
+    fallback buffer that has no data of its own.
+    """
+
+    def __init__(self, meshopt: bool = False):
+        self.data = bytearray()
+        self.buffer_views: List[Dict[str, Any]] = []
+        self.accessors: List[Dict[str, Any]] = []
+        self.meshopt = meshopt
+        self.fallback_length = 0
+        self.required_extensions: Set[str] = set()
+
+    def add_view(
+        self,
+        data: bytes,
+        target: Optional[int] = None,
+        stride: Optional[int] = None,
+    ) -> int:
+        self.data += b"\0" * (-len(self.data) % 4)
+        view = {"buffer": 0, "byteOffset": len(self.data), "byteLength": len(data)}
+        if target is not None:
+            view["target"] = target
+        if stride is not None:
+            view["byteStride"] = stride
+        self.data += data
+        self.buffer_views.append(view)
+        return len(self.buffer_views) - 1
+
+    def add_rows(self, values: np.ndarray, target: int) -> int:
+        """Buffer view over the rows of a 2D array, compressed when using meshopt"""
+        values = np.ascontiguousarray(values)
+        stride = values.itemsize * values.shape[1]
+        if not self.meshopt:
+            row_stride = stride if target == ARRAY_BUFFER else None
+            return self.add_view(values.tobytes(), target, row_stride)
+        if target == ARRAY_BUFFER:
+            rows = values.view(np.uint8).reshape(len(values), stride)
+            mode, encoded = "ATTRIBUTES", encode_vertex_buffer(rows)
+        else:
+            mode, encoded = "INDICES", encode_index_sequence(values)
+        self.data += b"\0" * (-len(self.data) % 4)
+        compressed = {
+            "buffer": 0,
+            "byteOffset": len(self.data),
+            "byteLength": len(encoded),
+            "byteStride": stride,
+            "mode": mode,
+            "count": len(values),
+        }
+        self.data += encoded
+        self.fallback_length += -self.fallback_length % 4
+        view = {
+            "buffer": 1,
+            "byteOffset": self.fallback_length,
+            "byteLength": stride * len(values),
+            "target": target,
+            "extensions": {EXT_MESHOPT_COMPRESSION: compressed},
+        }
+        if target == ARRAY_BUFFER:
+            view["byteStride"] = stride
+        self.fallback_length += stride * len(values)
+        self.required_extensions.add(EXT_MESHOPT_COMPRESSION)
+        self.buffer_views.append(view)
+        return len(self.buffer_views) - 1
+
+    def add_accessor(
+        self,
+        view: int,
+        component_type: int,
+        count: int,
+        kind: str,
+        **extra: Any,
+    ) -> int:
+        accessor = {
+            "bufferView": view,
+            "componentType": component_type,
+            "count": int(count),
+            "type": kind,
+            **extra,
+        }
+        self.accessors.append(accessor)
+        return len(self.accessors) - 1
+
+    def add_vertices(self, values: np.ndarray, kind: str, bounds: bool = False) -> int:
+        values = np.ascontiguousarray(values, dtype=np.float32)
+        extra = {}
+        if bounds and len(values):
+            extra = {
+                "min": values.min(axis=0).tolist(),
+                "max": values.max(axis=0).tolist(),
+            }
+        if self.meshopt:
+            view = self.add_rows(values, ARRAY_BUFFER)
+        else:
+            view = self.add_view(values.tobytes(), ARRAY_BUFFER)
+        return self.add_accessor(view, FLOAT, len(values), kind, **extra)
+
+    def add_quantized(
+        self,
+        values: np.ndarray,
+        kind: str,
+        normalized: bool,
+        bounds: bool = False,
+    ) -> int:
+        """Integer vertex data (KHR_mesh_quantization)
+
+        Rows may carry padding past the accessor's components.
+        """
+        components = {"VEC2": 2, "VEC3": 3, "VEC4": 4}[kind]
+        extra: Dict[str, Any] = {"normalized": True} if normalized else {}
+        if bounds and len(values):
+            used = values[:, :components]
+            extra.update(min=used.min(axis=0).tolist(), max=used.max(axis=0).tolist())
+        if values.dtype != np.float32:
+            self.required_extensions.add(KHR_MESH_QUANTIZATION)
+        view = self.add_rows(values, ARRAY_BUFFER)
+        component_type = COMPONENT_TYPES[values.dtype]
+        return self.add_accessor(view, component_type, len(values), kind, **extra)
+
+    def add_indices(self, faces: np.ndarray, vertex_count: int) -> int:
+        # 16-bit indices whenever every index fits
+        dtype, component_type = (
+            (np.uint16, UNSIGNED_SHORT)
+            if vertex_count <= 0xFFFF
+            else (np.uint32, UNSIGNED_INT)
+        )
+        indices = np.ascontiguousarray(faces, dtype=dtype).ravel()
+        if self.meshopt:
+            view = self.add_rows(indices[:, None], ELEMENT_ARRAY_BUFFER)
+        else:
+            view = self.add_view(indices.tobytes(), ELEMENT_ARRAY_BUFFER)
+        return self.add_accessor(view, component_type, len(indices), "SCALAR")
+
+    def document(self, **fields: Any) -> Dict[str, Any]:
+        buffers: List[Dict[str, Any]] = [{"byteLength": len(self.data)}]
+        if self.fallback_length:
+            fallback = {EXT_MESHOPT_COMPRESSION: {"fallback": True}}
+            buffers.append({"byteLength": self.fallback_length, "extensions": fallback})
+        if self.required_extensions:
+            used = set(fields.get("extensionsUsed", [])) | self.required_extensions
+            fields["extensionsUsed"] = sorted(used)
+            fields["extensionsRequired"] = sorted(self.required_extensions)
+        return {
+            "asset": {"version": "2.0", "generator": "VoxelVerve"},
+            "buffers": buffers,
+            "bufferViews": self.buffer_views,
+            "accessors": self.accessors,
+            **fields,
+        }
+
+def vertex_attributes(
+    builder: GltfBuilder,
+    mesh: Mesh,
+    compression: Optional[CompressionSettings] = None,
+) -> Tuple[Dict[str, int], Dict[str, Any]]:
+    """Accessors of a mesh's vertex attributes and the node transform they need
+
+    Compressed positions are stored on an integer grid, so the node maps
+    them back with a translation and a uniform scale.
+    """
+    # glTF puts the texture origin at the top left
+    uvs = np.c_[mesh.uvs[:, 0], 1.0 - mesh.uvs[:, 1]] if mesh.uvs is not None else None
+    if compression is None:
+        positions = builder.add_vertices(mesh.vertices, "VEC3", bounds=True)
+        attributes = {"POSITION": positions}
+        if mesh.normals is not None:
+            attributes["NORMAL"] = builder.add_vertices(mesh.normals, "VEC3")
+        if mesh.tangents is not None:
+            attributes["TANGENT"] = builder.add_vertices(mesh.tangents, "VEC4")
+        if uvs is not None:
+            attributes["TEXCOORD_0"] = builder.add_vertices(uvs, "VEC2")
+        return attributes, {}
+
+    grid, offset, scale = quantize_positions(mesh.vertices, compression.position_bits)
+    positions = builder.add_quantized(grid, "VEC3", normalized=False, bounds=True)
+    attributes = {"POSITION": positions}
+    if mesh.normals is not None:
+        normals = quantize_snorm(mesh.normals, compression.normal_bits)
+        attributes["NORMAL"] = builder.add_quantized(normals, "VEC3", normalized=True)
+    if mesh.tangents is not None:
+        tangents = quantize_snorm(mesh.tangents, compression.normal_bits)
+        attributes["TANGENT"] = builder.add_quantized(tangents, "VEC4", normalized=True)
+    if uvs is not None:
+        if uvs_quantizable(uvs):
+            quantized = quantize_unorm(uvs, compression.uv_bits)
+            attributes["TEXCOORD_0"] = builder.add_quantized(
+                quantized, "VEC2", normalized=True
+            )
+        else:
+            attributes["TEXCOORD_0"] = builder.add_vertices(uvs, "VEC2")
+    return attributes, {"translation": offset.tolist(), "scale": [scale] * 3}
+
+def mesh_glb(mesh: Mesh, compression: Optional[CompressionSettings] = None) -> bytes:
+    """GLB of a single mesh, quantized and optionally meshopt-compressed"""
+    meshopt = compression is not None and compression.mode == "meshopt"
+    builder = GltfBuilder(meshopt=meshopt)
+    attributes, transform = vertex_attributes(builder, mesh, compression)
+    indices = builder.add_indices(mesh.faces, mesh.vertex_count)
+    primitive = {"attributes": attributes, "indices": indices, "material": 0, "mode": 4}
+    document = builder.document(
+        scene=0,
+        scenes=[{"nodes": [0]}],
+        nodes=[{"mesh": 0, **transform}],
+        meshes=[{"primitives": [primitive]}],
+        materials=[DEFAULT_MATERIAL],
+    )
+    return encode_glb(document, bytes(builder.data))
+
+def lod_chain_glb(
+    chain: LodChain,
+    compression: Optional[CompressionSettings] = None,
+) -> bytes:
+    """GLB with one mesh per LOD sharing the vertex accessors
+
+    The first node carries the MSFT_lod extension pointing at the coarser
+    levels, so viewers without LOD support show LOD0 only.
+    """
+    meshopt = compression is not None and compression.mode == "meshopt"
+    builder = GltfBuilder(meshopt=meshopt)
+    attributes, transform = vertex_attributes(builder, chain.vertices, compression)
+
+    meshes = []
+    nodes = []
+    lod0_triangles = max(chain.levels[0].triangle_count, 1)
+    for index, level in enumerate(chain.levels):
+        indices = builder.add_indices(level.faces, level.vertex_count)
+        primitive = {
+            "attributes": attributes,
+            "indices": indices,
+            "material": 0,
+            "mode": 4,
+        }
+        meshes.append({"name": f"LOD{index}", "primitives": [primitive]})
+        nodes.append({"name": f"LOD{index}", "mesh": index, **transform})
+
+    if len(nodes) > 1:
+        # Switch levels at screen coverage proportional to their resolution
+        coverage = [
+            0.5 * math.sqrt(level.triangle_count / lod0_triangles)
+            for level in chain.levels
+        ]
+        nodes[0]["extensions"] = {"MSFT_lod": {"ids": list(range(1, len(nodes)))}}
+        nodes[0]["extras"] = {"MSFT_screencoverage": coverage}
+
+    fields = {
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": nodes,
+        "meshes": meshes,
+        "materials": [DEFAULT_MATERIAL],
+    }
+    if len(nodes) > 1:
+        fields["extensionsUsed"] = ["MSFT_lod"]
+    return encode_glb(builder.document(**fields), bytes(builder.data))
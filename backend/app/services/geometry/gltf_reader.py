@@ -0,0 +1,380 @@
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from app.services.geometry.compression import (
+    decode_index_sequence,
+    decode_vertex_buffer,
+)
+from app.services.geometry.gltf import (
+    CHUNK_BIN,
+    CHUNK_JSON,
+    EXT_MESHOPT_COMPRESSION,
+    GLB_MAGIC,
+    GLB_VERSION,
+)
+from app.services.geometry.mesh import Mesh
+import json
+import mmap
+import struct
+import numpy as np
+
+COMPONENT_DTYPES: Dict[int, np.dtype] = {
+    5120: np.dtype(np.int8),
+    5121: np.dtype(np.uint8),
+    5122: np.dtype("<i2"),
+    5123: np.dtype("<u2"),
+    5125: np.dtype("<u4"),
+    5126: np.dtype("<f4"),
+}
+TYPE_SIZES = {
+    "SCALAR": 1,
+    "VEC2": 2,
+    "VEC3": 3,
+    "VEC4": 4,
+    "MAT2": 4,
+    "MAT3": 9,
+    "MAT4": 16,
+}
+
+# Extensions whose data this reader cannot decode
+UNSUPPORTED_EXTENSIONS = ("KHR_draco_mesh_compression",)
+
+# glTF attribute names for the optional Mesh fields
+MESH_ATTRIBUTES = {"uvs": "TEXCOORD_0", "normals": "NORMAL", "tangents": "TANGENT"}
+
+TRIANGLES = 4
+
+class GltfAsset:
+    """A GLB file whose binary chunk stays memory-mapped
+
+    accessor() returns read-only numpy views straight into the mapping,
+    honoring byteStride, so only the pages of the accessors a caller reads
+    are ever loaded. Buffer views compressed with EXT_meshopt_compression
+    are decoded once, on first use.
+    """
+
+    def __init__(
+        self,
+        document: Dict[str, Any],
+        binary: Union[bytes, memoryview, mmap.mmap],
+        offset: int,
+        length: int,
+    ):
+        self.document = document
+        self._binary = binary
+        self._offset = offset
+        self._length = length
+        self._decoded: Dict[int, bytes] = {}
+        extensions = set(document.get("extensionsRequired", []))
+        required = extensions & set(UNSUPPORTED_EXTENSIONS)
+        if required:
+            raise ValueError(
+                f"Unsupported glTF extensions: {', '.join(sorted(required))}"
+            )
+
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> "GltfAsset":
+        """Map a GLB file; the mapping lives as long as any view into it"""
+        with open(path, "rb") as handle:
+            try:
+                mapping = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError("Empty GLB file")
+        return cls.parse(mapping)
+
+    @classmethod
+    def parse(cls, data: Union[bytes, memoryview, mmap.mmap]) -> "GltfAsset":
+        """Read the chunk layout of a GLB held in memory
+
+        The binary chunk is not copied.
+        """
+        buffer = memoryview(data)
+        if len(buffer) < 20:
+            raise ValueError("Truncated GLB file")
+        magic, version, length = struct.unpack_from("<III", buffer, 0)
+        if magic != GLB_MAGIC or version != GLB_VERSION:
+            raise ValueError("Not a glTF 2.0 binary file")
+        length = min(length, len(buffer))
+        document = None
+        binary = (0, 0)
+        offset = 12
+        while offset + 8 <= length:
+            chunk_length, chunk_type = struct.unpack_from("<II", buffer, offset)
+            start = offset + 8
+            if start + chunk_length > length:
+                raise ValueError("Truncated GLB chunk")
+            if chunk_type == CHUNK_JSON and document is None:
+                text = bytes(buffer[start:start + chunk_length]).decode("utf-8")
+                document = json.loads(text)
+            elif chunk_type == CHUNK_BIN and binary == (0, 0):
+                binary = (start, chunk_length)
+            offset = start + chunk_length
+        if document is None:
+            raise ValueError("GLB file has no JSON chunk")
+        return cls(document, data, *binary)
+
+    def accessor(self, index: int) -> np.ndarray:
+        """Accessor data as a (count, components) view
+
+        Sparse accessors are materialized.
+        """
+        accessor = self.document["accessors"][index]
+        dtype = COMPONENT_DTYPES[accessor["componentType"]]
+        components = TYPE_SIZES[accessor["type"]]
+        count = accessor["count"]
+        values: np.ndarray
+        if "bufferView" in accessor:
+            buffer, base, length = self._view(accessor["bufferView"])
+            view = self.document["bufferViews"][accessor["bufferView"]]
+            offset = base + accessor.get("byteOffset", 0)
+            stride = view.get("byteStride") or dtype.itemsize * components
+            end = (
+                offset + stride * (count - 1) + dtype.itemsize * components
+                if count
+                else offset
+            )
+            if end > base + length:
+                raise ValueError(f"Accessor {index} runs past its buffer view")
+            values = np.ndarray(
+                (count, components),
+                dtype=dtype,
+                buffer=buffer,
+                offset=offset,
+                strides=(stride, dtype.itemsize),
+            )
+            values.flags.writeable = False
+        else:
+            values = np.zeros((count, components), dtype=dtype)
+        sparse = accessor.get("sparse")
+        if sparse:
+            values = values.copy()
+            indices = self._sparse_part(sparse["indices"], sparse["count"], 1).ravel()
+            values[indices.astype(np.int64)] = self._sparse_part(
+                sparse["values"], sparse["count"], components, dtype
+            )
+        return values
+
+    def _view(self, index: int) -> Tuple[Any, int, int]:
+        """Buffer holding a buffer view, the view's offset in it and its length"""
+        view = self.document["bufferViews"][index]
+        compressed = view.get("extensions", {}).get(EXT_MESHOPT_COMPRESSION)
+        if compressed is not None:
+            if index not in self._decoded:
+                self._decoded[index] = self._decode_meshopt(compressed)
+            return self._decoded[index], 0, len(self._decoded[index])
+        if view.get("buffer", 0) != 0:
+            raise ValueError("Only the GLB binary buffer is supported")
+        offset = view.get("byteOffset", 0)
+        if offset + view["byteLength"] > self._length:
+            raise ValueError(f"Buffer view {index} runs past the binary chunk")
+        return self._binary, self._offset + offset, view["byteLength"]
+
+    def _decode_meshopt(self, compressed: Dict[str, Any]) -> bytes:
+        if compressed.get("buffer", 0) != 0:
+            raise ValueError("Only the GLB binary buffer is supported")
+        if compressed.get("filter", "NONE") != "NONE":
+            raise ValueError(f"Unsupported meshopt filter: {compressed['filter']}")
+        start = self._offset + compressed.get("byteOffset", 0)
+        if compressed.get("byteOffset", 0) + compressed["byteLength"] > self._length:
+            raise ValueError("Compressed buffer view runs past the binary chunk")
+        data = self._binary[start:start + compressed["byteLength"]]
+        count, stride = compressed["count"], compressed["byteStride"]
+        if compressed["mode"] == "ATTRIBUTES":
+            return decode_vertex_buffer(data, count, stride).tobytes()
+        if compressed["mode"] == "INDICES" and stride in (2, 4):
+            indices = decode_index_sequence(data, count)
+            return indices.astype(np.uint16 if stride == 2 else np.uint32).tobytes()
+        raise ValueError(f"Unsupported meshopt mode: {compressed['mode']}")
+
+    def _sparse_part(
+        self,
+        part: Dict[str, Any],
+        count: int,
+        components: int,
+        dtype: Optional[np.dtype] = None,
+    ) -> np.ndarray:
+        buffer, base, _ = self._view(part["bufferView"])
+        dtype = dtype if dtype is not None else COMPONENT_DTYPES[part["componentType"]]
+        return np.ndarray(
+            (count, components),
+            dtype=dtype,
+            buffer=buffer,
+            offset=base + part.get("byteOffset", 0),
+        )
+
+    def decoded(self, index: int) -> np.ndarray:
+        """Accessor values as floats, expanding normalized integers
+
+        Float data is not copied.
+        """
+        values = self.accessor(index)
+        normalized = self.document["accessors"][index].get("normalized")
+        if values.dtype == np.float32 or not normalized:
+            return values
+        info = np.iinfo(values.dtype)
+        # Signed values clamp at -1 per the glTF spec
+        return np.maximum(values / np.float32(info.max), np.float32(-1.0))
+
+    def image_data(self, index: int) -> bytes:
+        """Encoded bytes of an image stored in the binary chunk"""
+        image = self.document.get("images", [])[index]
+        if "bufferView" not in image:
+            raise ValueError("Only images stored in the GLB binary chunk are supported")
+        buffer, base, length = self._view(image["bufferView"])
+        return bytes(buffer[base:base + length])
+
+    def primitives(self) -> Iterator[Tuple[Dict[str, Any], np.ndarray]]:
+        """Triangle primitives of the default scene with their world transforms"""
+        meshes = self.document.get("meshes", [])
+        nodes = self.document.get("nodes", [])
+        scenes = self.document.get("scenes", [])
+        if scenes:
+            roots = scenes[self.document.get("scene", 0)].get("nodes", [])
+            stack = [(root, np.eye(4)) for root in reversed(roots)]
+            while stack:
+                index, parent = stack.pop()
+                node = nodes[index]
+                world = parent @ node_matrix(node)
+                if "mesh" in node:
+                    for primitive in meshes[node["mesh"]]["primitives"]:
+                        if primitive.get("mode", TRIANGLES) == TRIANGLES:
+                            yield primitive, world
+                stack.extend(
+                    (child, world) for child in reversed(node.get("children", []))
+                )
+        else:
+            for mesh in meshes:
+                for primitive in mesh["primitives"]:
+                    if primitive.get("mode", TRIANGLES) == TRIANGLES:
+                        yield primitive, np.eye(4)
+
+    def mesh(self, attributes: Sequence[str] = (), dtype: Any = None) -> Mesh:
+        """Flatten the default scene into one Mesh, decoding only requested attributes
+
+        attributes names optional Mesh fields ("uvs", "normals", "tangents").
+        Values keep their stored types (float32 attributes, unsigned
+        indices) unless dtype is given, so a single untransformed primitive
+        is returned as views into the mapping. Algorithms that need wider
+        types convert with widen_mesh.
+        """
+        unknown = set(attributes) - set(MESH_ATTRIBUTES)
+        if unknown:
+            raise ValueError(f"Unknown mesh attributes: {', '.join(sorted(unknown))}")
+        # Attribute lists hold None for primitives without the attribute
+        parts: Dict[str, List[Any]] = {
+            "vertices": [],
+            "faces": [],
+            **{name: [] for name in attributes},
+        }
+        bases: List[int] = []
+        base = 0
+        for primitive, world in self.primitives():
+            if "POSITION" not in primitive["attributes"]:
+                continue
+            identity = np.array_equal(world, np.eye(4))
+            positions = self.decoded(primitive["attributes"]["POSITION"])
+            if not identity:
+                transformed = positions @ world[:3, :3].T + world[:3, 3]
+                positions = transformed.astype(dtype or positions.dtype, copy=False)
+            parts["vertices"].append(positions)
+            if "indices" in primitive:
+                faces = self.accessor(primitive["indices"]).reshape(-1, 3)
+            else:
+                count = len(positions) - len(positions) % 3
+                faces = np.arange(count, dtype=np.uint32).reshape(-1, 3)
+            parts["faces"].append(faces)
+            bases.append(base)
+            for name in attributes:
+                values = self._attribute(
+                    primitive, MESH_ATTRIBUTES[name], len(positions)
+                )
+                if values is not None and name == "normals" and not identity:
+                    normals: np.ndarray = values @ np.linalg.inv(world[:3, :3])
+                    normals /= _lengths(normals)
+                    values = normals.astype(dtype or values.dtype, copy=False)
+                elif values is not None and name == "tangents" and not identity:
+                    directions = values[:, :3] @ world[:3, :3].T
+                    directions /= _lengths(directions)
+                    tangents = np.c_[directions, values[:, 3]]
+                    values = tangents.astype(dtype or values.dtype, copy=False)
+                parts[name].append(values)
+            base += len(positions)
+        if not parts["vertices"]:
+            raise ValueError("File does not contain a triangle mesh")
+
+        fields = {
+            "vertices": _joined(parts["vertices"], dtype),
+            "faces": _offset_faces(parts["faces"], bases, base),
+        }
+        for name in attributes:
+            # Keep an attribute only if every primitive has it
+            if all(values is not None for values in parts[name]):
+                fields[name] = _joined(parts[name], dtype)
+        return Mesh(**fields)
+
+    def _attribute(
+        self,
+        primitive: Dict[str, Any],
+        name: str,
+        count: int,
+    ) -> Optional[np.ndarray]:
+        index = primitive["attributes"].get(name)
+        if index is None:
+            return None
+        values = self.decoded(index)
+        if len(values) != count:
+            return None
+        if name == "TEXCOORD_0":
+            # glTF puts the texture origin at the top left
+            values = np.c_[values[:, 0], 1.0 - values[:, 1]]
+        return values
+
+def _joined(parts: List[np.ndarray], dtype: Any) -> np.ndarray:
+    if len(parts) == 1:
+        return np.asarray(parts[0], dtype=dtype)
+    joined = np.concatenate(parts)
+    return joined.astype(dtype, copy=False) if dtype is not None else joined
+
+def _lengths(vectors: np.ndarray) -> np.ndarray:
+    lengths = np.linalg.norm(vectors, axis=1)
+    return np.maximum(lengths, np.finfo(np.float64).tiny)[:, None]
+
+def _offset_faces(
+    parts: List[np.ndarray], bases: List[int], vertex_count: int
+) -> np.ndarray:
+    """Faces of every primitive indexing the joined vertices
+
+    A single primitive is kept as is.
+    """
+    if len(parts) == 1:
+        return parts[0]
+    dtype = np.uint32 if vertex_count <= np.iinfo(np.uint32).max else np.int64
+    faces: np.ndarray = np.empty((sum(len(part) for part in parts), 3), dtype=dtype)
+    start = 0
+    for part, base in zip(parts, bases):
+        rows = faces[start:start + len(part)]
+        rows[:] = part
+        rows += dtype(base)
+        start += len(part)
+    return faces
+
+def node_matrix(node: Dict[str, Any]) -> np.ndarray:
+    """Local transform of a node from its matrix or its TRS properties"""
+    if "matrix" in node:
+        return np.array(node["matrix"], dtype=np.float64).reshape(4, 4).T
+    x, y, z, w = node.get("rotation", (0.0, 0.0, 0.0, 1.0))
+    rotation = np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ])
+    matrix = np.eye(4)
+    matrix[:3, :3] = rotation * np.array(node.get("scale", (1.0, 1.0, 1.0)))
+    matrix[:3, 3] = node.get("translation", (0.0, 0.0, 0.0))
+    return matrix
+
+def load_glb(path: Union[str, Path], attributes: Sequence[str] = ()) -> Mesh:
+    """Load a GLB through a memory map, decoding only the requested attributes
+
+    Arrays keep the file's types; see GltfAsset.mesh.
+    """
+    return GltfAsset.open(path).mesh(attributes)
@@ -0,0 +1,116 @@
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple
+from app.services.geometry.decimation import (
+    CollapseSequence, collapse_sequence, replay_collapses,
+)
+from app.services.geometry.mesh import Mesh, take_vertices
+from app.services.geometry.reorder import (
+    VERTEX_CACHE_SIZE, cache_stats, optimize_triangle_order,
+)
+import numpy as np
+
+# LOD sizes as fractions of the LOD0 triangle budget
+DEFAULT_LOD_RATIOS = (1.0, 0.5, 0.25, 0.1)
+
+class LodLevel(NamedTuple):
+    ratio: float
+    faces: np.ndarray  # (F, 3) indices into the shared vertex buffer
+    collapses: int
+    vertex_count: int  # the level only uses vertices below this index
+    error: float  # relative to the bounding diagonal
+
+    @property
+    def triangle_count(self) -> int:
+        return len(self.faces)
+
+class LodChain(NamedTuple):
+    """LOD levels cut from one collapse sequence, all indexing one vertex buffer"""
+
+    vertices: Mesh  # shared vertex buffer; its faces are those of the first level
+    levels: List[LodLevel]
+
+def lod_ratios(value: Any) -> List[float]:
+    """Validated LOD ratios, largest first"""
+    if not isinstance(value, (list, tuple)) or not value:
+        raise ValueError("lods must be a non-empty list of ratios")
+    try:
+        ratios = sorted({float(ratio) for ratio in value}, reverse=True)
+    except (TypeError, ValueError):
+        raise ValueError("lods must be a non-empty list of ratios")
+    if ratios[0] > 1 or ratios[-1] <= 0:
+        raise ValueError("LOD ratios must be in (0, 1]")
+    return ratios
+
+def collapses_for(sequence: CollapseSequence, target_triangles: int) -> int:
+    """Fewest collapses that bring the mesh to target_triangles, or all of them"""
+    if sequence.mesh.triangle_count <= target_triangles:
+        return 0
+    # face_counts only decreases, so search it reversed
+    reached = len(sequence.face_counts) - np.searchsorted(
+        sequence.face_counts[::-1], target_triangles, side="right"
+    )
+    return min(int(reached) + 1, len(sequence.face_counts))
+
+def build_lod_chain(
+    mesh: Mesh,
+    lod0_triangles: int,
+    ratios: Sequence[float] = DEFAULT_LOD_RATIOS,
+    max_error: float = 1.0,
+) -> LodChain:
+    """Decimate once to the smallest LOD and cut every level from the collapse order
+
+    Vertices are ordered so the ones that survive longest come first; each
+    level then uses a prefix of the shared vertex buffer.
+    """
+    ratios = lod_ratios(ratios)
+    targets = [max(1, int(lod0_triangles * ratio)) for ratio in ratios]
+    sequence = collapse_sequence(mesh, targets[-1], max_error)
+    base = sequence.mesh
+    collapse_count = len(sequence.face_counts)
+
+    # Collapse that removes each vertex; survivors of the whole run sort first
+    removed_at = np.full(len(base.vertices), collapse_count, dtype=np.int64)
+    remap_collapse = np.searchsorted(
+        sequence.remap_counts, np.arange(len(sequence.sources)), side="right"
+    )
+    removed_at[sequence.sources] = remap_collapse
+    order = np.argsort(-removed_at, kind="stable")
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    removed_sorted = removed_at[order]
+
+    levels = []
+    for ratio, target in zip(ratios, targets):
+        collapses = collapses_for(sequence, target)
+        faces = rank[replay_collapses(sequence, collapses)]
+        vertex_count = int(np.count_nonzero(removed_sorted >= collapses))
+        error = float(sequence.errors[collapses - 1]) if collapses else 0.0
+        levels.append(LodLevel(ratio, faces, collapses, vertex_count, error))
+
+    # Vertices collapsed before LOD0 are not used by any level
+    order = order[:levels[0].vertex_count]
+    return LodChain(take_vertices(base, order, levels[0].faces), levels)
+
+def reorder_lod_chain(
+    chain: LodChain,
+    cache_size: int = VERTEX_CACHE_SIZE,
+) -> Tuple[LodChain, Dict[str, Any]]:
+    """Reorder every level's triangles for the vertex cache and overdraw
+
+    The shared vertex buffer keeps its order so each level still uses a
+    prefix of it. Cache statistics are those of LOD0.
+    """
+    before = cache_stats(chain.levels[0].faces, cache_size)
+    vertices = chain.vertices.vertices
+    levels = [
+        level._replace(faces=optimize_triangle_order(vertices, level.faces, cache_size))
+        for level in chain.levels
+    ]
+    after = cache_stats(levels[0].faces, cache_size)
+    stats = {
+        "cache_size": cache_size,
+        "acmr_before": before["acmr"],
+        "acmr_after": after["acmr"],
+        "atvr_before": before["atvr"],
+        "atvr_after": after["atvr"],
+    }
+    return LodChain(chain.vertices._replace(faces=levels[0].faces), levels), stats
@@ -0,0 +1,165 @@
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+import hashlib
+import io
+import json
+import numpy as np
+
+# File types accepted for mesh URLs, by extension
+MESH_FILE_TYPES = {"glb", "gltf", "obj", "ply", "stl", "off"}
+
+# Rows converted at a time when hashing, so narrow arrays are never widened whole
+HASH_CHUNK_ROWS = 1 << 18
+
+class Mesh(NamedTuple):
+    """Indexed triangle mesh as plain numpy arrays"""
+
+    vertices: np.ndarray  # (N, 3) float64, or float32 as loaded from a GLB
+    faces: np.ndarray  # (M, 3) int64, or the GLB's unsigned index type
+    uvs: Optional[np.ndarray] = None  # (N, 2) float
+    normals: Optional[np.ndarray] = None  # (N, 3) float
+    tangents: Optional[np.ndarray] = None  # (N, 4) float; w is the bitangent sign
+
+    @property
+    def vertex_count(self) -> int:
+        return len(self.vertices)
+
+    @property
+    def triangle_count(self) -> int:
+        return len(self.faces)
+
+def mesh_file_type(url: str) -> str:
+    """File type of a mesh URL from its extension"""
+    path = url.split("?", 1)[0].split("#", 1)[0]
+    file_type = path.rsplit(".", 1)[-1].lower() if "." in path else ""
+    if file_type not in MESH_FILE_TYPES:
+        raise ValueError(f"Unsupported mesh format: {file_type or url}")
+    return file_type
+
+def mesh_content_hash(mesh: Mesh, options: Optional[Dict[str, Any]] = None) -> str:
+    """Digest of a mesh's geometry, its attributes and its processing options"""
+    digest = hashlib.sha256()
+    _hash_rows(digest, mesh.vertices, np.float32)
+    _hash_rows(digest, mesh.faces, np.int64)
+    for name in ("uvs", "normals", "tangents"):
+        values = getattr(mesh, name)
+        if values is not None:
+            digest.update(name.encode("utf-8"))
+            _hash_rows(digest, values, np.float32)
+    digest.update(json.dumps(options or {}, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+def _hash_rows(digest: Any, values: np.ndarray, dtype: Any):
+    for start in range(0, max(len(values), 1), HASH_CHUNK_ROWS):
+        rows = values[start:start + HASH_CHUNK_ROWS]
+        digest.update(np.ascontiguousarray(rows, dtype=dtype).tobytes())
+
+def widen_mesh(mesh: Mesh) -> Mesh:
+    """The mesh with float64 attributes and int64 faces, for algorithms that need them
+
+    Arrays that already have those types are not copied.
+    """
+    def wide(values: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        return np.asarray(values, dtype=np.float64) if values is not None else None
+
+    return Mesh(
+        vertices=np.asarray(mesh.vertices, dtype=np.float64),
+        faces=np.asarray(mesh.faces, dtype=np.int64),
+        uvs=wide(mesh.uvs),
+        normals=wide(mesh.normals),
+        tangents=wide(mesh.tangents),
+    )
+
+def load_mesh(data: bytes, file_type: str) -> Mesh:
+    """Parse a mesh file without merging or cleaning anything
+
+    Scenes with several geometries are flattened into one mesh with their
+    node transforms applied.
+    """
+    import trimesh
+
+    try:
+        loaded = trimesh.load(
+            io.BytesIO(data), file_type=file_type, process=False, force="mesh"
+        )
+    except Exception as e:
+        raise ValueError(f"Could not read {file_type} mesh: {e}") from e
+    if not isinstance(loaded, trimesh.Trimesh):
+        raise ValueError("File does not contain a triangle mesh")
+
+    uvs = getattr(loaded.visual, "uv", None)
+    if uvs is not None and len(uvs) != len(loaded.vertices):
+        uvs = None
+    return Mesh(
+        vertices=np.asarray(loaded.vertices, dtype=np.float64),
+        faces=np.asarray(loaded.faces, dtype=np.int64).reshape(-1, 3),
+        uvs=np.asarray(uvs, dtype=np.float64) if uvs is not None else None,
+    )
+
+def export_mesh(mesh: Mesh, file_type: str = "glb") -> bytes:
+    """Serialize a mesh, keeping its vertex order and UVs"""
+    import trimesh
+
+    visual = None
+    if mesh.uvs is not None:
+        visual = trimesh.visual.TextureVisuals(uv=mesh.uvs)
+    exported = trimesh.Trimesh(
+        vertices=mesh.vertices,
+        faces=mesh.faces,
+        vertex_normals=mesh.normals,
+        visual=visual,
+        process=False,
+    )
+    data = exported.export(file_type=file_type)
+    # Text formats come back as str; formats split over several files as a dict
+    if isinstance(data, str):
+        return data.encode()
+    if not isinstance(data, bytes):
+        raise ValueError(f"Cannot export a {file_type} mesh as one file")
+    return data
+
+def weld_positions(vertices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Unique vertex positions and the position index of every vertex
+
+    Vertices split along UV or normal seams share one position.
+    """
+    if not len(vertices):
+        return vertices.reshape(0, 3), np.zeros(0, dtype=np.int64)
+    positions, index = np.unique(vertices, axis=0, return_inverse=True)
+    return positions, index.reshape(-1).astype(np.int64)
+
+def take_vertices(mesh: Mesh, selection: np.ndarray, faces: np.ndarray) -> Mesh:
+    """The selected vertices with every attribute they carry, indexed by faces"""
+    def take(values: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        return values[selection] if values is not None else None
+
+    return Mesh(
+        vertices=mesh.vertices[selection],
+        faces=faces,
+        uvs=take(mesh.uvs),
+        normals=take(mesh.normals),
+        tangents=take(mesh.tangents),
+    )
+
+def weld_attributes(mesh: Mesh) -> Mesh:
+    """Merge vertices whose position and attributes are all identical"""
+    columns = [mesh.vertices]
+    for values in (mesh.uvs, mesh.normals, mesh.tangents):
+        if values is not None:
+            columns.append(values)
+    if not len(mesh.vertices):
+        return mesh
+    _, first, index = np.unique(
+        np.hstack(columns), axis=0, return_index=True, return_inverse=True
+    )
+    # Keep merged vertices in their original order
+    order = np.argsort(first)
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    return take_vertices(mesh, first[order], rank[index.reshape(-1)][mesh.faces])
+
+def compact_mesh(mesh: Mesh) -> Mesh:
+    """Drop vertices no face uses"""
+    used = np.zeros(len(mesh.vertices), dtype=bool)
+    used[mesh.faces.ravel()] = True
+    remap = np.cumsum(used) - 1
+    return take_vertices(mesh, used, remap[mesh.faces])
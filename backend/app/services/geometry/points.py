@@ -0,0 +1,617 @@
+from concurrent.futures import Executor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, List, Optional, Tuple
+from app.services.geometry.mesh import Mesh
+from app.services.geometry.reconstruction import (
+    MAX_BLOCK_SIZE,
+    MIN_BLOCK_SIZE,
+    extract_surface,
+)
+from app.services.geometry.uv import attach_array, share_array
+import io
+import logging
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+POINT_CLOUD_DEFAULTS = {"neighbors": 10, "resolution": 256, "block_size": 16}
+
+# Points per k-d tree leaf; leaves hold between this and twice this many
+LEAF_SIZE = 16
+
+# (query, candidate) distances evaluated per batch of a k-NN query
+QUERY_BATCH_PAIRS = 4_000_000
+
+# (sample, lattice point) pairs splatted per batch when a block is evaluated
+SPLAT_BATCH_PAIRS = 4_000_000
+
+# Width of the Gaussian that blends tangent planes, in sample spacings; close
+# samples dominate, so the blend smooths noise without flattening curvature
+FIELD_BANDWIDTH = 1.2
+
+# Lattice samples along the longest axis of a reconstruction
+MIN_RESOLUTION = 16
+MAX_RESOLUTION = 1024
+
+# Per-point arrays a shared field hands to pool tasks through shared memory
+SHARED_TREE_ARRAYS = ("points", "sorted_points", "order")
+
+class KdTree:
+    """Balanced k-d tree whose leaves are contiguous runs of one point permutation
+
+    Every node is split at its median along its widest axis, so the tree is
+    complete, nodes are numbered as a heap and every subtree is one slice of
+    the permutation. Queries are answered in batches: each batch visits the
+    leaves near its queries once and ranks all their points with numpy.
+    """
+
+    def __init__(self, points: np.ndarray, leaf_size: int = LEAF_SIZE):
+        points = np.ascontiguousarray(points, dtype=np.float64)
+        if points.ndim != 2 or points.shape[1] != 3 or not len(points):
+            raise ValueError("Points must be a non-empty (N, 3) array")
+        count = len(points)
+        depth = max(0, int(np.floor(np.log2(max(count / leaf_size, 1.0)))))
+        order = np.arange(count)
+        starts = np.array([0, count], dtype=np.int64)
+        axes, splits = [], []
+        for _ in range(depth):
+            sorted_points = points[order]
+            sizes = np.diff(starts)
+            low = np.minimum.reduceat(sorted_points, starts[:-1], axis=0)
+            high = np.maximum.reduceat(sorted_points, starts[:-1], axis=0)
+            axis = np.argmax(high - low, axis=1)
+            node = np.repeat(np.arange(len(sizes)), sizes)
+            widths = (high - low)[np.arange(len(sizes)), axis]
+            extent = np.maximum(widths, np.finfo(np.float64).tiny)
+            coordinate = sorted_points[np.arange(count), axis[node]]
+            # One sort orders every node's points along its own axis
+            along = (coordinate - low[node, axis[node]]) / extent[node]
+            key = node + along * (1.0 - 1e-9)
+            order = order[np.argsort(key, kind="stable")]
+            middle = starts[:-1] + sizes // 2
+            axes.append(axis)
+            splits.append(points[order[middle], axis])
+            starts = np.sort(np.r_[starts, middle])
+
+        self.points = points
+        self.order = order
+        self.depth = depth
+        self.leaf_starts = starts
+        self.axes = np.concatenate(axes) if axes else np.zeros(0, dtype=np.int64)
+        self.splits = np.concatenate(splits) if splits else np.zeros(0)
+        # Node boxes in heap order, leaves last
+        sorted_points = points[order]
+        self.sorted_points = sorted_points
+        lows = [np.minimum.reduceat(sorted_points, starts[:-1], axis=0)]
+        highs = [np.maximum.reduceat(sorted_points, starts[:-1], axis=0)]
+        for _ in range(depth):
+            lows.append(np.minimum(lows[-1][0::2], lows[-1][1::2]))
+            highs.append(np.maximum(highs[-1][0::2], highs[-1][1::2]))
+        self.low = np.concatenate(lows[::-1])
+        self.high = np.concatenate(highs[::-1])
+        # Queries are grouped on a grid of half the typical leaf size
+        leaf_width = float(np.median((highs[0] - lows[0]).max(axis=1)))
+        self.cell_size = max(leaf_width / 2, float(np.finfo(np.float64).tiny))
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def leaf_of(self, queries: np.ndarray) -> np.ndarray:
+        """Leaf each query descends to"""
+        node = np.zeros(len(queries), dtype=np.int64)
+        rows = np.arange(len(queries))
+        for level in range(self.depth):
+            heap = (1 << level) - 1 + node
+            node = 2 * node + (queries[rows, self.axes[heap]] >= self.splits[heap])
+        return node
+
+    def _leaves_near(
+        self,
+        low: np.ndarray,
+        high: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(box, leaf) pairs for every leaf whose bounds overlap one of the boxes"""
+        box = np.arange(len(low))
+        node = np.zeros(len(low), dtype=np.int64)
+        for level in range(self.depth + 1):
+            heap = (1 << level) - 1 + node
+            overlap = (self.low[heap] <= high[box]) & (self.high[heap] >= low[box])
+            overlap = overlap.all(axis=1)
+            box, node = box[overlap], node[overlap]
+            if level < self.depth:
+                box = np.repeat(box, 2)
+                node = (2 * node[:, None] + np.arange(2)).reshape(-1)
+        return box, node
+
+    def within_box(self, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+        """Indices of the points inside the box [low, high]"""
+        _, leaves = self._leaves_near(low[None], high[None])
+        lengths = self.leaf_starts[leaves + 1] - self.leaf_starts[leaves]
+        run_starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        slots = np.repeat(self.leaf_starts[leaves], lengths) + (
+            np.arange(int(lengths.sum())) - run_starts
+        )
+        candidates = self.sorted_points[slots]
+        inside = ((candidates >= low) & (candidates <= high)).all(axis=1)
+        return self.order[slots[inside]]
+
+    def query(
+        self,
+        queries: np.ndarray,
+        k: int = 1,
+        max_distance: float = np.inf,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Distances and indices of the k nearest points of every query, nearest first
+
+        Neighbours further than max_distance are reported at distance inf
+        with index len(self); bounding the search keeps queries far from the
+        points from visiting the whole tree.
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float64).reshape(-1, 3)
+        k = int(k)
+        if not 1 <= k <= len(self.points):
+            raise ValueError(f"k must be between 1 and {len(self.points)}")
+        distances = np.full((len(queries), k), np.inf)
+        indices = np.full((len(queries), k), len(self.points), dtype=np.int64)
+        if not len(queries):
+            return distances, indices
+
+        leaf = self.leaf_of(queries)
+        # The subtree above each leaf that holds at least k points bounds the search
+        # radius
+        level = self.depth
+        while level > 0:
+            subtrees = self.leaf_starts[::1 << (self.depth - level)]
+            if int(np.diff(subtrees).min()) >= k:
+                break
+            level -= 1
+        shift = self.depth - level
+        first = self.leaf_starts[(leaf >> shift) << shift]
+        next_subtree = ((leaf >> shift) + 1) << shift
+        last = self.leaf_starts[np.minimum(next_subtree, len(self.leaf_starts) - 1)]
+
+        # Queries share a search box with the others in their leaf and grid cell, so
+        # no box grows much beyond a leaf even where leaves are large
+        cell = (queries - queries.min(axis=0)) / self.cell_size
+        cell = np.floor(cell).astype(np.int64)
+        grouped = np.lexsort((cell[:, 2], cell[:, 1], cell[:, 0], leaf))
+        keys = np.c_[leaf, cell][grouped]
+        changed = (np.diff(keys, axis=0) != 0).any(axis=1)
+        group_starts = np.r_[0, np.flatnonzero(changed) + 1]
+        group_ends = np.r_[group_starts[1:], len(grouped)]
+        span = int((last - first).max())
+        batch_groups = max(1, QUERY_BATCH_PAIRS // max(span * 16 * LEAF_SIZE, 1))
+        for begin in range(0, len(group_starts), batch_groups):
+            end = min(begin + batch_groups, len(group_starts))
+            members = grouped[group_starts[begin]:group_ends[end - 1]]
+            group_sizes = group_ends[begin:end] - group_starts[begin:end]
+            group = np.repeat(np.arange(end - begin), group_sizes)
+            points = queries[members]
+
+            # Radius: k-th nearest among the bounding subtree's points
+            size = last[members] - first[members]
+            spread = np.arange(span)
+            slots = np.minimum(first[members][:, None] + spread, len(self.points) - 1)
+            offset = self.sorted_points[slots] - points[:, None, :]
+            gap = np.einsum("ijk,ijk->ij", offset, offset)
+            gap[spread >= size[:, None]] = np.inf
+            kth = np.partition(gap, k - 1, axis=1)[:, k - 1]
+            radius = np.minimum(np.sqrt(kth), max_distance)
+
+            # Leaves overlapping the box around each group's queries and radii
+            heads = np.r_[0, np.flatnonzero(np.diff(group)) + 1]
+            reach = np.maximum.reduceat(radius, heads)
+            low = np.minimum.reduceat(points, heads, axis=0) - reach[:, None]
+            high = np.maximum.reduceat(points, heads, axis=0) + reach[:, None]
+            box, near = self._leaves_near(low, high)
+            lengths = self.leaf_starts[near + 1] - self.leaf_starts[near]
+            totals = np.bincount(box, weights=lengths, minlength=end - begin)
+            totals = totals.astype(np.int64)
+            offsets = np.r_[0, np.cumsum(totals)]
+            run_starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+            position = np.arange(int(lengths.sum())) - run_starts
+            # Candidates of every group back to back, in group order, as positions in
+            # the permutation
+            flat = np.repeat(self.leaf_starts[near], lengths) + position
+            if not len(flat):
+                continue
+
+            # Rank queries in buckets of similar candidate counts, so one crowded group
+            # pads no others
+            width = totals[group]
+            bucket = np.ceil(np.log2(np.maximum(width, 1))).astype(np.int64)
+            for exponent in np.unique(bucket):
+                rows_in = np.flatnonzero(bucket == exponent)
+                span_width = max(int(width[rows_in].max()), k)
+                rows = max(1, QUERY_BATCH_PAIRS // span_width)
+                for row in range(0, len(rows_in), rows):
+                    picked_rows = rows_in[row:row + rows]
+                    columns = np.arange(span_width)
+                    slot = offsets[group[picked_rows]][:, None] + columns
+                    chunk = flat[np.minimum(slot, len(flat) - 1)]
+                    chunk[columns >= width[picked_rows][:, None]] = -1
+                    offset = self.sorted_points[chunk] - points[picked_rows, None, :]
+                    squared = np.einsum("ijk,ijk->ij", offset, offset)
+                    squared[chunk < 0] = np.inf
+                    if k < span_width:
+                        nearest = np.argpartition(squared, k - 1, axis=1)[:, :k]
+                    else:
+                        nearest = np.argsort(squared, axis=1)[:, :k]
+                    picked = np.take_along_axis(squared, nearest, axis=1)
+                    ranked = np.argsort(picked, axis=1)
+                    target = members[picked_rows]
+                    winners = np.take_along_axis(chunk, nearest, axis=1)
+                    winners = np.take_along_axis(winners, ranked, axis=1)
+                    picked = np.take_along_axis(picked, ranked, axis=1)
+                    distances[target] = np.sqrt(picked)
+                    indices[target] = self.order[winners]
+        missing = distances > max_distance
+        distances[missing] = np.inf
+        indices[missing] = len(self.points)
+        return distances, indices
+
+def pca_normals(
+    points: np.ndarray,
+    neighbors: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Unoriented normals and surface variation from each point's neighborhood
+
+    The normal is the direction of least variance of the neighbors; the
+    surface variation l0 / (l0 + l1 + l2) is 0 on a plane and 1/3 for
+    isotropic noise.
+    """
+    normals = np.empty((len(points), 3))
+    variation = np.empty(len(points))
+    rows = max(1, QUERY_BATCH_PAIRS // neighbors.shape[1])
+    for start in range(0, len(points), rows):
+        patch = points[neighbors[start:start + rows]]
+        patch = patch - patch.mean(axis=1, keepdims=True)
+        covariance = np.einsum("nki,nkj->nij", patch, patch)
+        values, vectors = np.linalg.eigh(covariance)
+        normals[start:start + rows] = vectors[:, :, 0]
+        total = np.maximum(values.sum(axis=1), np.finfo(np.float64).tiny)
+        variation[start:start + rows] = values[:, 0] / total
+    return normals, variation
+
+def orient_normals(
+    points: np.ndarray,
+    normals: np.ndarray,
+    neighbors: np.ndarray,
+) -> Tuple[np.ndarray, int]:
+    """Flip normals to agree along a minimum spanning tree of the k-NN graph
+
+    Follows Hoppe et al.
+
+    Edges weigh 1 - |n_i . n_j|, so orientation propagates across flat
+    regions first. The tree is grown with Boruvka's algorithm: in each round
+    every component joins its cheapest neighbour, and the components that
+    join form a forest whose relative flips are resolved by pointer
+    jumping. Finally every component is turned so that its highest point's
+    normal faces +z. Returns the oriented normals and the component count.
+    """
+    count = len(points)
+    source = np.repeat(np.arange(count), neighbors.shape[1])
+    target = neighbors.reshape(-1)
+    keep = source != target
+    source, target = source[keep], target[keep]
+    weight = 1.0 - np.abs(np.einsum("ij,ij->i", normals[source], normals[target]))
+    # Distinct integer keys break weight ties by edge, so no round can close a cycle
+    edge_bits = max(1, int(len(source)).bit_length())
+    levels = (1 << (62 - edge_bits)) - 1
+    key = (np.clip(weight, 0.0, 1.0) * levels).astype(np.int64) << edge_bits
+    key |= np.arange(len(source), dtype=np.int64)
+
+    flip = np.ones(count)
+    component = np.arange(count)
+    while len(source):
+        total = int(component.max()) + 1
+        a, b = component[source], component[target]
+        outgoing = a != b
+        source, target, key = source[outgoing], target[outgoing], key[outgoing]
+        a, b = a[outgoing], b[outgoing]
+        if not len(source):
+            break
+        best = np.full(total, np.iinfo(np.int64).max)
+        np.minimum.at(best, a, key)
+        np.minimum.at(best, b, key)
+        # Keys are unique, so each component's cheapest edge matches exactly one row
+        parent = np.arange(total)
+        sign = np.ones(total)
+        for mine, theirs in ((a, b), (b, a)):
+            edge = np.flatnonzero(key == best[mine])
+            parent[mine[edge]] = theirs[edge]
+            i, j = source[edge], target[edge]
+            agree = np.einsum("ij,ij->i", normals[i], normals[j]) * flip[i] * flip[j]
+            sign[mine[edge]] = np.where(agree < 0, -1.0, 1.0)
+        # Two components that picked the same edge point at each other; the smaller
+        # one is the root
+        roots = (parent[parent] == np.arange(total)) & (np.arange(total) < parent)
+        parent[roots] = np.flatnonzero(roots)
+        sign[roots] = 1.0
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            sign = sign * sign[parent]
+            parent = grand
+        flip *= sign[component]
+        component = np.unique(parent[component], return_inverse=True)[1].reshape(-1)
+
+    oriented = normals * flip[:, None]
+    total = int(component.max()) + 1
+    highest = np.lexsort((points[:, 2], component))
+    top = highest[np.r_[np.flatnonzero(np.diff(component[highest])), len(highest) - 1]]
+    turn = np.where(oriented[top, 2] < 0, -1.0, 1.0)
+    return oriented * turn[component][:, None], total
+
+class PointCloudField:
+    """Signed distance to the tangent planes of the nearest samples (Hoppe et al.)
+
+    Each lattice value blends the plane distances of every sample within
+    support, weighted by a Gaussian of their distance with the given
+    bandwidth; blending smooths scan noise. Blocks are evaluated by
+    splatting each nearby sample into the lattice points within its
+    support, so no lattice point needs a neighbour search. Lattice points
+    further than support from every sample are unknown (NaN). Pyramid
+    queries get a lower bound on the distance to the surface instead,
+    searched no further than reach beyond the support, so whole regions
+    away from the samples are skipped cheaply.
+
+    After share(), pickled copies carry shared memory specs in place of the
+    per-point arrays, so pool tasks do not receive the cloud through a pipe.
+    """
+
+    def __init__(
+        self,
+        tree: KdTree,
+        normals: np.ndarray,
+        support: float,
+        bandwidth: float,
+        reach: float,
+        shape: Tuple[int, int, int],
+        voxel_size: float,
+        origin: np.ndarray,
+    ):
+        self.tree = tree
+        self.normals = normals
+        self.support = float(support)
+        self.bandwidth = float(bandwidth)
+        self.reach = float(reach)
+        self.shape = tuple(int(size) for size in shape)
+        self.voxel_size = float(voxel_size)
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self._specs: Dict[str, Any] = {}
+
+    def share(self) -> List[SharedMemory]:
+        """Copy the per-point arrays to shared memory
+
+        The caller closes and unlinks the returned blocks when done.
+        """
+        blocks = []
+        for name in SHARED_TREE_ARRAYS + ("normals",):
+            source = self.normals if name == "normals" else getattr(self.tree, name)
+            memory, self._specs[name] = share_array(source)
+            blocks.append(memory)
+        return blocks
+
+    def __getstate__(self) -> Dict[str, Any]:
+        if not self._specs:
+            return self.__dict__
+        tree = {**self.tree.__dict__, **{name: None for name in SHARED_TREE_ARRAYS}}
+        return {**self.__dict__, "tree": tree, "normals": None}
+
+    def __setstate__(self, state: Dict[str, Any]):
+        if state["_specs"]:
+            tree = KdTree.__new__(KdTree)
+            tree.__dict__.update(state["tree"])
+            state = {**state, "tree": tree}
+            for name, spec in state["_specs"].items():
+                # Copying out is one memcpy and lets the block close straight away
+                memory, array = attach_array(spec)
+                values = array.copy()
+                del array
+                memory.close()
+                if name == "normals":
+                    state["normals"] = values
+                else:
+                    setattr(tree, name, values)
+        self.__dict__.update(state)
+
+    def sample(self, indices: np.ndarray) -> np.ndarray:
+        limit = self.support + self.reach
+        grid = self.origin + indices * self.voxel_size
+        distances, _ = self.tree.query(grid, 1, limit)
+        # The surface never strays further than support from a sample
+        return np.maximum(np.minimum(distances[:, 0], limit) - self.support, 0.0)
+
+    def block(self, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+        size = np.asarray([int(extent) for extent in high - low])
+        # Samples whose support reaches a lattice point of the block
+        near = self.tree.within_box(
+            self.origin + low * self.voxel_size - self.support,
+            self.origin + (high - 1) * self.voxel_size + self.support,
+        )
+        # Lattice steps from the cube holding a sample that can be within support
+        radius = self.support / self.voxel_size
+        reach = int(np.ceil(radius))
+        steps = np.arange(-reach, reach + 2)
+        offsets = np.stack(np.meshgrid(steps, steps, steps, indexing="ij"), -1)
+        offsets = offsets.reshape(-1, 3)
+        offsets = offsets[
+            np.linalg.norm(offsets - 0.5, axis=1) <= radius + np.sqrt(3.0) / 2
+        ]
+        offset_flat = (offsets[:, 0] * size[1] + offsets[:, 1]) * size[2]
+        offset_flat += offsets[:, 2]
+        offset_squared = np.einsum("ij,ij->i", offsets, offsets)
+        width = (self.bandwidth / self.voxel_size) ** 2
+
+        cells = int(np.prod(size))
+        weight_sum = np.zeros(cells)
+        plane_sum = np.zeros(cells)
+        # Sample positions in lattice units, relative to the block
+        local = (self.tree.points[near] - self.origin) / self.voxel_size - low
+        rows = max(1, SPLAT_BATCH_PAIRS // len(offsets))
+        for start in range(0, len(near), rows):
+            position = local[start:start + rows]
+            normals = self.normals[near[start:start + rows]]
+            base = np.floor(position).astype(np.int64)
+            fraction = position - base
+            # Distances and plane distances of base + offset, as products with the
+            # offsets so no (sample, offset, axis) array is built
+            squared = (
+                offset_squared
+                - 2.0 * fraction @ offsets.T
+                + np.einsum("ij,ij->i", fraction, fraction)[:, None]
+            )
+            planes = normals @ offsets.T
+            planes -= np.einsum("ij,ij->i", normals, fraction)[:, None]
+            used = squared <= radius * radius
+            for axis in range(3):
+                lattice = base[:, axis, None] + offsets[:, axis]
+                used &= (lattice >= 0) & (lattice < size[axis])
+            base_flat = (base[:, 0] * size[1] + base[:, 1]) * size[2] + base[:, 2]
+            flat = (base_flat[:, None] + offset_flat)[used]
+            weights = np.exp(-squared[used] / width)
+            weight_sum += np.bincount(flat, weights=weights, minlength=cells)
+            plane_sum += np.bincount(
+                flat, weights=weights * planes[used], minlength=cells
+            )
+
+        values = np.full(cells, np.nan, dtype=np.float32)
+        known = weight_sum > 0
+        values[known] = plane_sum[known] / weight_sum[known] * self.voxel_size
+        return values.reshape(tuple(size))
+
+def point_cloud_options(options: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """Validated reconstruction options, falling back to POINT_CLOUD_DEFAULTS"""
+    options = options or {}
+    values = dict(POINT_CLOUD_DEFAULTS)
+    for key in POINT_CLOUD_DEFAULTS:
+        if options.get(key) is not None:
+            values[key] = options[key]
+    try:
+        result = {key: int(value) for key, value in values.items()}
+    except (TypeError, ValueError):
+        raise ValueError("neighbors, resolution and block_size must be integers")
+    if not 3 <= result["neighbors"] <= 64:
+        raise ValueError("neighbors must be between 3 and 64")
+    if not MIN_RESOLUTION <= result["resolution"] <= MAX_RESOLUTION:
+        raise ValueError(
+            f"resolution must be between {MIN_RESOLUTION} and {MAX_RESOLUTION}"
+        )
+    if not MIN_BLOCK_SIZE <= result["block_size"] <= MAX_BLOCK_SIZE:
+        raise ValueError(
+            f"block_size must be between {MIN_BLOCK_SIZE} and {MAX_BLOCK_SIZE}"
+        )
+    return result
+
+def load_points(data: bytes, file_type: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Points and optional normals from an (N, 3) or (N, 6) .npy array or a PLY file"""
+    if file_type == "npy":
+        try:
+            array = np.load(io.BytesIO(data), allow_pickle=False)
+        except ValueError as e:
+            raise ValueError(f"Could not read npy point cloud: {e}") from e
+        if array.ndim != 2 or array.shape[1] not in (3, 6):
+            raise ValueError("Point cloud arrays must have shape (N, 3) or (N, 6)")
+        array = array.astype(np.float64)
+        return array[:, :3], array[:, 3:] if array.shape[1] == 6 else None
+    if file_type == "ply":
+        import trimesh
+
+        try:
+            loaded = trimesh.load(io.BytesIO(data), file_type="ply", process=False)
+        except Exception as e:
+            raise ValueError(f"Could not read ply point cloud: {e}") from e
+        vertices = getattr(loaded, "vertices", np.zeros((0, 3)))
+        points = np.asarray(vertices, dtype=np.float64)
+        raw = getattr(loaded, "metadata", {}).get("_ply_raw", {})
+        normals = raw.get("vertex", {}).get("data")
+        axes = ("nx", "ny", "nz")
+        if normals is not None and all(name in normals.dtype.names for name in axes):
+            normals = np.stack([normals[name] for name in axes], axis=1)
+            return points, normals.astype(np.float64)
+        return points, None
+    raise ValueError(f"Unsupported point cloud format: {file_type}")
+
+def reconstruct_surface(
+    points: np.ndarray,
+    normals: Optional[np.ndarray] = None,
+    options: Optional[Dict[str, Any]] = None,
+    pool: Optional[Executor] = None,
+) -> Tuple[Mesh, Dict[str, Any]]:
+    """Mesh an unorganized point cloud
+
+    Builds one k-d tree, estimates and orients normals from batched k-NN
+    queries unless normals are given, and extracts the zero set of the
+    tangent-plane distance with sparse marching cubes, in parallel on pool
+    if given. The lattice follows the sample spacing, with at most
+    options["resolution"] samples along the longest axis.
+    """
+    values = point_cloud_options(options)
+    points = np.asarray(points, dtype=np.float64)
+    finite = np.isfinite(points).all(axis=1)
+    points = points[finite]
+    if normals is not None:
+        normals = np.asarray(normals, dtype=np.float64)[finite]
+    if len(points) <= values["neighbors"]:
+        raise ValueError(f"Point cloud needs more than {values['neighbors']} points")
+
+    started = time.perf_counter()
+    tree = KdTree(points)
+    tree_seconds = time.perf_counter() - started
+    distances, neighbors = tree.query(points, values["neighbors"])
+    knn_seconds = time.perf_counter() - started - tree_seconds
+    components = None
+    if normals is None:
+        normals, _ = pca_normals(points, neighbors)
+        normals, components = orient_normals(points, normals, neighbors)
+    else:
+        lengths = np.linalg.norm(normals, axis=1)
+        normals = normals / np.maximum(lengths, np.finfo(np.float64).tiny)[:, None]
+    normal_seconds = time.perf_counter() - started - tree_seconds - knn_seconds
+
+    low, high = points.min(axis=0), points.max(axis=0)
+    extent = max(float((high - low).max()), float(np.finfo(np.float32).eps))
+    # A lattice finer than the sample spacing adds triangles but no detail, so
+    # sparse clouds get a coarser one; options["resolution"] is the maximum.
+    # On a surface, k neighbours cover a disc of pi r^2 = k spacing^2.
+    spacing = float(np.median(distances[:, -1]))
+    spacing *= np.sqrt(np.pi / (values["neighbors"] - 1))
+    steps = np.ceil(extent / max(spacing, float(np.finfo(np.float64).tiny))) + 1
+    resolution = int(np.clip(steps, MIN_RESOLUTION, values["resolution"]))
+    voxel_size = extent / (resolution - 1)
+    # The band around the samples must hold every lattice cube the surface crosses
+    support = np.sqrt(3.0) * voxel_size + float(np.percentile(distances[:, -1], 95))
+    origin = low - support - voxel_size
+    span = (high + support + voxel_size - origin) / voxel_size
+    shape = tuple(np.ceil(span).astype(np.int64) + 1)
+    # Far enough to rule out a whole block, so empty blocks cost one bounded query
+    reach = np.sqrt(3.0) * values["block_size"] * voxel_size
+    bandwidth = FIELD_BANDWIDTH * spacing
+    field = PointCloudField(
+        tree, normals, support, bandwidth, reach, shape, voxel_size, origin
+    )
+    blocks = field.share() if pool is not None else []
+    try:
+        mesh, extraction = extract_surface(field, 0.0, values["block_size"], 1.0, pool)
+    finally:
+        for memory in blocks:
+            memory.close()
+            memory.unlink()
+
+    stats = {
+        "points": len(points),
+        "neighbors": values["neighbors"],
+        "estimated_normals": components is not None,
+        "normal_components": components,
+        "resolution": resolution,
+        "voxel_size": voxel_size,
+        "tree_seconds": tree_seconds,
+        "knn_seconds": knn_seconds,
+        "normal_seconds": normal_seconds,
+        **extraction,
+        "seconds": time.perf_counter() - started,
+    }
+    return mesh, stats
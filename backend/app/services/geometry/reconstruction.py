@@ -0,0 +1,430 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from multiprocessing import get_context
+from pathlib import Path
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+from app.core.config import settings
+from app.services.geometry.mesh import Mesh
+import logging
+import os
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RECONSTRUCTION_DEFAULTS = {
+    "iso_level": 0.0,
+    "block_size": 32,
+    "lipschitz": 1.0,
+    "voxel_size": 1.0,
+}
+
+# Block edge lengths in cubes; each block is one pool task
+MIN_BLOCK_SIZE = 8
+MAX_BLOCK_SIZE = 128
+
+# Value of the virtual samples around the volume, so surfaces are capped at its boundary
+OUTSIDE = float(np.finfo(np.float32).max)
+
+# Cube corner i sits at offset (i & 1, (i >> 1) & 1, (i >> 2) & 1)
+CORNER_OFFSETS = np.array(
+    [[(corner >> axis) & 1 for axis in range(3)] for corner in range(8)],
+    dtype=np.int64,
+)
+
+# Cube edges as (lower corner, axis)
+CUBE_EDGES = [
+    (corner, axis)
+    for axis in range(3)
+    for corner in range(8)
+    if not (corner >> axis) & 1
+]
+
+def _cube_faces() -> List[List[int]]:
+    """Corners of each cube face, counter-clockwise seen from outside the cube"""
+    faces = []
+    for axis in range(3):
+        u, v = (axis + 1) % 3, (axis + 2) % 3
+        for side in (0, 1):
+            square = ((0, 0), (1, 0), (1, 1), (0, 1))
+            ring = [(side << axis) | (du << u) | (dv << v) for du, dv in square]
+            faces.append(ring if side else ring[::-1])
+    return faces
+
+def _triangle_table() -> Tuple[np.ndarray, np.ndarray]:
+    """Marching cubes triangles of all 256 corner cases, as (offsets, edge triples)
+
+    Each cube face is cut so every run of inside corners is separated on its
+    own. Both cubes sharing a face see the same corners and cut it the same
+    way, so the surface has no cracks between cubes. The face segments are
+    chained into loops and fanned into triangles that face the outside.
+    """
+    edge_index = {}
+    for index, (corner, axis) in enumerate(CUBE_EDGES):
+        edge_index[frozenset((corner, corner | (1 << axis)))] = index
+    faces = _cube_faces()
+    offsets = [0]
+    triangles: List[Tuple[int, int, int]] = []
+    for case in range(256):
+        inside = [bool(case >> corner & 1) for corner in range(8)]
+        following: Dict[int, int] = {}
+        for ring in faces:
+            crossings = []
+            for k in range(4):
+                a, b = ring[k], ring[(k + 1) % 4]
+                if inside[a] != inside[b]:
+                    crossings.append((edge_index[frozenset((a, b))], inside[b]))
+            # Pair each crossing into an inside run with the next crossing out of it
+            for position, (edge, entering) in enumerate(crossings):
+                if entering:
+                    following[crossings[(position + 1) % len(crossings)][0]] = edge
+        visited = set()
+        for start in following:
+            if start in visited:
+                continue
+            loop = [start]
+            visited.add(start)
+            while following[loop[-1]] != start:
+                loop.append(following[loop[-1]])
+                visited.add(loop[-1])
+            fan = range(1, len(loop) - 1)
+            triangles.extend((loop[0], loop[k + 1], loop[k]) for k in fan)
+        offsets.append(len(triangles))
+    edges = np.array(triangles, dtype=np.int64).reshape(-1, 3)
+    return np.array(offsets, dtype=np.int64), edges
+
+TRIANGLE_OFFSETS, TRIANGLE_EDGES = _triangle_table()
+
+class VolumeField:
+    """Signed distances sampled on a regular lattice, stored as a .npy file
+
+    Samples are read from the file as blocks and pyramid queries need them,
+    one row range at a time, so the volume is never mapped or loaded whole.
+    Pickling keeps only the path and header, so pool tasks open the file
+    themselves.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        voxel_size: float = 1.0,
+        origin: Tuple[float, float, float] = (0.0, 0.0, 0.0),
+    ):
+        self.path = str(path)
+        self.voxel_size = float(voxel_size)
+        self.origin = np.asarray(origin, dtype=np.float64)
+        try:
+            with open(self.path, "rb") as handle:
+                version = np.lib.format.read_magic(handle)
+                if version == (1, 0):
+                    header = np.lib.format.read_array_header_1_0(handle)
+                elif version == (2, 0):
+                    header = np.lib.format.read_array_header_2_0(handle)
+                else:
+                    raise ValueError(f"unsupported .npy version {version}")
+                shape, fortran_order, dtype = header
+                self.offset = handle.tell()
+        except (OSError, ValueError) as e:
+            raise ValueError(f"Could not read field: {e}") from e
+        if len(shape) != 3 or min(shape) < 2:
+            raise ValueError("Field must be a 3D array with 2 or more samples per axis")
+        if dtype.kind != "f":
+            raise ValueError("Field samples must be floating point")
+        self.shape = tuple(int(size) for size in shape)
+        self.dtype = dtype
+        self.fortran_order = fortran_order
+        # Fortran-ordered files are read as C-ordered arrays of the reversed shape
+        self._stored_shape = self.shape[::-1] if fortran_order else self.shape
+        self._handle: Optional[BinaryIO] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {**self.__dict__, "_handle": None}
+
+    def _read(self, low: Tuple[int, ...], high: Tuple[int, ...]) -> np.ndarray:
+        if self._handle is None:
+            self._handle = open(self.path, "rb")
+        _, rows, columns = self._stored_shape
+        itemsize = self.dtype.itemsize
+        shape = tuple(high[axis] - low[axis] for axis in range(3))
+        block = np.empty(shape, dtype=np.float32)
+        length = (high[1] - low[1]) * columns * itemsize
+        for slab in range(low[0], high[0]):
+            # One contiguous read covers the block's rows of this slab
+            start = self.offset + (slab * rows + low[1]) * columns * itemsize
+            data = os.pread(self._handle.fileno(), length, start)
+            if len(data) < length:
+                raise ValueError("Field file is truncated")
+            values = np.frombuffer(data, dtype=self.dtype).reshape(-1, columns)
+            block[slab - low[0]] = values[:, low[2]:high[2]]
+        return block
+
+    def block(self, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+        """Samples at lattice points low <= index < high"""
+        start = tuple(int(value) for value in low)
+        stop = tuple(int(value) for value in high)
+        if self.fortran_order:
+            return self._read(start[::-1], stop[::-1]).transpose(2, 1, 0)
+        return self._read(start, stop)
+
+    def sample(self, indices: np.ndarray) -> np.ndarray:
+        values = [self.block(index, index + 1)[0, 0, 0] for index in indices]
+        return np.array(values, dtype=np.float64)
+
+class FunctionField:
+    """Signed distance function evaluated on a regular lattice
+
+    The function maps (N, 3) world positions to (N,) values; it must be
+    picklable (a module-level function) to be evaluated on the pool.
+    """
+
+    def __init__(
+        self,
+        function: Callable[[np.ndarray], np.ndarray],
+        shape: Tuple[int, int, int],
+        voxel_size: float = 1.0,
+        origin: Tuple[float, float, float] = (0.0, 0.0, 0.0),
+    ):
+        self.function = function
+        self.shape = tuple(int(size) for size in shape)
+        self.voxel_size = float(voxel_size)
+        self.origin = np.asarray(origin, dtype=np.float64)
+
+    def block(self, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+        axes = [np.arange(low[axis], high[axis]) for axis in range(3)]
+        grid = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+        shape = tuple(len(values) for values in axes)
+        return self.sample(grid).astype(np.float32).reshape(shape)
+
+    def sample(self, indices: np.ndarray) -> np.ndarray:
+        values = self.function(self.origin + indices * self.voxel_size)
+        return np.asarray(values, dtype=np.float64).reshape(-1)
+
+def reconstruction_options(options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Validated extraction options, falling back to RECONSTRUCTION_DEFAULTS"""
+    options = options or {}
+    values = dict(RECONSTRUCTION_DEFAULTS)
+    for key in RECONSTRUCTION_DEFAULTS:
+        if options.get(key) is not None:
+            values[key] = options[key]
+    try:
+        result: Dict[str, Any] = {
+            "iso_level": float(values["iso_level"]),
+            "block_size": int(values["block_size"]),
+            "lipschitz": float(values["lipschitz"]),
+            "voxel_size": float(values["voxel_size"]),
+        }
+        origin = np.asarray(options.get("origin") or (0.0, 0.0, 0.0), dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError(
+            "iso_level, lipschitz, voxel_size and origin must be numbers "
+            "and block_size an integer"
+        )
+    if not MIN_BLOCK_SIZE <= result["block_size"] <= MAX_BLOCK_SIZE:
+        raise ValueError(
+            f"block_size must be between {MIN_BLOCK_SIZE} and {MAX_BLOCK_SIZE}"
+        )
+    if not result["lipschitz"] > 0 or not result["voxel_size"] > 0:
+        raise ValueError("lipschitz and voxel_size must be positive")
+    if origin.shape != (3,) or not np.isfinite(origin).all():
+        raise ValueError("origin must be three numbers")
+    result["origin"] = tuple(float(value) for value in origin)
+    return result
+
+def _padded_block(field: Any, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+    """Samples at padded lattice points low <= index < high
+
+    The padded lattice has one OUTSIDE sample before and after the field on
+    every axis, so padded index i is field index i - 1.
+    """
+    samples = np.full(tuple(high - low), OUTSIDE, dtype=np.float32)
+    inner_low = np.maximum(low, 1)
+    inner_high = np.minimum(high, np.asarray(field.shape) + 1)
+    if (inner_high > inner_low).all():
+        target = tuple(slice(a, b) for a, b in zip(inner_low - low, inner_high - low))
+        samples[target] = field.block(inner_low - 1, inner_high - 1)
+    return samples
+
+def occupied_blocks(
+    field: Any,
+    iso_level: float,
+    block_size: int,
+    lipschitz: float,
+) -> Tuple[np.ndarray, int]:
+    """Blocks that may contain the surface, found top-down through an occupancy pyramid
+
+    A pyramid cell is sampled once, at the lattice point nearest its
+    center. With a field whose values change by at most lipschitz per unit
+    of distance, a cell whose center value is further from iso_level than
+    lipschitz times the distance to its farthest corner cannot contain the
+    surface and is dropped with all its blocks. Cells touching the volume
+    boundary are only dropped when outside, since inside ones are capped
+    there; cells with an unknown (NaN) center are kept. Returns the lower
+    cube corners of the surviving blocks (in the padded lattice) and the
+    number of field samples taken.
+    """
+    cubes = np.asarray(field.shape) + 1
+    grid = -(-cubes // block_size)
+    level = int(np.ceil(np.log2(max(int(grid.max()), 1))))
+    cells = np.zeros((1, 3), dtype=np.int64)
+    children = CORNER_OFFSETS
+    samples = 0
+    while True:
+        extent = block_size << level
+        low = cells * extent
+        high = np.minimum(low + extent, cubes)
+        keep = (low < cubes).all(axis=1)
+        cells, low, high = cells[keep], low[keep], high[keep]
+        center = np.clip((low + high) // 2, 1, cubes - 1)
+        values = field.sample(center - 1) - iso_level
+        samples += len(center)
+        radius = np.linalg.norm(np.maximum(center - low, high - center), axis=1)
+        reach = lipschitz * field.voxel_size * radius
+        boundary = (low < 1).any(axis=1) | (high > cubes - 1).any(axis=1)
+        slack = reach * (1 + 1e-6)
+        keep = (values <= slack) & ((values >= -slack) | boundary)
+        keep |= np.isnan(values)
+        cells = cells[keep]
+        if level == 0 or not len(cells):
+            return cells * block_size, samples
+        cells = (cells[:, None, :] * 2 + children[None, :, :]).reshape(-1, 3)
+        level -= 1
+
+def extract_block(
+    field: Any,
+    low: np.ndarray,
+    block_size: int,
+    iso_level: float,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Marching cubes over one block of the padded lattice
+
+    Returns the block's vertices in padded lattice units, the lattice edge
+    each one lies on and the triangles as lattice edges. A block only emits
+    vertices on edges whose lower end lies inside it, so every edge shared
+    with a neighbour produces exactly one vertex. Cubes with an unknown
+    (NaN) corner are left empty.
+    """
+    padded = np.asarray(field.shape) + 2
+    high = np.minimum(low + block_size + 1, padded)
+    samples = _padded_block(field, low, high)
+    inside = samples < iso_level
+    unknown = np.isnan(samples)
+    size = np.asarray(samples.shape) - 1
+
+    case = np.zeros(tuple(size), dtype=np.int64)
+    skipped = np.zeros(tuple(size), dtype=bool)
+    for corner, (x, y, z) in enumerate(CORNER_OFFSETS):
+        window = np.s_[x:x + size[0], y:y + size[1], z:z + size[2]]
+        case |= inside[window].astype(np.int64) << corner
+        skipped |= unknown[window]
+    cubes = np.flatnonzero((case != 0) & (case != 255) & ~skipped)
+    case = case.ravel()[cubes]
+    cube = np.stack(np.unravel_index(cubes, tuple(size)), axis=1) + low
+
+    # Lattice edge id = 3 * (linear index of its lower end) + axis
+    strides = np.array([padded[1] * padded[2], padded[2], 1], dtype=np.int64)
+    edge_offset = np.array([
+        3 * int(CORNER_OFFSETS[corner] @ strides) + axis for corner, axis in CUBE_EDGES
+    ], dtype=np.int64)
+    counts = TRIANGLE_OFFSETS[case + 1] - TRIANGLE_OFFSETS[case]
+    first = np.repeat(TRIANGLE_OFFSETS[case] - np.cumsum(counts) + counts, counts)
+    local = TRIANGLE_EDGES[first + np.arange(int(counts.sum()))]
+    faces = 3 * np.repeat(cube @ strides, counts)[:, None] + edge_offset[local]
+
+    positions, edges = [], []
+    for axis in range(3):
+        step = np.eye(3, dtype=np.int64)[axis]
+        # Edges along axis whose lower end is owned by this block
+        near = samples[:size[0], :size[1], :size[2]]
+        far = samples[tuple(slice(s, n + s) for s, n in zip(step, size))]
+        known = ~np.isnan(near) & ~np.isnan(far)
+        crossing = np.flatnonzero(((near < iso_level) != (far < iso_level)) & known)
+        lower = np.stack(np.unravel_index(crossing, tuple(size)), axis=1)
+        f0 = near.ravel()[crossing].astype(np.float64)
+        f1 = far.ravel()[crossing].astype(np.float64)
+        # Caps sit half a voxel outside the volume, so corners do not pinch
+        capped = (f0 == OUTSIDE) | (f1 == OUTSIDE)
+        t = np.where(capped, 0.5, (iso_level - f0) / (f1 - f0))
+        point = (lower + low).astype(np.float64)
+        point[:, axis] += t
+        positions.append(point.astype(np.float32))
+        edges.append(3 * ((lower + low) @ strides) + axis)
+    return np.concatenate(positions), np.concatenate(edges), faces
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def reconstruction_pool() -> ProcessPoolExecutor:
+    """Process pool for block extraction, created on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned workers do not inherit the server's threads or sockets
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.MESH_RECON_WORKERS,
+                mp_context=get_context("spawn"),
+            )
+        return _pool
+
+def extract_surface(
+    field: Any,
+    iso_level: float = 0.0,
+    block_size: int = 32,
+    lipschitz: float = 1.0,
+    pool: Optional[Executor] = None,
+) -> Tuple[Mesh, Dict[str, Any]]:
+    """Watertight iso-surface of a signed distance field (negative inside)
+
+    Only blocks the occupancy pyramid cannot rule out are sampled, each as
+    its own pool task, and their results are merged as they arrive, so
+    memory follows the surface area rather than the volume. Surfaces that
+    reach the volume boundary are closed half a voxel outside it. Triangles
+    face the outside.
+    """
+    started = time.perf_counter()
+    blocks, pyramid_samples = occupied_blocks(field, iso_level, block_size, lipschitz)
+    task = partial(extract_block, field, block_size=block_size, iso_level=iso_level)
+    results: Iterable[Tuple[np.ndarray, np.ndarray, np.ndarray]]
+    if pool is None or len(blocks) < 2:
+        results = map(task, blocks)
+    else:
+        chunksize = max(1, len(blocks) // (16 * settings.MESH_RECON_WORKERS))
+        results = pool.map(task, blocks, chunksize=chunksize)
+
+    positions, edges, faces = [], [], []
+    for block_positions, block_edges, block_faces in results:
+        if len(block_faces) or len(block_edges):
+            positions.append(block_positions)
+            edges.append(block_edges)
+            faces.append(block_faces)
+    if not faces or not sum(len(part) for part in faces):
+        raise ValueError("The field has no surface at this iso level")
+    edges = np.concatenate(edges)
+    order = np.argsort(edges, kind="stable")
+    vertices = np.concatenate(positions)[order].astype(np.float64)
+    indices = np.searchsorted(edges[order], np.concatenate(faces))
+    # Padded lattice index i is field index i - 1
+    vertices = field.origin + (vertices - 1.0) * field.voxel_size
+
+    padded = np.asarray(field.shape) + 2
+    block_samples = int(np.prod(np.minimum(block_size + 1, padded)))
+    stats = {
+        "blocks": int(np.prod(-(-(padded - 1) // block_size))),
+        "occupied_blocks": len(blocks),
+        "field_samples": pyramid_samples + block_samples * len(blocks),
+        "dense_samples": int(np.prod(field.shape)),
+        "vertices": len(vertices),
+        "triangles": len(indices),
+        "seconds": time.perf_counter() - started,
+    }
+    return Mesh(vertices, indices.astype(np.int64)), stats
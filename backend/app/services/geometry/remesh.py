@@ -0,0 +1,429 @@
+from typing import Any, Dict, NamedTuple, Tuple
+from app.services.geometry.mesh import Mesh, compact_mesh, weld_positions, widen_mesh
+from app.services.geometry.spatial import SpatialHashGrid
+from app.services.geometry.validation import (
+    adjacent_half_edges, edge_topology, face_cross_products,
+)
+import numpy as np
+
+REMESH_ITERATIONS = 10
+MIN_REMESH_TRIANGLES = 8
+
+# Iterations continue past the requested number until the triangle count is
+# within COUNT_TOLERANCE of the target, up to MAX_REMESH_ITERATIONS in total
+COUNT_TOLERANCE = 0.05
+MAX_REMESH_ITERATIONS = 40
+
+# Edges longer than SPLIT_RATIO or shorter than COLLAPSE_RATIO times the
+# target length are split or collapsed (Botsch & Kobbelt)
+SPLIT_RATIO = 4.0 / 3.0
+COLLAPSE_RATIO = 4.0 / 5.0
+
+# Each split, collapse or flip pass handles an independent set of edges.
+# Splits and collapses repeat until nothing changes; flips stop at this limit
+MAX_FLIP_PASSES = 10
+
+# Collapse candidates are ranked in buckets of this fraction of the collapse length
+LENGTH_BUCKETS = 8
+
+RELAXATION_STEP = 0.5
+QUALITY_BINS = 10
+
+class RemeshResult(NamedTuple):
+    mesh: Mesh
+    iterations: int
+    edge_length: float
+
+def triangle_quality(vertices: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    """Shape quality per triangle, 4 * sqrt(3) * area / sum of squared edge lengths
+
+    1 for an equilateral triangle, 0 for a degenerate one.
+    """
+    cross, _ = face_cross_products(vertices, faces)
+    area = 0.5 * np.sqrt(np.einsum("ij,ij->i", cross, cross))
+    corners = vertices[faces]
+    edges = corners[:, [1, 2, 0]] - corners
+    squared = np.einsum("ijk,ijk->i", edges, edges)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        quality = np.where(squared > 0, 4.0 * np.sqrt(3.0) * area / squared, 0.0)
+    return np.clip(quality, 0.0, 1.0)
+
+def quality_report(mesh: Mesh) -> Dict[str, Any]:
+    """Distribution of triangle shape quality; quality_score is its mean"""
+    quality = triangle_quality(mesh.vertices, mesh.faces)
+    if not len(quality):
+        return {
+            "quality_score": 0.0,
+            "min": 0.0,
+            "p5": 0.0,
+            "median": 0.0,
+            "histogram": [0] * QUALITY_BINS,
+        }
+    histogram, _ = np.histogram(quality, bins=QUALITY_BINS, range=(0.0, 1.0))
+    return {
+        "quality_score": float(quality.mean()),
+        "min": float(quality.min()),
+        "p5": float(np.percentile(quality, 5)),
+        "median": float(np.median(quality)),
+        "histogram": histogram.tolist(),
+    }
+
+def _vertex_flags(topology, vertex_count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Boundary vertices and vertices on non-manifold edges"""
+    boundary = np.zeros(vertex_count, dtype=bool)
+    boundary[topology.edges[topology.face_counts == 1].ravel()] = True
+    locked = np.zeros(vertex_count, dtype=bool)
+    locked[topology.edges[topology.face_counts > 2].ravel()] = True
+    return boundary, locked
+
+def _edge_exists(
+    topology,
+    vertex_count: int,
+    first: np.ndarray,
+    second: np.ndarray,
+) -> np.ndarray:
+    # Edges come out of edge_topology sorted by their low * n + high key
+    keys = topology.edges[:, 0] * vertex_count + topology.edges[:, 1]
+    query = np.minimum(first, second) * vertex_count + np.maximum(first, second)
+    slot = np.minimum(np.searchsorted(keys, query), max(len(keys) - 1, 0))
+    return keys[slot] == query if len(keys) else np.zeros(len(query), dtype=bool)
+
+def _normals(vertices: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    cross, _ = face_cross_products(vertices, faces)
+    return cross
+
+def _rotate(values: np.ndarray, start: np.ndarray) -> np.ndarray:
+    """Rotate each row of an (N, 3) array so that column start comes first"""
+    return np.take_along_axis(values, (start[:, None] + np.arange(3)) % 3, axis=1)
+
+def split_long_edges(
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    high: float,
+) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Split every edge longer than high at its midpoint in one batch"""
+    topology = edge_topology(faces, len(vertices))
+    edges = topology.edges
+    lengths = np.linalg.norm(vertices[edges[:, 0]] - vertices[edges[:, 1]], axis=1)
+    split = np.flatnonzero(lengths > high)
+    if not len(split):
+        return vertices, faces, 0
+
+    midpoint = np.full(len(edges), -1, dtype=np.int64)
+    midpoint[split] = len(vertices) + np.arange(len(split))
+    vertices = np.vstack(
+        [vertices, 0.5 * (vertices[edges[split, 0]] + vertices[edges[split, 1]])]
+    )
+    # mids[f, s] is the midpoint of edge (f[s], f[s + 1]), or -1
+    mids = midpoint[topology.half_edge_edge].reshape(-1, 3)
+    splits = (mids >= 0).sum(axis=1)
+    parts = [faces[splits == 0]]
+
+    one = np.flatnonzero(splits == 1)
+    if len(one):
+        start = np.argmax(mids[one] >= 0, axis=1)
+        r, m = _rotate(faces[one], start), _rotate(mids[one], start)[:, 0]
+        parts += [np.c_[r[:, 0], m, r[:, 2]], np.c_[m, r[:, 1], r[:, 2]]]
+
+    two = np.flatnonzero(splits == 2)
+    if len(two):
+        # Rotate so the unsplit edge runs from r2 back to r0
+        start = (np.argmin(mids[two] >= 0, axis=1) + 1) % 3
+        r, m = _rotate(faces[two], start), _rotate(mids[two], start)
+        m0, m1 = m[:, 0], m[:, 1]
+        parts.append(np.c_[m0, r[:, 1], m1])
+        # Cut the remaining quad along its shorter diagonal
+        short = (
+            np.linalg.norm(vertices[r[:, 0]] - vertices[m1], axis=1)
+            <= np.linalg.norm(vertices[m0] - vertices[r[:, 2]], axis=1)
+        )
+        parts += [
+            np.where(
+                short[:, None], np.c_[r[:, 0], m0, m1], np.c_[r[:, 0], m0, r[:, 2]]
+            ),
+            np.where(
+                short[:, None], np.c_[r[:, 0], m1, r[:, 2]], np.c_[m0, m1, r[:, 2]]
+            ),
+        ]
+
+    three = np.flatnonzero(splits == 3)
+    if len(three):
+        f, m = faces[three], mids[three]
+        parts += [
+            np.c_[f[:, 0], m[:, 0], m[:, 2]],
+            np.c_[m[:, 0], f[:, 1], m[:, 1]],
+            np.c_[m[:, 2], m[:, 1], f[:, 2]],
+            m,
+        ]
+    return vertices, np.concatenate(parts), len(split)
+
+def collapse_short_edges(
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    low: float,
+    high: float,
+) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Collapse an independent set of edges shorter than low
+
+    No two chosen edges have endpoints in each other's one-ring, so their
+    validity checks do not interact and all of them are applied at once.
+    """
+    vertex_count = len(vertices)
+    topology = edge_topology(faces, vertex_count)
+    a, b = topology.edges[:, 0], topology.edges[:, 1]
+    counts = topology.face_counts
+    boundary, locked = _vertex_flags(topology, vertex_count)
+    lengths = np.linalg.norm(vertices[a] - vertices[b], axis=1)
+    candidates = np.flatnonzero(
+        (lengths < low) & (counts <= 2) & ~locked[a] & ~locked[b]
+        # An interior edge between two boundary vertices would pinch the surface
+        & ~(boundary[a] & boundary[b] & (counts == 2))
+    )
+    if not len(candidates):
+        return vertices, faces, 0
+
+    # Shortest edge wins within each one-ring neighbourhood. Lengths are
+    # bucketed and ties broken by a hash of the edge, so a gradual change in
+    # edge length does not leave only a few local minima to collapse per pass
+    no_priority = np.iinfo(np.int64).max
+    priority = np.full(len(a), no_priority, dtype=np.int64)
+    bucket = np.floor(lengths[candidates] * LENGTH_BUCKETS / low).astype(np.int64)
+    tie = (candidates * 2654435761) % (1 << 32)
+    by_length = candidates[np.lexsort((tie, bucket))]
+    priority[by_length] = np.arange(len(candidates))
+    nearest = np.full(vertex_count, no_priority, dtype=np.int64)
+    np.minimum.at(nearest, a[candidates], priority[candidates])
+    np.minimum.at(nearest, b[candidates], priority[candidates])
+    ring = nearest.copy()
+    np.minimum.at(ring, a, nearest[b])
+    np.minimum.at(ring, b, nearest[a])
+    chosen = candidates[
+        (priority[candidates] == ring[a[candidates]])
+        & (priority[candidates] == ring[b[candidates]])
+    ]
+
+    # Boundary vertices stay put; interior edges collapse to their midpoint
+    onto_b = boundary[b[chosen]] & ~boundary[a[chosen]]
+    keep = np.where(onto_b, b[chosen], a[chosen])
+    remove = np.where(onto_b, a[chosen], b[chosen])
+    moves_to_end = boundary[a[chosen]] ^ boundary[b[chosen]]
+    target = np.where(
+        moves_to_end[:, None], vertices[keep], 0.5 * (vertices[keep] + vertices[remove])
+    )
+    owner = np.full(vertex_count, -1, dtype=np.int64)
+    owner[keep] = np.arange(len(chosen))
+    owner[remove] = np.arange(len(chosen))
+
+    # Neighbours of either endpoint, excluding the edge itself
+    source = np.r_[a, b]
+    neighbour = np.r_[b, a]
+    collapse = owner[source]
+    touching = collapse >= 0
+    source, neighbour = source[touching], neighbour[touching]
+    collapse = collapse[touching]
+    other = np.where(source == keep[collapse], remove[collapse], keep[collapse])
+    outer = neighbour != other
+    source, neighbour = source[outer], neighbour[outer]
+    collapse, other = collapse[outer], other[outer]
+
+    # Link condition: common neighbours are exactly the opposite vertices;
+    # each one is seen once from each endpoint
+    shared = _edge_exists(topology, vertex_count, other, neighbour)
+    common = np.bincount(collapse[shared], minlength=len(chosen)) // 2
+    valid = common == counts[chosen]
+    degree = np.bincount(collapse, minlength=len(chosen)) - common
+    valid &= degree >= np.where(counts[chosen] == 2, 3, 2)
+    too_long = np.linalg.norm(target[collapse] - vertices[neighbour], axis=1) > high
+    valid &= np.bincount(collapse[too_long], minlength=len(chosen)) == 0
+
+    # Faces that keep one moved corner must not flip
+    corner_owner = owner[faces]
+    owned = corner_owner >= 0
+    moved = np.flatnonzero(owned.sum(axis=1) == 1)
+    if len(moved):
+        face_collapse = corner_owner[moved].max(axis=1)
+        before = vertices[faces[moved]]
+        after = np.where(
+            owned[moved][:, :, None], target[face_collapse][:, None, :], before
+        )
+        old = np.cross(before[:, 1] - before[:, 0], before[:, 2] - before[:, 0])
+        new = np.cross(after[:, 1] - after[:, 0], after[:, 2] - after[:, 0])
+        flipped = np.einsum("ij,ij->i", old, new) <= 0
+        valid &= np.bincount(face_collapse[flipped], minlength=len(chosen)) == 0
+
+    if not valid.any():
+        return vertices, faces, 0
+    vertices = vertices.copy()
+    vertices[keep[valid]] = target[valid]
+    remap = np.arange(vertex_count)
+    remap[remove[valid]] = keep[valid]
+    faces = remap[faces]
+    proper = (
+        (faces[:, 0] != faces[:, 1])
+        & (faces[:, 1] != faces[:, 2])
+        & (faces[:, 2] != faces[:, 0])
+    )
+    return vertices, faces[proper], int(valid.sum())
+
+def flip_edges(vertices: np.ndarray, faces: np.ndarray) -> Tuple[np.ndarray, int]:
+    """Flip an independent set of edges that bring vertex valences closer to 6
+
+    The ideal valence of a boundary vertex is 4. No vertex takes part in two
+    flips of the same pass, so every gain is exact and repeated passes end.
+    """
+    vertex_count = len(vertices)
+    topology = edge_topology(faces, vertex_count)
+    boundary, locked = _vertex_flags(topology, vertex_count)
+    first, second = adjacent_half_edges(topology)
+    interior = topology.face_counts[topology.half_edge_edge[first]] == 2
+    first, second = first[interior], second[interior]
+    f1, s1 = first // 3, first % 3
+    f2, s2 = second // 3, second % 3
+    a, b, c = faces[f1, s1], faces[f1, (s1 + 1) % 3], faces[f1, (s1 + 2) % 3]
+    d = faces[f2, (s2 + 2) % 3]
+
+    valence = np.bincount(topology.edges.ravel(), minlength=vertex_count)
+    ideal = np.where(boundary, 4, 6)
+
+    def deviation(vertex: np.ndarray, change: int) -> np.ndarray:
+        return np.abs(valence[vertex] + change - ideal[vertex])
+
+    gain = (
+        deviation(a, 0) + deviation(b, 0) + deviation(c, 0) + deviation(d, 0)
+        - deviation(a, -1) - deviation(b, -1) - deviation(c, 1) - deviation(d, 1)
+    )
+    candidate = (
+        (faces[f2, s2] == b) & (gain > 0) & (c != d) & ~locked[a] & ~locked[b]
+        & (valence[a] > 3) & (valence[b] > 3)
+        & ~_edge_exists(topology, vertex_count, c, d)
+    )
+    chosen = np.flatnonzero(candidate)
+    if len(chosen):
+        # New faces must face the same way as the pair they replace
+        ca, cb, cc, cd = a[chosen], b[chosen], c[chosen], d[chosen]
+        normal = _normals(vertices, faces[f1[chosen]])
+        normal += _normals(vertices, faces[f2[chosen]])
+        left = _normals(vertices, np.c_[ca, cd, cc])
+        right = _normals(vertices, np.c_[cb, cc, cd])
+        facing_left = np.einsum("ij,ij->i", left, normal) > 0
+        facing_right = np.einsum("ij,ij->i", right, normal) > 0
+        chosen = chosen[facing_left & facing_right]
+    if not len(chosen):
+        return faces, 0
+
+    # Each vertex takes part in at most one flip: the best one touching it.
+    # That also keeps two flips from creating the same edge
+    score = gain[chosen] * (len(first) + 1) + (len(first) - chosen)
+    best = np.zeros(vertex_count, dtype=np.int64)
+    for corner in (a, b, c, d):
+        np.maximum.at(best, corner[chosen], score)
+    chosen = chosen[
+        (score == best[a[chosen]]) & (score == best[b[chosen]])
+        & (score == best[c[chosen]]) & (score == best[d[chosen]])
+    ]
+
+    faces = faces.copy()
+    faces[f1[chosen]] = np.c_[a[chosen], d[chosen], c[chosen]]
+    faces[f2[chosen]] = np.c_[b[chosen], c[chosen], d[chosen]]
+    return faces, len(chosen)
+
+def relax_vertices(vertices: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    """Move interior vertices towards their neighbours' centroid in the tangent plane"""
+    vertex_count = len(vertices)
+    topology = edge_topology(faces, vertex_count)
+    boundary, locked = _vertex_flags(topology, vertex_count)
+    source = np.r_[topology.edges[:, 0], topology.edges[:, 1]]
+    neighbour = np.r_[topology.edges[:, 1], topology.edges[:, 0]]
+    degree = np.maximum(np.bincount(source, minlength=vertex_count), 1)
+    centroid = np.stack([
+        np.bincount(source, weights=vertices[neighbour, axis], minlength=vertex_count)
+        for axis in range(3)
+    ], axis=1) / degree[:, None]
+
+    cross = _normals(vertices, faces)
+    normals: np.ndarray = np.stack(
+        [
+            np.bincount(
+                faces.ravel(),
+                weights=np.repeat(cross[:, axis], 3),
+                minlength=vertex_count,
+            )
+            for axis in range(3)
+        ],
+        axis=1,
+    )
+    length = np.maximum(np.linalg.norm(normals, axis=1), np.finfo(np.float64).tiny)
+    normals /= length[:, None]
+    move = centroid - vertices
+    move -= normals * np.einsum("ij,ij->i", normals, move)[:, None]
+    move[boundary | locked] = 0.0
+    return vertices + RELAXATION_STEP * move
+
+def target_edge_length(mesh: Mesh, target_triangles: int) -> float:
+    """Edge length of target_triangles equilateral triangles covering the surface"""
+    cross, _ = face_cross_products(mesh.vertices, mesh.faces)
+    area = 0.5 * np.sqrt(np.einsum("ij,ij->i", cross, cross)).sum()
+    return float(np.sqrt(4.0 * area / (np.sqrt(3.0) * target_triangles)))
+
+def remesh(
+    mesh: Mesh,
+    target_triangles: int,
+    iterations: int = REMESH_ITERATIONS,
+) -> RemeshResult:
+    """Isotropic remeshing towards target_triangles near-equilateral triangles
+
+    Each iteration splits long edges, collapses short ones, flips edges to
+    even out valences, relaxes vertices tangentially and projects them back
+    onto the input surface. The target edge length is corrected after every
+    iteration, and iterations continue past the requested number until the
+    triangle count is within COUNT_TOLERANCE of the target. UVs are dropped.
+    """
+    if target_triangles < MIN_REMESH_TRIANGLES:
+        raise ValueError(f"target_triangles must be at least {MIN_REMESH_TRIANGLES}")
+    mesh = widen_mesh(mesh)
+    positions, index = weld_positions(mesh.vertices)
+    faces = index[mesh.faces]
+    proper = (
+        (faces[:, 0] != faces[:, 1])
+        & (faces[:, 1] != faces[:, 2])
+        & (faces[:, 2] != faces[:, 0])
+    )
+    source = compact_mesh(Mesh(positions, faces[proper]))
+    if not source.triangle_count:
+        raise ValueError("Mesh has no triangles to remesh")
+
+    length = target_edge_length(source, target_triangles)
+    corners = source.vertices[source.faces]
+    source_edge = float(np.linalg.norm(corners[:, 1] - corners[:, 0], axis=1).mean())
+    # Cells of half an edge keep the candidate lists short; the bound on the
+    # source side stops large input triangles from covering too many cells
+    grid = SpatialHashGrid(
+        source.vertices, source.faces, max(length / 2.0, source_edge / 4.0)
+    )
+
+    vertices, faces = source.vertices, source.faces
+    iteration = 0
+    while iteration < max(iterations, 1) or (
+        abs(len(faces) - target_triangles) > COUNT_TOLERANCE * target_triangles
+        and iteration < MAX_REMESH_ITERATIONS
+    ):
+        iteration += 1
+        high, low = SPLIT_RATIO * length, COLLAPSE_RATIO * length
+        # Every pass splits or collapses at least one edge, so both loops end
+        count = 1
+        while count:
+            vertices, faces, count = split_long_edges(vertices, faces, high)
+        count = 1
+        while count:
+            vertices, faces, count = collapse_short_edges(vertices, faces, low, high)
+        current = compact_mesh(Mesh(vertices, faces))
+        vertices, faces = current.vertices, current.faces
+        for _ in range(MAX_FLIP_PASSES):
+            faces, count = flip_edges(vertices, faces)
+            if not count:
+                break
+        vertices = relax_vertices(vertices, faces)
+        vertices, _ = grid.closest_points(vertices, length / 4.0)
+        # Steer the edge length towards the requested triangle count
+        length *= float(np.sqrt(len(faces) / target_triangles))
+    return RemeshResult(Mesh(vertices, faces), iteration, length)
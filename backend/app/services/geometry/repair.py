@@ -0,0 +1,606 @@
+from typing import Any, Dict, List, Optional, Tuple
+from app.services.geometry.mesh import Mesh, compact_mesh
+from app.services.geometry.reconstruction import extract_surface
+from app.services.geometry.spatial import SpatialHashGrid
+from app.services.geometry.validation import (
+    DEGENERATE_AREA_TOLERANCE,
+    DUPLICATE_VERTEX_TOLERANCE,
+    analyze_mesh,
+    bounding_diagonal,
+    edge_topology,
+    face_cross_products,
+    find_duplicate_vertices,
+    union_find,
+)
+import time
+import numpy as np
+
+REPAIR_DEFAULTS = {
+    "min_component_ratio": 0.01,
+    "max_hole_edges": 1000,
+    "rewrap": False,
+    "rewrap_resolution": 128,
+}
+
+# Holes with at most this many edges are fanned around their centroid; larger ones
+# are meshed by an advancing front
+FAN_HOLE_EDGES = 8
+
+# Advancing front: corners sharper than the first angle are closed with one triangle,
+# corners up to the second get one new vertex and wider ones two
+FRONT_CLOSE_ANGLE = np.radians(75.0)
+FRONT_SPLIT_ANGLE = np.radians(135.0)
+
+# Re-wrap lattice bounds (samples along the longest axis)
+MIN_REWRAP_RESOLUTION = 16
+MAX_REWRAP_RESOLUTION = 512
+
+# Lattice points closer than this many voxels to the surface block the outside
+# flood fill; more than half a voxel, so no lattice edge crosses the surface
+# between two free points
+REWRAP_SHELL = 0.6
+
+# Bound on surface samples held in memory at once while finding the shell
+SAMPLE_BATCH_POINTS = 1 << 20
+
+def repair_options(options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Validated repair options, falling back to REPAIR_DEFAULTS"""
+    options = options or {}
+    values = dict(REPAIR_DEFAULTS)
+    for key in REPAIR_DEFAULTS:
+        if options.get(key) is not None:
+            values[key] = options[key]
+    try:
+        result = {
+            "min_component_ratio": float(values["min_component_ratio"]),
+            "max_hole_edges": int(values["max_hole_edges"]),
+            "rewrap": bool(values["rewrap"]),
+            "rewrap_resolution": int(values["rewrap_resolution"]),
+        }
+    except (TypeError, ValueError):
+        raise ValueError(
+            "min_component_ratio must be a number and max_hole_edges and "
+            "rewrap_resolution integers"
+        )
+    if not 0.0 <= result["min_component_ratio"] <= 1.0:
+        raise ValueError("min_component_ratio must be between 0 and 1")
+    if result["max_hole_edges"] < 0:
+        raise ValueError("max_hole_edges must not be negative")
+    resolution = result["rewrap_resolution"]
+    if not MIN_REWRAP_RESOLUTION <= resolution <= MAX_REWRAP_RESOLUTION:
+        raise ValueError(
+            f"rewrap_resolution must be between {MIN_REWRAP_RESOLUTION} and "
+            f"{MAX_REWRAP_RESOLUTION}"
+        )
+    return result
+
+def merge_duplicate_vertices(
+    vertices: np.ndarray,
+    faces: np.ndarray,
+) -> Tuple[np.ndarray, int]:
+    """Faces with vertices at the same position, within validation tolerance, merged"""
+    tolerance = DUPLICATE_VERTEX_TOLERANCE * bounding_diagonal(vertices)
+    duplicates, first = find_duplicate_vertices(vertices, tolerance)
+    remap = np.arange(len(vertices))
+    remap[duplicates] = first
+    return remap[faces], len(duplicates)
+
+def remove_bad_faces(
+    vertices: np.ndarray,
+    faces: np.ndarray,
+) -> Tuple[np.ndarray, int, int]:
+    """Faces without degenerate ones and without repeats of an earlier face's vertices
+
+    Returns the faces kept and the number of degenerate and duplicate faces removed.
+    """
+    diagonal = bounding_diagonal(vertices)
+    cross, _ = face_cross_products(vertices, faces)
+    area = np.sqrt(np.einsum("ij,ij->i", cross, cross))
+    v0, v1, v2 = faces.T
+    degenerate = (v0 == v1) | (v1 == v2) | (v2 == v0)
+    degenerate |= area <= DEGENERATE_AREA_TOLERANCE * diagonal * diagonal
+    faces = faces[~degenerate]
+    # Either winding of the same three vertices is a duplicate
+    _, first = np.unique(np.sort(faces, axis=1), axis=0, return_index=True)
+    return faces[np.sort(first)], int(degenerate.sum()), len(faces) - len(first)
+
+def trim_non_manifold_edges(
+    faces: np.ndarray,
+    vertex_count: int,
+) -> Tuple[np.ndarray, int]:
+    """Faces with only two faces kept on every edge shared by more than two
+
+    The faces on such an edge are ranked by how many of their other edges
+    are manifold, then by index, so faces stitched into the surface beat
+    fins hanging off it. The best face is kept with the best one that
+    traverses the edge in the opposite direction (or the second best if
+    none does); the others are removed and their holes filled later.
+    """
+    topology = edge_topology(faces, vertex_count)
+    if not (topology.face_counts > 2).any():
+        return faces, 0
+    manifold = topology.face_counts[topology.half_edge_edge] == 2
+    attached = manifold.reshape(-1, 3).sum(axis=1)
+    half = np.arange(len(topology.half_edge_edge))
+    order = np.lexsort((half, -attached[half // 3], topology.half_edge_edge))
+    starts = np.cumsum(topology.face_counts) - topology.face_counts
+    edge = topology.half_edge_edge[order]
+    rank = np.arange(len(order)) - starts[edge]
+    forward = topology.half_edges[order, 0] < topology.half_edges[order, 1]
+    opposite = (rank > 0) & (forward != forward[starts[edge]])
+    partner = np.minimum.reduceat(np.where(opposite, rank, len(order)), starts)
+    partner = np.where(partner < len(order), partner, 1)
+    removed = (rank != 0) & (rank != partner[edge]) & (topology.face_counts[edge] > 2)
+    keep = np.ones(len(faces), dtype=bool)
+    keep[order[removed] // 3] = False
+    return faces[keep], int((~keep).sum())
+
+def split_non_manifold_vertices(
+    vertices: np.ndarray,
+    faces: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, int]:
+    """One copy of a vertex per fan of faces around it
+
+    Face corners at a vertex are joined across the two-face edges they
+    share; a vertex whose corners fall into several groups (faces meeting
+    only at the vertex, or separated by a non-manifold edge) keeps its index
+    for the first group and gets a new vertex for each other one.
+    """
+    topology = edge_topology(faces, len(vertices))
+    order = topology.order
+    starts = np.cumsum(topology.face_counts) - topology.face_counts
+    pairs = starts[topology.face_counts == 2]
+    first, second = order[pairs], order[pairs + 1]
+
+    # Half-edge h runs from corner h to the next corner of face h // 3
+    def corner(half: np.ndarray, end: int) -> np.ndarray:
+        return half - half % 3 + (half % 3 + end) % 3
+
+    opposite = topology.half_edges[first, 0] == topology.half_edges[second, 1]
+    a = np.r_[corner(first, 0), corner(first, 1)]
+    b = np.r_[
+        np.where(opposite, corner(second, 1), corner(second, 0)),
+        np.where(opposite, corner(second, 0), corner(second, 1)),
+    ]
+    labels, _ = union_find(faces.size, a, b)
+
+    corner_vertex = faces.ravel()
+    corner_keys = corner_vertex * np.int64(faces.size) + labels
+    keys, inverse = np.unique(corner_keys, return_inverse=True)
+    owner = keys // faces.size
+    copy = np.zeros(len(keys), dtype=bool)
+    copy[1:] = owner[1:] == owner[:-1]
+    index = np.where(copy, len(vertices) + np.cumsum(copy) - 1, owner)
+    vertices = np.concatenate([vertices, vertices[owner[copy]]])
+    return vertices, index[inverse.reshape(-1)].reshape(faces.shape), int(copy.sum())
+
+def rejoin_vertices(vertices: np.ndarray, faces: np.ndarray) -> Tuple[np.ndarray, int]:
+    """Faces with vertices at the same position merged where they stay manifold
+
+    Copies split off at a vertex whose fans hole filling has joined again
+    can be merged back; copies on a loop that was filled as one (passing
+    the vertex twice) must stay apart. Returns the faces and the number of
+    vertices merged away.
+    """
+    welded, _ = merge_duplicate_vertices(vertices, faces)
+    topology = edge_topology(welded, len(vertices))
+    _, split, _ = split_non_manifold_vertices(vertices, welded)
+    conflicted = np.zeros(len(vertices), dtype=bool)
+    conflicted[topology.edges[topology.face_counts > 2].ravel()] = True
+    conflicted[welded[split != welded]] = True
+    merged = np.where(conflicted[welded], faces, welded)
+    return merged, len(np.unique(faces)) - len(np.unique(merged))
+
+def remove_small_components(
+    faces: np.ndarray,
+    labels: np.ndarray,
+    sizes: np.ndarray,
+    min_ratio: float,
+) -> Tuple[np.ndarray, int, int]:
+    """Faces without the components smaller than min_ratio of the largest one
+
+    Returns the faces kept and the number of components and faces removed.
+    """
+    if not len(sizes):
+        return faces, 0, 0
+    small = np.flatnonzero(sizes < min_ratio * sizes[0])
+    if not len(small):
+        return faces, 0, 0
+    # Components are numbered largest first
+    keep = labels < small[0]
+    return faces[keep], len(small), int((~keep).sum())
+
+def boundary_loops(faces: np.ndarray, vertex_count: int) -> Tuple[List[List[int]], int]:
+    """Vertex loops around the holes of a consistently wound mesh
+
+    Each loop runs against the winding of the faces on its rim, so a
+    triangle (loop[i], loop[i + 1], x) closing it is wound like them.
+    Returns the loops and the number of boundary chains that do not close
+    (at vertices with several fans or inconsistent winding).
+    """
+    topology = edge_topology(faces, vertex_count)
+    open_half = np.flatnonzero(topology.face_counts[topology.half_edge_edge] == 1)
+    # Fill edges reverse the rim's half-edges
+    start = topology.half_edges[open_half, 1]
+    end = topology.half_edges[open_half, 0]
+    by_start = np.full(vertex_count, -1, dtype=np.int64)
+    by_start[start] = np.arange(len(start))
+    ambiguous = np.bincount(start, minlength=vertex_count) > 1
+
+    successor = np.where(ambiguous[end], -1, by_start[end]).tolist()
+    start = start.tolist()
+    visited = [False] * len(start)
+    loops, broken = [], 0
+    for edge in range(len(start)):
+        if visited[edge]:
+            continue
+        loop, current = [], edge
+        while current >= 0 and not visited[current]:
+            visited[current] = True
+            loop.append(start[current])
+            current = successor[current]
+        if current == edge:
+            loops.append(loop)
+        else:
+            broken += 1
+    return loops, broken
+
+# A front patch larger than this multiple of its hole's area is replaced by a fan
+MAX_FILL_AREA_RATIO = 2.0
+
+def _rotate(direction: np.ndarray, normal: np.ndarray, angle: float) -> np.ndarray:
+    return direction * np.cos(angle) + np.cross(normal, direction) * np.sin(angle)
+
+def _corner_angle(
+    positions: List[np.ndarray],
+    normal: np.ndarray,
+    previous: int,
+    vertex: int,
+    following: int,
+) -> float:
+    """Angle inside the front at a vertex, counter-clockwise about normal
+
+    Measured from the next edge to the previous one.
+    """
+    a = positions[previous] - positions[vertex]
+    b = positions[following] - positions[vertex]
+    angle = np.arctan2(np.dot(normal, np.cross(b, a)), np.dot(b, a))
+    return float(angle % (2.0 * np.pi))
+
+def loop_area_vector(positions: List[np.ndarray], loop: List[int]) -> np.ndarray:
+    """Newell normal of a loop, as long as the area it encloses
+
+    Points the way triangles closing the loop face.
+    """
+    corners = np.asarray([positions[vertex] for vertex in loop])
+    return 0.5 * np.cross(corners, np.roll(corners, -1, axis=0)).sum(axis=0)
+
+def _patch_area(
+    positions: List[np.ndarray], triangles: List[Tuple[int, int, int]]
+) -> float:
+    corners = np.asarray([[positions[vertex] for vertex in face] for face in triangles])
+    cross = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    return 0.5 * float(np.linalg.norm(cross, axis=1).sum())
+
+def advancing_front(
+    positions: List[np.ndarray],
+    normal: np.ndarray,
+    loop: List[int],
+) -> List[Tuple[int, int, int]]:
+    """Triangles covering a hole, grown inwards from its loop
+
+    The corner with the smallest angle is closed first, with zero, one or
+    two new vertices depending on its angle, placed in the plane through
+    the corner with the given unit normal at the average length of its
+    two edges. New vertices are appended to positions. A front that stops
+    shrinking is fanned around its centroid.
+    """
+    previous = {vertex: loop[i - 1] for i, vertex in enumerate(loop)}
+    following = {vertex: loop[(i + 1) % len(loop)] for i, vertex in enumerate(loop)}
+    angles = {
+        vertex: _corner_angle(
+            positions, normal, previous[vertex], vertex, following[vertex]
+        )
+        for vertex in loop
+    }
+    triangles: List[Tuple[int, int, int]] = []
+    steps = 4 * len(loop) + 16
+
+    while len(angles) > 3 and steps:
+        steps -= 1
+        vertex = min(angles, key=lambda corner: angles[corner])
+        angle = angles.pop(vertex)
+        p, n = previous[vertex], following[vertex]
+        if angle < FRONT_CLOSE_ANGLE:
+            triangles.append((p, vertex, n))
+            following[p], previous[n] = n, p
+            changed = [p, n]
+        else:
+            a = positions[p] - positions[vertex]
+            b = positions[n] - positions[vertex]
+            length = 0.5 * (np.linalg.norm(a) + np.linalg.norm(b))
+            b = b - normal * np.dot(b, normal)
+            direction = b / max(np.linalg.norm(b), np.finfo(np.float64).tiny)
+            parts = 2 if angle < FRONT_SPLIT_ANGLE else 3
+            # Corner vertices from the next edge's side round to the previous edge's
+            added = []
+            for part in range(1, parts):
+                offset = length * _rotate(direction, normal, angle * part / parts)
+                positions.append(positions[vertex] + offset)
+                added.append(len(positions) - 1)
+            chain = [n] + added + [p]
+            for near, far in zip(chain[:-1], chain[1:]):
+                triangles.append((far, vertex, near))
+                following[far], previous[near] = near, far
+            changed = chain
+        for corner in changed:
+            angles[corner] = _corner_angle(
+                positions, normal, previous[corner], corner, following[corner]
+            )
+
+    front = [next(iter(angles))]
+    while len(front) < len(angles):
+        front.append(following[front[-1]])
+    if len(front) == 3:
+        triangles.append((front[0], front[1], front[2]))
+    else:
+        triangles.extend(_fan(positions, front))
+    return triangles
+
+def _fan(positions: List[np.ndarray], loop: List[int]) -> List[Tuple[int, int, int]]:
+    """Triangles from each loop edge to a new vertex at the loop's centroid"""
+    center = len(positions)
+    positions.append(np.mean([positions[vertex] for vertex in loop], axis=0))
+    return [(loop[i], loop[(i + 1) % len(loop)], center) for i in range(len(loop))]
+
+def fill_hole(
+    positions: List[np.ndarray], loop: List[int]
+) -> List[Tuple[int, int, int]]:
+    """Triangles closing one hole, wound like the faces around it
+
+    Small holes are fanned around their centroid. Larger ones are filled
+    by an advancing front in the plane of the loop's Newell normal, and
+    fanned instead when the loop encloses no area or the front's patch
+    comes out much larger than the hole.
+    """
+    if len(loop) == 3:
+        return [(loop[0], loop[1], loop[2])]
+    area_vector = loop_area_vector(positions, loop)
+    area = float(np.linalg.norm(area_vector))
+    if len(loop) <= FAN_HOLE_EDGES or area <= np.finfo(np.float64).tiny:
+        return _fan(positions, loop)
+    count = len(positions)
+    triangles = advancing_front(positions, area_vector / area, loop)
+    if _patch_area(positions, triangles) <= MAX_FILL_AREA_RATIO * area:
+        return triangles
+    del positions[count:]
+    return _fan(positions, loop)
+
+def fill_holes(
+    vertices: np.ndarray, faces: np.ndarray, max_edges: int
+) -> Tuple[np.ndarray, np.ndarray, Dict[str, int]]:
+    """Close every hole with at most max_edges edges"""
+    loops, broken = boundary_loops(faces, len(vertices))
+    fillable = [loop for loop in loops if len(loop) <= max_edges]
+    counts = {
+        "filled_holes": len(fillable),
+        "open_holes": len(loops) - len(fillable) + broken,
+        "added_faces": 0,
+    }
+    if not fillable:
+        return vertices, faces, counts
+
+    positions = list(vertices)
+    triangles: List[Tuple[int, int, int]] = []
+    for loop in fillable:
+        triangles.extend(fill_hole(positions, loop))
+    counts["added_faces"] = len(triangles)
+    added = np.asarray(triangles, dtype=np.int64)
+    faces = np.concatenate([faces, added])
+    return np.asarray(positions, dtype=np.float64), faces, counts
+
+class GridField:
+    """Signed distances held in memory on a regular lattice, for extract_surface"""
+
+    def __init__(self, values: np.ndarray, voxel_size: float, origin: np.ndarray):
+        self.values = values
+        self.shape = tuple(int(size) for size in values.shape)
+        self.voxel_size = float(voxel_size)
+        self.origin = np.asarray(origin, dtype=np.float64)
+
+    def block(self, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+        return self.values[low[0]:high[0], low[1]:high[1], low[2]:high[2]]
+
+    def sample(self, indices: np.ndarray) -> np.ndarray:
+        axes = tuple(np.asarray(indices, dtype=np.int64).T)
+        return self.values[axes].astype(np.float64)
+
+def _surface_samples(vertices: np.ndarray, faces: np.ndarray, spacing: float):
+    """Batches of points covering every face, at most spacing apart along its edges"""
+    corners = vertices[faces]
+    edges = corners - np.roll(corners, 1, axis=1)
+    longest = np.linalg.norm(edges, axis=2).max(axis=1)
+    steps = np.maximum(1, np.ceil(longest / spacing)).astype(np.int64)
+    for step in np.unique(steps):
+        i, j = np.meshgrid(np.arange(step + 1), np.arange(step + 1), indexing="ij")
+        inside = i + j <= step
+        i, j = i[inside], j[inside]
+        weights = np.stack([i, j, step - i - j], axis=1) / step
+        group = corners[steps == step]
+        batch = max(1, SAMPLE_BATCH_POINTS // len(weights))
+        for begin in range(0, len(group), batch):
+            points = np.einsum("pk,fkd->fpd", weights, group[begin:begin + batch])
+            yield points.reshape(-1, 3)
+
+def _cap_holes(vertices: np.ndarray, faces: np.ndarray):
+    """Faces closing every hole, fanned from each rim's centroid
+
+    Rims are the connected groups of one-face edges; they need not form
+    closed or consistently wound loops. Returns the vertices with the
+    centroids appended and the faces with the fans appended.
+    """
+    topology = edge_topology(faces, len(vertices))
+    rim = topology.edges[topology.face_counts == 1]
+    if not len(rim):
+        return vertices, faces
+    labels, _ = union_find(len(vertices), rim[:, 0], rim[:, 1])
+    _, hole = np.unique(labels[rim[:, 0]], return_inverse=True)
+    centers = np.zeros((hole.max() + 1, 3))
+    np.add.at(centers, hole, vertices[rim[:, 0]] + vertices[rim[:, 1]])
+    centers /= 2.0 * np.bincount(hole)[:, None]
+    fans = np.column_stack([rim, len(vertices) + hole])
+    return np.vstack([vertices, centers]), np.vstack([faces, fans])
+
+def rewrap_mesh(mesh: Mesh, resolution: int) -> Mesh:
+    """Watertight outer surface of a mesh, rebuilt on a voxel lattice
+
+    Holes are first capped by fans around their rims, so the lattice is
+    closed there too. Lattice points near the surface form a shell; points
+    the outside can reach through the shell's gaps are outside and all
+    others inside, so cavities are filled. The surface is extracted from
+    distances signed that way, which places it up to about a voxel outside
+    the original.
+    """
+    vertices, faces = _cap_holes(
+        np.asarray(mesh.vertices, dtype=np.float64),
+        np.asarray(mesh.faces, dtype=np.int64),
+    )
+    low, high = vertices.min(axis=0), vertices.max(axis=0)
+    voxel = max(
+        float((high - low).max()) / (resolution - 1), float(np.finfo(np.float64).tiny)
+    )
+    # Two free layers around the mesh let the flood fill reach all the way round
+    origin = low - 2.0 * voxel
+    shape = np.ceil((high - low) / voxel).astype(np.int64) + 5
+    size = int(np.prod(shape))
+
+    # Lattice points within one voxel of some surface sample cover the shell
+    offsets = np.indices((3, 3, 3)).reshape(3, -1).T - 1
+    strides = np.array([shape[1] * shape[2], shape[2], 1], dtype=np.int64)
+    near = np.zeros(size, dtype=bool)
+    for samples in _surface_samples(vertices, faces, 0.5 * voxel):
+        cells = np.rint((samples - origin) / voxel).astype(np.int64)
+        for offset in offsets:
+            near[np.clip(cells + offset, 0, shape - 1) @ strides] = True
+    candidates = np.flatnonzero(near)
+    lattice = np.stack(np.unravel_index(candidates, tuple(shape)), axis=1)
+    points = origin + lattice * voxel
+    shell = REWRAP_SHELL * voxel
+    grid = SpatialHashGrid(vertices, faces, voxel)
+    closest, found = grid.closest_points(points, shell)
+    # Points further out only need to be known as free
+    distance = np.full(size, voxel)
+    distance[candidates[found]] = np.linalg.norm(closest[found] - points[found], axis=1)
+    free = distance > shell
+
+    # Free points connected to the lattice border are outside
+    index = np.arange(size).reshape(tuple(shape))
+    free_grid = free.reshape(tuple(shape))
+    a, b = [], []
+    for axis in range(3):
+        lower = tuple(slice(0, -1) if k == axis else slice(None) for k in range(3))
+        upper = tuple(slice(1, None) if k == axis else slice(None) for k in range(3))
+        linked = free_grid[lower] & free_grid[upper]
+        a.append(index[lower][linked])
+        b.append(index[upper][linked])
+    labels, _ = union_find(size, np.concatenate(a), np.concatenate(b))
+    # The first lattice point is a free border point: the mesh starts two voxels in
+    outside = labels == labels[0]
+
+    values = np.where(outside, distance, -distance).astype(np.float32)
+    values = values.reshape(tuple(shape))
+    rewrapped, _ = extract_surface(GridField(values, voxel, origin), block_size=32)
+    return rewrapped
+
+def repair_mesh(
+    mesh: Mesh,
+    options: Optional[Dict[str, Any]] = None,
+) -> Tuple[Mesh, Dict[str, Any]]:
+    """Fix what validation reports, in the order one fix enables the next
+
+    Duplicate vertices are welded, degenerate and duplicate faces dropped,
+    non-manifold edges trimmed to two faces, non-manifold vertices split,
+    windings made consistent, small components removed and holes filled.
+    If the mesh is still not watertight and consistently wound and
+    options["rewrap"] is set, it is rebuilt on a voxel lattice as a last
+    resort. UVs and normals are not carried over.
+    """
+    values = repair_options(options)
+    started = time.perf_counter()
+    vertices = np.asarray(mesh.vertices, dtype=np.float64)
+    faces = np.asarray(mesh.faces, dtype=np.int64)
+    if len(faces) and (faces.min() < 0 or faces.max() >= len(vertices)):
+        raise ValueError("Mesh has face indices outside the vertex array")
+    operations: Dict[str, Any] = {}
+
+    faces, operations["merged_vertices"] = merge_duplicate_vertices(vertices, faces)
+    faces, degenerate, duplicate = remove_bad_faces(vertices, faces)
+    operations["removed_degenerate_faces"] = degenerate
+    operations["removed_duplicate_faces"] = duplicate
+    faces, trimmed = trim_non_manifold_edges(faces, len(vertices))
+    operations["removed_non_manifold_faces"] = trimmed
+    vertices, faces, split = split_non_manifold_vertices(vertices, faces)
+
+    analysis = analyze_mesh(Mesh(vertices, faces))
+    flipped = analysis.flipped_faces
+    faces[flipped] = faces[flipped][:, ::-1]
+    operations["flipped_faces"] = len(flipped)
+    faces, components, component_faces = remove_small_components(
+        faces,
+        analysis.component_labels,
+        analysis.component_sizes,
+        values["min_component_ratio"],
+    )
+    operations["removed_components"] = components
+    operations["removed_component_faces"] = component_faces
+
+    vertices, faces, holes = fill_holes(vertices, faces, values["max_hole_edges"])
+    operations.update(holes)
+    faces, rejoined = rejoin_vertices(vertices, faces)
+    operations["split_vertices"] = split - rejoined
+    repaired = compact_mesh(Mesh(vertices, faces))
+
+    operations["rewrapped"] = False
+    if values["rewrap"] and len(repaired.faces):
+        analysis = analyze_mesh(repaired)
+        if not analysis.is_watertight or not analysis.is_winding_consistent:
+            repaired = rewrap_mesh(repaired, values["rewrap_resolution"])
+            operations["rewrapped"] = True
+
+    same_faces = np.array_equal(repaired.faces, mesh.faces)
+    changed = not same_faces or not np.array_equal(repaired.vertices, mesh.vertices)
+    return repaired, {
+        "changed": changed,
+        "operations": operations,
+        "seconds": time.perf_counter() - started,
+    }
+
+def repair_diff(
+    before: Dict[str, Any],
+    after: Dict[str, Any],
+) -> Dict[str, Dict[str, Any]]:
+    """Counts that changed between two validation reports
+
+    Returned as {name: {"before": ..., "after": ...}}.
+    """
+    counts: Dict[str, Dict[str, Any]] = {}
+    for report in (before, after):
+        for issue in report["issues"]:
+            counts.setdefault(issue["type"], {"before": 0, "after": 0})
+    for name, report in (("before", before), ("after", after)):
+        for issue in report["issues"]:
+            counts[issue["type"]][name] = issue["count"]
+    for key in (
+        "is_watertight",
+        "is_manifold",
+        "is_winding_consistent",
+        "triangle_count",
+        "vertex_count",
+        "component_count",
+    ):
+        counts[key] = {"before": before[key], "after": after[key]}
+    return {
+        name: change
+        for name, change in counts.items()
+        if change["before"] != change["after"]
+    }
@@ -0,0 +1,533 @@
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
+from app.services.geometry.bvh import Bvh, BvhCache, bvh_cache
+from app.services.geometry.cache import ResultCache, result_cache, result_key
+from app.services.geometry.compression import (
+    compression_report,
+    compression_settings,
+    compression_targets,
+)
+from app.services.geometry.decimation import decimate_mesh, decimation_target
+from app.services.geometry.gltf import lod_chain_glb, mesh_glb
+from app.services.geometry.gltf_reader import load_glb
+from app.services.geometry.lod import build_lod_chain, lod_ratios, reorder_lod_chain
+from app.services.geometry.mesh import (
+    Mesh,
+    export_mesh,
+    load_mesh,
+    mesh_content_hash,
+    mesh_file_type,
+)
+from app.services.geometry.points import (
+    load_points,
+    point_cloud_options,
+    reconstruct_surface,
+)
+from app.services.geometry.reconstruction import (
+    VolumeField,
+    extract_surface,
+    reconstruction_options,
+    reconstruction_pool,
+)
+from app.services.geometry.remesh import quality_report, remesh
+from app.services.geometry.repair import repair_diff, repair_mesh, repair_options
+from app.services.geometry.reorder import optimize_vertex_order
+from app.services.geometry.tangents import tangent_space, weld_options
+from app.services.geometry.uv import chart_cache, chart_pool, unwrap_mesh, uv_layout_png
+from app.services.geometry.validation import validate_mesh
+from app.services.storage import AssetStorage, storage, tile_directory
+import asyncio
+import logging
+import tempfile
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+class GeometryService:
+    """Mesh operations behind the geometry endpoints
+
+    Array work runs in the default executor so large meshes do not block the
+    event loop. Results are memoized by mesh content and options, so
+    repeating an operation on an unchanged mesh returns the earlier result.
+    """
+
+    def __init__(
+        self,
+        asset_storage: Optional[AssetStorage] = None,
+        cache: Optional[ResultCache] = None,
+        bvhs: Optional[BvhCache] = None,
+    ):
+        self.storage = asset_storage or storage
+        self.cache = cache or result_cache
+        self.bvhs = bvhs or bvh_cache
+
+    async def load_mesh(self, mesh_url: str, attributes: Sequence[str] = ()) -> Mesh:
+        """Load a mesh with the optional attributes a stage needs
+
+        Attributes are any of "uvs", "normals" and "tangents".
+
+        GLB files are memory-mapped and only the requested accessors are
+        decoded; other formats go through trimesh.
+        """
+        file_type = mesh_file_type(mesh_url)
+        loop = asyncio.get_running_loop()
+        if file_type == "glb":
+            async with self.storage.local_file(mesh_url) as path:
+                return await loop.run_in_executor(None, load_glb, path, attributes)
+        data = await self.storage.fetch(mesh_url)
+        return await loop.run_in_executor(None, load_mesh, data, file_type)
+
+    async def mesh_bvh(self, mesh: Mesh) -> Bvh:
+        """BVH for ray queries against a mesh, built once and shared by later stages"""
+        loop = asyncio.get_running_loop()
+        bvh, _ = await loop.run_in_executor(None, self.bvhs.get_or_build, mesh)
+        return bvh
+
+    async def memoized(
+        self,
+        operation: str,
+        mesh: Mesh,
+        options: Optional[Dict[str, Any]],
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """Result of compute(), or of an earlier run on the same content and options
+
+        Whether the result was reused is reported as stats["cached"], or as
+        "cached" for results without stats.
+        """
+        loop = asyncio.get_running_loop()
+        content_hash = await loop.run_in_executor(None, mesh_content_hash, mesh)
+        key = result_key(content_hash, operation, options)
+        result, cached = await self.cache.get_or_compute(key, compute)
+        if cached:
+            logger.info(f"Reused {operation} result for mesh {content_hash[:12]}")
+        stats = result["stats"] if isinstance(result.get("stats"), dict) else result
+        stats["cached"] = cached
+        return result
+
+    async def validate_mesh(
+        self,
+        mesh_url: str,
+        repair: bool = False,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Check a mesh for holes, non-manifold edges, bad faces and winding
+
+        With repair, the mesh is also run through the repair pipeline and
+        report["repair"] holds the repaired mesh, the counts that changed and
+        the repaired mesh's own report.
+        """
+        values = repair_options(options) if repair else None
+        mesh = await self.load_mesh(mesh_url)
+        report = await self.memoized(
+            "validate", mesh, None, lambda: self._validate(mesh_url, mesh)
+        )
+        if repair:
+            report["repair"] = await self.memoized(
+                "repair",
+                mesh,
+                values,
+                lambda: self._repair(mesh_url, mesh, report, values),
+            )
+        return report
+
+    async def _validate(self, mesh_url: str, mesh: Mesh) -> Dict[str, Any]:
+        started = time.perf_counter()
+        report = await asyncio.get_running_loop().run_in_executor(
+            None, validate_mesh, mesh
+        )
+        logger.info(
+            f"Validated {mesh_url}: {mesh.triangle_count} triangles in "
+            f"{time.perf_counter() - started:.2f}s, {len(report['issues'])} issues"
+        )
+        return report
+
+    async def _repair(
+        self,
+        mesh_url: str,
+        mesh: Mesh,
+        report: Dict[str, Any],
+        options: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        repaired, stats = await loop.run_in_executor(None, repair_mesh, mesh, options)
+        after = await loop.run_in_executor(None, validate_mesh, repaired)
+        # A mesh the pipeline left alone is not stored again
+        if not stats["changed"]:
+            repaired_url = mesh_url
+        else:
+            data = await loop.run_in_executor(None, mesh_glb, repaired)
+            repaired_url = await self.save_glb(data, "repaired")
+        logger.info(
+            f"Repaired {mesh_url}: "
+            f"{len(report['issues'])} -> {len(after['issues'])} issues, "
+            f"{stats['operations']['filled_holes']} holes filled "
+            f"in {stats['seconds']:.2f}s"
+        )
+        return {
+            "mesh_url": repaired_url,
+            "diff": repair_diff(report, after),
+            "report": after,
+            "stats": stats,
+        }
+
+    async def save_mesh(self, mesh: Mesh, folder: str) -> str:
+        data = await asyncio.get_running_loop().run_in_executor(
+            None, export_mesh, mesh, "glb"
+        )
+        return await self.save_glb(data, folder)
+
+    async def save_glb(self, data: bytes, folder: str) -> str:
+        return await self.storage.store(
+            f"meshes/{folder}/{uuid.uuid4()}.glb", data, "model/gltf-binary"
+        )
+
+    async def optimize_mesh(
+        self,
+        mesh_url: str,
+        target: str,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Decimate a mesh to the triangle budget of a target platform
+
+        With options["lods"] (ratios of that budget), the result is a GLB LOD
+        chain cut from a single decimation run. Triangles and vertices are then
+        reordered for the GPU vertex cache, overdraw and fetch locality unless
+        options["reorder"] is false. options["compression"] ("quantize" or
+        "meshopt") writes quantized, optionally meshopt-compressed buffers.
+        """
+        options = options or {}
+        mesh = await self.load_mesh(mesh_url, ("uvs",))
+        return await self.memoized(
+            "optimize",
+            mesh,
+            {**options, "target": target},
+            lambda: self._optimize(mesh_url, mesh, target, options),
+        )
+
+    async def _optimize(
+        self,
+        mesh_url: str,
+        mesh: Mesh,
+        target: str,
+        options: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        target_triangles, max_error = decimation_target(
+            target, mesh.triangle_count, options
+        )
+        compression = compression_settings(target, options)
+        ratios = (
+            lod_ratios(options["lods"]) if options.get("lods") is not None else None
+        )
+        reorder = bool(options.get("reorder", True))
+        loop = asyncio.get_running_loop()
+        vertex_cache: Optional[Dict[str, Any]] = None
+
+        started = time.perf_counter()
+        if ratios is None:
+            result = await loop.run_in_executor(
+                None, decimate_mesh, mesh, target_triangles, max_error
+            )
+            seconds = time.perf_counter() - started
+            optimized = result.mesh
+            if reorder:
+                reorder_started = time.perf_counter()
+                optimized, cache = await loop.run_in_executor(
+                    None, optimize_vertex_order, optimized
+                )
+                cache["seconds"] = time.perf_counter() - reorder_started
+                vertex_cache = cache
+            if compression is None:
+                optimized_url = await self.save_mesh(optimized, "optimized")
+            else:
+                data = await loop.run_in_executor(
+                    None, mesh_glb, optimized, compression
+                )
+                optimized_url = await self.save_glb(data, "optimized")
+            triangles, vertices = optimized.triangle_count, optimized.vertex_count
+            collapses, error = result.collapses, result.error
+        else:
+            chain = await loop.run_in_executor(
+                None, build_lod_chain, mesh, target_triangles, ratios, max_error
+            )
+            seconds = time.perf_counter() - started
+            if reorder:
+                reorder_started = time.perf_counter()
+                chain, cache = await loop.run_in_executor(
+                    None, reorder_lod_chain, chain
+                )
+                cache["seconds"] = time.perf_counter() - reorder_started
+                vertex_cache = cache
+            data = await loop.run_in_executor(None, lod_chain_glb, chain, compression)
+            optimized_url = await self.save_glb(data, "optimized")
+            optimized = chain.vertices
+            lod0 = chain.levels[0]
+            triangles, vertices = lod0.triangle_count, lod0.vertex_count
+            collapses, error = lod0.collapses, lod0.error
+
+        stats: Dict[str, Any] = {
+            "original_triangles": mesh.triangle_count,
+            "optimized_triangles": triangles,
+            "original_vertices": mesh.vertex_count,
+            "optimized_vertices": vertices,
+            "target_triangles": target_triangles,
+            "reduction_ratio": (
+                1.0 - triangles / mesh.triangle_count if mesh.triangle_count else 0.0
+            ),
+            "collapses": collapses,
+            "max_error": error,
+            "seconds": seconds,
+            "triangles_per_second": (
+                mesh.triangle_count / seconds if seconds > 0 else 0.0
+            ),
+        }
+        if vertex_cache is not None:
+            stats["vertex_cache"] = vertex_cache
+        if compression is not None:
+            report = await loop.run_in_executor(
+                None, compression_report, optimized, compression
+            )
+            report["file_bytes"] = len(data)
+            report["targets"] = await loop.run_in_executor(
+                None, compression_targets, optimized, compression.mode
+            )
+            stats["compression"] = report
+        if ratios is not None:
+            stats["lods"] = [
+                {
+                    "ratio": level.ratio,
+                    "triangles": level.triangle_count,
+                    "vertices": level.vertex_count,
+                    "error": level.error,
+                }
+                for level in chain.levels
+            ]
+        logger.info(
+            f"Optimized {mesh_url} for {target}: {stats['original_triangles']} -> "
+            f"{stats['optimized_triangles']} triangles in {seconds:.2f}s"
+        )
+        return {"optimized_mesh_url": optimized_url, "stats": stats}
+
+    async def remesh_mesh(self, mesh_url: str, target_triangles: int) -> Dict[str, Any]:
+        """Isotropically remesh a mesh to about target_triangles triangles"""
+        mesh = await self.load_mesh(mesh_url)
+        return await self.memoized(
+            "remesh",
+            mesh,
+            {"target_triangles": target_triangles},
+            lambda: self._remesh(mesh_url, mesh, target_triangles),
+        )
+
+    async def _remesh(
+        self,
+        mesh_url: str,
+        mesh: Mesh,
+        target_triangles: int,
+    ) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        result = await loop.run_in_executor(None, remesh, mesh, target_triangles)
+        seconds = time.perf_counter() - started
+        quality = await loop.run_in_executor(None, quality_report, result.mesh)
+        remeshed_url = await self.save_mesh(result.mesh, "remeshed")
+        logger.info(
+            f"Remeshed {mesh_url}: {mesh.triangle_count} -> "
+            f"{result.mesh.triangle_count} triangles in {seconds:.2f}s, "
+            f"quality {quality['quality_score']:.3f}"
+        )
+        return {
+            "remeshed_mesh_url": remeshed_url,
+            "actual_triangles": result.mesh.triangle_count,
+            "quality_score": quality.pop("quality_score"),
+            "quality": quality,
+            "stats": {
+                "original_triangles": mesh.triangle_count,
+                "target_triangles": target_triangles,
+                "vertices": result.mesh.vertex_count,
+                "edge_length": result.edge_length,
+                "iterations": result.iterations,
+                "seconds": seconds,
+            },
+        }
+
+    async def uv_unwrap_mesh(
+        self,
+        mesh_url: str,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Chart a mesh's components in parallel and pack them into one UV atlas
+
+        Charts are cached by mesh content, so unwrapping the same mesh with
+        different packing options only packs again.
+        """
+        mesh = await self.load_mesh(mesh_url)
+        return await self.memoized(
+            "uv-unwrap", mesh, options, lambda: self._uv_unwrap(mesh_url, mesh, options)
+        )
+
+    async def _uv_unwrap(
+        self,
+        mesh_url: str,
+        mesh: Mesh,
+        options: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        atlas, cached = await loop.run_in_executor(
+            None, unwrap_mesh, mesh, options, chart_pool(), chart_cache
+        )
+        seconds = time.perf_counter() - started
+        with tempfile.TemporaryDirectory(dir=tile_directory()) as directory:
+            layout = Path(directory) / "layout.png"
+            size = atlas.resolution
+            await loop.run_in_executor(None, uv_layout_png, atlas.mesh, size, layout)
+            key = f"uv_maps/{uuid.uuid4()}.png"
+            uv_map_url = await self.storage.store_file(key, layout, "image/png")
+        unwrapped_url = await self.save_mesh(atlas.mesh, "unwrapped")
+        logger.info(
+            f"Unwrapped {mesh_url}: {atlas.chart_count} charts in {seconds:.2f}s"
+            f"{' from cached charts' if cached else ''}, "
+            f"utilization {atlas.utilization:.2f}"
+        )
+        return {
+            "unwrapped_mesh_url": unwrapped_url,
+            "uv_map_url": uv_map_url,
+            "stats": {
+                "charts": atlas.chart_count,
+                "resolution": atlas.resolution,
+                "utilization": atlas.utilization,
+                "vertices": atlas.mesh.vertex_count,
+                "triangles": atlas.mesh.triangle_count,
+                "cached_charts": cached,
+                "seconds": seconds,
+            },
+        }
+
+    async def tangent_mesh(
+        self,
+        mesh_url: str,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Weld duplicated vertices and add MikkTSpace-style tangents for normal maps
+
+        Vertices stay split where UVs or normals are discontinuous. Missing
+        normals are generated from the welded surface.
+        """
+        tolerance, uv_tolerance, normal_degrees = weld_options(options)
+        mesh = await self.load_mesh(mesh_url, ("uvs", "normals"))
+        if mesh.uvs is None:
+            raise ValueError("Mesh has no UVs; unwrap it before generating tangents")
+        weld = {
+            "tolerance": tolerance,
+            "uv_tolerance": uv_tolerance,
+            "normal_degrees": normal_degrees,
+        }
+        return await self.memoized(
+            "tangents",
+            mesh,
+            weld,
+            lambda: self._tangents(
+                mesh_url, mesh, tolerance, uv_tolerance, normal_degrees
+            ),
+        )
+
+    async def _tangents(
+        self,
+        mesh_url: str,
+        mesh: Mesh,
+        tolerance: float,
+        uv_tolerance: float,
+        normal_degrees: float,
+    ) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        result, _, weld = await loop.run_in_executor(
+            None, tangent_space, mesh, tolerance, uv_tolerance, normal_degrees
+        )
+        seconds = time.perf_counter() - started
+        mirrored = (
+            int((result.tangents[:, 3] < 0).sum()) if result.tangents is not None else 0
+        )
+        data = await loop.run_in_executor(None, mesh_glb, result)
+        tangent_url = await self.save_glb(data, "tangents")
+        logger.info(
+            f"Generated tangents for {mesh_url}: "
+            f"{weld['vertices_before']} -> {weld['vertices_after']} vertices "
+            f"in {seconds:.2f}s"
+        )
+        return {
+            "mesh_url": tangent_url,
+            "stats": {
+                **weld,
+                "triangles": result.triangle_count,
+                "mirrored_vertices": mirrored,
+                "seconds": seconds,
+            },
+        }
+
+    async def reconstruct_mesh(
+        self,
+        field_url: str,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Extract a watertight mesh from a signed distance volume stored as .npy
+
+        Only blocks near the surface are read from the volume and meshed, in
+        parallel on the reconstruction pool.
+        """
+        values = reconstruction_options(options)
+        if not field_url.split("?", 1)[0].lower().endswith(".npy"):
+            raise ValueError("Field must be a .npy volume of signed distances")
+        loop = asyncio.get_running_loop()
+        async with self.storage.local_file(field_url) as path:
+            field = await loop.run_in_executor(
+                None, VolumeField, path, values["voxel_size"], values["origin"]
+            )
+            mesh, stats = await loop.run_in_executor(
+                None,
+                extract_surface,
+                field,
+                values["iso_level"],
+                values["block_size"],
+                values["lipschitz"],
+                reconstruction_pool(),
+            )
+        data = await loop.run_in_executor(None, mesh_glb, mesh)
+        mesh_url = await self.save_glb(data, "reconstructed")
+        logger.info(
+            f"Reconstructed {field_url}: {stats['triangles']} triangles from "
+            f"{stats['occupied_blocks']}/{stats['blocks']} blocks "
+            f"in {stats['seconds']:.2f}s"
+        )
+        stats = {"resolution": list(field.shape), **stats}
+        return {"mesh_url": mesh_url, "stats": stats}
+
+    async def reconstruct_points(
+        self,
+        points_url: str,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Mesh a point cloud stored as .ply or .npy
+
+        A .npy cloud holds (N, 3) points, or (N, 6) points and normals.
+
+        Normals are estimated and oriented when the cloud has none.
+        """
+        point_cloud_options(options)
+        file_type = points_url.split("?", 1)[0].rsplit(".", 1)[-1].lower()
+        if file_type not in ("npy", "ply"):
+            raise ValueError("Point cloud must be a .npy array or a .ply file")
+        data = await self.storage.fetch(points_url)
+        loop = asyncio.get_running_loop()
+        points, normals = await loop.run_in_executor(None, load_points, data, file_type)
+        mesh, stats = await loop.run_in_executor(
+            None, reconstruct_surface, points, normals, options, reconstruction_pool()
+        )
+        data = await loop.run_in_executor(None, mesh_glb, mesh)
+        mesh_url = await self.save_glb(data, "reconstructed")
+        logger.info(
+            f"Reconstructed {points_url}: {stats['triangles']} triangles "
+            f"from {stats['points']} points in {stats['seconds']:.2f}s"
+        )
+        return {"mesh_url": mesh_url, "stats": stats}
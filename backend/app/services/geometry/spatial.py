@@ -0,0 +1,177 @@
+from typing import Tuple
+import numpy as np
+
+# Bits per axis of a packed grid cell key
+CELL_BITS = 21
+
+# Point-triangle pairs evaluated per batch when projecting
+PROJECTION_BATCH_PAIRS = 2_000_000
+
+def _pack(cells: np.ndarray) -> np.ndarray:
+    return (cells[:, 0] << (2 * CELL_BITS)) | (cells[:, 1] << CELL_BITS) | cells[:, 2]
+
+def closest_points_on_triangles(
+    points: np.ndarray,
+    a: np.ndarray,
+    b: np.ndarray,
+    c: np.ndarray,
+) -> np.ndarray:
+    """Closest point on each triangle (a, b, c) to the matching point
+
+    Found by the Voronoi region of the triangle the point falls in.
+    """
+    ab, ac = b - a, c - a
+    ap, bp, cp = points - a, points - b, points - c
+    d1 = np.einsum("ij,ij->i", ab, ap)
+    d2 = np.einsum("ij,ij->i", ac, ap)
+    d3 = np.einsum("ij,ij->i", ab, bp)
+    d4 = np.einsum("ij,ij->i", ac, bp)
+    d5 = np.einsum("ij,ij->i", ab, cp)
+    d6 = np.einsum("ij,ij->i", ac, cp)
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        total = va + vb + vc
+        v = np.where(total != 0, vb / total, 0.0)
+        w = np.where(total != 0, vc / total, 0.0)
+        result = a + ab * v[:, None] + ac * w[:, None]
+
+        # Regions are assigned from lowest to highest precedence
+        on_bc = (va <= 0) & (d4 - d3 >= 0) & (d5 - d6 >= 0)
+        t = (d4 - d3) / ((d4 - d3) + (d5 - d6))
+        result = np.where(
+            on_bc[:, None], b + (c - b) * np.nan_to_num(t)[:, None], result
+        )
+        on_ac = (vb <= 0) & (d2 >= 0) & (d6 <= 0)
+        t = d2 / (d2 - d6)
+        result = np.where(on_ac[:, None], a + ac * np.nan_to_num(t)[:, None], result)
+        result = np.where(((d6 >= 0) & (d5 <= d6))[:, None], c, result)
+        on_ab = (vc <= 0) & (d1 >= 0) & (d3 <= 0)
+        t = d1 / (d1 - d3)
+        result = np.where(on_ab[:, None], a + ab * np.nan_to_num(t)[:, None], result)
+    result = np.where(((d3 >= 0) & (d4 <= d3))[:, None], b, result)
+    result = np.where(((d1 <= 0) & (d2 <= 0))[:, None], a, result)
+    return result
+
+class SpatialHashGrid:
+    """Uniform grid of triangle bounding boxes stored as one sorted array of cell keys
+
+    Every triangle is listed in each cell its bounding box touches, so a
+    query only has to look at the cells around a point.
+    """
+
+    def __init__(self, vertices: np.ndarray, faces: np.ndarray, cell_size: float):
+        self.vertices = vertices
+        self.faces = faces
+        corners = vertices[faces]
+        extent = (
+            float((vertices.max(axis=0) - vertices.min(axis=0)).max())
+            if len(vertices)
+            else 0.0
+        )
+        # Keep the grid within the packed key range
+        self.cell_size = max(
+            cell_size,
+            extent / ((1 << CELL_BITS) - 4),
+            float(np.finfo(np.float64).tiny),
+        )
+        self.origin = (
+            vertices.min(axis=0) - 2 * self.cell_size if len(vertices) else np.zeros(3)
+        )
+
+        low = self._cells(corners.min(axis=1))
+        spans = self._cells(corners.max(axis=1)) - low + 1
+        counts = spans.prod(axis=1)
+        triangle = np.repeat(np.arange(len(faces)), counts)
+        # Position of each entry inside its triangle's box of cells
+        starts = np.repeat(np.cumsum(counts) - counts, counts)
+        offset = np.arange(len(triangle)) - starts
+        span = spans[triangle]
+        cells = low[triangle] + np.stack(
+            [
+                offset // (span[:, 1] * span[:, 2]),
+                (offset // span[:, 2]) % span[:, 1],
+                offset % span[:, 2],
+            ],
+            axis=1,
+        )
+        keys = _pack(cells)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.triangles = triangle[order]
+        occupied = (
+            np.count_nonzero(self.keys[1:] != self.keys[:-1]) + 1 if len(keys) else 1
+        )
+        self.occupancy = len(keys) / occupied  # triangles per non-empty cell
+
+    def _cells(self, points: np.ndarray) -> np.ndarray:
+        cells = np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+        return np.clip(cells, 0, (1 << CELL_BITS) - 1)
+
+    def candidates(
+        self,
+        points: np.ndarray,
+        radius: float,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(point, triangle) pairs for the triangles listed in cells near each point
+
+        A cell is near a point if it overlaps the box of the given radius.
+        """
+        # Cells overlapping the box [point - radius, point + radius]
+        low = self._cells(points - radius)
+        high = self._cells(points + radius)
+        steps = np.arange(int(np.floor(2 * radius / self.cell_size)) + 2)
+        grid = np.meshgrid(steps, steps, steps, indexing="ij")
+        offsets = np.stack(grid, axis=-1).reshape(-1, 3)
+        cells = low[:, None, :] + offsets[None, :, :]
+        inside = (cells <= high[:, None, :]).all(axis=2).ravel()
+        keys = _pack(cells.reshape(-1, 3)[inside])
+        owner = np.repeat(np.arange(len(points)), len(offsets))[inside]
+        starts = np.searchsorted(self.keys, keys, side="left")
+        counts = np.searchsorted(self.keys, keys, side="right") - starts
+        point = np.repeat(owner, counts)
+        entry = (
+            np.arange(counts.sum())
+            - np.repeat(np.cumsum(counts) - counts, counts)
+            + np.repeat(starts, counts)
+        )
+        return point, self.triangles[entry]
+
+    def closest_points(
+        self,
+        points: np.ndarray,
+        radius: float,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Closest surface point within radius of each point, and whether one was found
+
+        Points with no triangle nearby are returned unchanged.
+        """
+        result = points.copy()
+        found = np.zeros(len(points), dtype=bool)
+        # Bound the number of pairs held in memory at once
+        per_point = (
+            self.occupancy * (int(np.floor(2 * radius / self.cell_size)) + 2) ** 3
+        )
+        batch = max(1, int(PROJECTION_BATCH_PAIRS // per_point))
+        for start in range(0, len(points), batch):
+            chunk = points[start:start + batch]
+            point, triangle = self.candidates(chunk, radius)
+            if not len(point):
+                continue
+            corners = self.faces[triangle]
+            closest = closest_points_on_triangles(
+                chunk[point],
+                self.vertices[corners[:, 0]],
+                self.vertices[corners[:, 1]],
+                self.vertices[corners[:, 2]],
+            )
+            delta = closest - chunk[point]
+            distance = np.einsum("ij,ij->i", delta, delta)
+            # Nearest candidate per point: sort by point, then distance
+            order = np.lexsort((distance, point))
+            first = order[np.r_[True, point[order][1:] != point[order][:-1]]]
+            result[start + point[first]] = closest[first]
+            found[start + point[first]] = True
+        return result, found
@@ -0,0 +1,325 @@
+from itertools import product
+from typing import Any, Dict, Optional, Tuple
+from app.services.geometry.mesh import Mesh, widen_mesh
+from app.services.geometry.spatial import CELL_BITS
+from app.services.geometry.validation import union_find
+import numpy as np
+
+# Position weld tolerance, relative to the bounding box diagonal
+WELD_TOLERANCE = 1e-5
+MIN_WELD_TOLERANCE = 1e-6
+MAX_WELD_TOLERANCE = 1e-2
+
+# Coincident vertices stay split where UVs differ by more than this or normals by
+# more than this angle
+WELD_UV_TOLERANCE = 1e-5
+WELD_NORMAL_DEGREES = 2.0
+
+# Each vertex is compared with at most this many others at its position
+MAX_WELD_CANDIDATES = 16
+
+# A cell and its neighbours towards one corner, as steps along each axis
+CORNER_OFFSETS = [np.array(offset) for offset in product((0, 1), repeat=3)]
+
+def _sum_by(index: np.ndarray, values: np.ndarray, count: int) -> np.ndarray:
+    # Scatter-add of rows, one bincount per column
+    return np.stack([
+        np.bincount(index, weights=values[:, axis], minlength=count)
+        for axis in range(values.shape[1])
+    ], axis=1)
+
+def _dot(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.einsum("ij,ij->i", a, b)
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    lengths = np.maximum(np.sqrt(_dot(vectors, vectors)), np.finfo(np.float64).tiny)
+    return vectors / lengths[:, None]
+
+def weld_options(
+    options: Optional[Dict[str, Any]] = None,
+) -> Tuple[float, float, float]:
+    """Validated (tolerance, uv_tolerance, normal_degrees) from request options"""
+    options = options or {}
+    tolerance = float(options.get("tolerance", WELD_TOLERANCE))
+    uv_tolerance = float(options.get("uv_tolerance", WELD_UV_TOLERANCE))
+    normal_degrees = float(options.get("normal_degrees", WELD_NORMAL_DEGREES))
+    if not MIN_WELD_TOLERANCE <= tolerance <= MAX_WELD_TOLERANCE:
+        raise ValueError(
+            f"tolerance must be between {MIN_WELD_TOLERANCE} and "
+            f"{MAX_WELD_TOLERANCE}"
+        )
+    if uv_tolerance < 0:
+        raise ValueError("uv_tolerance must not be negative")
+    if not 0 <= normal_degrees <= 180:
+        raise ValueError("normal_degrees must be between 0 and 180")
+    return tolerance, uv_tolerance, normal_degrees
+
+def _cell_keys(cells: np.ndarray) -> np.ndarray:
+    return (cells[:, 0] << (2 * CELL_BITS)) | (cells[:, 1] << CELL_BITS) | cells[:, 2]
+
+def position_clusters(vertices: np.ndarray, tolerance: float) -> np.ndarray:
+    """Cluster label of every vertex; vertices within tolerance share a cluster
+
+    Distinct positions are hashed on a grid of cells twice the tolerance
+    wide, so a position within the tolerance of another lies in the same
+    cell or in one of the seven around the other's nearest cell corner.
+    Positions in those cells are compared by actual distance and pairs
+    within the tolerance are joined; clusters are the connected components.
+    """
+    count = len(vertices)
+    if not count:
+        return np.zeros(0, dtype=np.int64)
+    # Merge exact copies first so a pile of them is not compared pairwise;
+    # copies kept apart by a hash collision still join by distance below
+    bits = np.ascontiguousarray(vertices, dtype=np.float64).view(np.int64)
+    copies = np.argsort((bits * np.array([1, 3, 5])).sum(axis=1))
+    ordered_vertices = vertices[copies]
+    repeated = (ordered_vertices[1:] == ordered_vertices[:-1]).all(axis=1)
+    index = np.empty(count, dtype=np.int64)
+    index[copies] = np.cumsum(np.r_[False, ~repeated])
+    positions = ordered_vertices[np.r_[True, ~repeated]]
+
+    scaled = (positions - positions.min(axis=0)) / (2.0 * tolerance)
+    # One empty cell of margin keeps neighbour keys non-negative
+    cells = np.floor(scaled).astype(np.int64) + 1
+    keys = _cell_keys(cells)
+    # Work in key order: cells become runs and lookups arrive nearly sorted
+    order = np.argsort(keys)
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    index, scaled, cells, keys = rank[index], scaled[order], cells[order], keys[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    occupied = keys[starts]
+    sizes = np.diff(np.r_[starts, len(keys)])
+    side = np.where(scaled - (cells - 1) >= 0.5, 1, -1)
+
+    a, b = [], []
+    for corner in CORNER_OFFSETS:
+        wanted = _cell_keys(cells + side * corner)
+        slot = np.minimum(np.searchsorted(occupied, wanted), len(occupied) - 1)
+        counts = np.where(occupied[slot] == wanted, sizes[slot], 0)
+        first = np.repeat(np.arange(len(positions)), counts)
+        second = (
+            np.arange(counts.sum())
+            - np.repeat(np.cumsum(counts) - counts, counts)
+            + np.repeat(starts[slot], counts)
+        )
+        # Pairs are met from both ends; keep one
+        keep = first < second
+        first, second = first[keep], second[keep]
+        delta = scaled[first] - scaled[second]
+        near = np.einsum("ij,ij->i", delta, delta) <= 0.25
+        a.append(first[near])
+        b.append(second[near])
+    labels, _ = union_find(len(positions), np.concatenate(a), np.concatenate(b))
+    return labels[index]
+
+def _first_occurrence_ids(labels: np.ndarray, count: int) -> Tuple[np.ndarray, int]:
+    """Dense ids for labels in [0, count), numbered in order of first occurrence"""
+    first = np.full(count, len(labels), dtype=np.int64)
+    first[labels[::-1]] = np.arange(len(labels) - 1, -1, -1)
+    used = np.flatnonzero(first < len(labels))
+    ids = np.empty(count, dtype=np.int64)
+    ids[used[np.argsort(first[used])]] = np.arange(len(used))
+    return ids[labels], len(used)
+
+def weld_vertices(
+    mesh: Mesh,
+    tolerance: float = WELD_TOLERANCE,
+    uv_tolerance: float = WELD_UV_TOLERANCE,
+    normal_degrees: float = WELD_NORMAL_DEGREES,
+) -> Tuple[Mesh, Dict[str, Any]]:
+    """Merge coincident vertices, keeping them split across UV and normal seams
+
+    Vertices are clustered by position (tolerance relative to the bounding
+    box diagonal). Within a cluster, vertices join when their UVs and
+    normals agree; every joined group becomes one vertex at the mean of its
+    cluster, so the copies left on either side of a seam share a position
+    exactly. Faces that collapse are dropped.
+    """
+    mesh = widen_mesh(mesh)
+    count = mesh.vertex_count
+    if not count:
+        return mesh, {
+            "vertices_before": 0,
+            "vertices_after": 0,
+            "seam_vertices": 0,
+            "degenerate_faces": 0,
+        }
+    if tolerance < MIN_WELD_TOLERANCE:
+        # Grid cells must fit the packed keys
+        raise ValueError(f"tolerance must be at least {MIN_WELD_TOLERANCE}")
+    extent = mesh.vertices.max(axis=0) - mesh.vertices.min(axis=0)
+    tiny = float(np.finfo(np.float64).tiny)
+    cell = max(tolerance * float(np.linalg.norm(extent)), tiny)
+    clusters = position_clusters(mesh.vertices, cell)
+    normals = _normalized(mesh.normals) if mesh.normals is not None else None
+    columns = [values for values in (mesh.uvs, mesh.normals) if values is not None]
+
+    if columns:
+        # Identical attributes sort next to each other within a cluster
+        attributes = np.ascontiguousarray(np.hstack(columns))
+        odd = np.arange(1, 2 * attributes.shape[1], 2, dtype=np.int64)
+        hashed = (attributes.view(np.int64) * odd).sum(axis=1)
+        if count < 1 << 23:
+            order = np.argsort((clusters << 40) | (hashed & ((1 << 40) - 1)))
+        else:
+            order = np.lexsort((hashed, clusters))
+        ordered = attributes[order]
+        cluster_order = clusters[order]
+        same_cluster = cluster_order[1:] == cluster_order[:-1]
+        repeated = same_cluster & (ordered[1:] == ordered[:-1]).all(axis=1)
+        exact_order = np.cumsum(np.r_[False, ~repeated])
+        exact = np.empty(count, dtype=np.int64)
+        exact[order] = exact_order
+        groups = int(exact_order[-1]) + 1
+
+        # Nearly identical attributes within a cluster join too
+        min_cosine = np.cos(np.radians(normal_degrees))
+        a, b = [], []
+        for step in range(1, min(MAX_WELD_CANDIDATES, count - 1) + 1):
+            same = cluster_order[:-step] == cluster_order[step:]
+            if not same.any():
+                break
+            distinct = exact_order[:-step] != exact_order[step:]
+            candidates = np.flatnonzero(same & distinct)
+            i, j = order[candidates], order[candidates + step]
+            joined = np.ones(len(i), dtype=bool)
+            if mesh.uvs is not None:
+                joined &= np.abs(mesh.uvs[i] - mesh.uvs[j]).max(axis=1) <= uv_tolerance
+            if normals is not None:
+                joined &= np.einsum("ij,ij->i", normals[i], normals[j]) >= min_cosine
+            a.append(exact[i[joined]])
+            b.append(exact[j[joined]])
+        if a:
+            labels, _ = union_find(groups, np.concatenate(a), np.concatenate(b))
+        else:
+            labels = np.arange(groups)
+        group, welded_count = _first_occurrence_ids(labels[exact], groups)
+    else:
+        group, welded_count = _first_occurrence_ids(clusters, count)
+    members = np.bincount(group, minlength=welded_count)[:, None]
+
+    cluster_size = np.maximum(np.bincount(clusters, minlength=count), 1)
+    cluster_mean = _sum_by(clusters, mesh.vertices, count) / cluster_size[:, None]
+    representative = np.empty(welded_count, dtype=np.int64)
+    representative[group] = np.arange(count)
+    vertices = cluster_mean[clusters[representative]]
+    uvs = welded_normals = None
+    if mesh.uvs is not None:
+        uvs = _sum_by(group, mesh.uvs, welded_count) / members
+    if normals is not None:
+        welded_normals = _normalized(_sum_by(group, normals, welded_count))
+
+    faces = group[mesh.faces]
+    v0, v1, v2 = faces.T
+    proper = (v0 != v1) & (v1 != v2) & (v2 != v0)
+    welded = Mesh(vertices, faces[proper], uvs=uvs, normals=welded_normals)
+    positions = int((np.bincount(clusters, minlength=count) > 0).sum())
+    stats = {
+        "vertices_before": count,
+        "vertices_after": welded_count,
+        # Extra vertices kept at a shared position because attributes differ
+        "seam_vertices": welded_count - positions,
+        "degenerate_faces": int((~proper).sum()),
+    }
+    return welded, stats
+
+def corner_angles(vertices: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    """(F, 3) interior angle of every triangle corner"""
+    corners = vertices[faces]
+    # Unit edges leaving corners 0, 1 and 2
+    edges = [_normalized(corners[:, (i + 1) % 3] - corners[:, i]) for i in range(3)]
+    angles = np.empty(faces.shape)
+    for corner in range(3):
+        cosine = -_dot(edges[corner], edges[corner - 1])
+        angles[:, corner] = np.arccos(np.clip(cosine, -1.0, 1.0))
+    return angles
+
+def _corner_sum(
+    faces: np.ndarray,
+    values: np.ndarray,
+    angles: np.ndarray,
+    count: int,
+) -> np.ndarray:
+    """Per-face vectors scattered to the face's vertices, weighted by corner angle"""
+    weighted = values[:, None, :] * angles[:, :, None]
+    return _sum_by(faces.ravel(), weighted.reshape(-1, values.shape[1]), count)
+
+def vertex_normals(
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    angles: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Corner-angle weighted vertex normals"""
+    corners = vertices[faces]
+    cross = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    face_normals = _normalized(cross)
+    angles = corner_angles(vertices, faces) if angles is None else angles
+    return _normalized(_corner_sum(faces, face_normals, angles, len(vertices)))
+
+def compute_tangents(mesh: Mesh) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-vertex tangents (N, 4) and bitangents (N, 3) in the MikkTSpace convention
+
+    Each face's UV-space tangent and bitangent are summed at its vertices
+    with corner angle weights, then orthonormalized against the vertex
+    normal (projecting before or after the sum is the same). w holds the
+    handedness, so bitangent = w * cross(normal, tangent) as glTF expects.
+    Faces with degenerate UVs contribute nothing, and vertices left without
+    a tangent get an arbitrary one perpendicular to their normal.
+    """
+    if mesh.uvs is None:
+        raise ValueError("Mesh has no UVs; unwrap it before generating tangents")
+    vertices, faces = mesh.vertices, mesh.faces
+    count = mesh.vertex_count
+    angles = corner_angles(vertices, faces)
+    if mesh.normals is not None:
+        normals = _normalized(mesh.normals)
+    else:
+        normals = vertex_normals(vertices, faces, angles)
+
+    corners = vertices[faces]
+    uv = mesh.uvs[faces]
+    edge1, edge2 = corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]
+    du1, dv1 = uv[:, 1, 0] - uv[:, 0, 0], uv[:, 1, 1] - uv[:, 0, 1]
+    du2, dv2 = uv[:, 2, 0] - uv[:, 0, 0], uv[:, 2, 1] - uv[:, 0, 1]
+    determinant = du1 * dv2 - du2 * dv1
+    scale = np.maximum(np.abs(du1 * dv2), np.abs(du2 * dv1))
+    valid = np.abs(determinant) > np.finfo(np.float64).eps * scale
+    # Only directions matter, so the determinant's sign is enough
+    sign = np.where(determinant < 0, -1.0, 1.0)[:, None]
+    face_tangents = _normalized((edge1 * dv2[:, None] - edge2 * dv1[:, None]) * sign)
+    face_bitangents = _normalized((edge2 * du1[:, None] - edge1 * du2[:, None]) * sign)
+    weights = angles * valid[:, None]
+    tangent_sum = _corner_sum(faces, face_tangents, weights, count)
+    bitangent_sum = _corner_sum(faces, face_bitangents, weights, count)
+
+    # Gram-Schmidt against the normal, falling back to any perpendicular axis
+    tangents = tangent_sum - normals * _dot(normals, tangent_sum)[:, None]
+    floor = np.finfo(np.float32).eps * np.maximum(_dot(tangent_sum, tangent_sum), 1.0)
+    missing = _dot(tangents, tangents) <= floor
+    if missing.any():
+        normal = normals[missing]
+        x_axis, y_axis = [[1.0, 0.0, 0.0]], [[0.0, 1.0, 0.0]]
+        axis = np.where(np.abs(normal[:, 0:1]) < 0.9, x_axis, y_axis)
+        tangents[missing] = axis - normal * _dot(normal, axis)[:, None]
+    tangents = _normalized(tangents)
+    cross = np.cross(normals, tangents)
+    handedness = np.where(_dot(cross, bitangent_sum) < 0, -1.0, 1.0)
+    return np.c_[tangents, handedness], cross * handedness[:, None]
+
+def tangent_space(
+    mesh: Mesh,
+    tolerance: float = WELD_TOLERANCE,
+    uv_tolerance: float = WELD_UV_TOLERANCE,
+    normal_degrees: float = WELD_NORMAL_DEGREES,
+) -> Tuple[Mesh, np.ndarray, Dict[str, Any]]:
+    """Weld a mesh, then give it normals and tangents
+
+    Returns the mesh, its bitangents and the weld stats.
+    """
+    welded, stats = weld_vertices(mesh, tolerance, uv_tolerance, normal_degrees)
+    if welded.normals is None:
+        welded = welded._replace(normals=vertex_normals(welded.vertices, welded.faces))
+    tangents, bitangents = compute_tangents(welded)
+    return welded._replace(tangents=tangents), bitangents, stats
@@ -0,0 +1,423 @@
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from app.core.config import settings
+from app.services.geometry.mesh import Mesh, mesh_content_hash, weld_positions
+from app.services.geometry.validation import union_find
+from app.services.storage.tiles import TiledImage
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# xatlas ChartOptions fields that may be set through the request options
+CHART_OPTIONS = (
+    "max_chart_area",
+    "max_boundary_length",
+    "normal_deviation_weight",
+    "roundness_weight",
+    "straightness_weight",
+    "normal_seam_weight",
+    "texture_seam_weight",
+    "max_cost",
+    "max_iterations",
+)
+
+UV_PACK_DEFAULTS = {"resolution": 1024, "padding": 2, "rotate": True}
+
+# Components are batched so each pool task charts at least this many faces
+MIN_TASK_FACES = 20000
+
+# Packing starts at this fill ratio and shrinks the scale until charts fit
+PACK_FILL = 0.8
+PACK_SHRINK = 0.95
+
+class ChartSet(NamedTuple):
+    """Charts of a position-welded mesh, before packing"""
+
+    positions: np.ndarray  # (P, 3) welded positions
+    vertex_map: np.ndarray  # (N,) position of every charted vertex
+    faces: np.ndarray  # (F, 3) charted vertex indices, in the mesh's face order
+    uvs: np.ndarray  # (N, 2) chart coordinates in world units
+    charts: np.ndarray  # (N,) chart of every charted vertex
+    chart_count: int
+
+class UvAtlas(NamedTuple):
+    mesh: Mesh
+    resolution: int
+    chart_count: int
+    utilization: float
+
+def chart_options(options: Dict[str, Any]) -> Dict[str, Any]:
+    """ChartOptions fields from request options; everything else is a packing option"""
+    return {key: options[key] for key in CHART_OPTIONS if options.get(key) is not None}
+
+def pack_options(options: Dict[str, Any]) -> Dict[str, Any]:
+    """Validated packing options, falling back to UV_PACK_DEFAULTS"""
+    given = {k: options[k] for k in UV_PACK_DEFAULTS if options.get(k) is not None}
+    values = {**UV_PACK_DEFAULTS, **given}
+    try:
+        resolution, padding = int(values["resolution"]), int(values["padding"])
+    except (TypeError, ValueError):
+        raise ValueError("resolution and padding must be integers")
+    if not 64 <= resolution <= 16384:
+        raise ValueError("resolution must be between 64 and 16384")
+    if not 0 <= padding < resolution // 8:
+        raise ValueError("padding must be between 0 and resolution / 8")
+    return {
+        "resolution": resolution,
+        "padding": padding,
+        "rotate": bool(values["rotate"]),
+    }
+
+class ChartCache:
+    """Chart sets of recently unwrapped meshes, keyed by content hash
+
+    Re-unwrapping an unchanged mesh with new packing options reuses its
+    charts and only packs again.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, ChartSet]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[ChartSet]:
+        with self._lock:
+            charts = self._entries.get(key)
+            if charts is not None:
+                self._entries.move_to_end(key)
+            return charts
+
+    def put(self, key: str, charts: ChartSet) -> None:
+        with self._lock:
+            self._entries[key] = charts
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+chart_cache = ChartCache(settings.UV_CHART_CACHE_SIZE)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def chart_pool() -> ProcessPoolExecutor:
+    """Process pool for charting, created on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned workers do not inherit the server's threads or sockets
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.UV_UNWRAP_WORKERS, mp_context=get_context("spawn")
+            )
+        return _pool
+
+def share_array(
+    array: np.ndarray,
+) -> Tuple[SharedMemory, Tuple[str, Tuple[int, ...], str]]:
+    """Copy of an array in a new shared memory block, and the spec to attach it by"""
+    memory = SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=memory.buf)[...] = array
+    return memory, (memory.name, array.shape, array.dtype.str)
+
+def attach_array(
+    spec: Tuple[str, Tuple[int, ...], str],
+) -> Tuple[SharedMemory, np.ndarray]:
+    """Block and array view for a spec from share_array; close the block when done"""
+    # Workers share the parent's resource tracker, which unlinks the block once
+    memory = SharedMemory(name=spec[0])
+    return memory, np.ndarray(spec[1], dtype=np.dtype(spec[2]), buffer=memory.buf)
+
+def chart_component(
+    positions: np.ndarray,
+    faces: np.ndarray,
+    options: Dict[str, Any],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Chart one connected component with xatlas
+
+    Returns the input vertex of every output vertex, the output faces in
+    input order and UVs scaled back to world units.
+    """
+    import xatlas
+
+    atlas = xatlas.Atlas()
+    atlas.add_mesh(
+        np.ascontiguousarray(positions, dtype=np.float32),
+        np.ascontiguousarray(faces, dtype=np.uint32),
+    )
+    chart = xatlas.ChartOptions()
+    for key, value in options.items():
+        setattr(chart, key, value)
+    atlas.generate(chart_options=chart)
+    vertex_map, indices, uvs = atlas.get_mesh(0)
+    # xatlas normalizes UVs to its own atlas; undo that so all components share a scale
+    size = np.array([atlas.width, atlas.height], dtype=np.float64)
+    triangles = indices.astype(np.int64).reshape(-1, 3)
+    return vertex_map.astype(np.int64), triangles, uvs * size / atlas.texels_per_unit
+
+def _chart_ranges(
+    positions: np.ndarray,
+    faces: np.ndarray,
+    ranges: List[Tuple[int, int]],
+    options: Dict[str, Any],
+) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    results = []
+    for start, end in ranges:
+        used, local = np.unique(faces[start:end], return_inverse=True)
+        vertex_map, indices, uvs = chart_component(
+            positions[used], local.reshape(-1, 3), options
+        )
+        results.append((used[vertex_map], indices, uvs))
+    return results
+
+def _chart_task(
+    positions_spec: Tuple[str, Tuple[int, ...], str],
+    faces_spec: Tuple[str, Tuple[int, ...], str],
+    ranges: List[Tuple[int, int]],
+    options: Dict[str, Any],
+) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Pool task: chart the components stored at ranges of the shared face array"""
+    positions_memory, positions = attach_array(positions_spec)
+    faces_memory, faces = attach_array(faces_spec)
+    try:
+        return _chart_ranges(positions, faces, ranges, options)
+    finally:
+        del positions, faces
+        positions_memory.close()
+        faces_memory.close()
+
+def face_components(faces: np.ndarray, vertex_count: int) -> np.ndarray:
+    """Connected component of every face, through shared vertices"""
+    labels, _ = union_find(
+        vertex_count, np.r_[faces[:, 0], faces[:, 1]], np.r_[faces[:, 1], faces[:, 2]]
+    )
+    return np.unique(labels[faces[:, 0]], return_inverse=True)[1].reshape(-1)
+
+def task_batches(sizes: np.ndarray, workers: int) -> List[List[int]]:
+    """Group components, largest first, into batches of at least MIN_TASK_FACES faces"""
+    target = max(MIN_TASK_FACES, int(sizes.sum()) // max(4 * workers, 1))
+    batches: List[List[int]] = [[]]
+    filled = 0
+    for component in np.argsort(-sizes, kind="stable"):
+        if filled >= target:
+            batches.append([])
+            filled = 0
+        batches[-1].append(int(component))
+        filled += int(sizes[component])
+    return batches
+
+def chart_mesh(
+    mesh: Mesh,
+    options: Dict[str, Any],
+    pool: Optional[Executor] = None,
+) -> ChartSet:
+    """Chart every connected component of a mesh, in parallel on the pool
+
+    Positions and faces go to the workers through shared memory; each task
+    only receives the face ranges of its components.
+    """
+    positions, index = weld_positions(np.asarray(mesh.vertices, dtype=np.float64))
+    faces = index[mesh.faces]
+    if not len(faces):
+        raise ValueError("Mesh has no triangles to unwrap")
+    component = face_components(faces, len(positions))
+    order = np.argsort(component, kind="stable")
+    sizes = np.bincount(component)
+    starts = np.r_[0, np.cumsum(sizes)[:-1]]
+    batches = task_batches(sizes, settings.UV_UNWRAP_WORKERS)
+
+    tasks = [
+        [(int(starts[c]), int(starts[c] + sizes[c])) for c in batch]
+        for batch in batches
+    ]
+    shared_positions = positions.astype(np.float32)
+    if pool is None or len(tasks) == 1:
+        results = [
+            _chart_ranges(shared_positions, faces[order], ranges, options)
+            for ranges in tasks
+        ]
+    else:
+        positions_memory, positions_spec = share_array(shared_positions)
+        faces_memory, faces_spec = share_array(faces[order])
+        try:
+            futures = [
+                pool.submit(_chart_task, positions_spec, faces_spec, ranges, options)
+                for ranges in tasks
+            ]
+            results = [future.result() for future in futures]
+        finally:
+            for memory in (positions_memory, faces_memory):
+                memory.close()
+                memory.unlink()
+
+    vertex_maps, uv_parts = [], []
+    charted_faces = np.empty_like(faces)
+    offset = 0
+    for batch, batch_results in zip(batches, results):
+        for c, (vertex_map, indices, uvs) in zip(batch, batch_results):
+            charted_faces[order[starts[c]:starts[c] + sizes[c]]] = indices + offset
+            vertex_maps.append(vertex_map)
+            uv_parts.append(uvs)
+            offset += len(vertex_map)
+    vertex_map = np.concatenate(vertex_maps)
+    # Charts are islands of the output: xatlas splits vertices along chart seams
+    labels, _ = union_find(
+        offset,
+        np.r_[charted_faces[:, 0], charted_faces[:, 1]],
+        np.r_[charted_faces[:, 1], charted_faces[:, 2]],
+    )
+    _, charts = np.unique(labels, return_inverse=True)
+    charts = charts.reshape(-1)
+    return ChartSet(
+        positions,
+        vertex_map,
+        charted_faces,
+        np.concatenate(uv_parts),
+        charts,
+        int(charts.max()) + 1,
+    )
+
+def shelf_pack(sizes: np.ndarray, width: int) -> Optional[np.ndarray]:
+    """Lower-left corners for rectangles on shelves of the given width, tallest first
+
+    Returns None if the rectangles do not fit in a width x width square.
+    """
+    corners = np.zeros((len(sizes), 2), dtype=np.int64)
+    x = y = shelf = 0
+    for rect in np.lexsort((-sizes[:, 0], -sizes[:, 1])):
+        w, h = sizes[rect]
+        if w > width:
+            return None
+        if x + w > width:
+            x, y, shelf = 0, y + shelf, 0
+        if y + h > width:
+            return None
+        corners[rect] = (x, y)
+        x += w
+        shelf = max(shelf, h)
+    return corners
+
+def pack_charts(
+    charts: ChartSet,
+    resolution: int,
+    padding: int,
+    rotate: bool,
+) -> Tuple[np.ndarray, float]:
+    """Place all charts in one square atlas
+
+    Returns UVs in [0, 1] and the texel utilization.
+    """
+    uvs = charts.uvs.astype(np.float64)
+    count = charts.chart_count
+    low = np.full((count, 2), np.inf)
+    high = np.full((count, 2), -np.inf)
+    np.minimum.at(low, charts.charts, uvs)
+    np.maximum.at(high, charts.charts, uvs)
+    uvs = uvs - low[charts.charts]
+    extent = high - low
+    if rotate:
+        # Lay charts on their long side so shelves stay shallow
+        upright = extent[:, 1] > extent[:, 0]
+        turn = upright[charts.charts]
+        uvs[turn] = np.c_[extent[charts.charts[turn], 1] - uvs[turn, 1], uvs[turn, 0]]
+        extent[upright] = extent[upright][:, ::-1]
+
+    corners_uv = uvs[charts.faces]
+    first = corners_uv[:, 1] - corners_uv[:, 0]
+    second = corners_uv[:, 2] - corners_uv[:, 0]
+    area = 0.5 * np.abs(np.cross(first, second)).sum()
+    # Scale at which the padded chart boxes cover PACK_FILL of the atlas:
+    # sum((w * s + 2p) * (h * s + 2p)) = PACK_FILL * resolution^2
+    quadratic = float((extent[:, 0] * extent[:, 1]).sum())
+    linear = 2.0 * padding * float(extent.sum())
+    constant = 4.0 * padding * padding * count - PACK_FILL * resolution * resolution
+    if quadratic > 0:
+        root = np.sqrt(linear * linear - 4.0 * quadratic * constant)
+        scale = (-linear + root) / (2.0 * quadratic)
+    else:
+        scale = -constant / max(linear, float(np.finfo(np.float64).tiny))
+    # Never let the largest chart exceed the atlas
+    largest = max(float(extent.max()), float(np.finfo(np.float64).tiny))
+    scale = min(scale, (resolution - 2 * padding) / largest)
+    while True:
+        sizes = np.ceil(extent * scale).astype(np.int64) + 2 * padding
+        corners = shelf_pack(sizes, resolution)
+        if corners is not None:
+            break
+        scale *= PACK_SHRINK
+    placed = (uvs * scale + corners[charts.charts] + padding) / resolution
+    return placed, float(area * scale * scale / (resolution * resolution))
+
+def unwrap_mesh(
+    mesh: Mesh,
+    options: Optional[Dict[str, Any]] = None,
+    pool: Optional[Executor] = None,
+    cache: Optional[ChartCache] = None,
+) -> Tuple[UvAtlas, bool]:
+    """Chart a mesh (or reuse cached charts) and pack it into one atlas
+
+    Returns the atlas and whether the charts came from the cache. The mesh
+    is welded by position first; its previous UVs and normals are dropped.
+    """
+    options = options or {}
+    chart = chart_options(options)
+    packing = pack_options(options)
+    key = mesh_content_hash(mesh, chart)
+    charts = cache.get(key) if cache is not None else None
+    cached = charts is not None
+    if charts is None:
+        charts = chart_mesh(mesh, chart, pool)
+        if cache is not None:
+            cache.put(key, charts)
+    uvs, utilization = pack_charts(
+        charts, packing["resolution"], packing["padding"], packing["rotate"]
+    )
+    unwrapped = Mesh(charts.positions[charts.vertex_map], charts.faces, uvs=uvs)
+    atlas = UvAtlas(unwrapped, packing["resolution"], charts.chart_count, utilization)
+    return atlas, cached
+
+def uv_layout_png(mesh: Mesh, resolution: int, target: Path) -> None:
+    """Write a PNG of the UV layout, with V pointing up, drawing it a tile at a time
+
+    Each tile is drawn with only the triangles whose bounds reach it and
+    kept in a tiled image beside target; tiles no chart reaches are never
+    stored. The PNG is then streamed from the tiles.
+    """
+    from PIL import Image, ImageDraw
+    # The texture package imports the geometry package, so its PNG writer is
+    # imported on use
+    from app.services.texture.png import tiles_to_png
+
+    if mesh.uvs is None:
+        raise ValueError("Mesh has no UVs")
+    points = mesh.uvs[mesh.faces] * resolution
+    points[:, :, 1] = resolution - points[:, :, 1]
+    # PIL rounds fractional corners differently either side of zero; whole texels
+    # draw the same in every tile
+    points = np.rint(points)
+    tiles_path = Path(target).with_suffix(".tiles")
+    with TiledImage.create(tiles_path, resolution, resolution, 1) as image:
+        # Outlines are a texel wide, so bounds are widened by one
+        low = np.clip(np.floor(points.min(axis=1)) - 1, 0, resolution - 1)
+        high = np.clip(np.ceil(points.max(axis=1)) + 1, 0, resolution - 1)
+        low = low.astype(np.int64) // image.tile_size
+        high = high.astype(np.int64) // image.tile_size
+        for tile_y in range(image.tiles_y):
+            row = np.flatnonzero((low[:, 1] <= tile_y) & (high[:, 1] >= tile_y))
+            for tile_x in range(image.tiles_x):
+                triangles = row[(low[row, 0] <= tile_x) & (high[row, 0] >= tile_x)]
+                if not len(triangles):
+                    continue
+                box = image.box(tile_x, tile_y)
+                canvas = Image.new("L", (box.x1 - box.x0, box.y1 - box.y0), 0)
+                draw = ImageDraw.Draw(canvas)
+                for triangle in (points[triangles] - (box.x0, box.y0)).tolist():
+                    corners = [tuple(point) for point in triangle]
+                    draw.polygon(corners, fill=96, outline=255)
+                image.write_tile(tile_x, tile_y, np.asarray(canvas))
+        tiles_to_png(image, target)
+    tiles_path.unlink()
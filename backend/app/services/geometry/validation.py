@@ -0,0 +1,415 @@
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from app.services.geometry.mesh import Mesh, weld_positions
+import numpy as np
+
+# At most this many face or vertex indices are listed per issue; counts are exact
+MAX_REPORTED_INDICES = 1000
+
+# Tolerances relative to the bounding box diagonal
+DEGENERATE_AREA_TOLERANCE = 1e-12  # twice the face area, relative to diagonal squared
+DUPLICATE_VERTEX_TOLERANCE = 1e-6
+
+# Bits per axis of the duplicate vertex grid; 2**20 cells cover the diagonal at
+# that tolerance
+GRID_BITS = 20
+
+class EdgeTopology(NamedTuple):
+    """Undirected edges of a face set, built by sorting 64-bit edge keys"""
+
+    edges: np.ndarray  # (E, 2) vertex pairs, low index first
+    face_counts: np.ndarray  # (E,) faces using each edge
+    half_edges: np.ndarray  # (3F, 2) directed edges, three per face in face order
+    half_edge_edge: np.ndarray  # (3F,) edge index of each half-edge
+    order: np.ndarray  # (3F,) half-edge indices sorted by edge
+
+class MeshAnalysis(NamedTuple):
+    vertex_count: int
+    triangle_count: int
+    degenerate_faces: np.ndarray
+    duplicate_vertices: np.ndarray  # vertices that repeat an earlier position
+    unreferenced_vertices: np.ndarray
+    boundary_edges: np.ndarray  # (B, 2)
+    boundary_faces: np.ndarray
+    non_manifold_edges: np.ndarray  # (K, 2)
+    non_manifold_faces: np.ndarray
+    flipped_faces: np.ndarray
+    non_orientable_faces: np.ndarray
+    component_labels: np.ndarray  # (F,) component of each face, -1 for degenerate faces
+    component_sizes: np.ndarray  # faces per component, largest first
+
+    @property
+    def is_watertight(self) -> bool:
+        return not len(self.boundary_edges) and not len(self.non_manifold_edges)
+
+    @property
+    def is_manifold(self) -> bool:
+        return not len(self.non_manifold_edges)
+
+    @property
+    def is_winding_consistent(self) -> bool:
+        return not len(self.flipped_faces) and not len(self.non_orientable_faces)
+
+def bounding_diagonal(vertices: np.ndarray) -> float:
+    if not len(vertices):
+        return 0.0
+    return float(np.linalg.norm(vertices.max(axis=0) - vertices.min(axis=0)))
+
+def edge_topology(faces: np.ndarray, vertex_count: int) -> EdgeTopology:
+    """Group the half-edges of a face set by undirected edge"""
+    half_edges = faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    low = np.minimum(half_edges[:, 0], half_edges[:, 1])
+    high = np.maximum(half_edges[:, 0], half_edges[:, 1])
+    keys = low * np.int64(max(vertex_count, 1)) + high
+
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    starts = (
+        np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        if len(keys)
+        else np.zeros(0, dtype=np.int64)
+    )
+    face_counts = np.diff(np.r_[starts, len(keys)])
+
+    half_edge_edge = np.empty(len(keys), dtype=np.int64)
+    half_edge_edge[order] = np.repeat(np.arange(len(starts)), face_counts)
+    edges = np.stack([low[order[starts]], high[order[starts]]], axis=1)
+    return EdgeTopology(edges, face_counts, half_edges, half_edge_edge, order)
+
+def adjacent_half_edges(topology: EdgeTopology) -> Tuple[np.ndarray, np.ndarray]:
+    """Pairs of half-edges on the same edge
+
+    Edges with more than two faces give a chain of pairs.
+    """
+    order = topology.order
+    same = topology.half_edge_edge[order[1:]] == topology.half_edge_edge[order[:-1]]
+    return order[:-1][same], order[1:][same]
+
+def union_find(
+    count: int,
+    a: np.ndarray,
+    b: np.ndarray,
+    relation: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Connected components of a graph by vectorized hooking and pointer jumping
+
+    Returns the root label of every node and its parity relative to its
+    root. With a relation (0 or 1 per edge), parity[a] ^ parity[b] ==
+    relation wherever the relation is satisfiable; without one every parity
+    is zero.
+    """
+    parent = np.arange(count)
+    parity = np.zeros(count, dtype=np.int8)
+    a = np.asarray(a, dtype=np.int64)
+    b = np.asarray(b, dtype=np.int64)
+    hook_edge = np.full(count, -1, dtype=np.int64)
+
+    while True:
+        # Point every node at its root
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            if relation is not None:
+                parity = parity ^ parity[parent]
+            parent = grand
+
+        root_a = parent[a]
+        root_b = parent[b]
+        active = np.flatnonzero(root_a != root_b)
+        if not len(active):
+            return parent, parity
+
+        # Hook the larger root of every crossing edge under the smaller one;
+        # when several edges hook the same root, any one of them will do
+        hook_edge[np.maximum(root_a[active], root_b[active])] = active
+        hooked = np.flatnonzero(hook_edge >= 0)
+        edges = hook_edge[hooked]
+        hook_edge[hooked] = -1
+        parent[hooked] = np.minimum(root_a[edges], root_b[edges])
+        if relation is not None:
+            parity[hooked] = parity[a[edges]] ^ parity[b[edges]] ^ relation[edges]
+
+def face_cross_products(
+    vertices: np.ndarray,
+    faces: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """(F, 3) unnormalized face normals and the first corner of each face
+
+    The length of each normal is twice the face area.
+    """
+    v0 = vertices[faces[:, 0]]
+    e1 = vertices[faces[:, 1]] - v0
+    e2 = vertices[faces[:, 2]] - v0
+    cross = np.empty_like(e1)
+    cross[:, 0] = e1[:, 1] * e2[:, 2] - e1[:, 2] * e2[:, 1]
+    cross[:, 1] = e1[:, 2] * e2[:, 0] - e1[:, 0] * e2[:, 2]
+    cross[:, 2] = e1[:, 0] * e2[:, 1] - e1[:, 1] * e2[:, 0]
+    return cross, v0
+
+def grid_keys(vertices: np.ndarray, cell_size: float) -> np.ndarray:
+    """One int64 key per vertex for the grid cell containing it"""
+    extent = (
+        vertices.max(axis=0) - vertices.min(axis=0) if len(vertices) else np.zeros(3)
+    )
+    cell_size = max(
+        cell_size,
+        float(extent.max()) / ((1 << GRID_BITS) - 1),
+        float(np.finfo(np.float64).tiny),
+    )
+    grid = np.floor((vertices - vertices.min(axis=0)) / cell_size).astype(np.int64)
+    return (grid[:, 0] << (2 * GRID_BITS)) | (grid[:, 1] << GRID_BITS) | grid[:, 2]
+
+def find_duplicate_vertices(
+    vertices: np.ndarray,
+    tolerance: float,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Vertices whose position repeats an earlier one on a grid of the given cell size
+
+    Returns (duplicates, first occurrence for each duplicate).
+    """
+    if len(vertices) < 2:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    keys = grid_keys(vertices, tolerance)
+    order = np.argsort(keys)
+    ordered = keys[order]
+    same = ordered[1:] == ordered[:-1]
+
+    # The lowest index in each run of equal positions is the one kept
+    starts = np.flatnonzero(np.r_[True, ~same])
+    keep = np.minimum.reduceat(order, starts)
+    run = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(order)]))
+    duplicate = order != keep[run]
+    return order[duplicate], keep[run[duplicate]]
+
+def analyze_mesh(mesh: Mesh) -> MeshAnalysis:
+    """Run every validation check over the whole mesh with array operations"""
+    vertices = np.asarray(mesh.vertices, dtype=np.float64)
+    faces = np.asarray(mesh.faces, dtype=np.int64)
+    vertex_count = len(vertices)
+    face_count = len(faces)
+    if face_count and (faces.min() < 0 or faces.max() >= vertex_count):
+        raise ValueError("Mesh has face indices outside the vertex array")
+
+    diagonal = bounding_diagonal(vertices)
+    index_degenerate = (
+        (faces[:, 0] == faces[:, 1])
+        | (faces[:, 1] == faces[:, 2])
+        | (faces[:, 2] == faces[:, 0])
+    )
+    cross, v0 = face_cross_products(vertices, faces)
+    doubled_area = np.sqrt(np.einsum("ij,ij->i", cross, cross))
+    # Signed volume of the tetrahedron each face forms with the origin
+    volumes = np.einsum("ij,ij->i", v0, cross) / 6.0
+    del cross, v0
+    degenerate = index_degenerate | (
+        doubled_area <= DEGENERATE_AREA_TOLERANCE * diagonal * diagonal
+    )
+
+    duplicates, _ = find_duplicate_vertices(
+        vertices, DUPLICATE_VERTEX_TOLERANCE * diagonal
+    )
+    used = (
+        np.bincount(faces.ravel(), minlength=vertex_count) > 0
+        if face_count
+        else np.zeros(vertex_count, dtype=bool)
+    )
+
+    # Edge, winding and component checks run on welded positions so vertices
+    # split along UV or normal seams do not read as open edges. Reported edges
+    # use the first vertex at each position. Exact duplicates are also grid
+    # duplicates, so meshes without any skip the weld.
+    if len(duplicates):
+        positions, position_index = weld_positions(vertices)
+        welded = position_index[faces]
+        first_vertex = np.empty(len(positions), dtype=np.int64)
+        first_vertex[position_index[::-1]] = np.arange(vertex_count - 1, -1, -1)
+        welded_degenerate = (
+            (welded[:, 0] == welded[:, 1])
+            | (welded[:, 1] == welded[:, 2])
+            | (welded[:, 2] == welded[:, 0])
+        )
+        del positions, position_index
+    else:
+        welded = faces
+        first_vertex = np.arange(vertex_count)
+        welded_degenerate = index_degenerate
+
+    # Edge checks skip faces that reuse a position; they have no proper edges
+    if welded_degenerate.any():
+        kept = np.flatnonzero(~welded_degenerate)
+        topology = edge_topology(welded[kept], len(first_vertex))
+        half_face = kept[np.arange(len(topology.half_edges)) // 3]
+    else:
+        kept = np.arange(face_count)
+        topology = edge_topology(welded, len(first_vertex))
+        half_face = np.arange(len(topology.half_edges)) // 3
+
+    boundary = topology.face_counts == 1
+    non_manifold = topology.face_counts > 2
+    edge_of_half = topology.half_edge_edge
+    open_half = np.flatnonzero((topology.face_counts != 2)[edge_of_half])
+    open_counts = topology.face_counts[edge_of_half[open_half]]
+    boundary_faces = np.unique(half_face[open_half[open_counts == 1]])
+    non_manifold_faces = np.unique(half_face[open_half[open_counts > 2]])
+
+    # On two-face edges, neighbours are consistently wound when they traverse
+    # the edge in opposite directions
+    adjacent_first, adjacent_second = adjacent_half_edges(topology)
+    manifold_pair = topology.face_counts[edge_of_half[adjacent_first]] == 2
+    first, second = adjacent_first[manifold_pair], adjacent_second[manifold_pair]
+    same_direction = (
+        topology.half_edges[first, 0] == topology.half_edges[second, 0]
+    ).astype(np.int8)
+    oriented_labels, parity = union_find(
+        face_count, half_face[first], half_face[second], same_direction
+    )
+
+    # Faces sharing any edge are connected; non-manifold edges join patches
+    joined, _ = union_find(
+        face_count,
+        oriented_labels[half_face[adjacent_first[~manifold_pair]]],
+        oriented_labels[half_face[adjacent_second[~manifold_pair]]],
+    )
+    labels = joined[oriented_labels]
+
+    conflicts = (parity[half_face[first]] ^ parity[half_face[second]]) != same_direction
+    non_orientable_faces = np.unique(
+        np.r_[half_face[first][conflicts], half_face[second][conflicts]]
+    )
+
+    # Within each consistently wound patch the minority winding is flipped.
+    # Closed patches instead keep the winding that gives a positive volume.
+    flipped_parity = np.zeros(face_count, dtype=np.int8)
+    if face_count:
+        sign = 1 - 2 * parity.astype(np.float64)
+        volume = np.bincount(
+            oriented_labels, weights=volumes * sign, minlength=face_count
+        )
+        size = np.bincount(oriented_labels, minlength=face_count)
+        odd = np.bincount(oriented_labels, weights=parity, minlength=face_count)
+        open_patch = np.zeros(face_count, dtype=bool)
+        open_patch[oriented_labels[boundary_faces]] = True
+        open_patch[oriented_labels[non_manifold_faces]] = True
+        flipped_parity = np.where(
+            open_patch, (odd * 2 < size).astype(np.int8), (volume >= 0).astype(np.int8)
+        )
+        flipped_parity = np.where(
+            open_patch & (odd * 2 == size), 1, flipped_parity
+        ).astype(np.int8)
+    flipped = (
+        (parity == flipped_parity[oriented_labels]) & ~welded_degenerate
+        if face_count
+        else np.zeros(0, dtype=bool)
+    )
+
+    # Components are numbered by size; degenerate faces belong to none
+    component_labels = np.full(face_count, -1, dtype=np.int64)
+    component_sizes = np.zeros(0, dtype=np.int64)
+    if len(kept):
+        roots, inverse, counts = np.unique(
+            labels[kept], return_inverse=True, return_counts=True
+        )
+        rank = np.empty(len(roots), dtype=np.int64)
+        by_size = np.argsort(-counts, kind="stable")
+        rank[by_size] = np.arange(len(roots))
+        component_labels[kept] = rank[inverse]
+        component_sizes = counts[by_size]
+
+    return MeshAnalysis(
+        vertex_count=vertex_count,
+        triangle_count=face_count,
+        degenerate_faces=np.flatnonzero(degenerate),
+        duplicate_vertices=np.sort(duplicates),
+        unreferenced_vertices=np.flatnonzero(~used),
+        boundary_edges=first_vertex[topology.edges[boundary]],
+        boundary_faces=boundary_faces,
+        non_manifold_edges=first_vertex[topology.edges[non_manifold]],
+        non_manifold_faces=non_manifold_faces,
+        flipped_faces=np.flatnonzero(flipped),
+        non_orientable_faces=non_orientable_faces,
+        component_labels=component_labels,
+        component_sizes=component_sizes,
+    )
+
+def _issue(
+    kind: str,
+    severity: str,
+    message: str,
+    count: int,
+    **indices: np.ndarray,
+) -> Dict[str, Any]:
+    issue: Dict[str, Any] = {"type": kind, "severity": severity, "message": message}
+    issue["count"] = int(count)
+    for name, values in indices.items():
+        issue[name] = values[:MAX_REPORTED_INDICES].tolist()
+    return issue
+
+def validation_report(analysis: MeshAnalysis) -> Dict[str, Any]:
+    """JSON report for an analysis; issue index lists are truncated, counts are not"""
+    issues: List[Dict[str, Any]] = []
+    if len(analysis.degenerate_faces):
+        issues.append(_issue(
+            "degenerate_faces", "error", "Faces with repeated vertices or zero area",
+            len(analysis.degenerate_faces), face_indices=analysis.degenerate_faces,
+        ))
+    if len(analysis.boundary_edges):
+        issues.append(_issue(
+            "boundary_edges", "error",
+            "Edges used by only one face; the mesh has holes",
+            len(analysis.boundary_edges),
+            face_indices=analysis.boundary_faces,
+            edges=analysis.boundary_edges,
+        ))
+    if len(analysis.non_manifold_edges):
+        issues.append(_issue(
+            "non_manifold_edges", "error", "Edges shared by more than two faces",
+            len(analysis.non_manifold_edges),
+            face_indices=analysis.non_manifold_faces,
+            edges=analysis.non_manifold_edges,
+        ))
+    if len(analysis.flipped_faces):
+        issues.append(_issue(
+            "flipped_normals", "error",
+            "Faces wound opposite to their neighbours or facing inwards",
+            len(analysis.flipped_faces), face_indices=analysis.flipped_faces,
+        ))
+    if len(analysis.non_orientable_faces):
+        issues.append(_issue(
+            "non_orientable", "error",
+            "Faces on edges where no consistent winding exists",
+            len(analysis.non_orientable_faces),
+            face_indices=analysis.non_orientable_faces,
+        ))
+    if len(analysis.duplicate_vertices):
+        issues.append(_issue(
+            "duplicate_vertices", "warning",
+            "Vertices at the same position as another vertex",
+            len(analysis.duplicate_vertices),
+            vertex_indices=analysis.duplicate_vertices,
+        ))
+    if len(analysis.unreferenced_vertices):
+        issues.append(_issue(
+            "unreferenced_vertices", "warning", "Vertices not used by any face",
+            len(analysis.unreferenced_vertices),
+            vertex_indices=analysis.unreferenced_vertices,
+        ))
+    if len(analysis.component_sizes) > 1:
+        issues.append(_issue(
+            "disconnected_components", "warning",
+            "Mesh consists of several disconnected parts",
+            len(analysis.component_sizes), component_sizes=analysis.component_sizes,
+        ))
+
+    return {
+        "is_watertight": analysis.is_watertight,
+        "is_manifold": analysis.is_manifold,
+        "is_winding_consistent": analysis.is_winding_consistent,
+        "triangle_count": analysis.triangle_count,
+        "vertex_count": analysis.vertex_count,
+        "component_count": len(analysis.component_sizes),
+        "issues": issues,
+    }
+
+def validate_mesh(mesh: Mesh) -> Dict[str, Any]:
+    return validation_report(analyze_mesh(mesh))
@@ -0,0 +1,22 @@
+from .assets import AssetStorage, storage
+from .tiles import (
+    TileBox,
+    TileCache,
+    TiledImage,
+    TileRowReader,
+    is_tiled_image,
+    tile_cache,
+    tile_directory,
+)
+
+__all__ = [
+    "AssetStorage",
+    "storage",
+    "TileBox",
+    "TileCache",
+    "TiledImage",
+    "TileRowReader",
+    "is_tiled_image",
+    "tile_cache",
+    "tile_directory",
+]
@@ -0,0 +1,230 @@
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import IO, AsyncIterator, Optional, Sequence
+from urllib.parse import urlparse
+from app.core.config import settings
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Redirects followed when downloading an asset; each target is checked
+MAX_REDIRECTS = 5
+
+class AssetStorage:
+    """Reads and writes mesh and texture assets
+
+    Assets live in the S3 bucket, or under STORAGE_LOCAL_PATH in development,
+    and are addressed by URLs under STORAGE_PUBLIC_URL. Other http(s) URLs are
+    downloaded directly, but only from the storage host or STORAGE_FETCH_HOSTS.
+    """
+
+    def __init__(
+        self,
+        public_url: Optional[str] = None,
+        local_path: Optional[str] = None,
+        max_fetch_bytes: Optional[int] = None,
+        fetch_hosts: Optional[Sequence[str]] = None,
+    ):
+        self.public_url = (public_url or settings.STORAGE_PUBLIC_URL).rstrip("/")
+        local_path = (
+            local_path if local_path is not None else settings.STORAGE_LOCAL_PATH
+        )
+        self.local_path = Path(local_path).resolve() if local_path else None
+        self.max_fetch_bytes = max_fetch_bytes or settings.STORAGE_MAX_FETCH_BYTES
+        hosts = fetch_hosts if fetch_hosts is not None else settings.STORAGE_FETCH_HOSTS
+        self.fetch_hosts = {urlparse(self.public_url).hostname} | {
+            host.lower() for host in hosts or ()
+        }
+        self._s3 = None
+
+    def url_for(self, key: str) -> str:
+        return f"{self.public_url}/{key}"
+
+    def key_for(self, url: str) -> Optional[str]:
+        """Storage key of a URL under the public base URL, or None for external URLs"""
+        prefix = self.public_url + "/"
+        if url.startswith(prefix):
+            return url[len(prefix):]
+        return None
+
+    async def fetch(self, url: str) -> bytes:
+        """Download an asset; raises ValueError if it cannot be read"""
+        key = self.key_for(url)
+        if key is not None:
+            return await self.read(key)
+
+        return await self._download(url)
+
+    @asynccontextmanager
+    async def local_file(self, url: str) -> AsyncIterator[Path]:
+        """Path of an asset on local disk, for readers that memory-map it
+
+        Local assets are used in place; others are streamed to a temporary
+        file that is removed on exit.
+        """
+        key = self.key_for(url)
+        if key is not None and self.local_path is not None:
+            path = self._local_file(key)
+            if not path.is_file():
+                raise ValueError(f"Asset not found: {key}")
+            yield path
+            return
+        if key is None:
+            self.check_url(url)
+
+        suffix = Path(urlparse(url).path).suffix
+        handle = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+        try:
+            if key is not None:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self._s3_download, key, handle
+                )
+            else:
+                await self._download(url, handle)
+            handle.close()
+            yield Path(handle.name)
+        finally:
+            handle.close()
+            os.unlink(handle.name)
+
+    async def read(self, key: str) -> bytes:
+        loop = asyncio.get_running_loop()
+        if self.local_path is not None:
+            path = self._local_file(key)
+            if not path.is_file():
+                raise ValueError(f"Asset not found: {key}")
+            return await loop.run_in_executor(None, path.read_bytes)
+        return await loop.run_in_executor(None, self._s3_read, key)
+
+    async def store(
+        self,
+        key: str,
+        data: bytes,
+        content_type: str = "application/octet-stream",
+    ) -> str:
+        """Save an asset and return its public URL"""
+        loop = asyncio.get_running_loop()
+        if self.local_path is not None:
+            path = self._local_file(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            await loop.run_in_executor(None, path.write_bytes, data)
+        else:
+            await loop.run_in_executor(None, self._s3_write, key, data, content_type)
+        return self.url_for(key)
+
+    async def store_file(
+        self,
+        key: str,
+        path: Path,
+        content_type: str = "application/octet-stream",
+    ) -> str:
+        """Save an asset from a file without reading it into memory; returns its URL"""
+        loop = asyncio.get_running_loop()
+        if self.local_path is not None:
+            target = self._local_file(key)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            await loop.run_in_executor(None, shutil.copyfile, path, target)
+        else:
+            await loop.run_in_executor(None, self._s3_upload, key, path, content_type)
+        return self.url_for(key)
+
+    def check_url(self, url: str):
+        """Reject anything but http(s) URLs on an allowed host
+
+        Keeps asset URLs in requests from reaching internal services.
+        """
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported asset URL: {url}")
+        if parsed.hostname not in self.fetch_hosts:
+            raise ValueError(f"Asset host not allowed: {parsed.hostname}")
+
+    def _local_file(self, key: str) -> Path:
+        if self.local_path is None:
+            raise ValueError("Local asset storage is not configured")
+        path = (self.local_path / key).resolve()
+        if self.local_path not in path.parents:
+            raise ValueError(f"Invalid asset key: {key}")
+        return path
+
+    def _client(self):
+        if self._s3 is None:
+            import boto3
+
+            self._s3 = boto3.client(
+                "s3",
+                region_name=settings.AWS_REGION,
+                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            )
+        return self._s3
+
+    def _s3_read(self, key: str) -> bytes:
+        from botocore.exceptions import ClientError
+
+        try:
+            response = self._client().get_object(Bucket=settings.S3_BUCKET, Key=key)
+        except ClientError as e:
+            raise ValueError(f"Asset not found: {key}") from e
+        if response["ContentLength"] > self.max_fetch_bytes:
+            raise ValueError(f"Asset exceeds {self.max_fetch_bytes} bytes: {key}")
+        return response["Body"].read()
+
+    def _s3_download(self, key: str, handle: IO[bytes]):
+        from botocore.exceptions import ClientError
+
+        try:
+            response = self._client().get_object(Bucket=settings.S3_BUCKET, Key=key)
+        except ClientError as e:
+            raise ValueError(f"Asset not found: {key}") from e
+        if response["ContentLength"] > self.max_fetch_bytes:
+            raise ValueError(f"Asset exceeds {self.max_fetch_bytes} bytes: {key}")
+        for chunk in response["Body"].iter_chunks(1 << 20):
+            handle.write(chunk)
+
+    def _s3_write(self, key: str, data: bytes, content_type: str):
+        self._client().put_object(
+            Bucket=settings.S3_BUCKET, Key=key, Body=data, ContentType=content_type
+        )
+
+    def _s3_upload(self, key: str, path: Path, content_type: str):
+        extra = {"ContentType": content_type}
+        self._client().upload_file(str(path), settings.S3_BUCKET, key, ExtraArgs=extra)
+
+    async def _download(self, url: str, handle: Optional[IO[bytes]] = None) -> bytes:
+        """Download an asset into memory, or into handle if given"""
+        import httpx
+
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            # Redirects are followed by hand so every target host is checked
+            for _ in range(MAX_REDIRECTS + 1):
+                self.check_url(url)
+                async with client.stream("GET", url) as response:
+                    if response.is_redirect:
+                        url = str(response.url.join(response.headers["location"]))
+                        continue
+                    status = response.status_code
+                    if status != 200:
+                        raise ValueError(f"Failed to fetch {url}: HTTP {status}")
+                    data = bytearray()
+                    size = 0
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size > self.max_fetch_bytes:
+                            limit = self.max_fetch_bytes
+                            raise ValueError(f"Asset exceeds {limit} bytes: {url}")
+                        if handle is not None:
+                            handle.write(chunk)
+                        else:
+                            data += chunk
+                    break
+            else:
+                raise ValueError(f"Too many redirects fetching {url}")
+        logger.info(f"Fetched {size} bytes from {url}")
+        return bytes(data)
+
+storage = AssetStorage()
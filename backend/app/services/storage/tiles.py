@@ -0,0 +1,387 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterator, NamedTuple, Optional, Sequence, Tuple, Union
+from app.core.config import settings
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import numpy as np
+
+# File layout: header, one index byte per tile, then fixed-size tile slots from
+# the first page boundary
+TILE_MAGIC = b"VVTILES1"
+TILE_HEADER = struct.Struct(">8sIIHHI4d")
+TILE_DTYPES: Dict[int, np.dtype] = {0: np.dtype(np.uint8), 1: np.dtype(np.float32)}
+
+# Tiles are square powers of two; at 64 texels and up every slot is a whole
+# number of pages
+MIN_TILE_SIZE = 64
+MAX_TILE_SIZE = 1024
+
+# Index states of a tile
+TILE_EMPTY = 0
+TILE_WRITTEN = 1
+
+class TileBox(NamedTuple):
+    """A tile and the texels it covers, clipped to the image"""
+
+    tx: int
+    ty: int
+    x0: int
+    y0: int
+    x1: int
+    y1: int
+
+class TileCache:
+    """Least recently used tiles of open tiled images, released past max_bytes
+
+    Tiles are views into memory-mapped files, so releasing one drops its
+    pages from the process (madvise DONTNEED); written texels stay in the
+    file's page cache and are read back on the next access. One cache is
+    shared by every image of a process, which bounds its resident texels
+    however many and however large the images.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.peak_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # (image id, tile) -> (image, tile bytes)
+        self._entries: "OrderedDict[Tuple[int, int], Tuple[TiledImage, int]]"
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def touch(self, image: "TiledImage", tile: int) -> None:
+        key = (id(image), tile)
+        released = []
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return
+            self.misses += 1
+            self._entries[key] = (image, image.tile_bytes)
+            self.bytes += image.tile_bytes
+            self.peak_bytes = max(self.peak_bytes, self.bytes)
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                (_, old), (owner, size) = self._entries.popitem(last=False)
+                self.bytes -= size
+                self.evictions += 1
+                released.append((owner, old))
+        for owner, old in released:
+            owner._release(old)
+
+    def forget(self, image: "TiledImage") -> None:
+        """Drop the tiles of an image being closed"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == id(image)]:
+                self.bytes -= self._entries.pop(key)[1]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "resident_bytes": self.bytes,
+                "peak_bytes": self.peak_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+class TiledImage:
+    """Image stored as fixed-size tiles in a memory-mapped file
+
+    An index in the file records which tiles were written. Tiles that were
+    never written are not stored (the file is sparse) and read as the fill
+    value, so a UV atlas only costs the charts it covers. Each tile is
+    contiguous, so reading or writing one touches only its own pages.
+    Several processes may open the same file and write disjoint tiles;
+    writes through the shared mapping are visible to all of them.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        writable: bool = False,
+        cache: Optional[TileCache] = None,
+    ):
+        self.path = Path(path)
+        self.writable = writable
+        self.cache = cache or tile_cache
+        self._file = open(self.path, "r+b" if writable else "rb")
+        try:
+            access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            self._map = mmap.mmap(self._file.fileno(), 0, access=access)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"Empty tiled image: {self.path}")
+        try:
+            header = TILE_HEADER.unpack_from(self._map, 0)
+            magic, width, height, channels, dtype, tile_size, *fill = header
+            if magic != TILE_MAGIC or dtype not in TILE_DTYPES:
+                raise ValueError(f"Not a tiled image: {self.path}")
+        except (struct.error, ValueError):
+            self.close()
+            raise ValueError(f"Not a tiled image: {self.path}")
+        self.width, self.height = width, height
+        self.channels, self.tile_size = channels, tile_size
+        self.dtype = TILE_DTYPES[dtype]
+        self.fill = np.asarray(fill[:channels], dtype=self.dtype)
+        self.tiles_x = -(-width // tile_size)
+        self.tiles_y = -(-height // tile_size)
+        self.tile_bytes = tile_size * tile_size * channels * self.dtype.itemsize
+        self._index: np.ndarray = np.ndarray(
+            (self.tiles_y, self.tiles_x),
+            dtype=np.uint8,
+            buffer=self._map,
+            offset=TILE_HEADER.size,
+        )
+        self._data = _data_offset(self.tiles_x * self.tiles_y)
+
+    @classmethod
+    def create(
+        cls,
+        path: Union[str, Path],
+        width: int,
+        height: int,
+        channels: int,
+        dtype: Any = np.uint8,
+        tile_size: Optional[int] = None,
+        fill: Sequence[float] = (0.0,),
+        cache: Optional[TileCache] = None,
+    ) -> "TiledImage":
+        """New tiled image with every tile unwritten
+
+        fill gives one value, or one per channel.
+        """
+        tile_size = tile_size or settings.TEXTURE_TILE_SIZE
+        in_range = MIN_TILE_SIZE <= tile_size <= MAX_TILE_SIZE
+        if not in_range or tile_size & (tile_size - 1):
+            raise ValueError(
+                "Tile size must be a power of two between "
+                f"{MIN_TILE_SIZE} and {MAX_TILE_SIZE}"
+            )
+        if width < 1 or height < 1 or not 1 <= channels <= 4:
+            raise ValueError("Tiled images need a positive size and 1 to 4 channels")
+        codes = {value: key for key, value in TILE_DTYPES.items()}
+        dtype = np.dtype(dtype)
+        if dtype not in codes:
+            raise ValueError("Tiled images hold uint8 or float32 texels")
+        fill = list(fill) if len(fill) > 1 else list(fill) * channels
+        tiles = -(-width // tile_size) * -(-height // tile_size)
+        tile_bytes = tile_size * tile_size * channels * dtype.itemsize
+        size = _data_offset(tiles) + tiles * tile_bytes
+        fill = fill + [0.0] * (4 - len(fill))
+        header = TILE_HEADER.pack(
+            TILE_MAGIC, width, height, channels, codes[dtype], tile_size, *fill
+        )
+        with open(path, "wb") as handle:
+            handle.write(header)
+            # Slots are allocated by the file system as tiles are written
+            handle.truncate(size)
+        return cls(path, writable=True, cache=cache)
+
+    def box(self, tx: int, ty: int) -> TileBox:
+        x0, y0 = tx * self.tile_size, ty * self.tile_size
+        x1 = min(x0 + self.tile_size, self.width)
+        y1 = min(y0 + self.tile_size, self.height)
+        return TileBox(tx, ty, x0, y0, x1, y1)
+
+    def tiles(
+        self,
+        region: Optional[Tuple[int, int, int, int]] = None,
+        written: Optional[bool] = None,
+    ) -> Iterator[TileBox]:
+        """Tiles overlapping region (x0, y0, x1, y1), row by row
+
+        written=True or False keeps only the tiles written or unwritten.
+        """
+        x0, y0, x1, y1 = region or (0, 0, self.width, self.height)
+        size = self.tile_size
+        rows = range(max(0, y0 // size), min(self.tiles_y, -(-y1 // size)))
+        columns = range(max(0, x0 // size), min(self.tiles_x, -(-x1 // size)))
+        for ty in rows:
+            for tx in columns:
+                if written is None or bool(self._index[ty, tx]) == written:
+                    yield self.box(tx, ty)
+
+    def written(self, tx: int, ty: int) -> bool:
+        return bool(self._index[ty, tx])
+
+    @property
+    def written_count(self) -> int:
+        return int(np.count_nonzero(self._index))
+
+    def _slot(self, tx: int, ty: int) -> np.ndarray:
+        tile = ty * self.tiles_x + tx
+        self.cache.touch(self, tile)
+        return np.ndarray(
+            (self.tile_size, self.tile_size, self.channels),
+            dtype=self.dtype,
+            buffer=self._map,
+            offset=self._data + tile * self.tile_bytes,
+        )
+
+    def _release(self, tile: int) -> None:
+        if not hasattr(self._map, "madvise"):
+            return
+        try:
+            start = self._data + tile * self.tile_bytes
+            self._map.madvise(mmap.MADV_DONTNEED, start, self.tile_bytes)
+        except ValueError:
+            # Closed by another thread since the cache let the tile go
+            pass
+
+    def read_tile(self, tx: int, ty: int) -> np.ndarray:
+        """Texels (h, w, C) of a tile, clipped to the image
+
+        A read-only view, or a copy of the fill value if the tile is unwritten.
+        """
+        box = self.box(tx, ty)
+        if not self._index[ty, tx]:
+            shape = (box.y1 - box.y0, box.x1 - box.x0, self.channels)
+            return np.broadcast_to(self.fill, shape).copy()
+        view = self._slot(tx, ty)[:box.y1 - box.y0, :box.x1 - box.x0]
+        view.flags.writeable = False
+        return view
+
+    def write_tile(self, tx: int, ty: int, texels: np.ndarray) -> None:
+        """Replace a whole tile; texels (h, w, C) cover it clipped to the image"""
+        if not self.writable:
+            raise ValueError(f"Tiled image is read-only: {self.path}")
+        box = self.box(tx, ty)
+        texels = np.asarray(texels)
+        if texels.ndim == 2:
+            texels = texels[:, :, None]
+        shape = (box.y1 - box.y0, box.x1 - box.x0, self.channels)
+        if texels.shape != shape:
+            raise ValueError(f"Tile ({tx}, {ty}) takes texels of shape {shape}")
+        self._slot(tx, ty)[:box.y1 - box.y0, :box.x1 - box.x0] = texels
+        self._index[ty, tx] = TILE_WRITTEN
+
+    def read(self, x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+        """Copy of the texels in [x0, x1) x [y0, y1), assembled from its tiles"""
+        if not (0 <= x0 <= x1 <= self.width and 0 <= y0 <= y1 <= self.height):
+            raise ValueError(
+                f"Region ({x0}, {y0}, {x1}, {y1}) is outside the "
+                f"{self.width}x{self.height} image"
+            )
+        region = np.empty((y1 - y0, x1 - x0, self.channels), dtype=self.dtype)
+        for box in self.tiles((x0, y0, x1, y1)):
+            in_tile, in_region = _overlap(box, x0, y0, x1, y1)
+            if self._index[box.ty, box.tx]:
+                region[in_region] = self._slot(box.tx, box.ty)[in_tile]
+            else:
+                region[in_region] = self.fill
+        return region
+
+    def write(self, x0: int, y0: int, texels: np.ndarray) -> None:
+        """Write texels (h, w, C) with their top left corner at (x0, y0)
+
+        Tiles the region only partly covers keep their other texels, or the
+        fill value if they were unwritten. Writers in other processes must
+        not share those tiles.
+        """
+        if not self.writable:
+            raise ValueError(f"Tiled image is read-only: {self.path}")
+        texels = np.asarray(texels)
+        if texels.ndim == 2:
+            texels = texels[:, :, None]
+        y1, x1 = y0 + texels.shape[0], x0 + texels.shape[1]
+        inside = 0 <= x0 <= x1 <= self.width and 0 <= y0 <= y1 <= self.height
+        if not inside or texels.shape[2] != self.channels:
+            raise ValueError(
+                f"Texels {texels.shape} at ({x0}, {y0}) do not fit the "
+                f"{self.width}x{self.height}x{self.channels} image"
+            )
+        for box in self.tiles((x0, y0, x1, y1)):
+            in_tile, in_region = _overlap(box, x0, y0, x1, y1)
+            tile = self._slot(box.tx, box.ty)
+            covered = x0 <= box.x0 and y0 <= box.y0 and x1 >= box.x1 and y1 >= box.y1
+            if not self._index[box.ty, box.tx] and not covered:
+                tile[...] = self.fill
+            tile[in_tile] = texels[in_region]
+            self._index[box.ty, box.tx] = TILE_WRITTEN
+
+    def flush(self) -> None:
+        if self.writable and not self._map.closed:
+            self._map.flush()
+
+    def close(self) -> None:
+        self.cache.forget(self)
+        if hasattr(self, "_index"):
+            del self._index
+        try:
+            self._map.close()
+        except BufferError:
+            # Tile views still held by callers keep the mapping until they are
+            # dropped
+            pass
+        self._file.close()
+
+    def __enter__(self) -> "TiledImage":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class TileRowReader:
+    """Rows of a tiled image from the top
+
+    Has the read(count) interface of PngBandReader.
+    """
+
+    def __init__(self, image: TiledImage):
+        self.image = image
+        self.width, self.height = image.width, image.height
+        self.channels = image.channels
+        self.row = 0
+
+    def read(self, count: int) -> np.ndarray:
+        count = max(0, min(count, self.height - self.row))
+        rows = self.image.read(0, self.row, self.width, self.row + count)
+        self.row += count
+        return rows
+
+    def close(self) -> None:
+        self.image.close()
+
+    def __enter__(self) -> "TileRowReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def _data_offset(tiles: int) -> int:
+    return -(-(TILE_HEADER.size + tiles) // mmap.PAGESIZE) * mmap.PAGESIZE
+
+def _overlap(
+    box: TileBox,
+    x0: int,
+    y0: int,
+    x1: int,
+    y1: int,
+) -> Tuple[Tuple[slice, slice], Tuple[slice, slice]]:
+    """Slices of a tile and of region (x0, y0, x1, y1) where the two overlap"""
+    ax0, ay0 = max(x0, box.x0), max(y0, box.y0)
+    ax1, ay1 = min(x1, box.x1), min(y1, box.y1)
+    in_tile = slice(ay0 - box.y0, ay1 - box.y0), slice(ax0 - box.x0, ax1 - box.x0)
+    in_region = slice(ay0 - y0, ay1 - y0), slice(ax0 - x0, ax1 - x0)
+    return in_tile, in_region
+
+def is_tiled_image(path: Union[str, Path]) -> bool:
+    with open(path, "rb") as handle:
+        return handle.read(len(TILE_MAGIC)) == TILE_MAGIC
+
+def tile_directory() -> str:
+    """Directory for working tiled images, created on first use"""
+    default = os.path.join(tempfile.gettempdir(), "voxelverve-tiles")
+    path = settings.TEXTURE_TILE_PATH or default
+    os.makedirs(path, exist_ok=True)
+    return path
+
+tile_cache = TileCache(settings.TEXTURE_TILE_CACHE_BYTES)
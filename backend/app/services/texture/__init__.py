@@ -0,0 +1,88 @@
+from .bake import (
+    BAKE_DEFAULTS,
+    BAKE_MAPS,
+    MAP_CHANNELS,
+    BakeSource,
+    bake_maps,
+    bake_options,
+    bake_pool,
+    bake_tiles,
+    dilate,
+    dilate_tiles,
+    rasterize_tile,
+    sample_texture,
+    source_from_glb,
+    source_from_mesh,
+    tile_triangles,
+)
+from .png import PngBandReader, PngBandWriter, png_to_tiles, tiles_to_png
+from .optimize import (
+    TEXTURE_FORMATS,
+    TEXTURE_PRESETS,
+    decode_texture,
+    downsample_tiles,
+    encode_texture,
+    load_texture,
+    map_kind,
+    resize_tiles,
+    target_size,
+    texture_encoder,
+    texture_levels,
+    texture_options,
+    write_texture,
+)
+from .pack import (
+    PACK_DEFAULTS,
+    PACKING_METHODS,
+    ChannelSource,
+    layout_textures,
+    material_textures,
+    pack_layout,
+    pack_material,
+    packing_map,
+)
+from .service import TextureService
+
+__all__ = [
+    "BAKE_DEFAULTS",
+    "BAKE_MAPS",
+    "MAP_CHANNELS",
+    "BakeSource",
+    "bake_maps",
+    "bake_options",
+    "bake_pool",
+    "bake_tiles",
+    "dilate",
+    "dilate_tiles",
+    "rasterize_tile",
+    "sample_texture",
+    "source_from_glb",
+    "source_from_mesh",
+    "tile_triangles",
+    "PngBandReader",
+    "PngBandWriter",
+    "png_to_tiles",
+    "tiles_to_png",
+    "TEXTURE_FORMATS",
+    "TEXTURE_PRESETS",
+    "decode_texture",
+    "downsample_tiles",
+    "encode_texture",
+    "load_texture",
+    "map_kind",
+    "resize_tiles",
+    "target_size",
+    "texture_encoder",
+    "texture_levels",
+    "texture_options",
+    "write_texture",
+    "PACK_DEFAULTS",
+    "PACKING_METHODS",
+    "ChannelSource",
+    "layout_textures",
+    "material_textures",
+    "pack_layout",
+    "pack_material",
+    "packing_map",
+    "TextureService",
+]
@@ -0,0 +1,779 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from app.core.config import settings
+from app.services.geometry.bvh import Bvh
+from app.services.geometry.gltf_reader import GltfAsset
+from app.services.geometry.mesh import Mesh, mesh_content_hash, widen_mesh
+from app.services.geometry.tangents import compute_tangents, vertex_normals
+from app.services.geometry.uv import attach_array, share_array
+from app.services.geometry.validation import bounding_diagonal
+from app.services.storage.tiles import TiledImage
+import hashlib
+import io
+import logging
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Maps the baker can produce, in the order they are reported
+BAKE_MAPS = ("normal", "ao", "albedo", "roughness", "metallic")
+
+# Channels of each map's image and the value of texels no surface covers
+MAP_CHANNELS = {"normal": 3, "ao": 1, "albedo": 4, "roughness": 1, "metallic": 1}
+MAP_BACKGROUND = {
+    "normal": (128, 128, 255),
+    "ao": (255,),
+    "albedo": (0, 0, 0, 0),
+    "roughness": (255,),
+    "metallic": (0,),
+}
+
+# Distances are relative to the bounding box diagonal of the low-poly mesh
+BAKE_DEFAULTS = {
+    "resolution": 1024,
+    "samples": 16,
+    "tile_size": 64,
+    "padding": 4,
+    "cage_distance": 0.01,
+    "ao_distance": 0.1,
+}
+MIN_RESOLUTION = 16
+MAX_RESOLUTION = 8192
+MAX_SAMPLES = 256
+MAX_PADDING = 64
+
+# Bake tiles are the tiles of the output images, so each is written whole by one worker
+MIN_TILE_SIZE = 64
+MAX_TILE_SIZE = 512
+
+# Surface of primitives without a material, and of meshes in formats without
+# materials: a rough dielectric as base color RGBA, metallic and roughness
+DEFAULT_MATERIAL = (1.0, 1.0, 1.0, 1.0, 0.0, 1.0)
+
+# Ambient occlusion rays start this far (relative to the diagonal) off the surface
+RAY_OFFSET = 1e-5
+
+# Pool tasks per worker, so a few slow tiles do not leave the other workers idle
+TASKS_PER_WORKER = 4
+
+# Bvh arrays, in constructor order, as shared with the pool workers
+BVH_ARRAYS = ("vertices", "faces", "low", "high", "child", "start", "count", "order")
+
+class BakeSource(NamedTuple):
+    """High-poly surface with the material properties the baker transfers"""
+
+    mesh: Mesh  # with normals, and UVs if any material is textured
+    face_materials: np.ndarray  # (F,) material index of every face
+    materials: np.ndarray  # (M, 6) linear base color RGBA, metallic and roughness
+    # (M, 2) image index of the base color and metallic-roughness textures, or -1
+    textures: np.ndarray
+    images: List[np.ndarray]  # (H, W, 4) uint8 texture images
+    content_hash: str
+
+def bake_options(
+    maps: Sequence[str],
+    options: Optional[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """Validated maps and bake options, falling back to BAKE_DEFAULTS"""
+    options = options or {}
+    unknown = [name for name in maps if name not in BAKE_MAPS]
+    if unknown or not maps:
+        raise ValueError(
+            f"textures must be a non-empty list of: {', '.join(BAKE_MAPS)}"
+        )
+    values = dict(BAKE_DEFAULTS)
+    for key in BAKE_DEFAULTS:
+        if options.get(key) is not None:
+            values[key] = options[key]
+    try:
+        result: Dict[str, Any] = {
+            "resolution": int(values["resolution"]),
+            "samples": int(values["samples"]),
+            "tile_size": int(values["tile_size"]),
+            "padding": int(values["padding"]),
+            "cage_distance": float(values["cage_distance"]),
+            "ao_distance": float(values["ao_distance"]),
+        }
+    except (TypeError, ValueError):
+        raise ValueError(
+            "resolution, samples, tile_size and padding must be integers "
+            "and distances numbers"
+        )
+    if not MIN_RESOLUTION <= result["resolution"] <= MAX_RESOLUTION:
+        raise ValueError(
+            f"resolution must be between {MIN_RESOLUTION} and {MAX_RESOLUTION}"
+        )
+    if not 1 <= result["samples"] <= MAX_SAMPLES:
+        raise ValueError(f"samples must be between 1 and {MAX_SAMPLES}")
+    tile_size = result["tile_size"]
+    if not MIN_TILE_SIZE <= tile_size <= MAX_TILE_SIZE or tile_size & (tile_size - 1):
+        raise ValueError(
+            "tile_size must be a power of two between "
+            f"{MIN_TILE_SIZE} and {MAX_TILE_SIZE}"
+        )
+    if not 0 <= result["padding"] <= MAX_PADDING:
+        raise ValueError(f"padding must be between 0 and {MAX_PADDING}")
+    if not result["cage_distance"] > 0 or not result["ao_distance"] > 0:
+        raise ValueError("cage_distance and ao_distance must be positive")
+    result["maps"] = [name for name in BAKE_MAPS if name in maps]
+    return result
+
+def _decode_image(data: bytes) -> np.ndarray:
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        return np.asarray(image.convert("RGBA"), dtype=np.uint8)
+
+def source_from_glb(asset: GltfAsset) -> BakeSource:
+    """High-poly mesh and materials of a GLB, with the textures they use decoded
+
+    Textures are read through TEXCOORD_0; a texture bound to another UV set
+    is ignored in favour of its factors.
+    """
+    mesh = widen_mesh(asset.mesh(("uvs", "normals")))
+    document = asset.document
+    materials, textures = [], []
+    images: List[np.ndarray] = []
+    image_slots: Dict[int, int] = {}
+    hasher = hashlib.sha256(mesh_content_hash(mesh).encode("utf-8"))
+
+    def texture_image(reference: Optional[Dict[str, Any]]) -> int:
+        if not reference or reference.get("texCoord", 0) != 0 or mesh.uvs is None:
+            return -1
+        source = document.get("textures", [])[reference["index"]].get("source")
+        if source is None:
+            return -1
+        if source not in image_slots:
+            data = asset.image_data(source)
+            hasher.update(hashlib.sha256(data).digest())
+            image_slots[source] = len(images)
+            images.append(_decode_image(data))
+        return image_slots[source]
+
+    for material in document.get("materials", []):
+        pbr = material.get("pbrMetallicRoughness", {})
+        materials.append([
+            *pbr.get("baseColorFactor", (1.0, 1.0, 1.0, 1.0)),
+            pbr.get("metallicFactor", 1.0),
+            pbr.get("roughnessFactor", 1.0),
+        ])
+        textures.append([
+            texture_image(pbr.get("baseColorTexture")),
+            texture_image(pbr.get("metallicRoughnessTexture")),
+        ])
+    materials.append(list(DEFAULT_MATERIAL))
+    textures.append([-1, -1])
+    hasher.update(np.asarray(materials, dtype=np.float64).tobytes())
+
+    # Faces come in primitive order, as GltfAsset.mesh flattens them
+    accessors = document.get("accessors", [])
+    parts = []
+    for primitive, _ in asset.primitives():
+        if "POSITION" not in primitive["attributes"]:
+            continue
+        if "indices" in primitive:
+            count = accessors[primitive["indices"]]["count"] // 3
+        else:
+            count = accessors[primitive["attributes"]["POSITION"]]["count"] // 3
+        material = primitive.get("material", len(materials) - 1)
+        parts.append(np.full(count, material, dtype=np.int64))
+    face_materials = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+    if mesh.normals is None:
+        mesh = mesh._replace(normals=vertex_normals(mesh.vertices, mesh.faces))
+    return BakeSource(
+        mesh,
+        face_materials,
+        np.asarray(materials, dtype=np.float64),
+        np.asarray(textures, dtype=np.int64),
+        images,
+        hasher.hexdigest(),
+    )
+
+def source_from_mesh(mesh: Mesh) -> BakeSource:
+    """High-poly source for a mesh without materials"""
+    mesh = widen_mesh(mesh)
+    normals = mesh.normals
+    if normals is None:
+        normals = vertex_normals(mesh.vertices, mesh.faces)
+    return BakeSource(
+        Mesh(mesh.vertices, mesh.faces, uvs=mesh.uvs, normals=normals),
+        np.zeros(len(mesh.faces), dtype=np.int64),
+        np.asarray([DEFAULT_MATERIAL], dtype=np.float64),
+        np.full((1, 2), -1, dtype=np.int64),
+        [],
+        mesh_content_hash(mesh),
+    )
+
+def tile_triangles(
+    uvs: np.ndarray,
+    faces: np.ndarray,
+    resolution: int,
+    tile_size: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Triangles whose UV bounds reach the texel centers of each tile
+
+    Returned as CSR offsets and triangle indices. Tiles are numbered row by
+    row from the top of the image.
+    """
+    texels = _texel_coordinates(uvs[faces], resolution)
+    # Texel x covers centers x + 0.5 inside [min, max]
+    lowest, highest = texels.min(axis=1), texels.max(axis=1)
+    low = np.clip(np.ceil(lowest - 0.5), 0, resolution - 1).astype(np.int64)
+    high = np.clip(np.floor(highest - 0.5), -1, resolution - 1).astype(np.int64)
+    valid = (high >= low).all(axis=1) & (highest >= 0.5).all(axis=1)
+    valid &= (lowest <= resolution - 0.5).all(axis=1)
+    triangles = np.flatnonzero(valid)
+    low_tile, high_tile = low[valid] // tile_size, high[valid] // tile_size
+    spans = high_tile - low_tile + 1
+    counts = spans.prod(axis=1)
+    owner = np.repeat(np.arange(len(triangles)), counts)
+    offset = np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+    span = spans[owner]
+    tiles_per_row = -(-resolution // tile_size)
+    tile_x = low_tile[owner, 0] + offset % span[:, 0]
+    tile_y = low_tile[owner, 1] + offset // span[:, 0]
+    tile = tile_y * tiles_per_row + tile_x
+    order = np.argsort(tile, kind="stable")
+    offsets = np.searchsorted(tile[order], np.arange(tiles_per_row * tiles_per_row + 1))
+    return offsets, triangles[owner[order]]
+
+def _texel_coordinates(uv: np.ndarray, resolution: int) -> np.ndarray:
+    """UVs (V up) to continuous texel coordinates (x right, y down)"""
+    texels = np.empty(uv.shape, dtype=np.float64)
+    texels[..., 0] = uv[..., 0] * resolution
+    texels[..., 1] = (1.0 - uv[..., 1]) * resolution
+    return texels
+
+def rasterize_tile(
+    corners: np.ndarray,
+    low: Tuple[int, int],
+    high: Tuple[int, int],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Texels of a tile whose centers lie in one of the (K, 3, 2) texel-space triangles
+
+    Returns the texel x, y, the triangle covering it (the first one where
+    several overlap) and its barycentric weights.
+    """
+    x0, y0 = low
+    x1, y1 = high
+    lower = np.maximum(np.ceil(corners.min(axis=1) - 0.5), (x0, y0)).astype(np.int64)
+    upper = np.minimum(np.floor(corners.max(axis=1) - 0.5), (x1 - 1, y1 - 1))
+    upper = upper.astype(np.int64)
+    spans = np.maximum(upper - lower + 1, 0)
+    counts = spans.prod(axis=1)
+    triangle = np.repeat(np.arange(len(corners)), counts)
+    offset = np.arange(len(triangle)) - np.repeat(np.cumsum(counts) - counts, counts)
+    x = lower[triangle, 0] + offset % np.maximum(spans[triangle, 0], 1)
+    y = lower[triangle, 1] + offset // np.maximum(spans[triangle, 0], 1)
+
+    a, b, c = corners[triangle, 0], corners[triangle, 1], corners[triangle, 2]
+    px, py = x + 0.5, y + 0.5
+    (ax, ay), (bx, by), (cx, cy) = a.T, b.T, c.T
+    area = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        w1 = ((px - ax) * (cy - ay) - (py - ay) * (cx - ax)) / area
+        w2 = ((bx - ax) * (py - ay) - (by - ay) * (px - ax)) / area
+    w0 = 1.0 - w1 - w2
+    tolerance = -1e-9
+    inside = (area != 0) & (w0 >= tolerance) & (w1 >= tolerance) & (w2 >= tolerance)
+    x, y, triangle = x[inside], y[inside], triangle[inside]
+    weights = np.stack([w0[inside], w1[inside], w2[inside]], axis=1)
+
+    # Keep the lowest triangle index on texels covered more than once
+    key = (y - y0) * (x1 - x0) + (x - x0)
+    order = np.lexsort((triangle, key))
+    if len(order):
+        order = order[np.r_[True, key[order][1:] != key[order][:-1]]]
+    return x[order], y[order], triangle[order], weights[order]
+
+def _interpolate(
+    values: np.ndarray,
+    corners: np.ndarray,
+    weights: np.ndarray,
+) -> np.ndarray:
+    return np.einsum("nk,nkd->nd", weights, values[corners])
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    lengths = np.maximum(np.linalg.norm(vectors, axis=1), np.finfo(np.float64).tiny)
+    return vectors / lengths[:, None]
+
+def _to_uint8(values: np.ndarray) -> np.ndarray:
+    """Values in [0, 1] as 8-bit texels"""
+    return np.rint(np.clip(values, 0.0, 1.0) * 255.0).astype(np.uint8)
+
+def srgb_to_linear(values: np.ndarray) -> np.ndarray:
+    """sRGB-encoded values in [0, 1] to linear light"""
+    curve = ((values + 0.055) / 1.055) ** 2.4
+    return np.where(values <= 0.04045, values / 12.92, curve)
+
+def linear_to_srgb(values: np.ndarray) -> np.ndarray:
+    """Linear values to sRGB encoding, clipped to [0, 1]"""
+    values = np.clip(values, 0.0, 1.0)
+    curve = 1.055 * values ** (1.0 / 2.4) - 0.055
+    return np.where(values <= 0.0031308, values * 12.92, curve)
+
+def sample_texture(image: np.ndarray, uv: np.ndarray) -> np.ndarray:
+    """Bilinear samples (N, 4) in [0, 1] of a repeating (H, W, 4) image
+
+    UVs have V pointing up.
+    """
+    height, width = image.shape[:2]
+    x = uv[:, 0] * width - 0.5
+    y = (1.0 - uv[:, 1]) * height - 0.5
+    x0, y0 = np.floor(x), np.floor(y)
+    fx, fy = (x - x0)[:, None], (y - y0)[:, None]
+    x0, y0 = x0.astype(np.int64), y0.astype(np.int64)
+    xs = (np.mod(x0, width), np.mod(x0 + 1, width))
+    ys = (np.mod(y0, height), np.mod(y0 + 1, height))
+    top = image[ys[0], xs[0]] * (1.0 - fx) + image[ys[0], xs[1]] * fx
+    bottom = image[ys[1], xs[0]] * (1.0 - fx) + image[ys[1], xs[1]] * fx
+    return (top * (1.0 - fy) + bottom * fy) / 255.0
+
+def _orthonormal_basis(normals: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Two unit vectors perpendicular to each unit normal (Duff et al. 2017)"""
+    sign = np.where(normals[:, 2] >= 0.0, 1.0, -1.0)
+    a = -1.0 / (sign + normals[:, 2])
+    b = normals[:, 0] * normals[:, 1] * a
+    x, y = normals[:, 0], normals[:, 1]
+    first = np.stack([1.0 + sign * x ** 2 * a, sign * b, -sign * x], axis=1)
+    second = np.stack([b, sign + y ** 2 * a, -y], axis=1)
+    return first, second
+
+def _hemisphere_directions(
+    normals: np.ndarray,
+    x: np.ndarray,
+    y: np.ndarray,
+    samples: int,
+) -> np.ndarray:
+    """(N, samples, 3) cosine-weighted directions about each normal
+
+    A Fibonacci spiral over the disk, rotated by a hash of the texel so
+    neighbouring texels do not share a banding pattern.
+    """
+    k = np.arange(samples)
+    radius = np.sqrt((k + 0.5) / samples)
+    height = np.sqrt(1.0 - radius * radius)
+    hashed = ((x * 73856093) ^ (y * 19349663)) & 0xFFFF
+    angle = 2.0 * np.pi * (k * 0.6180339887498949 + hashed[:, None] / 65536.0)
+    first, second = _orthonormal_basis(normals)
+    return (
+        (radius * np.cos(angle))[:, :, None] * first[:, None, :]
+        + (radius * np.sin(angle))[:, :, None] * second[:, None, :]
+        + height[None, :, None] * normals[:, None, :]
+    )
+
+def bake_tiles(
+    arrays: Dict[str, np.ndarray],
+    outputs: Dict[str, TiledImage],
+    tiles: Sequence[int],
+    config: Dict[str, Any],
+) -> Dict[str, float]:
+    """Bake a set of tiles from the inputs in arrays into the tiled output images
+
+    Each texel's low-poly surface point casts a ray back along its normal
+    from the cage; the maps are shaded at the closest high-poly hit.
+    Texels whose ray misses are left for dilation. A tile is shaded into
+    its own buffers and written once; tiles no ray hits stay unwritten.
+    Returns the seconds spent per stage and map, and the texels covered
+    and missed.
+    """
+    resolution, tile_size = config["resolution"], config["tile_size"]
+    tiles_per_row = -(-resolution // tile_size)
+    maps = config["maps"]
+    bvh = Bvh(*(arrays[f"bvh_{name}"] for name in BVH_ARRAYS))
+    low_faces, low_uvs = arrays["low_faces"], arrays["low_uvs"]
+    high_faces = bvh.faces
+    timings = dict.fromkeys(("raster", "trace", "write", *maps), 0.0)
+    timings.update(texels=0, missed_texels=0)
+
+    for tile in tiles:
+        started = time.perf_counter()
+        tile_y, tile_x = divmod(int(tile), tiles_per_row)
+        low = (tile_x * tile_size, tile_y * tile_size)
+        high = tuple(min(start + tile_size, resolution) for start in low)
+        begin, end = arrays["tile_offsets"][tile:tile + 2]
+        candidates = arrays["tile_triangles"][begin:end]
+        corners = _texel_coordinates(low_uvs[low_faces[candidates]], resolution)
+        x, y, triangle, weights = rasterize_tile(corners, low, high)
+        faces = low_faces[candidates[triangle]]
+        position = _interpolate(arrays["low_vertices"], faces, weights)
+        normal = _normalized(_interpolate(arrays["low_normals"], faces, weights))
+        tangent = _interpolate(arrays["low_tangents"][:, :3], faces, weights)
+        tangent -= normal * np.einsum("ij,ij->i", tangent, normal)[:, None]
+        tangent = _normalized(tangent)
+        sign = _interpolate(arrays["low_tangents"][:, 3:], faces, weights)[:, 0]
+        handedness = np.where(sign < 0, -1.0, 1.0)
+        bitangent = np.cross(normal, tangent) * handedness[:, None]
+        timings["raster"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        cage = config["cage_distance"]
+        hits = bvh.intersect(position + normal * cage, -normal, 0.0, 2.0 * cage)
+        hit = hits.triangles >= 0
+        timings["texels"] += int(hit.sum())
+        timings["missed_texels"] += int((~hit).sum())
+        x, y = x[hit], y[hit]
+        normal, tangent, bitangent = normal[hit], tangent[hit], bitangent[hit]
+        source = hits.triangles[hit]
+        source_faces = high_faces[source]
+        barycentrics = hits.barycentrics[hit]
+        source_weights = np.c_[1.0 - barycentrics.sum(axis=1), barycentrics]
+        point = position[hit] - normal * (hits.distances[hit] - cage)[:, None]
+        shading = _interpolate(arrays["high_normals"], source_faces, source_weights)
+        shading = _normalized(shading)
+        timings["trace"] += time.perf_counter() - started
+        if not len(x):
+            continue
+        row, column = y - low[1], x - low[0]
+        shape = (high[1] - low[1], high[0] - low[0])
+        covered = np.zeros((*shape, 1), dtype=np.uint8)
+        covered[row, column] = 1
+        buffers = {}
+        for name in maps:
+            buffers[name] = np.empty((*shape, MAP_CHANNELS[name]), dtype=np.uint8)
+            buffers[name][...] = MAP_BACKGROUND[name]
+
+        if "normal" in maps:
+            started = time.perf_counter()
+            local = _normalized(np.stack([
+                np.einsum("ij,ij->i", shading, tangent),
+                np.einsum("ij,ij->i", shading, bitangent),
+                np.einsum("ij,ij->i", shading, normal),
+            ], axis=1))
+            buffers["normal"][row, column] = _to_uint8(local * 0.5 + 0.5)
+            timings["normal"] += time.perf_counter() - started
+
+        if "ao" in maps:
+            started = time.perf_counter()
+            # Offset along the side of the hit triangle facing the cage
+            vertices = bvh.vertices[source_faces]
+            edge1 = vertices[:, 1] - vertices[:, 0]
+            edge2 = vertices[:, 2] - vertices[:, 0]
+            geometric = _normalized(np.cross(edge1, edge2))
+            backward = np.einsum("ij,ij->i", geometric, normal) < 0
+            geometric *= np.where(backward, -1.0, 1.0)[:, None]
+            backward = np.einsum("ij,ij->i", shading, geometric) < 0
+            facing = shading * np.where(backward, -1.0, 1.0)[:, None]
+            samples = config["samples"]
+            directions = _hemisphere_directions(facing, x, y, samples).reshape(-1, 3)
+            offset = config["ray_offset"]
+            origins = np.repeat(point + geometric * offset, samples, axis=0)
+            blocked = bvh.occluded(origins, directions, offset, config["ao_distance"])
+            blocked = blocked.reshape(-1, samples)
+            buffers["ao"][row, column, 0] = _to_uint8(1.0 - blocked.mean(axis=1))
+            timings["ao"] += time.perf_counter() - started
+
+        surface = [name for name in ("albedo", "roughness", "metallic") if name in maps]
+        if surface:
+            material = arrays["face_materials"][source]
+            factors = arrays["materials"][material]
+            base_color = factors[:, :4].copy()
+            metallic_roughness = factors[:, 4:6].copy()
+            for index in np.unique(material):
+                base_image, mr_image = arrays["textures"][index]
+                if base_image < 0 and mr_image < 0:
+                    continue
+                started = time.perf_counter()
+                rows = np.flatnonzero(material == index)
+                hit_faces, hit_weights = source_faces[rows], source_weights[rows]
+                uv = _interpolate(arrays["high_uvs"], hit_faces, hit_weights)
+                if base_image >= 0 and "albedo" in maps:
+                    sampled = sample_texture(arrays[f"image_{base_image}"], uv)
+                    base_color[rows, :3] *= srgb_to_linear(sampled[:, :3])
+                    base_color[rows, 3] *= sampled[:, 3]
+                if mr_image >= 0 and ("roughness" in maps or "metallic" in maps):
+                    sampled = sample_texture(arrays[f"image_{mr_image}"], uv)
+                    # glTF keeps roughness in green and metalness in blue
+                    metallic_roughness[rows, 0] *= sampled[:, 2]
+                    metallic_roughness[rows, 1] *= sampled[:, 1]
+                elapsed = (time.perf_counter() - started) / len(surface)
+                for name in surface:
+                    timings[name] += elapsed
+            started = time.perf_counter()
+            if "albedo" in maps:
+                alpha = np.clip(base_color[:, 3], 0.0, 1.0)
+                color = np.c_[linear_to_srgb(base_color[:, :3]), alpha]
+                buffers["albedo"][row, column] = np.rint(color * 255.0).astype(np.uint8)
+            if "roughness" in maps:
+                roughness = metallic_roughness[:, 1]
+                buffers["roughness"][row, column, 0] = _to_uint8(roughness)
+            if "metallic" in maps:
+                metallic = metallic_roughness[:, 0]
+                buffers["metallic"][row, column, 0] = _to_uint8(metallic)
+            elapsed = (time.perf_counter() - started) / len(surface)
+            for name in surface:
+                timings[name] += elapsed
+
+        started = time.perf_counter()
+        for name in maps:
+            outputs[f"map_{name}"].write_tile(tile_x, tile_y, buffers[name])
+        outputs["covered"].write_tile(tile_x, tile_y, covered)
+        timings["write"] += time.perf_counter() - started
+    return timings
+
+def _bake_task(
+    specs: Dict[str, Tuple[str, Tuple[int, ...], str]],
+    paths: Dict[str, str],
+    tiles: List[int],
+    config: Dict[str, Any],
+) -> Dict[str, float]:
+    """Pool task: bake tiles from the shared arrays into the tiled images at paths"""
+    blocks, arrays, outputs = [], {}, {}
+    try:
+        for name, spec in specs.items():
+            memory, arrays[name] = attach_array(spec)
+            blocks.append(memory)
+        for name, path in paths.items():
+            outputs[name] = TiledImage(path, writable=True)
+        return bake_tiles(arrays, outputs, tiles, config)
+    finally:
+        arrays.clear()
+        for memory in blocks:
+            memory.close()
+        for image in outputs.values():
+            image.close()
+
+def dilate(image: np.ndarray, covered: np.ndarray, iterations: int) -> None:
+    """Grow the covered texels of an image outwards in place
+
+    Filtering across chart borders then stays in the chart. Each pass sets
+    every uncovered texel next to a covered one to the mean of its covered
+    neighbours.
+    """
+    height, width = covered.shape
+    covered = covered.copy()
+    offsets = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy or dx]
+    for _ in range(iterations):
+        padded = np.pad(covered, 1)
+        near = np.zeros_like(covered)
+        for dy, dx in offsets:
+            near |= padded[1 + dy:1 + dy + height, 1 + dx:1 + dx + width]
+        ys, xs = np.nonzero(near & ~covered)
+        if not len(ys):
+            return
+        total = np.zeros((len(ys), image.shape[2]))
+        count = np.zeros(len(ys))
+        for dy, dx in offsets:
+            ny, nx = ys + dy, xs + dx
+            inside = (ny >= 0) & (ny < height) & (nx >= 0) & (nx < width)
+            valid = np.zeros(len(ys), dtype=bool)
+            valid[inside] = covered[ny[inside], nx[inside]]
+            total[valid] += image[ny[valid], nx[valid]]
+            count += valid
+        image[ys, xs] = np.rint(total / count[:, None]).astype(image.dtype)
+        covered[ys, xs] = True
+
+def dilate_tiles(image: TiledImage, covered: TiledImage, iterations: int) -> int:
+    """Dilate a tiled image tile by tile
+
+    Each tile is read with a border as wide as the dilation. A texel moves
+    at most one texel per pass, so a tile dilated with that border matches
+    dilating the whole image. Tiles fully covered, or with no covered texel
+    within reach, are not read. Returns the tiles dilated.
+    """
+    if iterations <= 0:
+        return 0
+    dilated = 0
+    for box in image.tiles():
+        region = (
+            max(0, box.x0 - iterations),
+            max(0, box.y0 - iterations),
+            min(image.width, box.x1 + iterations),
+            min(image.height, box.y1 + iterations),
+        )
+        if next(covered.tiles(region, written=True), None) is None:
+            continue
+        mask = covered.read(*region)[:, :, 0] > 0
+        left, top = region[0], region[1]
+        inner = slice(box.y0 - top, box.y1 - top), slice(box.x0 - left, box.x1 - left)
+        if mask[inner].all() or not mask.any():
+            continue
+        # Texels are only read once covered, so tiles already dilated in place do
+        # not leak into their neighbours
+        texels = image.read(*region)
+        dilate(texels, mask, iterations)
+        image.write(box.x0, box.y0, texels[inner])
+        dilated += 1
+    return dilated
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def bake_pool() -> ProcessPoolExecutor:
+    """Process pool for baking tiles, created on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned workers do not inherit the server's threads or sockets
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.TEXTURE_BAKE_WORKERS,
+                mp_context=get_context("spawn"),
+            )
+        return _pool
+
+def _tile_batches(offsets: np.ndarray, tasks: int) -> List[List[int]]:
+    """Tiles with triangles, dealt into batches of similar counts, heaviest first"""
+    sizes = np.diff(offsets)
+    tiles = np.flatnonzero(sizes)
+    batches: List[List[int]] = [[] for _ in range(max(1, min(tasks, len(tiles))))]
+    load = np.zeros(len(batches))
+    for tile in tiles[np.argsort(-sizes[tiles], kind="stable")]:
+        lightest = int(np.argmin(load))
+        batches[lightest].append(int(tile))
+        load[lightest] += sizes[tile]
+    return [batch for batch in batches if batch]
+
+def bake_maps(
+    mesh: Mesh,
+    source: BakeSource,
+    bvh: Bvh,
+    options: Dict[str, Any],
+    directory: Path,
+    pool: Optional[Executor] = None,
+) -> Tuple[Dict[str, TiledImage], Dict[str, Any]]:
+    """Bake maps of the high-poly source into the UV layout of a low-poly mesh
+
+    The texture is cut into tiles; batches of tiles run as pool tasks that
+    read the meshes and BVH from shared memory and write their tiles into
+    tiled images in directory, so no process holds a whole map. Returns
+    the open tiled images by map name, for the caller to close, and bake
+    stats.
+    """
+    started = time.perf_counter()
+    mesh = widen_mesh(mesh)
+    if mesh.uvs is None:
+        raise ValueError("Mesh has no UVs; unwrap it before baking")
+    if not mesh.triangle_count or not source.mesh.triangle_count:
+        raise ValueError("Mesh has no triangles to bake")
+    resolution, tile_size = options["resolution"], options["tile_size"]
+    maps = options["maps"]
+    normals = mesh.normals
+    if normals is None:
+        normals = vertex_normals(mesh.vertices, mesh.faces)
+    tangents = mesh.tangents
+    if tangents is None:
+        tangents, _ = compute_tangents(mesh._replace(normals=normals))
+    diagonal = max(bounding_diagonal(mesh.vertices), float(np.finfo(np.float64).tiny))
+    config = {
+        "resolution": resolution,
+        "tile_size": tile_size,
+        "maps": maps,
+        "samples": options["samples"],
+        "cage_distance": options["cage_distance"] * diagonal,
+        "ao_distance": options["ao_distance"] * diagonal,
+        "ray_offset": RAY_OFFSET * diagonal,
+    }
+    offsets, triangles = tile_triangles(mesh.uvs, mesh.faces, resolution, tile_size)
+
+    high = source.mesh
+    high_uvs = high.uvs if high.uvs is not None else np.zeros((len(high.vertices), 2))
+    inputs = {
+        "low_vertices": np.asarray(mesh.vertices, dtype=np.float64),
+        "low_faces": np.asarray(mesh.faces, dtype=np.int64),
+        "low_uvs": np.asarray(mesh.uvs, dtype=np.float64),
+        "low_normals": np.asarray(normals, dtype=np.float64),
+        "low_tangents": np.asarray(tangents, dtype=np.float64),
+        "high_normals": np.asarray(high.normals, dtype=np.float64),
+        "high_uvs": np.asarray(high_uvs, dtype=np.float64),
+        "face_materials": source.face_materials,
+        "materials": source.materials,
+        "textures": source.textures,
+        "tile_offsets": offsets,
+        "tile_triangles": triangles,
+        **{f"bvh_{name}": getattr(bvh, name) for name in BVH_ARRAYS},
+        **{f"image_{index}": image for index, image in enumerate(source.images)},
+    }
+    path = directory / "covered.tiles"
+    covered = TiledImage.create(path, resolution, resolution, 1, np.uint8, tile_size)
+    outputs = {"covered": covered}
+    try:
+        for name in maps:
+            outputs[f"map_{name}"] = TiledImage.create(
+                directory / f"{name}.tiles",
+                resolution,
+                resolution,
+                MAP_CHANNELS[name],
+                np.uint8,
+                tile_size,
+                MAP_BACKGROUND[name],
+            )
+
+        workers = getattr(pool, "_max_workers", 1) if pool is not None else 1
+        batches = _tile_batches(offsets, TASKS_PER_WORKER * workers)
+        if pool is None or len(batches) < 2:
+            results = [bake_tiles(inputs, outputs, batch, config) for batch in batches]
+        else:
+            blocks, specs = [], {}
+            try:
+                for name, array in inputs.items():
+                    memory, specs[name] = share_array(array)
+                    blocks.append(memory)
+                paths = {name: str(image.path) for name, image in outputs.items()}
+                futures = [
+                    pool.submit(_bake_task, specs, paths, batch, config)
+                    for batch in batches
+                ]
+                results = [future.result() for future in futures]
+            finally:
+                for memory in blocks:
+                    memory.close()
+                    memory.unlink()
+
+        keys = ("raster", "trace", "write", *maps, "texels", "missed_texels")
+        timings = {key: sum(result[key] for result in results) for key in keys}
+        dilate_started = time.perf_counter()
+        padding = options["padding"]
+        dilated = sum(
+            dilate_tiles(outputs[f"map_{name}"], covered, padding) for name in maps
+        )
+        dilate_seconds = time.perf_counter() - dilate_started
+        stored = outputs["covered"].written_count
+    except Exception:
+        for image in outputs.values():
+            image.close()
+        raise
+    outputs.pop("covered").close()
+    images = {name: outputs[f"map_{name}"] for name in maps}
+
+    seconds = time.perf_counter() - started
+    texels = int(timings["texels"])
+    # Rasterizing and tracing serve every map, so each map's time includes an equal
+    # share of them
+    shared = timings["raster"] + timings["trace"] + timings["write"] + dilate_seconds
+    shared /= len(maps)
+    worker_seconds = {name: timings[name] + shared for name in maps}
+    # Maps bake together, so each gets the wall-clock share its worker time took
+    total = max(sum(worker_seconds.values()), 1e-9)
+    map_seconds = {name: seconds * worker_seconds[name] / total for name in maps}
+    stats = {
+        "resolution": resolution,
+        "samples": options["samples"],
+        "tile_size": tile_size,
+        "tiles": sum(len(batch) for batch in batches),
+        "stored_tiles": stored,
+        "dilated_tiles": dilated,
+        "workers": workers if pool is not None and len(batches) > 1 else 1,
+        "texels": texels,
+        "missed_texels": int(timings["missed_texels"]),
+        "coverage": texels / float(resolution * resolution),
+        "raster_seconds": timings["raster"],
+        "trace_seconds": timings["trace"],
+        "write_seconds": timings["write"],
+        "dilate_seconds": dilate_seconds,
+        "maps": {
+            name: {
+                "seconds": map_seconds[name],
+                "worker_seconds": worker_seconds[name],
+                "texels_per_second": texels / max(map_seconds[name], 1e-9),
+            }
+            for name in maps
+        },
+        "seconds": seconds,
+        "texels_per_second": texels * len(maps) / max(seconds, 1e-9),
+    }
+    return images, stats
@@ -0,0 +1,362 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+from app.core.config import settings
+from app.services.storage.tiles import TiledImage
+from app.services.texture.bake import linear_to_srgb, srgb_to_linear
+from app.services.texture.png import PNG_SIGNATURE, png_to_tiles, tiles_to_png
+import io
+import math
+import threading
+import numpy as np
+
+# Largest side, encoding and mip chain per target; quality is WebP quality in (0, 1]
+TEXTURE_PRESETS = {
+    "web": {"max_size": 2048, "format": "webp", "quality": 0.85, "mipmaps": True},
+    "mobile": {"max_size": 1024, "format": "webp", "quality": 0.75, "mipmaps": True},
+    "desktop": {"max_size": 4096, "format": "png", "quality": 1.0, "mipmaps": True},
+}
+TEXTURE_FORMATS = {"webp": "image/webp", "png": "image/png"}
+MAX_TEXTURE_SIZE = 16384
+
+# Color maps are filtered in linear light with premultiplied alpha, normal maps
+# as unit vectors, others as plain data
+COLOR_MAPS = ("albedo", "base_color", "basecolor", "diffuse", "emissive")
+NORMAL_MAPS = ("normal",)
+
+# Normal maps lose their directions under lossy WebP, so they are always
+# encoded losslessly
+LOSSLESS_MAPS = NORMAL_MAPS
+
+# Lanczos reach in texels of the filter's scale, and the source texels per side
+# a resized block reads at most
+LANCZOS_SUPPORT = 3
+RESIZE_BLOCK_TEXELS = 1024
+
+def texture_options(
+    target: str,
+    options: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Preset for a target, overridden by options"""
+    options = options or {}
+    if target not in TEXTURE_PRESETS:
+        raise ValueError(
+            f"Unknown optimize target: {target}; "
+            f"expected one of {', '.join(TEXTURE_PRESETS)}"
+        )
+    values: Dict[str, Any] = dict(TEXTURE_PRESETS[target])
+    for key in TEXTURE_PRESETS[target]:
+        if options.get(key) is not None:
+            values[key] = options[key]
+    if values["format"] not in TEXTURE_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(TEXTURE_FORMATS)}")
+    max_size = values["max_size"]
+    is_int = isinstance(max_size, int) and not isinstance(max_size, bool)
+    if not is_int or not 1 <= max_size <= MAX_TEXTURE_SIZE:
+        raise ValueError(
+            f"max_size must be an integer between 1 and {MAX_TEXTURE_SIZE}"
+        )
+    quality = values["quality"]
+    is_number = isinstance(quality, (int, float)) and not isinstance(quality, bool)
+    if not is_number or not 0 < quality <= 1:
+        raise ValueError("quality must be between 0 and 1")
+    values["mipmaps"] = bool(values["mipmaps"])
+    return values
+
+def map_kind(name: str) -> str:
+    """"color", "normal" or "data", from a map's name"""
+    key = name.lower()
+    if any(word in key for word in NORMAL_MAPS):
+        return "normal"
+    if any(word in key for word in COLOR_MAPS):
+        return "color"
+    return "data"
+
+def decode_texture(data: bytes) -> np.ndarray:
+    """(H, W, C) uint8 pixels of an encoded image, in L, LA, RGB or RGBA"""
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        image: Image.Image = Image.open(io.BytesIO(data))
+    except UnidentifiedImageError:
+        raise ValueError("Texture is not a readable image")
+    with image:
+        if image.mode not in ("L", "LA", "RGB", "RGBA"):
+            alpha = "A" in image.getbands() or "transparency" in image.info
+            image = image.convert("RGBA" if alpha else "RGB")
+        pixels = np.asarray(image, dtype=np.uint8)
+    return pixels if pixels.ndim == 3 else pixels[:, :, None]
+
+def load_texture(
+    path: Union[str, Path],
+    target: Union[str, Path],
+    tile_size: Optional[int] = None,
+) -> TiledImage:
+    """Tiled 8-bit image, in L, LA, RGB or RGBA, of a texture file
+
+    PNGs are streamed in a row of tiles at a time; other formats have no
+    partial decoder, so they are decoded whole and then tiled.
+    """
+    with open(path, "rb") as handle:
+        if handle.read(len(PNG_SIGNATURE)) == PNG_SIGNATURE:
+            return png_to_tiles(path, target, tile_size)
+        handle.seek(0)
+        pixels = decode_texture(handle.read())
+    height, width, channels = pixels.shape
+    image = TiledImage.create(target, width, height, channels, np.uint8, tile_size)
+    image.write(0, 0, pixels)
+    return image
+
+def target_size(
+    width: int,
+    height: int,
+    max_size: int,
+    power_of_two: bool,
+) -> Tuple[int, int]:
+    """Size that fits max_size keeping the aspect ratio
+
+    For mip chains, the nearest powers of two that fit.
+    """
+    scale = min(1.0, max_size / max(width, height))
+    if not power_of_two:
+        return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+    limit = 1 << (max_size.bit_length() - 1)
+    exponents = [max(0, int(round(np.log2(side * scale)))) for side in (width, height)]
+    width_exponent, height_exponent = exponents
+    return min(1 << width_exponent, limit), min(1 << height_exponent, limit)
+
+def _to_linear(pixels: np.ndarray, kind: str) -> np.ndarray:
+    """Float32 values to filter
+
+    Premultiplied linear color, vectors in [-1, 1], or data in [0, 1].
+    """
+    values = pixels.astype(np.float32) / 255.0
+    channels = values.shape[2]
+    if kind == "normal" and channels >= 3:
+        values[:, :, :3] = values[:, :, :3] * 2.0 - 1.0
+    elif kind == "color":
+        color = 3 if channels >= 3 else 1
+        values[:, :, :color] = srgb_to_linear(values[:, :, :color])
+        if channels in (2, 4):
+            values[:, :, :color] *= values[:, :, -1:]
+    return values
+
+def _from_linear(values: np.ndarray, kind: str) -> np.ndarray:
+    channels = values.shape[2]
+    values = values.copy()
+    if kind == "normal" and channels >= 3:
+        vectors = values[:, :, :3]
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=2, keepdims=True), 1e-8)
+        values[:, :, :3] = vectors * 0.5 + 0.5
+    elif kind == "color":
+        color = 3 if channels >= 3 else 1
+        if channels in (2, 4):
+            alpha = values[:, :, -1:]
+            unpremultiplied = values[:, :, :color] / np.maximum(alpha, 1e-8)
+            values[:, :, :color] = np.where(alpha > 0, unpremultiplied, 0.0)
+        values[:, :, :color] = linear_to_srgb(values[:, :, :color])
+    return np.rint(np.clip(values, 0.0, 1.0) * 255.0).astype(np.uint8)
+
+def resize_tiles(source: TiledImage, kind: str, target: TiledImage) -> None:
+    """Lanczos resize of a tiled 8-bit image into float32 linear values at target
+
+    target is a tiled image of the output size. Its tiles are filtered a
+    block at a time from the source texels under the block and the filter's
+    reach around it, which gives the same values as filtering the whole
+    image. Blocks shrink as the scale
+    grows so each reads at most about RESIZE_BLOCK_TEXELS per side.
+    """
+    from PIL import Image
+
+    if (source.width, source.height) == (target.width, target.height):
+        for box in target.tiles():
+            texels = source.read(box.x0, box.y0, box.x1, box.y1)
+            target.write_tile(box.tx, box.ty, _to_linear(texels, kind))
+        return
+    scale_x, scale_y = source.width / target.width, source.height / target.height
+    reach_x = math.ceil(LANCZOS_SUPPORT * max(scale_x, 1.0)) + 1
+    reach_y = math.ceil(LANCZOS_SUPPORT * max(scale_y, 1.0)) + 1
+    block = RESIZE_BLOCK_TEXELS // math.ceil(max(scale_x, scale_y))
+    block = max(1, min(target.tile_size, block))
+    for box in target.tiles():
+        shape = (box.y1 - box.y0, box.x1 - box.x0, target.channels)
+        tile = np.empty(shape, dtype=np.float32)
+        for y0 in range(box.y0, box.y1, block):
+            for x0 in range(box.x0, box.x1, block):
+                x1, y1 = min(x0 + block, box.x1), min(y0 + block, box.y1)
+                left, top = x0 * scale_x, y0 * scale_y
+                right, bottom = x1 * scale_x, y1 * scale_y
+                region = (
+                    max(0, math.floor(left) - reach_x),
+                    max(0, math.floor(top) - reach_y),
+                    min(source.width, math.ceil(right) + reach_x),
+                    min(source.height, math.ceil(bottom) + reach_y),
+                )
+                values = _to_linear(source.read(*region), kind)
+                window = (
+                    left - region[0],
+                    top - region[1],
+                    right - region[0],
+                    bottom - region[1],
+                )
+                rows = slice(y0 - box.y0, y1 - box.y0)
+                columns = slice(x0 - box.x0, x1 - box.x0)
+                for channel in range(target.channels):
+                    plane = Image.fromarray(np.ascontiguousarray(values[:, :, channel]))
+                    size = (x1 - x0, y1 - y0)
+                    resized = plane.resize(size, Image.Resampling.LANCZOS, box=window)
+                    tile[rows, columns, channel] = np.asarray(resized)
+        target.write_tile(box.tx, box.ty, tile)
+
+def downsample_tiles(level: TiledImage, target: TiledImage) -> None:
+    """Next mip level of a tiled float32 image
+
+    Each texel is the mean of the 2x2 texels under it. A side already at
+    1 texel stays 1 while the other keeps halving.
+    """
+    step_x, step_y = level.width // target.width, level.height // target.height
+    for box in target.tiles():
+        width, height = box.x1 - box.x0, box.y1 - box.y0
+        x0, y0 = box.x0 * step_x, box.y0 * step_y
+        values = level.read(x0, y0, box.x1 * step_x, box.y1 * step_y)
+        blocks = values.reshape(height, step_y, width, step_x, level.channels)
+        target.write_tile(box.tx, box.ty, blocks.mean(axis=(1, 3), dtype=np.float32))
+
+def texture_levels(
+    source: TiledImage,
+    kind: str,
+    options: Dict[str, Any],
+    directory: Path,
+) -> List[TiledImage]:
+    """The optimized base image and, with mipmaps, its mip chain
+
+    Levels are tiled 8-bit images in directory. Downsizing uses a Lanczos
+    filter and the mip chain a box filter, both on linear values, so color
+    maps keep their brightness and normal maps stay unit length. Only one
+    float level is kept at a time, and each is built tile by tile from the
+    one before. The caller closes the levels.
+    """
+    max_size, mipmaps = options["max_size"], options["mipmaps"]
+    width, height = target_size(source.width, source.height, max_size, mipmaps)
+    values = TiledImage.create(
+        directory / "values0.tiles",
+        width,
+        height,
+        source.channels,
+        np.float32,
+        source.tile_size,
+    )
+    levels: List[TiledImage] = []
+    try:
+        resize_tiles(source, kind, values)
+        while True:
+            level = TiledImage.create(
+                directory / f"level{len(levels)}.tiles",
+                values.width,
+                values.height,
+                values.channels,
+                np.uint8,
+                values.tile_size,
+            )
+            levels.append(level)
+            for box in values.tiles():
+                texels = _from_linear(values.read_tile(box.tx, box.ty), kind)
+                level.write_tile(box.tx, box.ty, texels)
+            if not options["mipmaps"] or max(values.width, values.height) == 1:
+                break
+            below = TiledImage.create(
+                directory / f"values{len(levels)}.tiles",
+                max(1, values.width // 2),
+                max(1, values.height // 2),
+                values.channels,
+                np.float32,
+                values.tile_size,
+            )
+            above, values = values, below
+            try:
+                downsample_tiles(above, values)
+            finally:
+                above.close()
+                above.path.unlink()
+    except Exception:
+        for level in levels:
+            level.close()
+        raise
+    finally:
+        values.close()
+        values.path.unlink(missing_ok=True)
+    return levels
+
+def encode_texture(
+    pixels: np.ndarray,
+    image_format: str,
+    quality: float,
+    lossless: bool = False,
+) -> bytes:
+    """WebP or PNG bytes of an (H, W, C) uint8 image"""
+    from PIL import Image
+
+    image = Image.fromarray(pixels[:, :, 0] if pixels.shape[2] == 1 else pixels)
+    buffer = io.BytesIO()
+    if image_format == "webp":
+        if image.mode in ("L", "LA"):
+            image = image.convert("RGBA" if image.mode == "LA" else "RGB")
+        percent = int(round(quality * 100))
+        lossless = lossless or quality >= 1.0
+        image.save(buffer, format="WEBP", quality=percent, lossless=lossless, method=4)
+    else:
+        image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def write_texture(
+    image: TiledImage,
+    target: Union[str, Path],
+    image_format: str,
+    quality: float,
+    lossless: bool = False,
+    measure: bool = False,
+) -> Optional[float]:
+    """Encode a tiled 8-bit level into a WebP or PNG file
+
+    With measure, returns its PSNR as psnr does. PNGs are streamed a row of
+    tiles at a time. WebP has no incremental encoder, so the level is read
+    whole; levels are at most max_size a side.
+    """
+    if image_format == "png":
+        tiles_to_png(image, target)
+        return None
+    pixels = image.read(0, 0, image.width, image.height)
+    data = encode_texture(pixels, image_format, quality, lossless)
+    Path(target).write_bytes(data)
+    return psnr(pixels, data) if measure else None
+
+def psnr(reference: np.ndarray, data: bytes) -> Optional[float]:
+    """Peak signal-to-noise ratio in dB of encoded data against the pixels it encodes
+
+    None when the encoding is lossless.
+    """
+    decoded = decode_texture(data)
+    if decoded.shape[2] != reference.shape[2]:
+        # WebP stores gray images as RGB(A)
+        if reference.shape[2] == 2:
+            decoded = decoded[:, :, [0, 3]]
+        else:
+            decoded = decoded[:, :, :reference.shape[2]]
+    error = np.mean((decoded.astype(np.float32) - reference.astype(np.float32)) ** 2)
+    if error == 0:
+        return None
+    return float(10.0 * np.log10(255.0 ** 2 / error))
+
+_encoder: Optional[ThreadPoolExecutor] = None
+_encoder_lock = threading.Lock()
+
+def texture_encoder() -> ThreadPoolExecutor:
+    """Thread pool encoding texture levels; Pillow releases the GIL while encoding"""
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            _encoder = ThreadPoolExecutor(
+                max_workers=settings.TEXTURE_ENCODE_THREADS,
+                thread_name_prefix="texture-encode",
+            )
+        return _encoder
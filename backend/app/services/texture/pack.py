@@ -0,0 +1,303 @@
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Set, Tuple, Union
+from app.services.storage.tiles import TiledImage, TileRowReader, is_tiled_image
+from app.services.texture.png import PngBandReader, PngBandWriter
+import time
+import numpy as np
+
+# How a packing method lays maps into output images: output name -> channel -> source
+PACKING_METHODS = ("orm", "separate", "custom")
+ORM_CHANNELS = {"r": "ao", "g": "roughness", "b": "metallic"}
+
+# Names maps may be given under
+MAP_ALIASES = {"occlusion": "ao", "metalness": "metallic"}
+
+# Value of an ORM channel whose map is missing: no occlusion, fully rough, dielectric
+PACK_DEFAULTS = {"ao": 1.0, "roughness": 1.0, "metallic": 0.0}
+
+CHANNELS = "rgba"
+
+# Memory for the rows of one band across all sources and outputs of a material
+PACK_BAND_BYTES = 1 << 24
+
+class ChannelSource(NamedTuple):
+    """Where a packed channel comes from: a channel of a map, or a constant"""
+
+    texture: Optional[str]  # key in the material's texture URLs; None for a constant
+    channel: Optional[int]  # channel of the source image, or None for its first
+    value: float  # constant in [0, 1] when texture is None
+
+def _channel_source(spec: Any, textures: Dict[str, str]) -> ChannelSource:
+    """Parse "map", "map.g" or a number in [0, 1]"""
+    if isinstance(spec, (int, float)) and not isinstance(spec, bool):
+        if not 0.0 <= spec <= 1.0:
+            raise ValueError("Constant channels must be between 0 and 1")
+        return ChannelSource(None, None, float(spec))
+    if not isinstance(spec, str):
+        raise ValueError(
+            'Channels must name a map, a map channel such as "roughness.g", or a number'
+        )
+    name, _, channel = spec.partition(".")
+    key = _texture_key(name, textures)
+    if key is None:
+        raise ValueError(f"No texture given for {name}")
+    if channel and (len(channel) != 1 or channel not in CHANNELS):
+        raise ValueError(f"Unknown channel {channel} in {spec}; use r, g, b or a")
+    return ChannelSource(key, CHANNELS.index(channel) if channel else None, 0.0)
+
+def _texture_key(name: str, textures: Dict[str, str]) -> Optional[str]:
+    """Key of the texture for a map name, accepting aliases either way round"""
+    canonical = MAP_ALIASES.get(name, name)
+    for key in textures:
+        if MAP_ALIASES.get(key, key) == canonical:
+            return key
+    return None
+
+def pack_layout(
+    textures: Dict[str, str],
+    method: str,
+    channels: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Dict[str, ChannelSource]]:
+    """Output images of a packing method, as output name -> channel -> source
+
+    orm packs ambient occlusion, roughness and metallic into R, G and B as
+    glTF's occlusion and metallicRoughness textures read them, filling
+    missing maps with neutral values. separate writes each map as its own
+    grayscale image. custom takes channels, mapping "r" to "a" to sources.
+    """
+    if not textures:
+        raise ValueError("texture_urls must not be empty")
+    if method == "orm":
+        layout = {}
+        for channel, name in ORM_CHANNELS.items():
+            key = _texture_key(name, textures)
+            if key:
+                layout[channel] = ChannelSource(key, None, 0.0)
+            else:
+                layout[channel] = ChannelSource(None, None, PACK_DEFAULTS[name])
+        if all(source.texture is None for source in layout.values()):
+            raise ValueError(
+                "orm packing needs at least one of ao, roughness and metallic"
+            )
+        return {"orm": layout}
+    if method == "separate":
+        return {key: {"r": ChannelSource(key, None, 0.0)} for key in textures}
+    if method == "custom":
+        if not channels or set(channels) - set(CHANNELS):
+            raise ValueError(
+                "custom packing needs channels mapping some of r, g, b and a to sources"
+            )
+        layout = {}
+        for channel in CHANNELS:
+            if channel in channels:
+                layout[channel] = _channel_source(channels[channel], textures)
+            elif channel != "a":
+                # Channels left out of an RGB(A) image are black
+                layout[channel] = ChannelSource(None, None, 0.0)
+        return {"packed": layout}
+    raise ValueError(
+        f"Unknown packing method: {method}; "
+        f"use one of: {', '.join(PACKING_METHODS)}"
+    )
+
+def packing_map(
+    layout: Dict[str, Dict[str, ChannelSource]],
+) -> Dict[str, Dict[str, Union[str, float]]]:
+    """Readable form of a layout
+
+    Maps output -> channel -> "map", "map.channel" or a constant.
+    """
+    readable: Dict[str, Dict[str, Union[str, float]]] = {}
+    for output, channels in layout.items():
+        readable[output] = {}
+        for channel, source in channels.items():
+            if source.texture is None:
+                readable[output][channel] = source.value
+            elif source.channel is None:
+                readable[output][channel] = source.texture
+            else:
+                name = f"{source.texture}.{CHANNELS[source.channel]}"
+                readable[output][channel] = name
+    return readable
+
+def layout_textures(layout: Dict[str, Dict[str, ChannelSource]]) -> List[str]:
+    """Maps a layout reads from, sorted"""
+    used: Set[str] = set()
+    for channels in layout.values():
+        used.update(source.texture for source in channels.values() if source.texture)
+    return sorted(used)
+
+def _pick(rows: np.ndarray, channel: Optional[int]) -> np.ndarray:
+    """One channel of (n, W, C) rows
+
+    Alpha of images without one is opaque; gray images answer r, g and b.
+    """
+    count = rows.shape[2]
+    if channel is None:
+        return rows[:, :, 0]
+    if channel == 3:
+        if count in (2, 4):
+            return rows[:, :, count - 1]
+        return np.full(rows.shape[:2], 255, dtype=np.uint8)
+    return rows[:, :, channel if count >= 3 else 0]
+
+def _open_rows(path: Union[str, Path]) -> Union[PngBandReader, TileRowReader]:
+    """Reader of a source's rows from the top
+
+    Opens a PNG, or a tiled image such as a bake's working maps.
+    """
+    if is_tiled_image(path):
+        return TileRowReader(TiledImage(path))
+    return PngBandReader(path)
+
+class _ResampledRows:
+    """Rows of a source image at the output size, read forward through a band reader
+
+    Sources smaller or larger than the output are resampled bilinearly
+    with texel centers aligned; only the source rows under the current
+    band are held.
+    """
+
+    def __init__(
+        self,
+        reader: Union[PngBandReader, TileRowReader],
+        width: int,
+        height: int,
+    ):
+        self.reader = reader
+        self.width, self.height = width, height
+        self._rows = np.zeros((0, reader.width, reader.channels), dtype=np.uint8)
+        self._first = 0
+        if reader.width != width:
+            x = (np.arange(width) + 0.5) * reader.width / width - 0.5
+            x = np.clip(x, 0, reader.width - 1)
+            self._x0 = np.floor(x).astype(np.int64)
+            self._x1 = np.minimum(self._x0 + 1, reader.width - 1)
+            self._fx = (x - self._x0)[None, :, None]
+
+    def _source_rows(self, start: int, stop: int) -> np.ndarray:
+        """Source rows [start, stop), dropping those above start"""
+        if stop > self._first + len(self._rows):
+            fresh = self.reader.read(stop - self._first - len(self._rows))
+            if len(self._rows):
+                fresh = np.concatenate([self._rows, fresh])
+            self._rows = fresh
+        drop = start - self._first
+        if drop > 0:
+            self._rows = self._rows[drop:]
+            self._first = start
+        return self._rows[:stop - start]
+
+    def rows(self, start: int, stop: int) -> np.ndarray:
+        """Output rows [start, stop) as (n, width, C) uint8"""
+        source_height = self.reader.height
+        if (self.reader.width, source_height) == (self.width, self.height):
+            return self._source_rows(start, stop)
+        if source_height == self.height:
+            rows = self._source_rows(start, stop).astype(np.float32)
+        else:
+            y = (np.arange(start, stop) + 0.5) * source_height / self.height - 0.5
+            y = np.clip(y, 0, source_height - 1)
+            y0 = np.floor(y).astype(np.int64)
+            y1 = np.minimum(y0 + 1, source_height - 1)
+            window = self._source_rows(int(y0[0]), int(y1[-1]) + 1).astype(np.float32)
+            fy = (y - y0)[:, None, None].astype(np.float32)
+            rows = window[y0 - y0[0]] * (1.0 - fy) + window[y1 - y0[0]] * fy
+        if self.reader.width != self.width:
+            rows = rows[:, self._x0] * (1.0 - self._fx) + rows[:, self._x1] * self._fx
+        return np.rint(rows).astype(np.uint8)
+
+def pack_material(
+    sources: Mapping[str, Union[str, Path]],
+    layout: Dict[str, Dict[str, ChannelSource]],
+    targets: Mapping[str, Union[str, Path]],
+    band_bytes: int = PACK_BAND_BYTES,
+) -> Dict[str, Any]:
+    """Pack the PNG or tiled images of one material into PNG files, band by band
+
+    Every source is read once, top to bottom, and every output is written
+    to its path in targets as its rows are stacked, so memory is bounded by
+    band_bytes however large the maps. Outputs take the size of the largest
+    source; smaller sources are resampled. Returns packing stats.
+    """
+    started = time.perf_counter()
+    used = layout_textures(layout)
+    with ExitStack() as stack:
+        readers: Dict[str, Union[PngBandReader, TileRowReader]] = {}
+        for key in used:
+            readers[key] = _open_rows(sources[key])
+            stack.enter_context(readers[key])
+        width = max(reader.width for reader in readers.values())
+        height = max(reader.height for reader in readers.values())
+        rows_by_source = {
+            key: _ResampledRows(reader, width, height)
+            for key, reader in readers.items()
+        }
+        writers = {}
+        for output, channels in layout.items():
+            writer = PngBandWriter(targets[output], width, height, len(channels))
+            writers[output] = stack.enter_context(writer)
+
+        # Bytes per output row across sources (a window of up to two source rows
+        # each) and outputs
+        row_bytes = sum(reader.channels * width * 8 for reader in readers.values())
+        row_bytes += sum(len(channels) * width * 24 for channels in layout.values())
+        band = max(1, min(height, band_bytes // max(row_bytes, 1)))
+        bands = 0
+        for start in range(0, height, band):
+            stop = min(start + band, height)
+            rows = {key: src.rows(start, stop) for key, src in rows_by_source.items()}
+            for output, channels in layout.items():
+                packed = np.empty((stop - start, width, len(channels)), dtype=np.uint8)
+                for index, source in enumerate(channels.values()):
+                    if source.texture is None:
+                        packed[:, :, index] = int(round(source.value * 255))
+                    else:
+                        picked = _pick(rows[source.texture], source.channel)
+                        packed[:, :, index] = picked
+                writers[output].write(packed)
+            bands += 1
+        resampled = [
+            key
+            for key, reader in readers.items()
+            if (reader.width, reader.height) != (width, height)
+        ]
+
+    seconds = time.perf_counter() - started
+    megapixels = width * height * len(layout) / 1e6
+    return {
+        "width": width,
+        "height": height,
+        "sources": len(used),
+        "resampled_sources": resampled,
+        "outputs": len(layout),
+        "band_rows": band,
+        "bands": bands,
+        "seconds": seconds,
+        "megapixels_per_second": megapixels / max(seconds, 1e-9),
+    }
+
+def material_textures(
+    texture_urls: Dict[str, Any],
+) -> Tuple[Dict[str, Dict[str, str]], bool]:
+    """Texture URLs per material, and whether several materials were given
+
+    texture_urls maps map names to URLs for one material, or material
+    names to such mappings for several.
+    """
+    if not texture_urls:
+        raise ValueError("texture_urls must not be empty")
+    nested = [isinstance(value, dict) for value in texture_urls.values()]
+    if all(nested):
+        materials = texture_urls
+    elif not any(nested):
+        materials = {"default": texture_urls}
+    else:
+        raise ValueError(
+            "texture_urls must map maps to URLs, or materials to such mappings"
+        )
+    for textures in materials.values():
+        if not textures or not all(isinstance(url, str) for url in textures.values()):
+            raise ValueError("Every material needs a mapping of maps to texture URLs")
+    return materials, all(nested)
@@ -0,0 +1,370 @@
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Tuple, Union
+from app.services.storage.tiles import TiledImage
+import io
+import logging
+import struct
+import zlib
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Channels of each PNG color type, before palette expansion
+COLOR_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# Color type written for images with 1 to 4 channels (gray, gray + alpha, RGB, RGBA)
+CHANNEL_COLOR_TYPES = {1: 0, 2: 4, 3: 2, 4: 6}
+
+# 8-bit color type with the same bytes per pixel, so PIL unfilters rows into
+# their raw bytes
+RAW_COLOR_TYPES = {1: 0, 2: 4, 3: 2, 4: 6}
+
+# Compressed bytes read from the file, and written per IDAT chunk, at a time
+READ_CHUNK_BYTES = 1 << 16
+IDAT_BYTES = 1 << 16
+
+# Image bytes filtered at once; choosing filters takes a few dozen bytes of
+# scratch per image byte
+FILTER_BYTES = 1 << 20
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    crc = struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+    return struct.pack(">I", len(data)) + kind + data + crc
+
+class PngBandReader:
+    """Reads a PNG's rows from the top, a band at a time, as (rows, W, C) uint8 arrays
+
+    The compressed stream is inflated incrementally and only the rows asked
+    for are unfiltered, so memory stays proportional to the band, not the
+    image. Palette images are expanded to RGB(A) and 16-bit samples are
+    reduced to their high byte. Interlaced images and 16-bit color images
+    have no bounded-memory path and are decoded whole by PIL.
+    """
+
+    def __init__(self, source: Union[str, Path, BinaryIO]):
+        self._file = open(source, "rb") if isinstance(source, (str, Path)) else source
+        self._owned = isinstance(source, (str, Path))
+        self._full: Optional[np.ndarray] = None
+        self.row = 0
+        try:
+            self._read_header()
+        except Exception:
+            self.close()
+            raise
+
+    def _read_header(self) -> None:
+        if self._file.read(8) != PNG_SIGNATURE:
+            raise ValueError("Texture is not a PNG image")
+        self._palette: Optional[np.ndarray] = None
+        self._alpha: Optional[bytes] = None
+        while True:
+            length, kind = self._chunk_header()
+            if kind == b"IHDR":
+                data = self._file.read(length)
+                fields = struct.unpack(">IIBBBBB", data)
+                self.width, self.height, self.depth, self.color_type = fields[:4]
+                self.interlace = fields[6]
+                if self.color_type not in COLOR_CHANNELS:
+                    raise ValueError(f"Unsupported PNG color type {self.color_type}")
+            elif kind == b"PLTE":
+                palette = np.frombuffer(self._file.read(length), dtype=np.uint8)
+                self._palette = palette.reshape(-1, 3)
+            elif kind == b"tRNS":
+                self._alpha = self._file.read(length)
+            elif kind == b"IDAT":
+                self._remaining = length
+                break
+            elif kind == b"IEND":
+                raise ValueError("PNG has no image data")
+            else:
+                self._file.seek(length, io.SEEK_CUR)
+            if kind != b"IDAT":
+                self._file.read(4)
+        self.channels = self._output_channels()
+        samples = COLOR_CHANNELS[self.color_type]
+        self._pixel_bytes = max(1, samples * self.depth // 8)
+        self._row_bytes = (self.width * samples * self.depth + 7) // 8
+        self._inflater = zlib.decompressobj()
+        self._pending = b""
+        self._previous: Optional[bytes] = None
+        if self.interlace or self._pixel_bytes not in RAW_COLOR_TYPES:
+            from PIL import Image
+
+            # No row-by-row path: Adam7 passes span the whole image, and no
+            # 8-bit type has 6 or 8 bytes per pixel
+            logger.info(
+                f"Decoding whole {self.width}x{self.height} PNG "
+                "(interlaced or 16-bit color)"
+            )
+            self._file.seek(0)
+            with Image.open(self._file) as image:
+                mode = {1: "L", 2: "LA", 3: "RGB", 4: "RGBA"}[self.channels]
+                pixels = np.asarray(image.convert(mode), dtype=np.uint8)
+                self._full = pixels.reshape(self.height, self.width, self.channels)
+
+    def _chunk_header(self) -> Tuple[int, bytes]:
+        header = self._file.read(8)
+        if len(header) < 8:
+            raise ValueError("Truncated PNG")
+        length, kind = struct.unpack(">I4s", header)
+        return length, kind
+
+    def _output_channels(self) -> int:
+        if self.color_type == 3:
+            if self._palette is None:
+                raise ValueError("Palette PNG has no palette")
+            return 4 if self._alpha else 3
+        channels = COLOR_CHANNELS[self.color_type]
+        # Gray and RGB images with a transparent color key gain an alpha channel
+        return channels + 1 if self._alpha and channels in (1, 3) else channels
+
+    def _compressed(self) -> bytes:
+        """Next piece of the IDAT stream, or b"" at its end"""
+        while not self._remaining:
+            self._file.read(4)
+            length, kind = self._chunk_header()
+            if kind != b"IDAT":
+                return b""
+            self._remaining = length
+        data = self._file.read(min(self._remaining, READ_CHUNK_BYTES))
+        if not data:
+            raise ValueError("Truncated PNG")
+        self._remaining -= len(data)
+        return data
+
+    def _filtered_rows(self, count: int) -> bytes:
+        size = count * (self._row_bytes + 1)
+        parts, have = [self._pending], len(self._pending)
+        while have < size:
+            data = self._inflater.unconsumed_tail or self._compressed()
+            if not data:
+                raise ValueError("Truncated PNG image data")
+            out = self._inflater.decompress(data, size - have)
+            parts.append(out)
+            have += len(out)
+        data = b"".join(parts)
+        self._pending = data[size:]
+        return data[:size]
+
+    def _unfilter(self, filtered: bytes, count: int) -> np.ndarray:
+        """Raw row bytes (count, row_bytes) of the scanlines after self._previous"""
+        # PIL unfilters a PNG of the same bytes per pixel; the row above the band
+        # leads it unfiltered
+        from PIL import Image
+
+        lead = b"" if self._previous is None else b"\x00" + self._previous
+        rows = count + (self._previous is not None)
+        width = self._row_bytes // self._pixel_bytes
+        color_type = RAW_COLOR_TYPES[self._pixel_bytes]
+        header = struct.pack(">IIBBBBB", width, rows, 8, color_type, 0, 0, 0)
+        parts = [
+            PNG_SIGNATURE,
+            _chunk(b"IHDR", header),
+            _chunk(b"IDAT", zlib.compress(lead + filtered, 0)),
+            _chunk(b"IEND", b""),
+        ]
+        synthetic = b"".join(parts)
+        with Image.open(io.BytesIO(synthetic)) as image:
+            raw = np.asarray(image, dtype=np.uint8).reshape(rows, self._row_bytes)
+        return raw[rows - count:]
+
+    def _samples(self, raw: np.ndarray) -> np.ndarray:
+        """(rows, W, C) uint8 pixels of raw row bytes"""
+        count = len(raw)
+        samples = COLOR_CHANNELS[self.color_type]
+        # tRNS of a gray or RGB image holds the 16-bit sample values of its key
+        key = None
+        if self._alpha and self.color_type != 3:
+            key = np.frombuffer(self._alpha, dtype=">u2")
+            key = key >> 8 if self.depth == 16 else key.astype(np.uint8)
+        if self.depth == 16:
+            values = raw.reshape(count, self.width, samples, 2)[..., 0]
+        elif self.depth == 8:
+            values = raw.reshape(count, self.width, samples)
+        else:
+            bit_count = self.width * self.depth
+            bits = np.unpackbits(raw, axis=1)[:, :bit_count]
+            bits = bits.reshape(count, self.width, self.depth)
+            weights = 1 << np.arange(self.depth - 1, -1, -1, dtype=np.uint8)
+            values = (bits * weights).sum(axis=2, dtype=np.uint8)[..., None]
+            if self.color_type == 0:
+                scale = np.uint8(255 // ((1 << self.depth) - 1))
+                values = values * scale
+                if key is not None:
+                    key = key * scale
+        if self.color_type == 3 and self._palette is not None:
+            index = values[..., 0]
+            colors = self._palette[np.minimum(index, len(self._palette) - 1)]
+            if not self._alpha:
+                return colors
+            alpha = np.full(256, 255, dtype=np.uint8)
+            alpha[:len(self._alpha)] = np.frombuffer(self._alpha, dtype=np.uint8)
+            return np.concatenate([colors, alpha[index][..., None]], axis=2)
+        if key is not None:
+            opaque = np.where((values == key).all(axis=2), 0, 255).astype(np.uint8)
+            return np.concatenate([values, opaque[..., None]], axis=2)
+        return np.ascontiguousarray(values)
+
+    def read(self, count: int) -> np.ndarray:
+        """The next count rows (fewer at the bottom) as (rows, W, C) uint8"""
+        count = max(0, min(count, self.height - self.row))
+        if self._full is not None:
+            rows = self._full[self.row:self.row + count]
+        elif count:
+            raw = self._unfilter(self._filtered_rows(count), count)
+            self._previous = raw[-1].tobytes()
+            rows = self._samples(raw)
+        else:
+            rows = np.zeros((0, self.width, self.channels), dtype=np.uint8)
+        self.row += count
+        return rows
+
+    def bands(self, rows: int) -> Iterator[np.ndarray]:
+        while self.row < self.height:
+            yield self.read(rows)
+
+    def close(self) -> None:
+        self._full = None
+        if self._owned:
+            self._file.close()
+
+    def __enter__(self) -> "PngBandReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class PngBandWriter:
+    """Writes an 8-bit PNG a band of rows at a time
+
+    Each row takes the filter (none, sub, up or paeth) with the smallest
+    sum of absolute signed bytes, the usual heuristic of PNG encoders, and
+    is deflated straight into IDAT chunks.
+    """
+
+    def __init__(
+        self,
+        target: Union[str, Path, BinaryIO],
+        width: int,
+        height: int,
+        channels: int,
+        level: int = 6,
+    ):
+        if channels not in CHANNEL_COLOR_TYPES:
+            raise ValueError("PNG images have 1 to 4 channels")
+        self._file = open(target, "wb") if isinstance(target, (str, Path)) else target
+        self._owned = isinstance(target, (str, Path))
+        self.width, self.height, self.channels = width, height, channels
+        self.row = 0
+        self._deflater = zlib.compressobj(level)
+        self._buffer = bytearray()
+        self._previous = np.zeros((1, width * channels), dtype=np.uint8)
+        self._file.write(PNG_SIGNATURE)
+        color_type = CHANNEL_COLOR_TYPES[channels]
+        header = struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+        self._file.write(_chunk(b"IHDR", header))
+
+    def _filter(self, rows: np.ndarray) -> np.ndarray:
+        """Rows (n, row_bytes) with the best filter applied
+
+        Each row is led by its filter type byte.
+        """
+        count, channels = len(rows), self.channels
+        current = rows.astype(np.int16)
+        up = np.concatenate([self._previous, rows[:-1]]).astype(np.int16)
+        left = np.zeros_like(current)
+        left[:, channels:] = current[:, :-channels]
+        upper_left = np.zeros_like(current)
+        upper_left[:, channels:] = up[:, :-channels]
+        estimate = left + up - upper_left
+        distances = [np.abs(estimate - near) for near in (left, up, upper_left)]
+        paeth = np.where(
+            (distances[0] <= distances[1]) & (distances[0] <= distances[2]),
+            left,
+            np.where(distances[1] <= distances[2], up, upper_left),
+        )
+        candidates = [current, current - left, current - up, current - paeth]
+        candidates = np.stack(candidates).astype(np.uint8)
+        cost = np.abs(candidates.view(np.int8).astype(np.int32)).sum(axis=2)
+        best = np.argmin(cost, axis=0)
+        filtered = candidates[best, np.arange(count)]
+        # Filter types 0, 1, 2 and 4; average (3) is rarely the smallest
+        types = np.array([0, 1, 2, 4], dtype=np.uint8)[best]
+        return np.concatenate([types[:, None], filtered], axis=1)
+
+    def write(self, rows: np.ndarray) -> None:
+        """Append (n, W, C) uint8 rows below those already written"""
+        if rows.shape[1:] != (self.width, self.channels):
+            raise ValueError(f"Rows must have shape (n, {self.width}, {self.channels})")
+        if self.row + len(rows) > self.height:
+            raise ValueError("More rows than the image height")
+        if not len(rows):
+            return
+        flat = np.ascontiguousarray(rows, dtype=np.uint8).reshape(len(rows), -1)
+        step = max(1, FILTER_BYTES // flat.shape[1])
+        for start in range(0, len(flat), step):
+            band = flat[start:start + step]
+            self._buffer += self._deflater.compress(self._filter(band).tobytes())
+            self._previous = band[-1:]
+            self._flush(False)
+        self.row += len(rows)
+
+    def _flush(self, final: bool) -> None:
+        while len(self._buffer) >= IDAT_BYTES or (final and self._buffer):
+            self._file.write(_chunk(b"IDAT", bytes(self._buffer[:IDAT_BYTES])))
+            del self._buffer[:IDAT_BYTES]
+
+    def close(self) -> None:
+        """Finish the image; every row must have been written"""
+        if self.row != self.height:
+            raise ValueError(f"Wrote {self.row} of {self.height} rows")
+        self._buffer += self._deflater.flush()
+        self._flush(True)
+        self._file.write(_chunk(b"IEND", b""))
+        if self._owned:
+            self._file.close()
+
+    def __enter__(self) -> "PngBandWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        # An unfinished image is left truncated for the caller to discard
+        if exc_type is None:
+            self.close()
+        elif self._owned:
+            self._file.close()
+
+def png_to_tiles(
+    source: Union[str, Path, BinaryIO],
+    target: Union[str, Path],
+    tile_size: Optional[int] = None,
+) -> TiledImage:
+    """Tiled image of a PNG, filled a row of tiles at a time
+
+    Memory stays bounded by the image width.
+    """
+    with PngBandReader(source) as reader:
+        width, height, channels = reader.width, reader.height, reader.channels
+        image = TiledImage.create(target, width, height, channels, np.uint8, tile_size)
+        try:
+            for y in range(0, reader.height, image.tile_size):
+                image.write(0, y, reader.read(image.tile_size))
+        except Exception:
+            image.close()
+            raise
+    return image
+
+def tiles_to_png(
+    image: TiledImage,
+    target: Union[str, Path, BinaryIO],
+    level: int = 6,
+) -> None:
+    """Stream an 8-bit tiled image into a PNG, a row of tiles at a time"""
+    if image.dtype != np.uint8:
+        raise ValueError("Only 8-bit tiled images can be written as PNG")
+    writer = PngBandWriter(target, image.width, image.height, image.channels, level)
+    with writer:
+        for y in range(0, image.height, image.tile_size):
+            bottom = min(y + image.tile_size, image.height)
+            writer.write(image.read(0, y, image.width, bottom))
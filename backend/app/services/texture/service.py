@@ -0,0 +1,335 @@
+from contextlib import AsyncExitStack
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.services.geometry import GeometryService
+from app.services.geometry.gltf_reader import GltfAsset
+from app.services.geometry.mesh import Mesh, mesh_file_type
+from app.services.storage import AssetStorage, TiledImage, storage, tile_directory
+from app.services.texture.bake import (
+    BakeSource,
+    bake_maps,
+    bake_options,
+    bake_pool,
+    source_from_glb,
+    source_from_mesh,
+)
+from app.services.texture.optimize import (
+    LOSSLESS_MAPS,
+    TEXTURE_FORMATS,
+    load_texture,
+    map_kind,
+    texture_encoder,
+    texture_levels,
+    texture_options,
+    write_texture,
+)
+from app.services.texture.pack import (
+    ChannelSource,
+    layout_textures,
+    material_textures,
+    pack_layout,
+    pack_material,
+    packing_map,
+)
+from app.services.texture.png import tiles_to_png
+import asyncio
+import logging
+import os
+import tempfile
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+class TextureService:
+    """Texture operations behind the texture endpoints
+
+    Meshes are loaded, and results memoized, through the geometry service,
+    so a baked mesh shares its BVH and cache with the geometry stages.
+    """
+
+    def __init__(
+        self,
+        asset_storage: Optional[AssetStorage] = None,
+        geometry: Optional[GeometryService] = None,
+    ):
+        self.storage = asset_storage or storage
+        self.geometry = geometry or GeometryService(self.storage)
+
+    async def load_source(self, mesh_url: str) -> BakeSource:
+        """High-poly mesh to bake from, with the materials and textures of GLB files"""
+        loop = asyncio.get_running_loop()
+        if mesh_file_type(mesh_url) == "glb":
+            async with self.storage.local_file(mesh_url) as path:
+                asset = await loop.run_in_executor(None, GltfAsset.open, path)
+                return await loop.run_in_executor(None, source_from_glb, asset)
+        mesh = await self.geometry.load_mesh(mesh_url, ("uvs", "normals"))
+        return await loop.run_in_executor(None, source_from_mesh, mesh)
+
+    async def bake_textures(
+        self,
+        mesh_url: str,
+        textures: List[str],
+        options: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Bake maps of a high-poly mesh into the UV layout of mesh_url
+
+        The high-poly mesh is options["high_poly_url"]; without one the mesh
+        bakes onto itself, which transfers its materials into textures and
+        bakes its ambient occlusion.
+        """
+        options = options or {}
+        values = bake_options(textures, options)
+        high_url = options.get("high_poly_url") or mesh_url
+        mesh = await self.geometry.load_mesh(mesh_url, ("uvs", "normals", "tangents"))
+        if mesh.uvs is None:
+            raise ValueError("Mesh has no UVs; unwrap it before baking")
+        source = await self.load_source(high_url)
+        key = {**values, "source": source.content_hash}
+        return await self.geometry.memoized(
+            "bake", mesh, key, lambda: self._bake(mesh_url, mesh, source, values)
+        )
+
+    async def _bake(
+        self,
+        mesh_url: str,
+        mesh: Mesh,
+        source: BakeSource,
+        options: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        bvh = await self.geometry.mesh_bvh(source.mesh)
+        with tempfile.TemporaryDirectory(dir=tile_directory()) as root:
+            directory = Path(root)
+            images, stats = await loop.run_in_executor(
+                None, bake_maps, mesh, source, bvh, options, directory, bake_pool()
+            )
+            try:
+                targets = {name: directory / f"{name}.png" for name in images}
+                writes = [
+                    loop.run_in_executor(None, tiles_to_png, image, targets[name])
+                    for name, image in images.items()
+                ]
+                await asyncio.gather(*writes)
+            finally:
+                for image in images.values():
+                    image.close()
+            bake_id = uuid.uuid4()
+            texture_urls = {}
+            for name, target in targets.items():
+                key = f"textures/baked/{bake_id}_{name}.png"
+                url = await self.storage.store_file(key, target, "image/png")
+                texture_urls[name] = url
+        logger.info(
+            f"Baked {', '.join(images)} for {mesh_url} at {stats['resolution']}px "
+            f"in {stats['seconds']:.2f}s "
+            f"({stats['texels_per_second']:.0f} texels/s, {stats['workers']} workers)"
+        )
+        return {"texture_urls": texture_urls, "stats": stats}
+
+    async def pack_textures(
+        self,
+        texture_urls: Dict[str, Any],
+        packing_method: str = "orm",
+        channels: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Pack the channels of PNG maps into new images, a band of rows at a time
+
+        texture_urls maps map names to URLs, or material names to such
+        mappings; up to TEXTURE_PACK_CONCURRENCY materials are packed at once.
+        """
+        materials, nested = material_textures(texture_urls)
+        layouts = {
+            name: pack_layout(textures, packing_method, channels)
+            for name, textures in materials.items()
+        }
+        started = time.perf_counter()
+        limit = asyncio.Semaphore(settings.TEXTURE_PACK_CONCURRENCY)
+
+        async def pack(name: str) -> Dict[str, Any]:
+            async with limit:
+                return await self._pack_material(materials[name], layouts[name])
+
+        results = await asyncio.gather(*(pack(name) for name in materials))
+        seconds = time.perf_counter() - started
+        logger.info(
+            f"Packed {len(materials)} materials ({packing_method}) "
+            f"in {seconds:.2f}s"
+        )
+        if not nested:
+            return results[0]
+        return {
+            "materials": dict(zip(materials, results)),
+            "stats": {"materials": len(materials), "seconds": seconds},
+        }
+
+    async def _pack_material(
+        self,
+        textures: Dict[str, str],
+        layout: Dict[str, Dict[str, ChannelSource]],
+    ) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        used = layout_textures(layout)
+        async with AsyncExitStack() as stack:
+            paths: Dict[str, Path] = {}
+            for key in used:
+                local_file = self.storage.local_file(textures[key])
+                paths[key] = await stack.enter_async_context(local_file)
+            directory = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+            targets = {
+                output: directory / f"{index}.png"
+                for index, output in enumerate(layout)
+            }
+            stats = await loop.run_in_executor(
+                None, pack_material, paths, layout, targets
+            )
+            pack_id = uuid.uuid4()
+            urls = {}
+            for output in layout:
+                key = f"textures/packed/{pack_id}_{output}.png"
+                target = targets[output]
+                urls[output] = await self.storage.store_file(key, target, "image/png")
+        result = {
+            "packed_texture_urls": urls,
+            "packing_map": packing_map(layout),
+            "stats": stats,
+        }
+        if len(urls) == 1:
+            result["packed_texture_url"] = next(iter(urls.values()))
+        return result
+
+    async def optimize_textures(
+        self,
+        texture_urls: Dict[str, str],
+        target: str,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Downsize textures for a target, build their mip chains and re-encode them
+
+        Each texture is tiled on disk and every level is built tile by tile,
+        so memory does not grow with the texture size. Levels are encoded on
+        the texture encoder threads while the next map is filtered. Sizes
+        and ratios in the stats are of the encoded files.
+        """
+        values = texture_options(target, options)
+        if not texture_urls or not all(
+            isinstance(url, str) for url in texture_urls.values()
+        ):
+            raise ValueError("texture_urls must map maps to texture URLs")
+        loop = asyncio.get_running_loop()
+        encoder = texture_encoder()
+        image_format, quality = values["format"], values["quality"]
+        content_type = TEXTURE_FORMATS[image_format]
+        started = time.perf_counter()
+        optimize_id = uuid.uuid4()
+        optimized_urls: Dict[str, str] = {}
+        mip_urls: Dict[str, List[str]] = {}
+        maps: Dict[str, Dict[str, Any]] = {}
+        with tempfile.TemporaryDirectory(dir=tile_directory()) as root:
+            # Per map: kind, file size, source size, levels, level files, encodes
+            pending: Dict[
+                str,
+                Tuple[
+                    str,
+                    int,
+                    Tuple[int, int],
+                    List[TiledImage],
+                    List[Path],
+                    List[asyncio.Future],
+                ],
+            ] = {}
+            try:
+                for index, (name, url) in enumerate(texture_urls.items()):
+                    directory = Path(root) / str(index)
+                    directory.mkdir()
+                    async with self.storage.local_file(url) as path:
+                        original_bytes = os.path.getsize(path)
+                        tiles = directory / "source.tiles"
+                        source = await loop.run_in_executor(
+                            None, load_texture, path, tiles
+                        )
+                    try:
+                        kind = map_kind(name)
+                        levels = await loop.run_in_executor(
+                            None, texture_levels, source, kind, values, directory
+                        )
+                    finally:
+                        source.close()
+                        source.path.unlink()
+                    lossless = kind in LOSSLESS_MAPS
+                    targets = [
+                        directory / f"{level}.{image_format}"
+                        for level in range(len(levels))
+                    ]
+                    encodes = []
+                    for level, (image, path) in enumerate(zip(levels, targets)):
+                        args = (image, path, image_format, quality, lossless, not level)
+                        encode = loop.run_in_executor(encoder, write_texture, *args)
+                        encodes.append(encode)
+                    size = (source.width, source.height)
+                    pending[name] = (
+                        kind, original_bytes, size, levels, targets, encodes
+                    )
+
+                for name, entry in pending.items():
+                    kind, original_bytes, source_size, levels, targets, encodes = entry
+                    errors = await asyncio.gather(*encodes)
+                    sizes = [path.stat().st_size for path in targets]
+                    prefix = f"textures/optimized/{optimize_id}_{name}"
+                    urls = []
+                    for level, path in enumerate(targets):
+                        suffix = f"_mip{level}" if level else ""
+                        key = f"{prefix}{suffix}.{image_format}"
+                        url = await self.storage.store_file(key, path, content_type)
+                        urls.append(url)
+                    optimized_urls[name], mip_urls[name] = urls[0], urls
+                    maps[name] = {
+                        "kind": kind,
+                        "original_size": list(source_size),
+                        "size": [levels[0].width, levels[0].height],
+                        "levels": len(levels),
+                        "original_bytes": original_bytes,
+                        "bytes": sizes[0],
+                        "mip_chain_bytes": sum(sizes),
+                        "compression_ratio": sizes[0] / max(original_bytes, 1),
+                        "psnr": errors[0],
+                    }
+            finally:
+                for _, _, _, levels, _, encodes in pending.values():
+                    await asyncio.gather(*encodes, return_exceptions=True)
+                    for image in levels:
+                        image.close()
+
+        seconds = time.perf_counter() - started
+        original = sum(stats["original_bytes"] for stats in maps.values())
+        optimized = sum(stats["bytes"] for stats in maps.values())
+        source_sizes = [stats["original_size"] for stats in maps.values()]
+        pixels = sum(width * height for width, height in source_sizes)
+        megapixels = pixels / 1e6
+        mip_chain_bytes = sum(stats["mip_chain_bytes"] for stats in maps.values())
+        ratio = optimized / max(original, 1)
+        logger.info(
+            f"Optimized {len(maps)} textures for {target}: "
+            f"{original} -> {optimized} bytes "
+            f"in {seconds:.2f}s ({megapixels / max(seconds, 1e-9):.1f} MP/s)"
+        )
+        return {
+            "optimized_texture_urls": optimized_urls,
+            "mip_urls": mip_urls,
+            "stats": {
+                "target": target,
+                "format": image_format,
+                "max_size": values["max_size"],
+                "mipmaps": values["mipmaps"],
+                "maps": maps,
+                "original_bytes": original,
+                "optimized_bytes": optimized,
+                "mip_chain_bytes": mip_chain_bytes,
+                "compression_ratio": ratio,
+                "file_size_reduction": 1.0 - ratio,
+                "megapixels": megapixels,
+                "seconds": seconds,
+                "megapixels_per_second": megapixels / max(seconds, 1e-9),
+            },
+        }
@@ -0,0 +1,49 @@
+from .broker import (
+    MessageBroker,
+    InMemoryBus,
+    InMemoryBroker,
+    RedisBroker,
+    create_broker,
+)
+from .protocol import (
+    PROTOCOL_VERSION,
+    SUPPORTED_ENCODINGS,
+    ClientFormat,
+    Envelope,
+    negotiate_format,
+    parse_last_seq,
+    run_topic,
+)
+from .hub import WebSocketHub, Subscriber, hub
+from .preview import encode_preview, parse_frame_header, preview_topic, publish_preview
+from .connections import ConnectionManager, connections
+from .studio import StudioHub, StudioFilter, StudioConnection, studio, studio_topic
+
+__all__ = [
+    "MessageBroker",
+    "InMemoryBus",
+    "InMemoryBroker",
+    "RedisBroker",
+    "create_broker",
+    "PROTOCOL_VERSION",
+    "SUPPORTED_ENCODINGS",
+    "ClientFormat",
+    "Envelope",
+    "negotiate_format",
+    "parse_last_seq",
+    "run_topic",
+    "WebSocketHub",
+    "Subscriber",
+    "hub",
+    "encode_preview",
+    "parse_frame_header",
+    "preview_topic",
+    "publish_preview",
+    "ConnectionManager",
+    "connections",
+    "StudioHub",
+    "StudioFilter",
+    "StudioConnection",
+    "studio",
+    "studio_topic",
+]
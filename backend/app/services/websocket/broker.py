@@ -0,0 +1,253 @@
+from collections import deque
+from typing import (
+    TYPE_CHECKING,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Union,
+)
+import asyncio
+import logging
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+    from redis.asyncio.client import PubSub
+
+logger = logging.getLogger(__name__)
+
+# Channel prefix for WebSocket topics on the shared broker
+CHANNEL_PREFIX = "voxelverve:ws:"
+
+# Key prefix and lifetime for the latest state snapshot of a topic
+STATE_PREFIX = "voxelverve:ws-state:"
+STATE_TTL_SECONDS = 24 * 60 * 60
+
+# Key prefixes for the sequence counter and the bounded buffer of recent
+# sequenced events of a topic
+SEQ_PREFIX = "voxelverve:ws-seq:"
+EVENTS_PREFIX = "voxelverve:ws-events:"
+
+# Broker payloads are text for JSON events and bytes for binary frames
+BrokerPayload = Union[str, bytes]
+
+MessageHandler = Callable[[str, BrokerPayload], Awaitable[None]]
+
+class MessageBroker:
+    """Relays serialized WebSocket events between worker processes"""
+
+    def __init__(self):
+        self._handler: Optional[MessageHandler] = None
+
+    async def start(self, handler: MessageHandler):
+        """Begin delivering messages for subscribed topics to handler(topic, payload)"""
+        self._handler = handler
+
+    async def close(self):
+        self._handler = None
+
+    async def publish(self, topic: str, payload: BrokerPayload):
+        raise NotImplementedError
+
+    async def subscribe(self, topic: str):
+        raise NotImplementedError
+
+    async def unsubscribe(self, topic: str):
+        raise NotImplementedError
+
+    async def set_state(self, topic: str, payload: str):
+        """Store the latest state snapshot of a topic for processes that join later"""
+        raise NotImplementedError
+
+    async def get_state(self, topic: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def next_seq(self, topic: str) -> int:
+        """Allocate the next sequence number of a topic, shared by every publisher"""
+        raise NotImplementedError
+
+    async def append_event(self, topic: str, payload: str, limit: int):
+        """Append to the topic's event buffer, keeping only the newest limit entries"""
+        raise NotImplementedError
+
+    async def get_events(self, topic: str) -> List[str]:
+        """Buffered events of a topic, oldest first"""
+        raise NotImplementedError
+
+class InMemoryBus:
+    """Shared channels and state store for in-memory brokers"""
+
+    def __init__(self):
+        self.channels: Dict[str, Set["InMemoryBroker"]] = {}
+        self.state: Dict[str, str] = {}
+        self.seqs: Dict[str, int] = {}
+        self.events: Dict[str, Deque[str]] = {}
+
+class InMemoryBroker(MessageBroker):
+    """Process-local broker; instances sharing a bus behave like separate workers"""
+
+    def __init__(self, bus: Optional[InMemoryBus] = None):
+        super().__init__()
+        self.bus = bus if bus is not None else InMemoryBus()
+        self.topics: Set[str] = set()
+
+    async def publish(self, topic: str, payload: BrokerPayload):
+        for broker in list(self.bus.channels.get(topic, ())):
+            if broker._handler is not None:
+                await broker._handler(topic, payload)
+
+    async def subscribe(self, topic: str):
+        self.topics.add(topic)
+        self.bus.channels.setdefault(topic, set()).add(self)
+
+    async def unsubscribe(self, topic: str):
+        self.topics.discard(topic)
+        brokers = self.bus.channels.get(topic)
+        if brokers is not None:
+            brokers.discard(self)
+            if not brokers:
+                del self.bus.channels[topic]
+
+    async def set_state(self, topic: str, payload: str):
+        self.bus.state[topic] = payload
+
+    async def get_state(self, topic: str) -> Optional[str]:
+        return self.bus.state.get(topic)
+
+    async def next_seq(self, topic: str) -> int:
+        self.bus.seqs[topic] = self.bus.seqs.get(topic, 0) + 1
+        return self.bus.seqs[topic]
+
+    async def append_event(self, topic: str, payload: str, limit: int):
+        events = self.bus.events.get(topic)
+        if events is None or events.maxlen != limit:
+            events = self.bus.events[topic] = deque(events or (), maxlen=limit)
+        events.append(payload)
+
+    async def get_events(self, topic: str) -> List[str]:
+        return list(self.bus.events.get(topic, ()))
+
+    async def close(self):
+        for topic in list(self.topics):
+            await self.unsubscribe(topic)
+        await super().close()
+
+class RedisBroker(MessageBroker):
+    """Redis pub/sub broker
+
+    Each process subscribes only to the topics it has sockets for.
+    """
+
+    def __init__(self, url: str):
+        super().__init__()
+        self.url = url
+        self._redis: Optional["Redis"] = None
+        self._pubsub: Optional["PubSub"] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, handler: MessageHandler):
+        import redis.asyncio as redis
+
+        await super().start(handler)
+        self._redis = redis.from_url(self.url)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def close(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        if self._pubsub:
+            await self._pubsub.close()
+        if self._redis:
+            await self._redis.close()
+        await super().close()
+
+    def _client(self) -> "Redis":
+        if self._redis is None:
+            raise RuntimeError("Redis broker used before start()")
+        return self._redis
+
+    def _subscriber(self) -> "PubSub":
+        if self._pubsub is None:
+            raise RuntimeError("Redis broker used before start()")
+        return self._pubsub
+
+    async def publish(self, topic: str, payload: BrokerPayload):
+        await self._client().publish(CHANNEL_PREFIX + topic, payload)
+
+    async def subscribe(self, topic: str):
+        await self._subscriber().subscribe(CHANNEL_PREFIX + topic)
+
+    async def unsubscribe(self, topic: str):
+        await self._subscriber().unsubscribe(CHANNEL_PREFIX + topic)
+
+    async def set_state(self, topic: str, payload: str):
+        await self._client().set(STATE_PREFIX + topic, payload, ex=STATE_TTL_SECONDS)
+
+    async def get_state(self, topic: str) -> Optional[str]:
+        payload = await self._client().get(STATE_PREFIX + topic)
+        if isinstance(payload, bytes):
+            payload = payload.decode()
+        return payload
+
+    async def next_seq(self, topic: str) -> int:
+        key = SEQ_PREFIX + topic
+        async with self._client().pipeline(transaction=True) as pipe:
+            pipe.incr(key)
+            pipe.expire(key, STATE_TTL_SECONDS)
+            seq, _ = await pipe.execute()
+        return seq
+
+    async def append_event(self, topic: str, payload: str, limit: int):
+        key = EVENTS_PREFIX + topic
+        async with self._client().pipeline(transaction=True) as pipe:
+            pipe.rpush(key, payload)
+            pipe.ltrim(key, -limit, -1)
+            pipe.expire(key, STATE_TTL_SECONDS)
+            await pipe.execute()
+
+    async def get_events(self, topic: str) -> List[str]:
+        events = await self._client().lrange(EVENTS_PREFIX + topic, 0, -1)
+        return [
+            event.decode() if isinstance(event, bytes) else event for event in events
+        ]
+
+    async def _listen(self):
+        while True:
+            try:
+                if not self._pubsub.subscribed:
+                    # The pub/sub connection is only opened by the first subscribe
+                    await asyncio.sleep(0.1)
+                    continue
+
+                message = await self._pubsub.get_message(timeout=1.0)
+                if message is None or message["type"] != "message":
+                    continue
+
+                channel = message["channel"]
+                if isinstance(channel, bytes):
+                    channel = channel.decode()
+                await self._handler(channel[len(CHANNEL_PREFIX):], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"WebSocket broker listener error: {e}")
+                await asyncio.sleep(1.0)
+
+def create_broker(url: Optional[str]) -> Optional[MessageBroker]:
+    """Create a broker for WS_MESSAGE_QUEUE_URL
+
+    An empty URL keeps delivery in-process.
+    """
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return InMemoryBroker()
+    return RedisBroker(url)
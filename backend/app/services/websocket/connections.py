@@ -0,0 +1,122 @@
+from typing import Any, AsyncIterator, Dict, Optional
+from fastapi import WebSocket
+from app.core.config import settings
+from app.services.websocket.hub import Subscriber
+import asyncio
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Close codes for connections the server ends on its own
+IDLE_CLOSE_CODE = 1001
+CAPACITY_CLOSE_CODE = 1013
+
+# Seconds a rejected client is asked to wait before reconnecting
+CAPACITY_RETRY_AFTER_SECONDS = 5
+
+class ConnectionManager:
+    """Per-process WebSocket admission, heartbeats and idle reaping
+
+    The server sends ``{"type": "ping"}`` when a socket has been quiet for a
+    heartbeat interval; clients answer with ``{"type": "pong"}``. Any client
+    message counts as activity, and sockets with none for the idle timeout
+    are closed.
+    """
+
+    def __init__(
+        self,
+        max_connections: Optional[int] = None,
+        heartbeat_interval: Optional[float] = None,
+        idle_timeout: Optional[float] = None,
+    ):
+        self.max_connections = max_connections or settings.WS_MAX_CONNECTIONS
+        self.heartbeat_interval = (
+            heartbeat_interval or settings.WS_HEARTBEAT_INTERVAL_SECONDS
+        )
+        self.idle_timeout = idle_timeout or settings.WS_IDLE_TIMEOUT_SECONDS
+        self.active = 0
+        self.peak = 0
+        self.rejected = 0
+        self.reaped = 0
+        self.pings = 0
+
+    async def admit(self, websocket: WebSocket) -> bool:
+        """Accept a socket, or ask the client to retry later when the process is full"""
+        await websocket.accept()
+        if self.active >= self.max_connections:
+            self.rejected += 1
+            try:
+                await websocket.send_text(json.dumps({
+                    "type": "error",
+                    "data": {
+                        "message": "Server at connection capacity",
+                        "retry_after": CAPACITY_RETRY_AFTER_SECONDS,
+                    }
+                }))
+                await websocket.close(code=CAPACITY_CLOSE_CODE)
+            except Exception:
+                pass
+            return False
+
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        return True
+
+    def release(self):
+        self.active -= 1
+
+    async def messages(
+        self,
+        websocket: WebSocket,
+        subscriber: Subscriber,
+    ) -> AsyncIterator[Any]:
+        """Yield decoded client messages, answering heartbeats and reaping idle sockets
+
+        Messages that are not valid JSON are skipped. Ends when the socket
+        is reaped; a client disconnect raises WebSocketDisconnect as usual.
+        """
+        loop = asyncio.get_running_loop()
+        last_seen = loop.time()
+        while True:
+            try:
+                message = await asyncio.wait_for(
+                    websocket.receive_text(), timeout=self.heartbeat_interval
+                )
+            except asyncio.TimeoutError:
+                if loop.time() - last_seen >= self.idle_timeout:
+                    logger.info(
+                        f"Closing idle WebSocket subscriber {subscriber.id} "
+                        f"on {subscriber.topic}"
+                    )
+                    self.reaped += 1
+                    subscriber.close(code=IDLE_CLOSE_CODE)
+                    return
+                self.pings += 1
+                subscriber.send({"type": "ping", "data": {"ts": time.time()}})
+                continue
+
+            last_seen = loop.time()
+            try:
+                payload = json.loads(message)
+            except ValueError:
+                continue
+
+            if isinstance(payload, dict) and payload.get("type") in ("ping", "pong"):
+                if payload["type"] == "ping":
+                    subscriber.send({"type": "pong", "data": payload.get("data") or {}})
+                continue
+            yield payload
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "peak": self.peak,
+            "max_connections": self.max_connections,
+            "rejected": self.rejected,
+            "reaped": self.reaped,
+            "pings": self.pings,
+        }
+
+connections = ConnectionManager()
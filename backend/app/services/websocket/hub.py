@@ -0,0 +1,654 @@
+from collections import deque
+from typing import (
+    Any, Callable, Deque, Dict, List, Mapping, NamedTuple, Optional, Sequence, Set,
+)
+from fastapi import WebSocket
+from app.core.config import settings
+from app.services.websocket.broker import MessageBroker, create_broker
+from app.services.websocket.protocol import (
+    DEFAULT_FORMAT,
+    PROTOCOL_VERSION,
+    TERMINAL_STATUSES,
+    ClientFormat,
+    Envelope,
+    apply_run_delta,
+    diff_run_state,
+    normalize_run_state,
+)
+import asyncio
+import json
+import logging
+import struct
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Length prefix of each frame in a binary broker payload
+FRAME_LENGTH = struct.Struct("<I")
+
+# Close code sent to subscribers that cannot keep up with non-droppable traffic
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+# Receives envelopes for a topic in place of a socket, e.g. to batch them
+TopicSink = Callable[[str, Envelope], None]
+
+class TopicState(NamedTuple):
+    seq: int
+    state: Optional[Dict[str, Any]]
+
+def split_frames(buffer: memoryview) -> List[memoryview]:
+    """Slice a length-prefixed binary broker payload into frame views"""
+    frames = []
+    offset = 0
+    while offset < buffer.nbytes:
+        (length,) = FRAME_LENGTH.unpack_from(buffer, offset)
+        offset += FRAME_LENGTH.size
+        frames.append(buffer[offset:offset + length])
+        offset += length
+    return frames
+
+class Subscriber:
+    """A single WebSocket attached to a topic with its own bounded send queue"""
+
+    def __init__(
+        self,
+        topic: str,
+        websocket: WebSocket,
+        max_queue_size: int,
+        fmt: ClientFormat = DEFAULT_FORMAT,
+    ):
+        self.id = str(uuid.uuid4())
+        self.topic = topic
+        self.websocket = websocket
+        self.max_queue_size = max_queue_size
+        self.format = fmt
+        self.queue: Deque[Envelope] = deque()
+        self.sent = 0
+        self.sent_bytes = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.closed = False
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the sender task"""
+        self._task = asyncio.create_task(self._sender())
+
+    def send(self, message: Dict[str, Any]) -> bool:
+        """Queue a message for this subscriber only"""
+        return self.enqueue(Envelope.from_message(message))
+
+    def enqueue(self, envelope: Envelope) -> bool:
+        """Queue an envelope without blocking; returns False if it was dropped"""
+        if self.closed:
+            return False
+
+        if len(self.queue) >= self.max_queue_size:
+            kept = self._make_room(envelope)
+            if kept is None:
+                return False
+            envelope = kept
+
+        self.queue.append(envelope)
+        self.max_depth = max(self.max_depth, len(self.queue))
+        self._ready.set()
+        return True
+
+    def _make_room(self, envelope: Envelope) -> Optional[Envelope]:
+        """Apply the slow consumer policy to a full queue
+
+        Queued intermediate updates are discarded in favour of the incoming
+        one. Run state is resent as a snapshot so delta clients stay
+        consistent; to make room for a message that must be delivered,
+        queued run state is collapsed into one snapshot of the latest.
+        Returns the envelope to queue, or None if it was dropped.
+        """
+        if envelope.droppable:
+            kept = deque(queued for queued in self.queue if not queued.droppable)
+            evicted = len(self.queue) - len(kept)
+            if evicted:
+                self.queue = kept
+                self.dropped += evicted
+                return envelope.as_snapshot() if envelope.is_state else envelope
+        else:
+            # Evict the oldest intermediate update to make room for the new message
+            for index, queued in enumerate(self.queue):
+                if queued.droppable and not queued.is_state:
+                    del self.queue[index]
+                    self.dropped += 1
+                    return envelope
+            if self._collapse_state():
+                return envelope
+
+        # Queue is full of messages we must deliver
+        self.dropped += 1
+        if envelope.droppable and not envelope.is_state:
+            return None
+        logger.warning(f"Closing slow WebSocket subscriber {self.id} on {self.topic}")
+        self.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        return None
+
+    def _collapse_state(self) -> bool:
+        """Replace queued run state with a snapshot of the latest, in its place
+
+        Returns False if that frees no room: one state envelope or fewer is
+        queued, or the latest was replayed without its state.
+        """
+        states = [queued for queued in self.queue if queued.is_state]
+        if len(states) < 2 or states[-1].state is None:
+            return False
+        latest = states[-1]
+        collapsed: Deque[Envelope] = deque()
+        for queued in self.queue:
+            if queued is latest:
+                collapsed.append(latest.as_snapshot())
+            elif not queued.is_state:
+                collapsed.append(queued)
+        self.queue = collapsed
+        self.dropped += len(states) - 1
+        return True
+
+    async def _sender(self):
+        """Drain the queue to the socket"""
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+
+                envelope = self.queue.popleft()
+                if envelope.frames is not None:
+                    for frame in envelope.frames:
+                        await self.websocket.send_bytes(frame)
+                        self.sent_bytes += frame.nbytes
+                    self.sent += 1
+                    continue
+
+                payload = envelope.encode(self.format)
+                if not isinstance(payload, str):
+                    await self.websocket.send_bytes(payload)
+                else:
+                    await self.websocket.send_text(payload)
+                self.sent += 1
+                self.sent_bytes += len(payload)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.info(
+                f"WebSocket subscriber {self.id} on {self.topic} send failed: {e}"
+            )
+            self.closed = True
+
+    def close(self, code: Optional[int] = None):
+        """Stop delivering messages, optionally closing the socket with a code"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        self._ready.set()
+        if code is not None:
+            asyncio.create_task(self._close_socket(code))
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def wait_closed(self):
+        """Wait for the sender task to exit"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "topic": self.topic,
+            "protocol": self.format.version,
+            "encoding": self.format.encoding,
+            "queue_depth": len(self.queue),
+            "max_queue_depth": self.max_depth,
+            "sent": self.sent,
+            "sent_bytes": self.sent_bytes,
+            "dropped": self.dropped,
+        }
+
+class WebSocketHub:
+    """Topic based pub/sub fan-out for WebSocket connections
+
+    With a broker configured, published events go through the broker so every
+    worker process delivers them to its own sockets; the hub only subscribes
+    to broker topics that have at least one local subscriber.
+
+    Run state is published as sequence-numbered deltas. Each process keeps
+    the current state of the topics it serves so new subscribers can start
+    from a snapshot, and the producer stores the latest snapshot in the
+    broker for processes that join a topic mid-run.
+
+    Sequenced events (deltas and run events) are also kept in a bounded
+    history per topic, mirrored in the broker, so a reconnecting client that
+    sends the last sequence number it saw is replayed only what it missed.
+    """
+
+    def __init__(
+        self,
+        max_queue_size: Optional[int] = None,
+        broker: Optional[MessageBroker] = None,
+        replay_size: Optional[int] = None,
+    ):
+        self.max_queue_size = max_queue_size or settings.WS_SEND_QUEUE_SIZE
+        self.replay_size = replay_size or settings.WS_REPLAY_BUFFER_SIZE
+        self.broker = broker
+        self.topics: Dict[str, Set[Subscriber]] = {}
+        self.sinks: Dict[str, Set[TopicSink]] = {}
+        # Latest state of topics with local subscribers
+        self.states: Dict[str, TopicState] = {}
+        # Recent sequenced envelopes of topics with local subscribers
+        self.histories: Dict[str, Deque[Envelope]] = {}
+        # State of topics this process publishes to
+        self._published_states: Dict[str, TopicState] = {}
+        self._joining: Dict[str, int] = {}
+        self.published = 0
+        self.relayed = 0
+        self.dropped = 0
+        self.replayed = 0
+        self.resynced = 0
+        self._started = False
+        self._start_lock = asyncio.Lock()
+
+    async def start(self):
+        """Connect the broker relay; safe to call more than once"""
+        async with self._start_lock:
+            if self._started:
+                return
+            if self.broker is not None:
+                await self.broker.start(self._on_broker_message)
+                for topic in set(self.topics) | set(self.sinks):
+                    await self.broker.subscribe(topic)
+            self._started = True
+
+    async def stop(self):
+        """Disconnect the broker relay"""
+        if self._started and self.broker is not None:
+            await self.broker.close()
+        self._started = False
+
+    async def subscribe(
+        self,
+        topic: str,
+        websocket: WebSocket,
+        fmt: ClientFormat = DEFAULT_FORMAT,
+        greeting: Optional[Dict[str, Any]] = None,
+        last_seq: Optional[int] = None,
+    ) -> Subscriber:
+        """Attach a WebSocket to a topic
+
+        The greeting is queued first, followed by the events after last_seq
+        when the client is resuming and they are still buffered, or else a
+        snapshot of the topic state if there is one.
+        """
+        await self.start()
+
+        first = not self._has_local_interest(topic)
+        self._joining[topic] = self._joining.get(topic, 0) + 1
+        try:
+            if first and self.broker is not None:
+                await self.broker.subscribe(topic)
+                await self._refresh_state(topic)
+            elif (
+                self.broker is None
+                and topic not in self.states
+                and topic in self._published_states
+            ):
+                self.states[topic] = self._published_states[topic]
+        finally:
+            self._joining[topic] -= 1
+            if not self._joining[topic]:
+                del self._joining[topic]
+
+        subscriber = Subscriber(topic, websocket, self.max_queue_size, fmt)
+        self.topics.setdefault(topic, set()).add(subscriber)
+        if greeting is not None:
+            subscriber.send(greeting)
+
+        missed = None
+        if last_seq is not None and fmt.version >= PROTOCOL_VERSION:
+            missed = self.replay(topic, last_seq)
+        if missed is not None:
+            for envelope in missed:
+                subscriber.enqueue(envelope)
+            self.replayed += len(missed)
+        else:
+            current = self.states.get(topic)
+            if current is not None and current.state is not None:
+                subscriber.enqueue(Envelope.for_state(current.seq, None, current.state))
+                if last_seq is not None:
+                    self.resynced += 1
+        subscriber.start()
+        return subscriber
+
+    def replay(self, topic: str, last_seq: int) -> Optional[List[Envelope]]:
+        """Buffered envelopes after last_seq, or None if a snapshot is needed instead
+
+        A snapshot is used when the gap reaches past the buffer, or when the
+        missed events would fill more than half of a send queue.
+        """
+        current = self.states.get(topic)
+        if current is None or last_seq > current.seq:
+            return None
+        if last_seq == current.seq:
+            return []
+
+        history = self.histories.get(topic)
+        first = history[0].seq if history else None
+        if not history or first is None or first > last_seq + 1:
+            return None
+        missed = [
+            envelope
+            for envelope in history
+            if envelope.seq is not None and envelope.seq > last_seq
+        ]
+        if len(missed) > self.max_queue_size // 2:
+            return None
+        return missed
+
+    async def unsubscribe(self, subscriber: Subscriber):
+        """Detach a subscriber and stop its sender task"""
+        topic = subscriber.topic
+        subscribers = self.topics.get(topic)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.topics[topic]
+                await self._release_topic(topic)
+
+        self.dropped += subscriber.dropped
+        subscriber.close()
+        await subscriber.wait_closed()
+
+    async def add_sink(self, topic: str, sink: TopicSink):
+        """Receive every envelope published to a topic in any process"""
+        await self.start()
+        if not self._has_local_interest(topic) and self.broker is not None:
+            await self.broker.subscribe(topic)
+        self.sinks.setdefault(topic, set()).add(sink)
+
+    async def remove_sink(self, topic: str, sink: TopicSink):
+        sinks = self.sinks.get(topic)
+        if sinks is not None:
+            sinks.discard(sink)
+            if not sinks:
+                del self.sinks[topic]
+                await self._release_topic(topic)
+
+    def _has_local_interest(self, topic: str) -> bool:
+        return topic in self.topics or topic in self.sinks or topic in self._joining
+
+    async def _release_topic(self, topic: str):
+        """Drop per-topic state once nothing in this process listens to it"""
+        if self._has_local_interest(topic):
+            return
+        if self.broker is None and topic in self._published_states:
+            # In-process mode keeps live runs so reconnects can still replay
+            return
+        self.states.pop(topic, None)
+        self.histories.pop(topic, None)
+        if self.broker is not None and self._started:
+            await self.broker.unsubscribe(topic)
+
+    async def publish(
+        self,
+        topic: str,
+        message: Dict[str, Any],
+        sequenced: bool = False,
+    ):
+        """Publish a message to every subscriber of a topic in any process
+
+        Sequenced messages share the topic's sequence with its state deltas
+        and are kept for replay to reconnecting clients.
+        """
+        if sequenced:
+            previous = self._published_states.get(topic)
+            seq = await self._next_seq(topic, previous)
+            if self.broker is None:
+                self._published_states[topic] = TopicState(
+                    seq, previous.state if previous else None
+                )
+            self.published += 1
+            await self._distribute(topic, seq, {"message": message})
+            return
+
+        self.published += 1
+        envelope = Envelope.from_message(message)
+        if self.broker is not None:
+            await self.start()
+            await self.broker.publish(topic, envelope.to_wire())
+        else:
+            self.publish_local(topic, envelope)
+
+    async def publish_state(
+        self,
+        topic: str,
+        state: Mapping[str, Any],
+    ) -> Optional[int]:
+        """Publish the full run state; only the changes since the last call go out
+
+        Returns the sequence number of the published delta, or None if nothing
+        changed.
+        """
+        state = normalize_run_state(state)
+        previous = await self._published_state(topic)
+
+        delta = diff_run_state(previous.state if previous else None, state)
+        if not delta:
+            return None
+
+        seq = await self._next_seq(topic, previous)
+        self._published_states[topic] = TopicState(seq, state)
+        self.published += 1
+        await self._distribute(topic, seq, {"delta": delta}, state)
+
+        if state["status"] in TERMINAL_STATUSES:
+            self._published_states.pop(topic, None)
+            if self.broker is None:
+                await self._release_topic(topic)
+        return seq
+
+    async def _published_state(self, topic: str) -> Optional[TopicState]:
+        previous = self._published_states.get(topic)
+        if previous is None and self.broker is not None:
+            await self.start()
+            previous = await self._load_state(topic)
+        return previous
+
+    async def _next_seq(self, topic: str, previous: Optional[TopicState]) -> int:
+        # Run events and state may be published from different processes
+        if self.broker is not None:
+            await self.start()
+            return await self.broker.next_seq(topic)
+        return (previous.seq if previous else 0) + 1
+
+    async def _distribute(
+        self,
+        topic: str,
+        seq: int,
+        event: Dict[str, Any],
+        state: Optional[Dict[str, Any]] = None,
+    ):
+        """Store and publish a sequenced event; state is given for deltas"""
+        if self.broker is not None:
+            wire = "s" + json.dumps(dict(event, seq=seq))
+            if state is not None:
+                await self.broker.set_state(
+                    topic, json.dumps({"seq": seq, "state": state})
+                )
+            await self.broker.append_event(topic, wire, self.replay_size)
+            await self.broker.publish(topic, wire)
+        else:
+            await self._apply_event(topic, dict(event, seq=seq))
+
+    async def publish_frames(self, topic: str, frames: Sequence[memoryview]):
+        """Publish the frames of one preview, each sent as one binary message
+
+        The frames are queued as one unit, so a subscriber that falls behind
+        skips whole previews rather than losing frames from the middle of
+        one. Local subscribers share the caller's memoryviews. Across
+        processes the frames travel as one broker message and are sliced
+        back into views of the received buffer.
+        """
+        self.published += 1
+        if self.broker is not None:
+            await self.start()
+            wire = bytearray(b"b")
+            for frame in frames:
+                wire += FRAME_LENGTH.pack(frame.nbytes)
+                wire += frame
+            await self.broker.publish(topic, bytes(wire))
+        else:
+            self.publish_local(topic, Envelope.for_frames(frames))
+
+    def publish_local(self, topic: str, envelope: Envelope) -> int:
+        """Queue an envelope for local subscribers; returns the number queued"""
+        delivered = 0
+        for subscriber in list(self.topics.get(topic, ())):
+            if subscriber.enqueue(envelope):
+                delivered += 1
+        for sink in list(self.sinks.get(topic, ())):
+            sink(topic, envelope)
+            delivered += 1
+        return delivered
+
+    async def _on_broker_message(self, topic: str, payload):
+        self.relayed += 1
+        if isinstance(payload, bytes):
+            if payload[:1] == b"b":
+                frames = split_frames(memoryview(payload)[1:])
+                self.publish_local(topic, Envelope.for_frames(frames))
+                return
+            payload = payload.decode()
+
+        if payload[:1] == "s":
+            await self._apply_event(topic, json.loads(payload[1:]))
+        else:
+            self.publish_local(topic, Envelope.from_wire(payload))
+
+    async def _apply_event(self, topic: str, event: Dict[str, Any]):
+        if not self._has_local_interest(topic) and topic not in self.states:
+            return
+
+        seq = event["seq"]
+        current = self.states.get(topic)
+        base = current.seq if current else 0
+        if seq <= base:
+            # Already covered by a snapshot
+            return
+
+        if seq != base + 1:
+            # Missed an update; resync from the stored snapshot
+            if await self._refresh_state(topic):
+                latest = self.states[topic]
+                if latest.state is not None:
+                    self.publish_local(
+                        topic, Envelope.for_state(latest.seq, None, latest.state)
+                    )
+            return
+
+        state = current.state if current else None
+        if "delta" in event:
+            state = apply_run_delta(state, event["delta"])
+        envelope = _sequenced_envelope(event, state)
+        self.states[topic] = TopicState(seq, state)
+        self._history(topic).append(envelope)
+        self.publish_local(topic, envelope)
+
+    def _history(self, topic: str) -> Deque[Envelope]:
+        history = self.histories.get(topic)
+        if history is None:
+            history = self.histories[topic] = deque(maxlen=self.replay_size)
+        return history
+
+    async def _load_state(self, topic: str) -> Optional[TopicState]:
+        if self.broker is None:
+            return None
+        payload = await self.broker.get_state(topic)
+        if payload is None:
+            return None
+        stored = json.loads(payload)
+        return TopicState(stored["seq"], stored["state"])
+
+    async def _refresh_state(self, topic: str) -> bool:
+        """Replace the local state and history with the stored ones if they are newer
+
+        The snapshot is only stored with deltas, so run events buffered after
+        it advance the sequence. Buffered deltas older than the snapshot carry
+        no state; they are only replayed to v2 clients.
+        """
+        if self.broker is None:
+            return False
+        loaded = await self._load_state(topic)
+        payloads = await self.broker.get_events(topic)
+        events = sorted(
+            (json.loads(payload[1:]) for payload in payloads),
+            key=lambda event: event["seq"],
+        )
+
+        seq = loaded.seq if loaded else 0
+        state = loaded.state if loaded else None
+        history: Deque[Envelope] = deque(maxlen=self.replay_size)
+        for event in events:
+            if event["seq"] > seq and "delta" in event:
+                state = apply_run_delta(state, event["delta"])
+            history.append(
+                _sequenced_envelope(event, state if event["seq"] >= seq else None)
+            )
+            seq = max(seq, event["seq"])
+
+        current = self.states.get(topic)
+        if not seq or (current is not None and seq <= current.seq):
+            return False
+        self.states[topic] = TopicState(seq, state)
+        self.histories[topic] = history
+        return True
+
+    def subscriber_count(self, topic: Optional[str] = None) -> int:
+        if topic is not None:
+            return len(self.topics.get(topic, ()))
+        return sum(len(subscribers) for subscribers in self.topics.values())
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth and drop counters across all subscribers"""
+        subscribers = [s for topic in self.topics.values() for s in topic]
+        depths = [len(s.queue) for s in subscribers]
+        return {
+            "topics": len(self.topics),
+            "subscribers": len(subscribers),
+            "published": self.published,
+            "relayed": self.relayed,
+            "dropped": self.dropped + sum(s.dropped for s in subscribers),
+            "replayed": self.replayed,
+            "resynced": self.resynced,
+            "sent_bytes": sum(s.sent_bytes for s in subscribers),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "slow_subscribers": [
+                s.metrics()
+                for s in subscribers
+                if s.dropped or len(s.queue) > self.max_queue_size // 2
+            ],
+        }
+
+def _sequenced_envelope(
+    event: Dict[str, Any],
+    state: Optional[Dict[str, Any]],
+) -> Envelope:
+    if "delta" in event:
+        return Envelope.for_state(event["seq"], event["delta"], state)
+    return Envelope.from_message(event["message"], seq=event["seq"])
+
+hub = WebSocketHub(broker=create_broker(settings.WS_MESSAGE_QUEUE_URL))
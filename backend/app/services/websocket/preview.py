@@ -0,0 +1,176 @@
+from typing import Iterator, List, NamedTuple, Optional
+from app.core.config import settings
+from app.services.websocket.hub import hub
+import numpy as np
+import struct
+
+# A preview is streamed as binary WebSocket messages, each a fixed header
+# (magic, version, kind, preview_id, total, offset, count, nbytes) followed
+# by one slice of one buffer. Offsets and counts are in elements: vertices
+# for positions/colors/refinement, triangles for indices. Positions are
+# quantized to 16 bits per axis and split into byte planes so a coarse mesh
+# can be drawn before the refinement plane arrives.
+MAGIC = b"VVPV"
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct("<4sBBHIIIII")
+MANIFEST = struct.Struct("<IIBB2x3f3f")
+
+KIND_MANIFEST = 0
+KIND_POSITIONS = 1
+KIND_INDICES = 2
+KIND_COLORS = 3
+KIND_REFINE = 4
+
+# Upper bound for 16-bit quantized coordinates
+QUANTIZATION_RANGE = 65535
+
+class QuantizedPositions(NamedTuple):
+    coarse: np.ndarray  # (N, 3) uint8 high bytes
+    refine: np.ndarray  # (N, 3) uint8 low bytes
+    origin: np.ndarray  # (3,) float32
+    scale: np.ndarray  # (3,) float32, world units per quantization step
+
+class PreviewFrameHeader(NamedTuple):
+    kind: int
+    preview_id: int
+    total: int
+    offset: int
+    element_count: int
+    nbytes: int
+
+def preview_topic(run_id: str) -> str:
+    return f"preview:{run_id}"
+
+def quantize_positions(positions: np.ndarray) -> QuantizedPositions:
+    """Quantize float positions to 16 bits per axis, as high and low byte planes"""
+    positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+    if len(positions):
+        origin = positions.min(axis=0)
+        extent = positions.max(axis=0) - origin
+    else:
+        origin = np.zeros(3, dtype=np.float32)
+        extent = np.zeros(3, dtype=np.float32)
+    scale = np.where(extent > 0, extent / QUANTIZATION_RANGE, 1.0).astype(np.float32)
+
+    quantized = np.rint((positions - origin) / scale).astype(np.uint16)
+    coarse = (quantized >> 8).astype(np.uint8)
+    refine = (quantized & 0xFF).astype(np.uint8)
+    return QuantizedPositions(coarse, refine, origin.astype(np.float32), scale)
+
+def dequantize_positions(
+    coarse: np.ndarray,
+    origin: np.ndarray,
+    scale: np.ndarray,
+    refine: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Reconstruct positions; without the refinement plane the cell centre is used"""
+    quantized = coarse.astype(np.float32) * 256.0
+    quantized += refine if refine is not None else 128.0
+    return origin + quantized * scale
+
+def _element_bytes(array: np.ndarray) -> int:
+    return array.itemsize * (array.shape[1] if array.ndim > 1 else 1)
+
+def encode_preview(
+    preview_id: int,
+    positions: np.ndarray,
+    indices: np.ndarray,
+    colors: Optional[np.ndarray] = None,
+    chunk_bytes: Optional[int] = None,
+) -> List[memoryview]:
+    """Pack a preview into frames
+
+    Frames go coarse positions, triangles, colors, then refinement.
+
+    The arrays are copied once into a shared frame buffer; the returned
+    frames are memoryview slices of it.
+    """
+    chunk_bytes = chunk_bytes or settings.WS_PREVIEW_CHUNK_BYTES
+    quantized = quantize_positions(positions)
+    vertex_count = len(quantized.coarse)
+
+    index_dtype = np.uint16 if vertex_count <= 0xFFFF else np.uint32
+    triangles = np.ascontiguousarray(
+        np.asarray(indices).reshape(-1, 3), dtype=index_dtype
+    )
+    if colors is not None:
+        colors = np.asarray(colors)
+        if colors.dtype != np.uint8:
+            colors = np.clip(np.rint(colors * 255.0), 0, 255)
+        colors = np.ascontiguousarray(colors, dtype=np.uint8).reshape(vertex_count, -1)
+
+    manifest = np.frombuffer(MANIFEST.pack(
+        vertex_count,
+        len(triangles),
+        np.dtype(index_dtype).itemsize,
+        colors.shape[1] if colors is not None else 0,
+        *quantized.origin,
+        *quantized.scale,
+    ), dtype=np.uint8).reshape(1, -1)
+
+    buffers = [
+        (KIND_MANIFEST, manifest),
+        (KIND_POSITIONS, quantized.coarse),
+        (KIND_INDICES, triangles),
+    ]
+    if colors is not None:
+        buffers.append((KIND_COLORS, colors))
+    buffers.append((KIND_REFINE, quantized.refine))
+
+    # Lay out every frame, then pack them into one buffer
+    layout = []
+    size = 0
+    for kind, array in buffers:
+        element_bytes = _element_bytes(array)
+        per_chunk = max(chunk_bytes // element_bytes, 1)
+        for offset in range(0, max(len(array), 1), per_chunk):
+            count = min(per_chunk, len(array) - offset)
+            layout.append((kind, array, offset, count, size))
+            size += HEADER.size + count * element_bytes
+
+    frame_buffer = bytearray(size)
+    target = np.frombuffer(frame_buffer, dtype=np.uint8)
+    frames = []
+    for kind, array, offset, count, start in layout:
+        element_bytes = _element_bytes(array)
+        nbytes = count * element_bytes
+        HEADER.pack_into(
+            frame_buffer, start,
+            MAGIC, FORMAT_VERSION, kind, 0, preview_id,
+            len(array), offset, count, nbytes,
+        )
+        payload_start = start + HEADER.size
+        source = array.reshape(-1).view(np.uint8)
+        chunk = source[offset * element_bytes:(offset + count) * element_bytes]
+        target[payload_start:payload_start + nbytes] = chunk
+        frames.append(memoryview(frame_buffer)[start:payload_start + nbytes])
+    return frames
+
+def parse_frame_header(frame: memoryview) -> PreviewFrameHeader:
+    fields = HEADER.unpack_from(frame)
+    magic, version, kind, _, preview_id, total, offset, count, nbytes = fields
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Not a preview frame")
+    return PreviewFrameHeader(kind, preview_id, total, offset, count, nbytes)
+
+def iter_frame_payloads(frames: List[memoryview]) -> Iterator[tuple]:
+    """Yield (header, payload view) pairs for Python clients"""
+    for frame in frames:
+        header = parse_frame_header(frame)
+        yield header, frame[HEADER.size:HEADER.size + header.nbytes]
+
+async def publish_preview(
+    run_id: str,
+    preview_id: int,
+    positions: np.ndarray,
+    indices: np.ndarray,
+    colors: Optional[np.ndarray] = None,
+) -> int:
+    """Stream a mesh preview to the run's binary preview channel
+
+    Returns the frame count.
+    """
+    frames = encode_preview(preview_id, positions, indices, colors)
+    await hub.publish_frames(preview_topic(run_id), frames)
+    return len(frames)
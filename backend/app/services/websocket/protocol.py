@@ -0,0 +1,264 @@
+from typing import Any, Dict, Mapping, NamedTuple, Optional, Sequence, Union
+import json
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack is optional, clients fall back to JSON
+    msgpack = None
+
+# Version 1 sends the full run state on every tick; version 2 sends a snapshot
+# on connect followed by sequence-numbered deltas.
+LEGACY_PROTOCOL_VERSION = 1
+PROTOCOL_VERSION = 2
+
+SUPPORTED_ENCODINGS = ("json", "msgpack") if msgpack is not None else ("json",)
+
+# Top-level run fields tracked by the delta protocol
+RUN_FIELDS = (
+    "run_id",
+    "status",
+    "progress",
+    "current_stage",
+    "estimated_time_remaining",
+)
+
+# Message types that only carry intermediate state and can be coalesced away
+# when a subscriber falls behind. Everything else (completion, errors, stage
+# results) is always delivered.
+DROPPABLE_MESSAGE_TYPES = {"progress", "generation_update", "preview", "ping"}
+
+# Statuses after which no further run updates are expected
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+# Progress values are rounded so float noise does not produce deltas
+PROGRESS_PRECISION = 4
+
+Payload = Union[str, bytes]
+
+class ClientFormat(NamedTuple):
+    version: int
+    encoding: str
+
+DEFAULT_FORMAT = ClientFormat(LEGACY_PROTOCOL_VERSION, "json")
+
+def run_topic(run_id: str) -> str:
+    return f"run:{run_id}"
+
+def negotiate_format(params: Mapping[str, str]) -> ClientFormat:
+    """Pick the protocol version and encoding from the connection query string"""
+    try:
+        version = int(params.get("v", LEGACY_PROTOCOL_VERSION))
+    except ValueError:
+        version = LEGACY_PROTOCOL_VERSION
+    version = min(max(version, LEGACY_PROTOCOL_VERSION), PROTOCOL_VERSION)
+
+    # Binary encodings are only offered with the versioned protocol
+    encoding = params.get("encoding", "json")
+    if version < PROTOCOL_VERSION or encoding not in SUPPORTED_ENCODINGS:
+        encoding = "json"
+    return ClientFormat(version, encoding)
+
+def parse_last_seq(params: Mapping[str, str]) -> Optional[int]:
+    """Sequence number of the last event a reconnecting client received"""
+    try:
+        return int(params["last_seq"])
+    except (KeyError, ValueError):
+        return None
+
+def encode(message: Dict[str, Any], encoding: str) -> Payload:
+    if encoding == "msgpack":
+        return msgpack.packb(message, use_bin_type=True, default=str)
+    return json.dumps(message, separators=(",", ":"), default=str)
+
+def _round(value: Any) -> Any:
+    if isinstance(value, float):
+        return round(value, PROGRESS_PRECISION)
+    return value
+
+def normalize_run_state(state: Mapping[str, Any]) -> Dict[str, Any]:
+    """Reduce a progress update to the fields carried by the run protocol"""
+    normalized = {field: _round(state.get(field)) for field in RUN_FIELDS}
+    normalized["stages"] = [
+        {key: _round(value) for key, value in stage.items()}
+        for stage in state.get("stages") or []
+    ]
+    return normalized
+
+def diff_run_state(
+    previous: Optional[Dict[str, Any]],
+    current: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Changed run fields and changed stage fields keyed by stage id"""
+    delta: Dict[str, Any] = {}
+
+    run = {
+        field: current[field]
+        for field in RUN_FIELDS
+        if previous is None or previous.get(field) != current[field]
+    }
+    if run:
+        delta["run"] = run
+
+    previous_stages = (
+        {stage["id"]: stage for stage in previous["stages"]} if previous else {}
+    )
+    stages = {}
+    for stage in current["stages"]:
+        before = previous_stages.get(stage["id"])
+        if before is None:
+            stages[stage["id"]] = stage
+            continue
+        changed = {
+            key: value for key, value in stage.items() if before.get(key) != value
+        }
+        if changed:
+            stages[stage["id"]] = changed
+    if stages:
+        delta["stages"] = stages
+
+    return delta
+
+def apply_run_delta(
+    state: Optional[Dict[str, Any]],
+    delta: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Return a new state with a delta applied; the input state is not modified"""
+    updated: Dict[str, Any] = (
+        dict(state) if state else {field: None for field in RUN_FIELDS}
+    )
+    updated.update(delta.get("run", {}))
+
+    stages = [dict(stage) for stage in (state or {}).get("stages", [])]
+    index = {stage["id"]: stage for stage in stages}
+    for stage_id, changes in delta.get("stages", {}).items():
+        if stage_id in index:
+            index[stage_id].update(changes)
+        else:
+            stages.append(dict(changes, id=stage_id))
+    updated["stages"] = stages
+    return updated
+
+class Envelope:
+    """A published event, encoded at most once per client format
+
+    The encoded payloads are shared by all subscribers. Plain events carry a
+    message dict and, on run topics, a sequence number. Run state events
+    carry the delta, its sequence number and the full state after applying
+    it, so they can be rendered as a delta (v2), a snapshot (v2 resync) or a
+    full update (v1). Deltas replayed from the broker's event buffer have no
+    state and are only sent to v2 clients. Binary frames are sent as-is to
+    every client; the frames of one preview travel in a single envelope, so
+    a slow client drops or receives a preview as a whole.
+    """
+
+    __slots__ = (
+        "message",
+        "droppable",
+        "seq",
+        "delta",
+        "state",
+        "snapshot",
+        "frames",
+        "_encoded",
+    )
+
+    def __init__(
+        self,
+        message: Optional[Dict[str, Any]] = None,
+        droppable: bool = False,
+        seq: Optional[int] = None,
+        delta: Optional[Dict[str, Any]] = None,
+        state: Optional[Dict[str, Any]] = None,
+        snapshot: bool = False,
+        frames: Optional[Sequence[memoryview]] = None,
+    ):
+        self.message = message
+        self.droppable = droppable
+        self.seq = seq
+        self.delta = delta
+        self.state = state
+        self.snapshot = snapshot
+        self.frames = frames
+        self._encoded: Dict[ClientFormat, Payload] = {}
+
+    @classmethod
+    def from_message(
+        cls,
+        message: Dict[str, Any],
+        seq: Optional[int] = None,
+    ) -> "Envelope":
+        return cls(
+            message=message,
+            droppable=message.get("type") in DROPPABLE_MESSAGE_TYPES,
+            seq=seq,
+        )
+
+    @classmethod
+    def for_state(
+        cls,
+        seq: int,
+        delta: Optional[Dict[str, Any]],
+        state: Optional[Dict[str, Any]],
+    ) -> "Envelope":
+        # Intermediate state is always superseded by a later snapshot
+        return cls(
+            droppable=True, seq=seq, delta=delta, state=state, snapshot=delta is None
+        )
+
+    @classmethod
+    def for_frames(cls, frames: Sequence[memoryview]) -> "Envelope":
+        # A newer preview supersedes a queued one, but a preview is never cut short
+        return cls(droppable=True, frames=tuple(frames))
+
+    def as_snapshot(self) -> "Envelope":
+        return Envelope(droppable=True, seq=self.seq, state=self.state, snapshot=True)
+
+    @property
+    def is_state(self) -> bool:
+        return self.delta is not None or self.snapshot
+
+    def render(self, version: int) -> Dict[str, Any]:
+        if not self.is_state:
+            if self.message is None:
+                self.message = json.loads(self._encoded[DEFAULT_FORMAT])
+            if self.seq is not None and version >= PROTOCOL_VERSION:
+                return dict(self.message, seq=self.seq)
+            return self.message
+        if version < PROTOCOL_VERSION:
+            return {"type": "generation_update", "data": self.state}
+        if self.snapshot:
+            return {
+                "type": "snapshot",
+                "v": PROTOCOL_VERSION,
+                "seq": self.seq,
+                "data": self.state,
+            }
+        return {
+            "type": "delta",
+            "v": PROTOCOL_VERSION,
+            "seq": self.seq,
+            "data": self.delta,
+        }
+
+    def encode(self, fmt: ClientFormat) -> Payload:
+        payload = self._encoded.get(fmt)
+        if payload is None:
+            payload = encode(self.render(fmt.version), fmt.encoding)
+            self._encoded[fmt] = payload
+        return payload
+
+    def to_wire(self) -> str:
+        """Broker payload for plain events: a flag character, then the JSON text"""
+        text = self.encode(DEFAULT_FORMAT)
+        if isinstance(text, bytes):
+            text = text.decode()
+        return ("1" if self.droppable else "0") + text
+
+    @classmethod
+    def from_wire(cls, payload: str) -> "Envelope":
+        envelope = cls(droppable=payload[:1] == "1")
+        # Both protocol versions render plain events identically
+        text = payload[1:]
+        envelope._encoded[DEFAULT_FORMAT] = text
+        envelope._encoded[ClientFormat(PROTOCOL_VERSION, "json")] = text
+        return envelope
@@ -0,0 +1,228 @@
+from typing import Any, Dict, FrozenSet, List, Mapping, NamedTuple, Optional, Set, Tuple
+from fastapi import WebSocket
+from app.core.config import settings
+from app.services.websocket.hub import Subscriber, WebSocketHub, hub
+from app.services.websocket.protocol import DEFAULT_FORMAT, Envelope
+import asyncio
+import itertools
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Topic carrying events for every studio connection
+STUDIO_BROADCAST_TOPIC = "studio:*"
+
+# Event types sent to a socket for each studio view
+VIEW_EVENT_TYPES: Dict[str, FrozenSet[str]] = {
+    "runs": frozenset(
+        {"run_created", "run_updated", "run_completed", "run_failed", "run_cancelled"}
+    ),
+    "stats": frozenset({"stats_updated"}),
+    "exports": frozenset({"export_created", "export_updated"}),
+}
+
+# Event types where only the latest event per run within a tick matters
+COALESCED_EVENT_TYPES = {"run_updated", "stats_updated"}
+
+def studio_topic(user_id: str) -> str:
+    # "*" would alias the broadcast topic and receive every user's events
+    if user_id == "*":
+        raise ValueError("Invalid studio user id")
+    return f"studio:{user_id}"
+
+class StudioFilter(NamedTuple):
+    """Server-side filter for the events a studio socket receives
+
+    A field left as None matches everything.
+    """
+
+    types: Optional[FrozenSet[str]] = None
+    run_ids: Optional[FrozenSet[str]] = None
+
+    @classmethod
+    def from_params(cls, params: Mapping[str, Any]) -> "StudioFilter":
+        """Build a filter from a view name and/or explicit event types and run ids"""
+        types: Optional[Set[str]] = None
+        view = params.get("view")
+        if view:
+            if view not in VIEW_EVENT_TYPES:
+                raise ValueError(f"Unknown studio view: {view}")
+            types = set(VIEW_EVENT_TYPES[view])
+
+        explicit = _as_set(params.get("types"))
+        if explicit is not None:
+            types = explicit if types is None else types & explicit
+
+        run_ids = _as_set(params.get("run_ids"))
+        return cls(
+            frozenset(types) if types is not None else None,
+            frozenset(run_ids) if run_ids is not None else None,
+        )
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        if self.types is not None and event.get("type") not in self.types:
+            return False
+        if self.run_ids is not None:
+            run_id = (event.get("data") or {}).get("run_id")
+            if run_id is not None and run_id not in self.run_ids:
+                return False
+        return True
+
+def _as_set(value: Any) -> Optional[Set[str]]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return {item for item in value.split(",") if item}
+    return set(value)
+
+class StudioConnection:
+    def __init__(self, user_id: str, subscriber: Subscriber, filter: StudioFilter):
+        self.user_id = user_id
+        self.subscriber = subscriber
+        self.filter = filter
+
+def coalesce_events(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Keep only the latest event per (type, run) for coalesced types, in order"""
+    latest: Dict[Tuple[str, Any], int] = {}
+    for index, event in enumerate(events):
+        if event.get("type") in COALESCED_EVENT_TYPES:
+            latest[(event["type"], (event.get("data") or {}).get("run_id"))] = index
+    return [
+        event for index, event in enumerate(events)
+        if event.get("type") not in COALESCED_EVENT_TYPES
+        or latest[(event["type"], (event.get("data") or {}).get("run_id"))] == index
+    ]
+
+class StudioHub:
+    """Studio-wide delivery indexed by user, batched into one frame per tick
+
+    Events for a user are buffered as they arrive from any process and
+    flushed every tick as a single ``batch`` frame per socket. Sockets of the
+    same user with the same filter share one encoded frame.
+    """
+
+    def __init__(self, hub: WebSocketHub, tick_interval: Optional[float] = None):
+        self.hub = hub
+        self.tick_interval = tick_interval or settings.WS_STUDIO_TICK_MS / 1000
+        self.connections: Dict[str, Set[StudioConnection]] = {}
+        # Buffered (arrival order, event) pairs per user and for all users
+        self.pending: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+        self.pending_broadcast: List[Tuple[int, Dict[str, Any]]] = []
+        self._arrivals = itertools.count()
+        self.frames_sent = 0
+        self.events_batched = 0
+        self._ticker: Optional[asyncio.Task] = None
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        user_id: str,
+        filter: Optional[StudioFilter] = None,
+        greeting: Optional[Dict[str, Any]] = None,
+    ) -> StudioConnection:
+        subscriber = Subscriber(
+            studio_topic(user_id), websocket, self.hub.max_queue_size, DEFAULT_FORMAT
+        )
+        connection = StudioConnection(user_id, subscriber, filter or StudioFilter())
+
+        if not self.connections:
+            await self.hub.add_sink(STUDIO_BROADCAST_TOPIC, self._on_event)
+        if user_id not in self.connections:
+            await self.hub.add_sink(studio_topic(user_id), self._on_event)
+        self.connections.setdefault(user_id, set()).add(connection)
+
+        if greeting is not None:
+            subscriber.send(greeting)
+        subscriber.start()
+        self._ensure_ticker()
+        return connection
+
+    async def disconnect(self, connection: StudioConnection):
+        connections = self.connections.get(connection.user_id)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self.connections[connection.user_id]
+                self.pending.pop(connection.user_id, None)
+                await self.hub.remove_sink(
+                    studio_topic(connection.user_id), self._on_event
+                )
+                if not self.connections:
+                    await self.hub.remove_sink(STUDIO_BROADCAST_TOPIC, self._on_event)
+                    self.pending_broadcast.clear()
+
+        connection.subscriber.close()
+        await connection.subscriber.wait_closed()
+
+    def set_filter(self, connection: StudioConnection, filter: StudioFilter):
+        """Switch the events a socket receives, e.g. when the user changes view"""
+        connection.filter = filter
+
+    async def publish(self, event: Dict[str, Any], user_id: Optional[str] = None):
+        """Send an event to one user's studio sockets, or to every studio socket"""
+        topic = studio_topic(user_id) if user_id is not None else STUDIO_BROADCAST_TOPIC
+        await self.hub.publish(topic, event)
+
+    def _on_event(self, topic: str, envelope: Envelope):
+        entry = (next(self._arrivals), envelope.render(DEFAULT_FORMAT.version))
+        if topic == STUDIO_BROADCAST_TOPIC:
+            self.pending_broadcast.append(entry)
+        else:
+            self.pending.setdefault(topic[len("studio:"):], []).append(entry)
+
+    def _ensure_ticker(self):
+        if self._ticker is None or self._ticker.done():
+            self._ticker = asyncio.create_task(self._run_ticker())
+
+    async def _run_ticker(self):
+        while self.connections:
+            await asyncio.sleep(self.tick_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Studio flush failed: {e}")
+
+    def flush(self):
+        """Send each socket one frame with the events buffered since the last tick"""
+        pending, self.pending = self.pending, {}
+        broadcast, self.pending_broadcast = self.pending_broadcast, []
+        users = self.connections.keys() if broadcast else pending.keys()
+
+        for user_id in list(users):
+            connections = self.connections.get(user_id)
+            if not connections:
+                continue
+            entries = sorted(
+                broadcast + pending.get(user_id, []), key=lambda entry: entry[0]
+            )
+            events = coalesce_events([event for _, event in entries])
+            self.events_batched += len(events)
+
+            # One encoded frame per distinct filter
+            frames: Dict[StudioFilter, Optional[Envelope]] = {}
+            for connection in connections:
+                if connection.filter not in frames:
+                    matched = [
+                        event for event in events if connection.filter.matches(event)
+                    ]
+                    frames[connection.filter] = Envelope.from_message({
+                        "type": "batch",
+                        "data": {"events": matched},
+                    }) if matched else None
+                frame = frames[connection.filter]
+                if frame is not None:
+                    connection.subscriber.enqueue(frame)
+                    self.frames_sent += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "users": len(self.connections),
+            "connections": sum(len(c) for c in self.connections.values()),
+            "frames_sent": self.frames_sent,
+            "events_batched": self.events_batched,
+            "pending_events": (
+                sum(len(e) for e in self.pending.values()) + len(self.pending_broadcast)
+            ),
+        }
+
+studio = StudioHub(hub)
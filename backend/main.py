@@ -1,53 +1,7 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.trustedhost import TrustedHostMiddleware
 import uvicorn
 
 from app.core.config import settings
-from app.api.v1.api import api_router
-from app.core.events import create_start_app_handler, create_stop_app_handler
-
-def create_application() -> FastAPI:
-    """Create FastAPI application with all middleware and routes."""
-    
-    app = FastAPI(
-        title="VoxelVerve API",
-        description="Real-time AI-powered text-to-3D model generator API",
-        version="1.0.0",
-        docs_url="/docs" if settings.ENVIRONMENT != "production" else None,
-        redoc_url="/redoc" if settings.ENVIRONMENT != "production" else None,
-    )
-
-    # Add CORS middleware
-    app.add_middleware(
-        CORSMiddleware,
-        allow_origins=settings.ALLOWED_HOSTS,
-        allow_credentials=True,
-        allow_methods=["*"],
-        allow_headers=["*"],
-    )
-
-    # Add trusted host middleware
-    app.add_middleware(
-        TrustedHostMiddleware,
-        allowed_hosts=settings.ALLOWED_HOSTS,
-    )
-
-    # Add event handlers
-    app.add_event_handler("startup", create_start_app_handler(app))
-    app.add_event_handler("shutdown", create_stop_app_handler(app))
-
-    # Include API router
-    app.include_router(api_router, prefix="/api/v1")
-
-    # Health check endpoint
-    @app.get("/health")
-    async def health_check():
-        return {"status": "healthy", "service": "voxelverve-api"}
-
-    return app
-
-app = create_application()
+from app.main import app
 
 if __name__ == "__main__":
     uvicorn.run(
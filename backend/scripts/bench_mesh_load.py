@@ -0,0 +1,150 @@
+"""Compare load time and peak RSS of the GLB loaders.
+
+Writes a height-field GLB with positions, normals and UVs (or uses --path)
+and loads it in a fresh process per loader, so each peak RSS is measured
+from the same baseline:
+
+    trimesh       bytes read into memory and parsed by trimesh
+    mmap          memory-mapped reader, positions and indices only
+    mmap+uvs      memory-mapped reader, also decoding TEXCOORD_0
+    views         accessor views only, no conversion (pages touched once)
+
+Usage (from backend/):
+    python -m scripts.bench_mesh_load --triangles 5000000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.services.geometry.gltf import GltfBuilder, encode_glb
+from app.services.geometry.gltf_reader import GltfAsset, load_glb
+from app.services.geometry.mesh import load_mesh
+
+LOADERS = ("trimesh", "mmap", "mmap+uvs", "views")
+
+def write_grid(path: Path, triangles: int):
+    """Height-field grid with about the requested triangle count"""
+    side = max(int(np.sqrt(triangles / 2)), 1)
+    u, v = np.meshgrid(
+        np.linspace(0, 1, side + 1), np.linspace(0, 1, side + 1), indexing="ij"
+    )
+    height = 0.05 * np.sin(12 * u) * np.cos(9 * v)
+    positions = np.stack([u, height, v], axis=-1).reshape(-1, 3)
+    normals = np.tile([0.0, 1.0, 0.0], (len(positions), 1))
+    uvs = np.stack([u, 1.0 - v], axis=-1).reshape(-1, 2)
+    corner = (np.arange(side)[:, None] * (side + 1) + np.arange(side)[None, :]).ravel()
+    faces = np.concatenate([
+        np.stack([corner, corner + 1, corner + side + 1], axis=1),
+        np.stack([corner + 1, corner + side + 2, corner + side + 1], axis=1),
+    ])
+
+    builder = GltfBuilder()
+    attributes = {
+        "POSITION": builder.add_vertices(positions, "VEC3", bounds=True),
+        "NORMAL": builder.add_vertices(normals, "VEC3"),
+        "TEXCOORD_0": builder.add_vertices(uvs, "VEC2"),
+    }
+    indices = builder.add_indices(faces, len(positions))
+    document = builder.document(
+        scene=0,
+        scenes=[{"nodes": [0]}],
+        nodes=[{"mesh": 0}],
+        meshes=[
+            {"primitives": [{"attributes": attributes, "indices": indices, "mode": 4}]}
+        ],
+    )
+    path.write_bytes(encode_glb(document, bytes(builder.data)))
+    return len(faces)
+
+def peak_rss_mb() -> float:
+    # ru_maxrss survives exec on Linux, so it would report the parent's peak
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_child(loader: str, path: str):
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    if loader == "trimesh":
+        mesh = load_mesh(Path(path).read_bytes(), "glb")
+    elif loader == "mmap":
+        mesh = load_glb(path)
+    elif loader == "mmap+uvs":
+        mesh = load_glb(path, ("uvs",))
+    else:
+        asset = GltfAsset.open(path)
+        primitive = next(asset.primitives())[0]
+        positions = asset.accessor(primitive["attributes"]["POSITION"])
+        indices = asset.accessor(primitive["indices"])
+        # Touch every page so the views are really read
+        positions.max(axis=0), indices.max()
+        mesh = None
+    seconds = time.perf_counter() - started
+    triangles = mesh.triangle_count if mesh is not None else len(indices) // 3
+    peak_mb = peak_rss_mb() - baseline
+    print(json.dumps({"seconds": seconds, "peak_mb": peak_mb, "triangles": triangles}))
+
+def main(triangles: int, path: str = None):
+    temporary = None
+    if path is None:
+        temporary = tempfile.NamedTemporaryFile(suffix=".glb", delete=False)
+        temporary.close()
+        path = temporary.name
+        written = write_grid(Path(path), triangles)
+        print(f"Wrote {written} triangles to {path}")
+    size = os.path.getsize(path) / (1 << 20)
+    print(f"{size:.0f} MB GLB")
+    print(f"{'loader':<12}{'seconds':>10}{'peak RSS MB':>14}{'triangles':>12}")
+    try:
+        for loader in LOADERS:
+            output = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "scripts.bench_mesh_load",
+                    "--child",
+                    loader,
+                    path,
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(
+                f"{loader:<12}{result['seconds']:>10.2f}{result['peak_mb']:>14.0f}"
+                f"{result['triangles']:>12}"
+            )
+    finally:
+        if temporary is not None:
+            os.unlink(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--triangles", type=int, default=5_000_000)
+    parser.add_argument(
+        "--path", help="benchmark an existing GLB instead of a generated grid"
+    )
+    parser.add_argument(
+        "--child", nargs=2, metavar=("LOADER", "PATH"), help=argparse.SUPPRESS
+    )
+    args = parser.parse_args()
+    if args.child:
+        run_child(*args.child)
+    else:
+        main(args.triangles, args.path)
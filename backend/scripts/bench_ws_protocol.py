@@ -0,0 +1,86 @@
+"""Compare bytes per run and fan-out CPU for the run update protocols.
+
+Simulates a nine-stage generation run and pushes every tick through a
+WebSocketHub to in-process subscribers, once per client format.
+
+Usage (from backend/):
+    python -m scripts.bench_ws_protocol --subscribers 1000 --ticks 200
+"""
+import argparse
+import asyncio
+import time
+
+from app.services.generation import GenerationService
+from app.services.websocket import SUPPORTED_ENCODINGS, ClientFormat, WebSocketHub
+
+class NullWebSocket:
+    async def send_text(self, data):
+        pass
+
+    async def send_bytes(self, data):
+        pass
+
+    async def close(self, code=None):
+        pass
+
+def simulate_run(run_id: str, ticks: int):
+    """Yield run states with one stage advancing at a time"""
+    stages = GenerationService(db=None)._get_default_stages()
+    per_stage = max(ticks // len(stages), 1)
+    for index, stage in enumerate(stages):
+        stage["status"] = "running"
+        for step in range(1, per_stage + 1):
+            stage["progress"] = step / per_stage
+            progress = (index + step / per_stage) / len(stages)
+            yield {
+                "run_id": run_id,
+                "status": stage["id"],
+                "progress": progress,
+                "current_stage": stage["id"],
+                "estimated_time_remaining": 300.0 * (1 - progress),
+                "stages": [dict(s) for s in stages],
+            }
+        stage["status"] = "completed"
+
+async def measure(fmt: ClientFormat, subscribers: int, ticks: int):
+    hub = WebSocketHub(max_queue_size=ticks + 16)
+    topic = "run:bench"
+    attached = [
+        await hub.subscribe(topic, NullWebSocket(), fmt) for _ in range(subscribers)
+    ]
+
+    started = time.process_time()
+    for state in simulate_run("bench", ticks):
+        await hub.publish_state(topic, state)
+        await asyncio.sleep(0)
+    while any(s.queue for s in attached):
+        await asyncio.sleep(0)
+    cpu = time.process_time() - started
+
+    per_run = attached[0].sent_bytes
+    for subscriber in attached:
+        await hub.unsubscribe(subscriber)
+    return per_run, cpu
+
+async def main(subscribers: int, ticks: int):
+    formats = [ClientFormat(1, "json")] + [
+        ClientFormat(2, encoding) for encoding in SUPPORTED_ENCODINGS
+    ]
+    print(f"{subscribers} subscribers, {ticks} ticks per run")
+    print(
+        f"{'protocol':<10}{'encoding':<10}{'bytes/run':>12}{'cpu s':>10}"
+        f"{'cpu s/1k subs':>16}"
+    )
+    for fmt in formats:
+        per_run, cpu = await measure(fmt, subscribers, ticks)
+        print(
+            f"v{fmt.version:<9}{fmt.encoding:<10}{per_run:>12}{cpu:>10.3f}"
+            f"{cpu * 1000 / subscribers:>16.3f}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--ticks", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.subscribers, args.ticks))
@@ -0,0 +1,293 @@
+"""Open thousands of WebSocket connections against the app and measure capacity.
+
+Starts the app with uvicorn in a child process, connects N sockets spread
+over a number of runs from several client processes, then publishes probe
+events from inside the server process. Reports server memory per
+connection, rejected connections and fan-out latency percentiles (publish
+to client receive).
+
+Usage (from backend/):
+    python -m scripts.ws_load --connections 5000 --runs 50 --messages 20
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import time
+
+import websockets
+
+PROBE_TYPE = "load_probe"
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return float("nan")
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def serve(app_path: str, host: str, port: int, commands):
+    """Child process: run the app and execute publish commands on its event loop"""
+    import uvicorn
+    from uvicorn.importer import import_from_string
+
+    raise_fd_limit()
+    app = import_from_string(app_path)
+    server = uvicorn.Server(
+        uvicorn.Config(app, host=host, port=port, log_level="warning")
+    )
+
+    async def handle_commands():
+        from app.services.websocket import connections, hub, run_topic
+
+        loop = asyncio.get_running_loop()
+        while True:
+            command, args = await loop.run_in_executor(None, commands.recv)
+            if command == "publish":
+                run_ids, count, interval = args
+                for index in range(count):
+                    for run_id in run_ids:
+                        await hub.publish(run_topic(run_id), {
+                            "type": PROBE_TYPE,
+                            "data": {"index": index, "sent_at": time.time()},
+                        })
+                    await asyncio.sleep(interval)
+                commands.send(count)
+            elif command == "metrics":
+                commands.send({**hub.metrics(), "connections": connections.metrics()})
+            elif command == "stop":
+                server.should_exit = True
+                commands.send(None)
+                return
+
+    async def main():
+        await asyncio.gather(server.serve(), handle_commands())
+
+    asyncio.run(main())
+
+class Client:
+    def __init__(self, url: str):
+        self.url = url
+        self.latencies = []
+        self.rejected = False
+        self.connected = asyncio.Event()
+        self.socket = None
+
+    async def run(self):
+        try:
+            async with websockets.connect(
+                self.url, ping_interval=None, max_queue=None
+            ) as socket:
+                self.socket = socket
+                async for raw in socket:
+                    message = json.loads(raw)
+                    kind = message.get("type")
+                    if kind == "connected":
+                        self.connected.set()
+                    elif kind == "ping":
+                        await socket.send(json.dumps({"type": "pong"}))
+                    elif kind == PROBE_TYPE:
+                        self.latencies.append(time.time() - message["data"]["sent_at"])
+        except websockets.ConnectionClosed as e:
+            self.rejected = e.rcvd is not None and e.rcvd.code == 1013
+        except OSError:
+            self.rejected = True
+        finally:
+            self.connected.set()
+
+async def open_clients(urls, concurrency: int):
+    clients = [Client(url) for url in urls]
+    tasks = []
+    gate = asyncio.Semaphore(concurrency)
+
+    async def connect(client: Client):
+        # Bound the connect burst so the server sees a steady ramp
+        async with gate:
+            tasks.append(asyncio.create_task(client.run()))
+            await client.connected.wait()
+
+    await asyncio.gather(*(connect(client) for client in clients))
+    return clients, tasks
+
+def client_worker(urls, concurrency: int, conn):
+    """Client process: hold a share of the sockets and report probe latencies"""
+    raise_fd_limit()
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        clients, tasks = await open_clients(urls, concurrency)
+        open_ = [client for client in clients if not client.rejected]
+        conn.send((len(open_), len(clients) - len(open_)))
+
+        messages, timeout = await loop.run_in_executor(None, conn.recv)
+        deadline = time.monotonic() + timeout
+        while (
+            any(len(c.latencies) < messages for c in open_)
+            and time.monotonic() < deadline
+        ):
+            await asyncio.sleep(0.05)
+        conn.send([latency for client in open_ for latency in client.latencies])
+
+        await loop.run_in_executor(None, conn.recv)
+        for client in open_:
+            if client.socket is not None:
+                await client.socket.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        conn.send(None)
+
+    asyncio.run(main())
+
+async def call(conn, message):
+    loop = asyncio.get_running_loop()
+    conn.send(message)
+    return await loop.run_in_executor(None, conn.recv)
+
+def call_sync(conn, message):
+    conn.send(message)
+    return conn.recv()
+
+async def wait_for_port(host: str, port: int, timeout: float):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+async def main(args):
+    context = multiprocessing.get_context("spawn")
+    server_conn, child_conn = context.Pipe()
+    server = context.Process(
+        target=serve, args=(args.app, args.host, args.port, child_conn), daemon=True
+    )
+    server.start()
+    await wait_for_port(args.host, args.port, timeout=30)
+    baseline = rss_bytes(server.pid)
+
+    run_ids = [f"load-{index}" for index in range(args.runs)]
+    urls = [
+        f"ws://{args.host}:{args.port}/api/v1/ws/runs/{run_ids[index % args.runs]}"
+        for index in range(args.connections)
+    ]
+
+    # Clients run in their own processes so client-side parsing does not
+    # dominate the measured latency
+    workers = []
+    started = time.monotonic()
+    for index in range(args.client_processes):
+        conn, worker_conn = context.Pipe()
+        process = context.Process(
+            target=client_worker,
+            args=(
+                urls[index::args.client_processes],
+                args.connect_concurrency,
+                worker_conn,
+            ),
+            daemon=True,
+        )
+        process.start()
+        workers.append((process, conn))
+
+    loop = asyncio.get_running_loop()
+    counts = await asyncio.gather(
+        *(loop.run_in_executor(None, conn.recv) for _, conn in workers)
+    )
+    connect_seconds = time.monotonic() - started
+    opened = sum(count for count, _ in counts)
+    rejected = sum(count for _, count in counts)
+    await asyncio.sleep(args.settle)
+    loaded = rss_bytes(server.pid)
+
+    for _, conn in workers:
+        conn.send((args.messages, args.timeout))
+    await call(server_conn, ("publish", (run_ids, args.messages, args.interval)))
+    results = await asyncio.gather(
+        *(loop.run_in_executor(None, conn.recv) for _, conn in workers)
+    )
+    latencies = [latency for result in results for latency in result]
+    metrics = await call(server_conn, ("metrics", None))
+
+    print(
+        f"connections   {opened} open, {rejected} rejected, "
+        f"{connect_seconds:.1f}s to connect"
+    )
+    print(
+        f"server rss    {baseline / 2**20:.1f} MiB idle, "
+        f"{loaded / 2**20:.1f} MiB loaded"
+    )
+    if opened:
+        print(f"per socket    {(loaded - baseline) / opened / 1024:.1f} KiB")
+    print(
+        f"fan-out       {len(latencies)}/{opened * args.messages} delivered, "
+        f"~{opened // args.runs} sockets per run"
+    )
+    if latencies:
+        print(
+            "latency ms    "
+            f"p50 {percentile(latencies, 0.50) * 1000:.1f}  "
+            f"p90 {percentile(latencies, 0.90) * 1000:.1f}  "
+            f"p99 {percentile(latencies, 0.99) * 1000:.1f}  "
+            f"max {max(latencies) * 1000:.1f}"
+        )
+    print(
+        f"server        dropped {metrics['dropped']}, "
+        f"max queue depth {metrics['queue_depth_max']}"
+    )
+    print(f"              {json.dumps(metrics['connections'])}")
+
+    await asyncio.gather(
+        *(loop.run_in_executor(None, call_sync, conn, "close") for _, conn in workers)
+    )
+    for process, _ in workers:
+        process.join(timeout=10)
+    await call(server_conn, ("stop", None))
+    server.join(timeout=10)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--app", default="main:app", help="ASGI app import string")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--connections", type=int, default=2000)
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=20,
+        help="sockets are spread evenly over this many runs",
+    )
+    parser.add_argument(
+        "--messages", type=int, default=20, help="probe events published per run"
+    )
+    parser.add_argument(
+        "--interval", type=float, default=0.05, help="seconds between probe rounds"
+    )
+    parser.add_argument("--client-processes", type=int, default=4)
+    parser.add_argument(
+        "--connect-concurrency",
+        type=int,
+        default=200,
+        help="connects in flight per client process",
+    )
+    parser.add_argument(
+        "--settle", type=float, default=1.0, help="seconds to wait after connecting"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=30.0, help="seconds to wait for probe delivery"
+    )
+    asyncio.run(main(parser.parse_args()))
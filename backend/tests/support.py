@@ -0,0 +1,109 @@
+from types import SimpleNamespace
+from typing import List, Optional, Union
+import asyncio
+import json
+import numpy as np
+
+class RecordingSocket:
+    """Stands in for a FastAPI WebSocket and records what it is sent
+
+    Clearing the gate holds sends back, simulating a slow client.
+    """
+
+    def __init__(self):
+        self.messages: List[Union[str, bytes]] = []
+        self.close_code: Optional[int] = None
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def send_text(self, text: str):
+        await self.gate.wait()
+        self.messages.append(text)
+
+    async def send_bytes(self, data):
+        await self.gate.wait()
+        self.messages.append(bytes(data))
+
+    async def close(self, code: Optional[int] = None):
+        self.close_code = code
+
+    def json_messages(self) -> List[dict]:
+        return [
+            json.loads(message) for message in self.messages if isinstance(message, str)
+        ]
+
+    def binary_messages(self) -> List[bytes]:
+        return [message for message in self.messages if isinstance(message, bytes)]
+
+class FakeSession:
+    """Stands in for an AsyncSession holding a single generation run"""
+
+    def __init__(self, run: SimpleNamespace):
+        self.run = run
+
+    async def execute(self, statement):
+        if statement.is_dml:
+            for column, value in statement.compile().params.items():
+                if hasattr(self.run, column):
+                    setattr(self.run, column, value)
+            return SimpleNamespace(rowcount=1)
+        return SimpleNamespace(
+            scalar_one_or_none=lambda: self.run,
+            scalars=lambda: SimpleNamespace(all=lambda: [self.run]),
+        )
+
+    async def commit(self):
+        pass
+
+async def drain(rounds: int = 20):
+    """Let sender tasks run until their queues are empty"""
+    for _ in range(rounds):
+        await asyncio.sleep(0)
+
+def box_mesh_arrays(size: float = 1.0):
+    """Positions and outward-facing triangles of a closed cube with 8 shared corners"""
+    vertices = np.array(
+        [[x, y, z] for x in (0.0, size) for y in (0.0, size) for z in (0.0, size)],
+        dtype=np.float64,
+    )
+    faces = np.array(
+        [
+            [0, 1, 3], [0, 3, 2], [4, 6, 7], [4, 7, 5],
+            [0, 4, 5], [0, 5, 1], [2, 3, 7], [2, 7, 6],
+            [0, 2, 6], [0, 6, 4], [1, 5, 7], [1, 7, 3],
+        ],
+        dtype=np.int64,
+    )
+    return vertices, faces
+
+def sphere_mesh_arrays(rings: int = 16, segments: int = 32, radius: float = 1.0):
+    """Closed UV sphere with poles, outward-facing"""
+    vertices = [[0.0, 0.0, radius]]
+    for ring in range(1, rings):
+        theta = np.pi * ring / rings
+        for segment in range(segments):
+            phi = 2.0 * np.pi * segment / segments
+            vertices.append([
+                radius * np.sin(theta) * np.cos(phi),
+                radius * np.sin(theta) * np.sin(phi),
+                radius * np.cos(theta),
+            ])
+    vertices.append([0.0, 0.0, -radius])
+    bottom = len(vertices) - 1
+    faces = []
+    for segment in range(segments):
+        following = (segment + 1) % segments
+        faces.append([0, 1 + segment, 1 + following])
+    for ring in range(rings - 2):
+        start = 1 + ring * segments
+        for segment in range(segments):
+            following = (segment + 1) % segments
+            a, b = start + segment, start + following
+            c, d = a + segments, b + segments
+            faces.append([a, c, d])
+            faces.append([a, d, b])
+    last = 1 + (rings - 2) * segments
+    for segment in range(segments):
+        following = (segment + 1) % segments
+        faces.append([bottom, last + following, last + segment])
+    return np.array(vertices, dtype=np.float64), np.array(faces, dtype=np.int64)
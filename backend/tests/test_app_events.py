@@ -0,0 +1,31 @@
+from app.services.websocket import hub
+import asyncio
+import pytest
+
+# The application imports every endpoint and their dependencies
+pytest.importorskip("jose")
+pytest.importorskip("multipart")
+
+def test_application_starts_and_stops_the_websocket_relay(monkeypatch):
+    from app.main import create_application
+
+    calls = []
+
+    async def start():
+        calls.append("start")
+
+    async def stop():
+        calls.append("stop")
+
+    monkeypatch.setattr(hub, "start", start)
+    monkeypatch.setattr(hub, "stop", stop)
+    app = create_application()
+
+    async def run():
+        for handler in app.router.on_startup:
+            await handler()
+        for handler in app.router.on_shutdown:
+            await handler()
+
+    asyncio.run(run())
+    assert calls == ["start", "stop"]
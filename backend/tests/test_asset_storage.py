@@ -0,0 +1,57 @@
+from app.services.storage.assets import AssetStorage
+import asyncio
+import httpx
+import pytest
+
+def storage(tmp_path):
+    return AssetStorage(
+        public_url="https://storage.example.com",
+        local_path=str(tmp_path),
+        max_fetch_bytes=1 << 20,
+        fetch_hosts=["cdn.example.com"],
+    )
+
+def mock_http(monkeypatch, handler):
+    client = httpx.AsyncClient
+    transport = httpx.MockTransport(handler)
+    monkeypatch.setattr(
+        httpx, "AsyncClient", lambda **kwargs: client(transport=transport, **kwargs)
+    )
+
+def test_storage_urls_are_read_from_storage(tmp_path):
+    (tmp_path / "meshes").mkdir()
+    (tmp_path / "meshes" / "a.glb").write_bytes(b"glb")
+    url = "https://storage.example.com/meshes/a.glb"
+    assert asyncio.run(storage(tmp_path).fetch(url)) == b"glb"
+
+@pytest.mark.parametrize("url", [
+    "http://169.254.169.254/latest/meta-data/",
+    "http://localhost:8000/internal",
+    "file:///etc/passwd",
+    "https://cdn.example.com.evil.test/a.glb",
+])
+def test_urls_outside_the_allowed_hosts_are_rejected(tmp_path, url):
+    with pytest.raises(ValueError):
+        asyncio.run(storage(tmp_path).fetch(url))
+
+def test_downloads_follow_redirects_between_allowed_hosts(tmp_path, monkeypatch):
+    def handler(request):
+        if request.url.path == "/old.glb":
+            return httpx.Response(302, headers={"location": "/new.glb"})
+        return httpx.Response(200, content=b"mesh")
+
+    mock_http(monkeypatch, handler)
+    url = "https://cdn.example.com/old.glb"
+    assert asyncio.run(storage(tmp_path).fetch(url)) == b"mesh"
+
+def test_redirects_to_other_hosts_are_rejected(tmp_path, monkeypatch):
+    requested = []
+
+    def handler(request):
+        requested.append(str(request.url))
+        return httpx.Response(302, headers={"location": "http://10.0.0.1/admin"})
+
+    mock_http(monkeypatch, handler)
+    with pytest.raises(ValueError, match="not allowed"):
+        asyncio.run(storage(tmp_path).fetch("https://cdn.example.com/a.glb"))
+    assert requested == ["https://cdn.example.com/a.glb"]
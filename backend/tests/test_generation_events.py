@@ -0,0 +1,98 @@
+from types import SimpleNamespace
+from app.models.generation_run import GenerationStatus
+from app.schemas.generation import GenerationProgressUpdate
+from app.services import generation
+from app.services.generation import GenerationService
+from app.services.websocket import StudioHub, WebSocketHub, run_topic, studio_topic
+from support import FakeSession, RecordingSocket, drain
+import asyncio
+import pytest
+
+def make_run():
+    return SimpleNamespace(
+        id="run-1",
+        user_id="user-1",
+        status=GenerationStatus.COARSE_GEN,
+        progress=0.4,
+        current_stage="coarse_gen",
+        stages=[{"id": "coarse_gen", "status": "running", "progress": 0.5}],
+        estimated_time_remaining=120.0,
+        result=None,
+        error=None,
+    )
+
+def complete(service):
+    return service.complete_generation("run-1", {"model": "a.glb"})
+
+def fail(service):
+    return service.fail_generation("run-1", "out of memory")
+
+def cancel(service):
+    return service.cancel_generation("run-1", "user-1")
+
+@pytest.mark.parametrize("finish, status", [
+    (complete, "completed"),
+    (fail, "failed"),
+    (cancel, "cancelled"),
+])
+def test_terminal_state_reaches_subscribers_and_releases_the_topic(
+    monkeypatch, finish, status
+):
+    hub = WebSocketHub(max_queue_size=16)
+    monkeypatch.setattr(generation, "hub", hub)
+    monkeypatch.setattr(generation, "studio", StudioHub(hub, tick_interval=60))
+    topic = run_topic("run-1")
+
+    async def run():
+        socket = RecordingSocket()
+        subscriber = await hub.subscribe(topic, socket)
+        service = GenerationService(FakeSession(make_run()))
+        await hub.publish_state(topic, vars(make_run()) | {"status": "coarse_gen"})
+        await finish(service)
+        await drain()
+        await hub.unsubscribe(subscriber)
+        return socket
+
+    updates = asyncio.run(run()).json_messages()
+    assert updates[-1]["data"]["status"] == status
+    assert topic not in hub._published_states
+    assert topic not in hub.states
+
+def test_studio_receives_run_lifecycle_and_stats_events(monkeypatch):
+    hub = WebSocketHub(max_queue_size=16)
+    studio = StudioHub(hub, tick_interval=60)
+    monkeypatch.setattr(generation, "hub", hub)
+    monkeypatch.setattr(generation, "studio", studio)
+
+    async def run():
+        socket = RecordingSocket()
+        connection = await studio.connect(socket, "user-1")
+        service = GenerationService(FakeSession(make_run()))
+        await service.update_generation_progress("run-1", GenerationProgressUpdate(
+            run_id="run-1",
+            status=GenerationStatus.COARSE_GEN,
+            progress=0.6,
+            current_stage="coarse_gen",
+            stages=[],
+            estimated_time_remaining=60.0,
+        ))
+        await service.fail_generation("run-1", "out of memory")
+        studio.flush()
+        await drain()
+        await studio.disconnect(connection)
+        return socket
+
+    batches = asyncio.run(run()).json_messages()
+    events = [event for batch in batches for event in batch["data"]["events"]]
+    assert [event["type"] for event in events] == [
+        "run_updated", "run_failed", "stats_updated"
+    ]
+    assert events[0]["data"]["progress"] == 0.6
+    assert events[1]["data"]["error"] == "out of memory"
+    assert events[2]["data"]["total_runs"] == 1
+
+def test_studio_rejects_the_wildcard_user_id():
+    with pytest.raises(ValueError):
+        studio_topic("*")
+    with pytest.raises(ValueError):
+        asyncio.run(StudioHub(WebSocketHub(max_queue_size=4)).publish({}, "*"))
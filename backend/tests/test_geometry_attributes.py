@@ -0,0 +1,47 @@
+from app.services.geometry import Mesh, compact_mesh, weld_attributes
+from app.services.geometry.reorder import optimize_vertex_order
+from app.services.geometry.tangents import position_clusters, tangent_space
+from support import sphere_mesh_arrays
+import numpy as np
+
+def tangent_sphere():
+    vertices, faces = sphere_mesh_arrays()
+    uvs = np.c_[np.arctan2(vertices[:, 1], vertices[:, 0]), vertices[:, 2]]
+    mesh, _, _ = tangent_space(Mesh(vertices, faces, uvs=uvs))
+    return mesh
+
+def corner_tangents(mesh):
+    return mesh.tangents[mesh.faces]
+
+def test_weld_attributes_keeps_vertices_split_by_tangents():
+    mesh = tangent_sphere()
+    doubled = Mesh(
+        vertices=np.r_[mesh.vertices, mesh.vertices],
+        faces=np.r_[mesh.faces, mesh.faces + mesh.vertex_count],
+        uvs=np.r_[mesh.uvs, mesh.uvs],
+        normals=np.r_[mesh.normals, mesh.normals],
+        tangents=np.r_[mesh.tangents, -mesh.tangents],
+    )
+    welded = weld_attributes(doubled)
+    assert welded.vertex_count == doubled.vertex_count
+    assert np.array_equal(corner_tangents(welded), corner_tangents(doubled))
+
+def test_compact_and_reorder_carry_tangents():
+    mesh = tangent_sphere()
+    compacted = compact_mesh(mesh._replace(faces=mesh.faces[: len(mesh.faces) // 2]))
+    assert compacted.tangents is not None
+    assert np.array_equal(
+        corner_tangents(compacted), mesh.tangents[mesh.faces[: len(mesh.faces) // 2]]
+    )
+
+    reordered, _ = optimize_vertex_order(mesh)
+    assert reordered.tangents is not None
+    # Each vertex keeps its own tangent through the remap
+    before = sorted(map(tuple, np.c_[mesh.vertices, mesh.tangents]))
+    after = sorted(map(tuple, np.c_[reordered.vertices, reordered.tangents]))
+    assert before == after
+
+def test_position_clusters_join_vertices_by_distance():
+    vertices = np.array([[0.0, 0.0, 0.0], [1.98, 0.0, 0.0], [2.02, 0.0, 0.0]])
+    labels = position_clusters(vertices, 1.0)
+    assert labels[1] == labels[2] != labels[0]
@@ -0,0 +1,58 @@
+from app.services.geometry import BvhCache, Mesh, build_bvh
+from support import sphere_mesh_arrays
+import numpy as np
+
+def brute_force_distances(vertices, faces, origins, directions):
+    """Closest hit of every ray against every triangle, Moller-Trumbore"""
+    corners = vertices[faces]
+    edge1 = corners[:, 1] - corners[:, 0]
+    edge2 = corners[:, 2] - corners[:, 0]
+    closest = np.full(len(origins), np.inf)
+    for index, (origin, direction) in enumerate(zip(origins, directions)):
+        p = np.cross(direction, edge2)
+        determinant = np.einsum("ij,ij->i", edge1, p)
+        valid = np.abs(determinant) > 1e-12
+        inverse = 1.0 / np.where(valid, determinant, 1.0)
+        offset = origin - corners[:, 0]
+        u = np.einsum("ij,ij->i", offset, p) * inverse
+        q = np.cross(offset, edge1)
+        v = (q @ direction) * inverse
+        t = np.einsum("ij,ij->i", edge2, q) * inverse
+        hit = valid & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+        if hit.any():
+            closest[index] = t[hit].min()
+    return closest
+
+def random_rays(count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    origins = rng.uniform(-2.0, 2.0, (count, 3))
+    directions = rng.normal(size=(count, 3))
+    return origins, directions / np.linalg.norm(directions, axis=1, keepdims=True)
+
+def test_closest_hits_match_brute_force():
+    vertices, faces = sphere_mesh_arrays()
+    origins, directions = random_rays(400)
+    hits = build_bvh(vertices, faces).intersect(origins, directions)
+    expected = brute_force_distances(vertices, faces, origins, directions)
+    assert np.array_equal(np.isinf(hits.distances), np.isinf(expected))
+    finite = np.isfinite(expected)
+    assert np.allclose(hits.distances[finite], expected[finite])
+    assert (hits.triangles[~finite] == -1).all()
+
+def test_occluded_agrees_with_intersect():
+    vertices, faces = sphere_mesh_arrays()
+    origins, directions = random_rays(400, seed=1)
+    bvh = build_bvh(vertices, faces)
+    hits = bvh.intersect(origins, directions, max_distance=1.5)
+    occluded = bvh.occluded(origins, directions, max_distance=1.5)
+    assert np.array_equal(occluded, hits.triangles >= 0)
+
+def test_cache_reuses_bvh_from_memory_and_disk(tmp_path):
+    mesh = Mesh(*sphere_mesh_arrays())
+    cache = BvhCache(str(tmp_path), 4, 1 << 30)
+    built, reused = cache.get_or_build(mesh)
+    assert not reused
+    assert cache.get_or_build(mesh) == (built, True)
+    loaded, reused = BvhCache(str(tmp_path), 4, 1 << 30).get_or_build(mesh)
+    assert reused
+    assert np.array_equal(loaded.child, built.child)
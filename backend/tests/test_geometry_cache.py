@@ -0,0 +1,65 @@
+from app.services.geometry.cache import ResultCache, result_key
+import asyncio
+import pytest
+
+def test_equivalent_options_share_a_key():
+    same = result_key("abc", "remesh", {"ratio": 1.0, "seed": None, "sizes": (1, 2)})
+    assert same == result_key("abc", "remesh", {"sizes": [1, 2], "ratio": 1})
+    assert same != result_key("abc", "remesh", {"ratio": 2})
+    assert same != result_key("abd", "remesh", {"ratio": 1, "sizes": [1, 2]})
+
+def test_concurrent_callers_share_one_computation(tmp_path):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"value": len(calls)}
+
+    async def run():
+        cache = ResultCache(str(tmp_path), 1 << 20, 1 << 20)
+        callers = [cache.get_or_compute("k", compute) for _ in range(5)]
+        results = await asyncio.gather(*callers)
+        later = await cache.get_or_compute("k", compute)
+        return results, later
+
+    results, later = asyncio.run(run())
+    assert len(calls) == 1
+    assert [result for result, _ in results] == [{"value": 1}] * 5
+    assert sorted(shared for _, shared in results) == [False] + [True] * 4
+    assert later == ({"value": 1}, True)
+
+def test_failures_reach_every_waiter_and_are_not_cached(tmp_path):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        if len(calls) == 1:
+            raise ValueError("bad mesh")
+        return {"value": 2}
+
+    async def run():
+        cache = ResultCache(str(tmp_path), 1 << 20, 1 << 20)
+        first = [cache.get_or_compute("k", compute) for _ in range(3)]
+        failures = await asyncio.gather(*first, return_exceptions=True)
+        return failures, await cache.get_or_compute("k", compute)
+
+    failures, retried = asyncio.run(run())
+    assert all(isinstance(failure, ValueError) for failure in failures)
+    assert retried == ({"value": 2}, False)
+
+def test_entries_survive_in_the_directory_and_evict_by_bytes(tmp_path):
+    cache = ResultCache(str(tmp_path), 64, 1 << 20)
+    cache.put("a" * 64, b'{"value": 1}')
+    assert ResultCache(str(tmp_path), 64, 1 << 20).get("a" * 64) == b'{"value": 1}'
+
+    small = ResultCache(str(tmp_path / "small"), 16, 40)
+    for name in "bcd":
+        small.put(name * 64, b'{"value": "0123456789"}')
+    assert small.get("b" * 64) is None
+    assert small.get("d" * 64) is not None
+
+@pytest.mark.parametrize("options", [None, {}])
+def test_missing_options_are_empty(options):
+    assert result_key("abc", "validate", options) == result_key("abc", "validate")
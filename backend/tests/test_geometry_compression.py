@@ -0,0 +1,66 @@
+from app.services.geometry import Mesh
+from app.services.geometry.compression import (
+    CompressionSettings,
+    compression_report,
+    compression_settings,
+    decode_index_sequence,
+    decode_vertex_buffer,
+    encode_index_sequence,
+    encode_vertex_buffer,
+    quantize_positions,
+)
+from support import sphere_mesh_arrays
+import numpy as np
+import pytest
+
+def vertex_rows(count: int, stride: int, seed: int = 0) -> np.ndarray:
+    """Slowly varying bytes with some noise, like quantized attributes"""
+    rng = np.random.default_rng(seed)
+    smooth = np.cumsum(rng.integers(-3, 4, (count, stride)), axis=0)
+    noise = rng.integers(0, 256, (count, stride)) * (rng.random((count, stride)) < 0.05)
+    return ((smooth + noise) % 256).astype(np.uint8)
+
+@pytest.mark.parametrize("stride", [4, 8, 12, 16, 64])
+@pytest.mark.parametrize("count", [0, 1, 15, 17, 300, 1500])
+def test_vertex_codec_round_trips(count, stride):
+    rows = vertex_rows(count, stride)
+    decoded = decode_vertex_buffer(encode_vertex_buffer(rows), count, stride)
+    assert decoded.dtype == np.uint8
+    assert np.array_equal(decoded, rows)
+
+def test_vertex_codec_shrinks_coherent_rows():
+    rows = vertex_rows(4096, 16)
+    rows[:] = rows[:1]
+    assert len(encode_vertex_buffer(rows)) < rows.nbytes // 8
+
+def test_vertex_codec_rejects_unaligned_strides():
+    with pytest.raises(ValueError):
+        encode_vertex_buffer(np.zeros((4, 6), dtype=np.uint8))
+
+def test_index_sequence_round_trips():
+    _, faces = sphere_mesh_arrays()
+    # The format stores deltas in 31-bit zigzag, so jumps must stay under 2**30
+    jumps = np.random.default_rng(1).integers(0, 1 << 30, 999)
+    for indices in (faces.ravel(), jumps, np.zeros(3, dtype=np.int64)):
+        encoded = encode_index_sequence(indices)
+        assert np.array_equal(decode_index_sequence(encoded, len(indices)), indices)
+
+def test_positions_are_within_half_a_step_of_the_grid():
+    vertices, _ = sphere_mesh_arrays()
+    grid, offset, scale = quantize_positions(vertices, 12)
+    restored = grid[:, :3] * scale + offset
+    assert np.abs(restored - vertices).max() <= 0.5 * scale + 1e-12
+
+def test_report_covers_the_codec():
+    mesh = Mesh(*sphere_mesh_arrays())
+    report = compression_report(mesh, CompressionSettings("meshopt", 14, 8, 12))
+    assert report["encoded_bytes"] < report["quantized_bytes"] < report["raw_bytes"]
+    assert report["position_error"] <= 0.5 / ((1 << 14) - 1) + 1e-12
+
+def test_compression_settings_validate_bits():
+    assert compression_settings("web") is None
+    assert compression_settings("web", {"compression": "meshopt"}).position_bits == 14
+    with pytest.raises(ValueError):
+        compression_settings("web", {"compression": "meshopt", "uv_bits": 20})
+    with pytest.raises(ValueError):
+        compression_settings("web", {"compression": "draco"})
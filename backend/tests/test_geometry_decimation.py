@@ -0,0 +1,38 @@
+from app.services.geometry import Mesh, analyze_mesh
+from app.services.geometry.decimation import decimate_mesh, decimation_target
+from app.services.geometry.validation import bounding_diagonal
+from support import sphere_mesh_arrays
+import numpy as np
+import pytest
+
+def sphere() -> Mesh:
+    return Mesh(*sphere_mesh_arrays(rings=32, segments=64))
+
+def surface_deviation(mesh: Mesh) -> float:
+    """Largest distance of a face centroid from the unit sphere"""
+    centroids = mesh.vertices[mesh.faces].mean(axis=1)
+    return float(np.abs(np.linalg.norm(centroids, axis=1) - 1.0).max())
+
+@pytest.mark.parametrize("max_error", [1.0, 0.001])
+def test_decimation_stays_within_its_error_bound(max_error):
+    mesh = sphere()
+    target = mesh.triangle_count // 4
+    result = decimate_mesh(mesh, target, max_error)
+    assert result.collapses > 0
+    assert result.error <= max_error
+    assert analyze_mesh(result.mesh).is_watertight
+    # The error is an RMS distance, so single points may stray a few times further
+    allowed = 3.0 * result.error * bounding_diagonal(mesh.vertices)
+    assert surface_deviation(result.mesh) <= surface_deviation(mesh) + allowed
+
+def test_error_limit_stops_decimation_before_the_target():
+    mesh = sphere()
+    target = mesh.triangle_count // 4
+    assert decimate_mesh(mesh, target, 1.0).mesh.triangle_count <= target
+    assert decimate_mesh(mesh, target, 0.001).mesh.triangle_count > target
+    assert decimate_mesh(mesh, target, 0.0).collapses == 0
+
+def test_unknown_target_is_rejected():
+    with pytest.raises(ValueError):
+        decimation_target("console", 1000)
+    assert decimation_target("web", 1000) == (250, 0.01)
@@ -0,0 +1,36 @@
+from app.services.geometry import Mesh
+from app.services.geometry.decimation import collapse_sequence, decimate_mesh
+from app.services.geometry.lod import build_lod_chain, collapses_for, lod_ratios
+from support import sphere_mesh_arrays
+import pytest
+
+def sphere() -> Mesh:
+    return Mesh(*sphere_mesh_arrays(rings=32, segments=64))
+
+def test_lod_levels_shrink_with_growing_error_over_one_vertex_buffer():
+    mesh = sphere()
+    chain = build_lod_chain(mesh, mesh.triangle_count, [1.0, 0.5, 0.25, 0.1])
+    levels = chain.levels
+    assert [level.triangle_count for level in levels] == sorted(
+        (level.triangle_count for level in levels), reverse=True
+    )
+    for level in levels:
+        assert level.triangle_count <= max(1, int(mesh.triangle_count * level.ratio))
+        assert level.faces.max() < level.vertex_count
+    errors = [level.error for level in levels]
+    assert errors == sorted(errors)
+    assert len(chain.vertices.vertices) == levels[0].vertex_count
+
+def test_sequence_prefix_matches_a_separate_decimation():
+    mesh = sphere()
+    target = mesh.triangle_count // 2
+    sequence = collapse_sequence(mesh, mesh.triangle_count // 8)
+    collapses = collapses_for(sequence, target)
+    assert sequence.face_counts[collapses - 1] <= target
+    assert collapses == decimate_mesh(mesh, target).collapses
+
+def test_ratios_are_validated_and_sorted():
+    assert lod_ratios([0.25, 1, 0.5, 0.5]) == [1.0, 0.5, 0.25]
+    for value in ([], [0.0], [1.5], "half"):
+        with pytest.raises(ValueError):
+            lod_ratios(value)
@@ -0,0 +1,33 @@
+from app.services.geometry import analyze_mesh
+from app.services.geometry.points import reconstruct_surface
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import numpy as np
+
+def sphere_points(count: int, radius: float = 1.0) -> np.ndarray:
+    """Evenly spread samples of a sphere on a Fibonacci spiral"""
+    index = np.arange(count) + 0.5
+    z = 1.0 - 2.0 * index / count
+    angle = np.pi * (1.0 + np.sqrt(5.0)) * index
+    ring = np.sqrt(1.0 - z * z)
+    return radius * np.column_stack([ring * np.cos(angle), ring * np.sin(angle), z])
+
+def test_sparse_sphere_is_closed_on_a_coarse_lattice():
+    mesh, stats = reconstruct_surface(sphere_points(2000))
+    assert analyze_mesh(mesh).is_watertight
+    assert stats["estimated_normals"]
+    assert stats["resolution"] < 64
+    radii = np.linalg.norm(mesh.vertices, axis=1)
+    assert np.abs(radii - 1.0).max() < 0.05
+
+def test_resolution_option_caps_the_lattice():
+    _, stats = reconstruct_surface(sphere_points(2000), options={"resolution": 16})
+    assert stats["resolution"] == 16
+
+def test_pool_extraction_matches_serial():
+    points = sphere_points(2000)
+    serial, _ = reconstruct_surface(points)
+    with ProcessPoolExecutor(1, mp_context=get_context("fork")) as pool:
+        pooled, _ = reconstruct_surface(points, pool=pool)
+    assert len(pooled.faces) == len(serial.faces)
+    assert analyze_mesh(pooled).is_watertight
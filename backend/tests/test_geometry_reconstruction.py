@@ -0,0 +1,58 @@
+from app.services.geometry import (
+    FunctionField,
+    VolumeField,
+    analyze_mesh,
+    extract_surface,
+)
+import numpy as np
+import pytest
+
+def sphere_distance(points: np.ndarray) -> np.ndarray:
+    return np.linalg.norm(points - 0.5, axis=1) - 0.3
+
+def sphere_field(size: int = 48) -> FunctionField:
+    return FunctionField(sphere_distance, (size, size, size), 1.0 / (size - 1))
+
+def volume(mesh) -> float:
+    corners = mesh.vertices[mesh.faces]
+    cross = np.cross(corners[:, 1], corners[:, 2])
+    return float(np.einsum("ij,ij->i", corners[:, 0], cross).sum()) / 6.0
+
+def test_sphere_surface_is_closed_and_faces_out():
+    mesh, stats = extract_surface(sphere_field(), block_size=8)
+    analysis = analyze_mesh(mesh)
+    assert analysis.is_watertight
+    assert analysis.is_winding_consistent
+    radii = np.linalg.norm(mesh.vertices - 0.5, axis=1)
+    assert np.abs(radii - 0.3).max() < 0.01
+    assert volume(mesh) == pytest.approx(4.0 / 3.0 * np.pi * 0.3 ** 3, rel=0.02)
+    # Blocks away from the shell are ruled out without sampling them whole
+    assert stats["occupied_blocks"] < stats["blocks"]
+    assert stats["field_samples"] < stats["dense_samples"]
+
+def test_block_size_does_not_change_the_surface():
+    small, _ = extract_surface(sphere_field(), block_size=8)
+    large, _ = extract_surface(sphere_field(), block_size=32)
+    assert small.triangle_count == large.triangle_count
+    assert np.allclose(np.sort(small.vertices, axis=0), np.sort(large.vertices, axis=0))
+
+def test_volume_file_matches_the_function(tmp_path):
+    size = 32
+    axis = np.arange(size) / (size - 1)
+    grid = np.stack(np.meshgrid(axis, axis, axis, indexing="ij"), axis=-1)
+    values = sphere_distance(grid.reshape(-1, 3)).reshape(grid.shape[:3])
+    path = tmp_path / "sphere.npy"
+    np.save(path, values.astype(np.float32))
+    from_file, _ = extract_surface(VolumeField(str(path), 1.0 / (size - 1)))
+    from_function, _ = extract_surface(sphere_field(size))
+    assert from_file.triangle_count == from_function.triangle_count
+
+def test_surface_cut_by_the_volume_boundary_is_closed():
+    field = FunctionField(lambda points: points[:, 2] - 0.5, (12, 12, 12), 1.0 / 11)
+    mesh, _ = extract_surface(field, block_size=8)
+    assert analyze_mesh(mesh).is_watertight
+
+def test_field_without_surface_is_rejected():
+    field = FunctionField(lambda points: np.ones(len(points)), (12, 12, 12))
+    with pytest.raises(ValueError):
+        extract_surface(field)
@@ -0,0 +1,34 @@
+from app.services.geometry import Mesh, analyze_mesh
+from app.services.geometry.remesh import COUNT_TOLERANCE, quality_report, remesh
+from support import sphere_mesh_arrays
+import numpy as np
+import pytest
+
+def test_remesh_reaches_the_target_with_better_triangles():
+    source = Mesh(*sphere_mesh_arrays(rings=24, segments=48))
+    result = remesh(source, 2000)
+    mesh = result.mesh
+
+    assert abs(mesh.triangle_count - 2000) < 2000 * 0.25
+    assert analyze_mesh(mesh).is_watertight
+    assert (
+        quality_report(mesh)["quality_score"] > quality_report(source)["quality_score"]
+    )
+    assert quality_report(mesh)["p5"] > 0.5
+    # Vertices are projected back onto the input surface
+    radius = np.linalg.norm(mesh.vertices, axis=1)
+    assert np.abs(radius - 1.0).max() < 0.01
+
+def test_remesh_rejects_tiny_targets():
+    with pytest.raises(ValueError):
+        remesh(Mesh(*sphere_mesh_arrays()), 1)
+
+def test_remesh_converges_on_large_reductions():
+    source = Mesh(*sphere_mesh_arrays(rings=100, segments=200))
+    result = remesh(source, 5000)
+    mesh = result.mesh
+
+    assert source.triangle_count == 39600
+    assert abs(mesh.triangle_count - 5000) <= 5000 * COUNT_TOLERANCE
+    assert analyze_mesh(mesh).is_watertight
+    assert quality_report(mesh)["p5"] > 0.5
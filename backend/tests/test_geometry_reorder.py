@@ -0,0 +1,44 @@
+from app.services.geometry import Mesh
+from app.services.geometry.reorder import (
+    cache_misses,
+    cache_stats,
+    optimize_vertex_order,
+)
+from support import sphere_mesh_arrays
+import numpy as np
+
+def shuffled_sphere() -> Mesh:
+    vertices, faces = sphere_mesh_arrays(rings=24, segments=48)
+    order = np.random.default_rng(0).permutation(len(faces))
+    return Mesh(vertices, faces[order], normals=vertices.copy())
+
+def triangles(mesh: Mesh) -> set:
+    """Triangles by corner positions, ignoring their rotation"""
+    rounded = np.round(mesh.vertices, 9)
+    corners = [tuple(map(tuple, rounded[face])) for face in mesh.faces]
+    return {min(c[i:] + c[:i] for i in range(3)) for c in corners}
+
+def test_cache_misses_count_fifo_evictions():
+    faces = np.array([[0, 1, 2], [2, 1, 3], [4, 5, 6], [0, 1, 2]])
+    assert cache_misses(faces, cache_size=3).tolist() == [3, 1, 3, 3]
+    assert cache_stats(faces, cache_size=16)["acmr"] == 7 / 4
+
+def test_reordering_cuts_cache_misses_and_keeps_the_mesh():
+    mesh = shuffled_sphere()
+    result, stats = optimize_vertex_order(mesh)
+    assert stats["acmr_after"] < 0.6 * stats["acmr_before"]
+    assert stats["acmr_after"] == cache_stats(result.faces)["acmr"]
+    assert triangles(result) == triangles(mesh)
+    # Normals travel with their vertices
+    assert np.allclose(result.normals, result.vertices)
+
+def test_vertices_are_fetched_in_first_use_order():
+    result, _ = optimize_vertex_order(shuffled_sphere())
+    _, first = np.unique(result.faces.ravel(), return_index=True)
+    assert np.all(np.diff(first) > 0)
+
+def test_vertex_buffer_can_be_left_alone():
+    mesh = shuffled_sphere()
+    result, _ = optimize_vertex_order(mesh, remap_vertices=False)
+    assert result.vertices is mesh.vertices
+    assert triangles(result) == triangles(mesh)
@@ -0,0 +1,68 @@
+from app.services.geometry import Mesh, analyze_mesh, repair_mesh
+from support import box_mesh_arrays, sphere_mesh_arrays
+import numpy as np
+
+def open_cylinder(sections: int = 16, radius: float = 1.0, height: float = 2.0) -> Mesh:
+    """Side wall of a cylinder around the z axis, both ends left open"""
+    angles = np.arange(sections) * 2.0 * np.pi / sections
+    ring = radius * np.column_stack([np.cos(angles), np.sin(angles)])
+    vertices = np.vstack([
+        np.column_stack([ring, np.full(sections, -0.5 * height)]),
+        np.column_stack([ring, np.full(sections, 0.5 * height)]),
+    ])
+    i = np.arange(sections)
+    j = (i + 1) % sections
+    faces = np.vstack([
+        np.column_stack([i, j, j + sections]),
+        np.column_stack([i, j + sections, i + sections]),
+    ])
+    return Mesh(vertices, faces)
+
+def volume(mesh: Mesh) -> float:
+    corners = mesh.vertices[mesh.faces]
+    cross = np.cross(corners[:, 1], corners[:, 2])
+    return float(np.einsum("ij,ij->i", corners[:, 0], cross).sum()) / 6.0
+
+def test_open_cylinder_is_capped_flat():
+    mesh = open_cylinder()
+    repaired, stats = repair_mesh(mesh)
+    assert stats["operations"]["filled_holes"] == 2
+    assert analyze_mesh(repaired).is_watertight
+    # The caps close the 16-gon prism, so nothing bulges past either rim
+    prism = 0.5 * 16 * np.sin(2.0 * np.pi / 16) * 2.0
+    assert abs(volume(repaired) - prism) < 1e-6
+    assert np.allclose(np.abs(repaired.vertices[:, 2]).max(), 1.0)
+
+def test_box_missing_a_face_is_closed():
+    vertices, faces = box_mesh_arrays()
+    repaired, stats = repair_mesh(Mesh(vertices, faces[2:]))
+    assert stats["operations"]["filled_holes"] == 1
+    analysis = analyze_mesh(repaired)
+    assert analysis.is_watertight
+    assert analysis.is_winding_consistent
+    assert abs(volume(repaired) - 1.0) < 1e-9
+
+def test_fin_on_an_edge_is_trimmed_instead_of_the_surface():
+    vertices, faces = sphere_mesh_arrays(8, 16)
+    sphere = volume(Mesh(vertices, faces))
+    tip = np.vstack([vertices, [[5.0, 5.0, 5.0]]])
+    for corner in range(3):
+        a, b = faces[0, corner], faces[0, (corner + 1) % 3]
+        for fin in ([b, a, len(vertices)], [a, b, len(vertices)]):
+            repaired, stats = repair_mesh(Mesh(tip, np.vstack([faces, [fin]])))
+            assert stats["operations"]["removed_non_manifold_faces"] == 1
+            assert stats["operations"]["filled_holes"] == 0
+            assert analyze_mesh(repaired).is_watertight
+            assert np.abs(repaired.vertices).max() <= 1.0 + 1e-9
+            assert abs(volume(repaired) - sphere) < 1e-9
+
+def test_rewrap_of_an_open_mesh_is_solid():
+    vertices, faces = sphere_mesh_arrays(16, 32)
+    top = vertices[faces].mean(axis=1)[:, 2] > 0.7
+    options = {"max_hole_edges": 0, "rewrap": True, "rewrap_resolution": 64}
+    repaired, stats = repair_mesh(Mesh(vertices, faces[~top]), options)
+    assert stats["operations"]["rewrapped"]
+    assert analyze_mesh(repaired).is_watertight
+    # Sealed across the hole rather than a shell around the open surface
+    sphere = volume(Mesh(vertices, faces))
+    assert abs(volume(repaired) - sphere) < 0.1 * sphere
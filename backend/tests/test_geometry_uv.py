@@ -0,0 +1,86 @@
+from app.services.geometry import Mesh
+from app.services.geometry.uv import (
+    MIN_TASK_FACES,
+    PACK_FILL,
+    ChartSet,
+    pack_charts,
+    pack_options,
+    task_batches,
+    unwrap_mesh,
+)
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from multiprocessing import get_context
+from support import sphere_mesh_arrays
+import numpy as np
+import pytest
+import subprocess
+import sys
+
+# Charts the test sphere with xatlas alone; some xatlas builds crash on it
+XATLAS_PROBE = """
+import numpy as np, xatlas
+from support import sphere_mesh_arrays
+vertices, faces = sphere_mesh_arrays()
+xatlas.parametrize(np.float32(vertices), np.uint32(faces))
+"""
+
+@lru_cache(maxsize=None)
+def xatlas_runs() -> bool:
+    """Whether xatlas charts the test sphere, tried once in a fresh interpreter"""
+    probe = subprocess.run(
+        [sys.executable, "-c", XATLAS_PROBE],
+        cwd=Path(__file__).parent,
+        capture_output=True,
+    )
+    return probe.returncode == 0
+
+def square_charts(sizes) -> ChartSet:
+    """One two-triangle square chart per size, in world units"""
+    corners = np.array([[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0]])
+    uvs = np.concatenate([corners * size for size in sizes])
+    quad = np.array([[0, 1, 2], [0, 2, 3]])
+    faces = np.concatenate([quad + 4 * index for index in range(len(sizes))])
+    positions = np.c_[uvs, np.zeros(len(uvs))]
+    charts = np.repeat(np.arange(len(sizes)), 4)
+    return ChartSet(positions, np.arange(len(uvs)), faces, uvs, charts, len(sizes))
+
+def test_packed_charts_fit_the_atlas_without_overlapping():
+    charts = square_charts([1.0, 2.0, 0.5, 0.5, 3.0])
+    uvs, utilization = pack_charts(charts, 256, 2, True)
+    assert uvs.min() >= 0.0 and uvs.max() <= 1.0
+    assert 0.0 < utilization <= PACK_FILL
+    boxes = [
+        (uvs[charts.charts == c].min(axis=0), uvs[charts.charts == c].max(axis=0))
+        for c in range(charts.chart_count)
+    ]
+    for i, (low, high) in enumerate(boxes):
+        for other_low, other_high in boxes[i + 1:]:
+            assert (high <= other_low).any() or (other_high <= low).any()
+
+def test_components_are_batched_by_face_count():
+    sizes = np.array([MIN_TASK_FACES, 10, MIN_TASK_FACES // 2, MIN_TASK_FACES // 2])
+    batches = task_batches(sizes, workers=4)
+    assert sorted(c for batch in batches for c in batch) == [0, 1, 2, 3]
+    assert batches[0] == [0]
+
+def test_pack_options_are_validated():
+    assert pack_options({}) == {"resolution": 1024, "padding": 2, "rotate": True}
+    with pytest.raises(ValueError):
+        pack_options({"resolution": 32})
+
+def _unwrap_summary():
+    atlas, _ = unwrap_mesh(Mesh(*sphere_mesh_arrays()))
+    uvs = atlas.mesh.uvs
+    return atlas.mesh.triangle_count, atlas.chart_count, uvs.min(), uvs.max()
+
+def test_sphere_unwraps_into_the_unit_square():
+    if not xatlas_runs():
+        pytest.skip("xatlas crashes on the test sphere in this environment")
+    # The worker keeps a crash from taking the test run down with it
+    with ProcessPoolExecutor(1, mp_context=get_context("fork")) as pool:
+        triangles, charts, low, high = pool.submit(_unwrap_summary).result()
+    assert triangles == len(sphere_mesh_arrays()[1])
+    assert charts >= 1
+    assert 0.0 <= low and high <= 1.0
@@ -0,0 +1,35 @@
+from app.services.geometry import Mesh, analyze_mesh
+from support import box_mesh_arrays
+import numpy as np
+
+def split_box():
+    """The unit cube with every face corner its own vertex, as after a UV seam split"""
+    vertices, faces = box_mesh_arrays()
+    return Mesh(vertices[faces.ravel()], np.arange(len(faces) * 3).reshape(-1, 3))
+
+def test_closed_box_is_watertight_and_consistent():
+    analysis = analyze_mesh(Mesh(*box_mesh_arrays()))
+    assert analysis.is_watertight
+    assert analysis.is_winding_consistent
+    assert list(analysis.component_sizes) == [12]
+
+def test_split_vertices_are_welded_for_topology():
+    analysis = analyze_mesh(split_box())
+    assert analysis.is_watertight
+    assert analysis.is_winding_consistent
+    assert list(analysis.component_sizes) == [12]
+    assert len(analysis.duplicate_vertices) == 36 - 8
+
+def test_open_box_reports_boundary_edges_as_vertex_pairs():
+    vertices, faces = box_mesh_arrays()
+    analysis = analyze_mesh(Mesh(vertices, faces[2:]))
+    assert not analysis.is_watertight
+    assert len(analysis.boundary_edges) == 4
+    assert analysis.boundary_edges.max() < len(vertices)
+
+def test_flipped_face_is_detected():
+    vertices, faces = box_mesh_arrays()
+    faces = faces.copy()
+    faces[5] = faces[5][::-1]
+    analysis = analyze_mesh(Mesh(vertices, faces))
+    assert list(analysis.flipped_faces) == [5]
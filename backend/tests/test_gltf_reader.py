@@ -0,0 +1,51 @@
+from app.services.geometry import Mesh, analyze_mesh, load_glb, widen_mesh
+from app.services.geometry.gltf import mesh_glb
+from support import box_mesh_arrays, sphere_mesh_arrays
+import numpy as np
+import trimesh
+
+def test_single_primitive_is_loaded_as_views_of_the_file(tmp_path):
+    vertices, faces = sphere_mesh_arrays()
+    path = tmp_path / "sphere.glb"
+    path.write_bytes(mesh_glb(Mesh(vertices, faces)))
+
+    mesh = load_glb(path)
+    assert mesh.vertices.dtype == np.float32
+    assert mesh.faces.dtype == np.uint16
+    assert not mesh.vertices.flags.owndata
+    assert not mesh.faces.flags.owndata
+    assert np.array_equal(mesh.faces, faces)
+    assert np.allclose(mesh.vertices, vertices, atol=1e-6)
+
+def test_primitives_are_joined_with_offset_indices(tmp_path):
+    vertices, faces = box_mesh_arrays()
+    scene = trimesh.Scene()
+    for index in range(3):
+        transform = np.eye(4)
+        transform[:3, 3] = [2.0 * index, 0.0, 0.0]
+        scene.add_geometry(
+            trimesh.Trimesh(vertices, faces, process=False),
+            transform=transform,
+            node_name=f"box{index}",
+        )
+    path = tmp_path / "boxes.glb"
+    path.write_bytes(scene.export(file_type="glb"))
+
+    mesh = load_glb(path)
+    assert mesh.vertices.dtype == np.float32
+    assert mesh.faces.dtype == np.uint32
+    assert mesh.triangle_count == 36
+    analysis = analyze_mesh(mesh)
+    assert analysis.is_watertight
+    assert list(analysis.component_sizes) == [12, 12, 12]
+
+def test_widen_mesh_copies_only_narrow_arrays():
+    vertices, faces = box_mesh_arrays()
+    narrow = widen_mesh(Mesh(vertices.astype(np.float32), faces.astype(np.uint32)))
+    assert narrow.vertices.dtype == np.float64
+    assert narrow.faces.dtype == np.int64
+
+    wide = Mesh(vertices, faces)
+    widened = widen_mesh(wide)
+    assert widened.vertices is wide.vertices
+    assert widened.faces is wide.faces
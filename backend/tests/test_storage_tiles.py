@@ -0,0 +1,98 @@
+from app.services.storage.tiles import (
+    TileCache,
+    TiledImage,
+    TileRowReader,
+    is_tiled_image,
+)
+from app.services.texture.png import png_to_tiles, tiles_to_png
+import numpy as np
+import pytest
+
+def test_unwritten_tiles_read_as_fill(tmp_path):
+    path = tmp_path / "atlas.tiles"
+    fill = (0.25, -1.0)
+    with TiledImage.create(path, 200, 130, 2, np.float32, 64, fill=fill) as image:
+        assert (image.tiles_x, image.tiles_y) == (4, 3)
+        assert image.written_count == 0
+        texels = image.read(10, 20, 150, 100)
+        assert texels.shape == (80, 140, 2)
+        assert (texels[:, :, 0] == 0.25).all() and (texels[:, :, 1] == -1.0).all()
+        assert image.read_tile(3, 2).shape == (2, 8, 2)
+    assert is_tiled_image(path)
+
+def test_partial_writes_keep_fill_and_span_tiles(tmp_path):
+    values = np.arange(70 * 90 * 3, dtype=np.uint8).reshape(70, 90, 3)
+    path = tmp_path / "image.tiles"
+    with TiledImage.create(path, 160, 160, 3, np.uint8, 64, fill=(7,)) as image:
+        image.write(30, 40, values)
+        # The region touches four tiles of the nine
+        assert image.written_count == 4
+        assert [(box.tx, box.ty) for box in image.tiles(written=True)] == [
+            (0, 0), (1, 0), (0, 1), (1, 1),
+        ]
+        assert np.array_equal(image.read(30, 40, 120, 110), values)
+        assert (image.read(0, 0, 30, 64) == 7).all()
+        assert (image.read(120, 0, 160, 160) == 7).all()
+
+def test_tiles_persist_across_reopen(tmp_path):
+    path = tmp_path / "image.tiles"
+    tile = np.full((64, 64, 1), 9, dtype=np.uint8)
+    with TiledImage.create(path, 128, 100, 1, np.uint8, 64) as image:
+        image.write_tile(1, 0, tile)
+        with pytest.raises(ValueError):
+            image.write_tile(1, 1, tile)
+    with TiledImage(path) as image:
+        assert image.written(1, 0) and not image.written(0, 0)
+        assert (image.read_tile(1, 0) == 9).all()
+        with pytest.raises(ValueError):
+            image.write_tile(0, 0, tile)
+        with pytest.raises(ValueError):
+            image.read(0, 0, 129, 10)
+
+@pytest.mark.parametrize(
+    "size, channels, dtype",
+    [(32, 1, np.uint8), (65, 1, np.uint8), (64, 5, np.uint8), (64, 1, np.int16)],
+)
+def test_bad_layouts_are_rejected(tmp_path, size, channels, dtype):
+    with pytest.raises(ValueError):
+        TiledImage.create(tmp_path / "bad.tiles", 10, 10, channels, dtype, size)
+
+def test_non_tiled_files_are_rejected(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not a tiled image, just some bytes")
+    assert not is_tiled_image(path)
+    with pytest.raises(ValueError):
+        TiledImage(path)
+
+def test_row_reader_streams_rows_in_order(tmp_path):
+    values = np.random.default_rng(0).integers(0, 256, (150, 70, 4), dtype=np.uint8)
+    image = TiledImage.create(tmp_path / "image.tiles", 70, 150, 4, np.uint8, 64)
+    image.write(0, 0, values)
+    with TileRowReader(image) as reader:
+        bands = [reader.read(40) for _ in range(5)]
+    assert [len(band) for band in bands] == [40, 40, 40, 30, 0]
+    assert np.array_equal(np.concatenate(bands), values)
+
+def test_cache_releases_least_recently_used_tiles(tmp_path):
+    cache = TileCache(2 * 64 * 64)
+    values = np.random.default_rng(1).integers(0, 256, (64, 256, 1), dtype=np.uint8)
+    path = tmp_path / "image.tiles"
+    with TiledImage.create(path, 256, 64, 1, np.uint8, 64, cache=cache) as image:
+        image.write(0, 0, values)
+        stats = cache.stats()
+        assert stats["resident_bytes"] <= 2 * 64 * 64
+        assert stats["evictions"] == 2
+        # Released tiles are read back from the file
+        assert np.array_equal(image.read(0, 0, 256, 64), values)
+    assert cache.stats()["resident_bytes"] == 0
+
+def test_png_round_trip_through_tiles(tmp_path):
+    values = np.random.default_rng(2).integers(0, 256, (100, 130, 3), dtype=np.uint8)
+    png = tmp_path / "image.png"
+    source = tmp_path / "source.tiles"
+    with TiledImage.create(source, 130, 100, 3, np.uint8, 64) as image:
+        image.write(0, 0, values)
+        tiles_to_png(image, png)
+    with png_to_tiles(png, tmp_path / "copy.tiles", 64) as image:
+        assert image.written_count == 6
+        assert np.array_equal(image.read(0, 0, 130, 100), values)
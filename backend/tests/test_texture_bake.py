@@ -0,0 +1,42 @@
+from app.services.geometry import Mesh, build_bvh
+from app.services.texture.bake import bake_maps, bake_options, source_from_mesh
+import numpy as np
+
+def unit_quad() -> Mesh:
+    """Two triangles spanning the unit square in z = 0, with UVs equal to x and y"""
+    vertices = np.array(
+        [[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [1.0, 1.0, 0.0], [0.0, 1.0, 0.0]]
+    )
+    faces = np.array([[0, 1, 2], [0, 2, 3]])
+    return Mesh(vertices, faces, uvs=vertices[:, :2].copy())
+
+def test_self_bake_of_a_flat_quad(tmp_path):
+    mesh = unit_quad()
+    source = source_from_mesh(mesh)
+    options = bake_options(["normal", "ao"], {"resolution": 128, "samples": 4})
+    bvh = build_bvh(mesh.vertices, mesh.faces)
+    images, stats = bake_maps(mesh, source, bvh, options, tmp_path)
+    try:
+        normal = images["normal"].read_tile(0, 0).copy()
+        ao = images["ao"].read_tile(0, 0).copy()
+    finally:
+        for image in images.values():
+            image.close()
+    # A flat surface baked onto itself points straight out in tangent space
+    assert np.abs(normal[..., :3].astype(int) - [128, 128, 255]).max() <= 1
+    assert ao.min() >= 250
+    assert stats["coverage"] > 0.95
+
+def test_map_seconds_share_the_wall_clock(tmp_path):
+    mesh = unit_quad()
+    options = bake_options(["normal", "ao"], {"resolution": 64, "samples": 4})
+    bvh = build_bvh(mesh.vertices, mesh.faces)
+    images, stats = bake_maps(mesh, source_from_mesh(mesh), bvh, options, tmp_path)
+    for image in images.values():
+        image.close()
+    maps = stats["maps"].values()
+    assert np.isclose(sum(entry["seconds"] for entry in maps), stats["seconds"])
+    for entry in maps:
+        assert entry["seconds"] <= stats["seconds"]
+        rate = stats["texels"] / entry["seconds"]
+        assert np.isclose(entry["texels_per_second"], rate)
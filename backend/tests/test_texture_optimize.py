@@ -0,0 +1,116 @@
+from app.services.storage.tiles import TiledImage
+from app.services.texture.optimize import (
+    decode_texture,
+    encode_texture,
+    map_kind,
+    psnr,
+    target_size,
+    texture_levels,
+    texture_options,
+)
+import numpy as np
+import pytest
+
+def tiled(path, pixels: np.ndarray) -> TiledImage:
+    height, width, channels = pixels.shape
+    image = TiledImage.create(path, width, height, channels, np.uint8, 64)
+    image.write(0, 0, pixels)
+    return image
+
+def test_options_override_the_target_preset():
+    assert texture_options("web")["max_size"] == 2048
+    options = texture_options("mobile", {"max_size": 512, "quality": None})
+    assert options["max_size"] == 512 and options["quality"] == 0.75
+
+@pytest.mark.parametrize(
+    "target, options",
+    [
+        ("console", None),
+        ("web", {"format": "jpeg"}),
+        ("web", {"max_size": 0}),
+        ("web", {"max_size": True}),
+        ("web", {"quality": 1.5}),
+    ],
+)
+def test_bad_options_are_rejected(target, options):
+    with pytest.raises(ValueError):
+        texture_options(target, options)
+
+@pytest.mark.parametrize(
+    "name, kind",
+    [
+        ("Normal", "normal"),
+        ("baseColor", "color"),
+        ("emissive", "color"),
+        ("orm", "data"),
+    ],
+)
+def test_map_kind_follows_the_name(name, kind):
+    assert map_kind(name) == kind
+
+def test_target_size_fits_max_size():
+    assert target_size(3000, 1500, 2048, False) == (2048, 1024)
+    assert target_size(100, 40, 2048, False) == (100, 40)
+    # Mip chains round each side to the nearest power of two under the cap
+    assert target_size(1000, 300, 2048, True) == (1024, 256)
+    assert target_size(3000, 1500, 1000, True) == (512, 512)
+
+def test_mip_chain_keeps_flat_color_and_unit_normals(tmp_path):
+    color = np.empty((48, 96, 4), dtype=np.uint8)
+    color[...] = (200, 90, 30, 255)
+    options = {"max_size": 64, "mipmaps": True}
+    with tiled(tmp_path / "color.tiles", color) as source:
+        levels = texture_levels(source, "color", options, tmp_path)
+    try:
+        assert [(level.width, level.height) for level in levels] == [
+            (64, 32), (32, 16), (16, 8), (8, 4), (4, 2), (2, 1), (1, 1),
+        ]
+        for level in levels:
+            pixels = level.read(0, 0, level.width, level.height)
+            assert np.abs(pixels.astype(int) - color[0, 0]).max() <= 1
+    finally:
+        for level in levels:
+            level.close()
+
+    normal = np.empty((64, 64, 3), dtype=np.uint8)
+    normal[:, :32] = (218, 128, 218)
+    normal[:, 32:] = (38, 128, 218)
+    with tiled(tmp_path / "normal.tiles", normal) as source:
+        levels = texture_levels(source, "normal", options, tmp_path)
+    try:
+        pixels = levels[-1].read(0, 0, 1, 1)
+        vectors = pixels.astype(np.float64) / 255.0 * 2.0 - 1.0
+        # The averaged normal is renormalized instead of shrinking
+        assert np.linalg.norm(vectors) == pytest.approx(1.0, abs=0.02)
+        assert vectors[0, 0, 2] > 0.99
+    finally:
+        for level in levels:
+            level.close()
+
+def test_without_mipmaps_only_the_base_level_is_written(tmp_path):
+    pixels = np.random.default_rng(0).integers(0, 256, (40, 30, 1), dtype=np.uint8)
+    with tiled(tmp_path / "data.tiles", pixels) as source:
+        options = {"max_size": 64, "mipmaps": False}
+        levels = texture_levels(source, "data", options, tmp_path)
+    try:
+        assert len(levels) == 1
+        assert np.array_equal(levels[0].read(0, 0, 30, 40), pixels)
+    finally:
+        levels[0].close()
+
+@pytest.mark.parametrize("image_format", ["png", "webp"])
+def test_lossless_encoding_round_trips(image_format):
+    pixels = np.random.default_rng(1).integers(0, 256, (24, 40, 4), dtype=np.uint8)
+    # Lossless WebP drops the color of fully transparent texels
+    pixels[:, :, 3] |= 1
+    data = encode_texture(pixels, image_format, 0.5, lossless=True)
+    assert np.array_equal(decode_texture(data), pixels)
+    assert psnr(pixels, data) is None
+
+def test_lossy_webp_reports_psnr():
+    y, x = np.mgrid[0:64, 0:64]
+    pixels = np.stack([x * 4, y * 4, (x + y) * 2], axis=2).astype(np.uint8)
+    data = encode_texture(pixels, "webp", 0.75)
+    assert 25.0 < psnr(pixels, data) < 100.0
+    gray = pixels[:, :, :1]
+    assert psnr(gray, encode_texture(gray, "webp", 0.75)) > 25.0
@@ -0,0 +1,80 @@
+from app.services.texture.pack import pack_layout, pack_material, packing_map
+from app.services.texture.png import PngBandReader, PngBandWriter
+from PIL import Image
+import numpy as np
+import pytest
+
+def gradient(width: int, height: int, channels: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = (x * 3 + y * 5)[:, :, None] + rng.integers(0, 40, (1, 1, channels))
+    return (base % 256).astype(np.uint8)
+
+def save(path, pixels: np.ndarray) -> str:
+    Image.fromarray(pixels if pixels.shape[2] > 1 else pixels[:, :, 0]).save(path)
+    return str(path)
+
+def load(path) -> np.ndarray:
+    with Image.open(path) as image:
+        return np.asarray(image)
+
+def test_orm_packs_channels_band_by_band(tmp_path):
+    ao = gradient(96, 80, 1, 0)
+    roughness = gradient(96, 80, 3, 1)
+    sources = {
+        "ao": save(tmp_path / "ao.png", ao),
+        "roughness": save(tmp_path / "roughness.png", roughness),
+    }
+    layout = pack_layout(sources, "orm")
+    target = tmp_path / "orm.png"
+    stats = pack_material(sources, layout, {"orm": target}, band_bytes=96 * 64)
+    packed = load(target)
+    assert stats["bands"] > 1
+    assert np.array_equal(packed[:, :, 0], ao[:, :, 0])
+    assert np.array_equal(packed[:, :, 1], roughness[:, :, 0])
+    # Metallic is missing, so it is filled with the neutral value
+    assert (packed[:, :, 2] == 0).all()
+    assert packing_map(layout) == {"orm": {"r": "ao", "g": "roughness", "b": 0.0}}
+
+def test_smaller_sources_are_resampled_to_the_largest(tmp_path):
+    sources = {
+        "metalness": save(tmp_path / "metal.png", np.full((16, 16, 1), 200, np.uint8)),
+        "roughness": save(tmp_path / "rough.png", gradient(64, 32, 1, 2)),
+    }
+    target = tmp_path / "orm.png"
+    stats = pack_material(sources, pack_layout(sources, "orm"), {"orm": target})
+    packed = load(target)
+    assert packed.shape == (32, 64, 3)
+    assert (packed[:, :, 2] == 200).all()
+    assert (packed[:, :, 0] == 255).all()
+    assert stats["resampled_sources"] == ["metalness"]
+
+def test_custom_channels_pick_source_channels(tmp_path):
+    color = gradient(32, 32, 4, 3)
+    sources = {"albedo": save(tmp_path / "albedo.png", color)}
+    channels = {"r": "albedo.b", "g": 0.5, "a": "albedo.a"}
+    layout = pack_layout(sources, "custom", channels)
+    target = tmp_path / "packed.png"
+    pack_material(sources, layout, {"packed": target})
+    packed = load(target)
+    assert np.array_equal(packed[:, :, 0], color[:, :, 2])
+    assert (packed[:, :, 1] == 128).all()
+    assert (packed[:, :, 2] == 0).all()
+    assert np.array_equal(packed[:, :, 3], color[:, :, 3])
+
+@pytest.mark.parametrize("channels", [None, {"x": "ao"}, {"r": "ao.q"}, {"r": 2.0}])
+def test_bad_custom_layouts_are_rejected(channels):
+    with pytest.raises(ValueError):
+        pack_layout({"ao": "ao.png"}, "custom", channels)
+
+@pytest.mark.parametrize("channels", [1, 2, 3, 4])
+def test_png_bands_round_trip(tmp_path, channels):
+    pixels = gradient(50, 37, channels, channels)
+    path = tmp_path / "image.png"
+    with PngBandWriter(path, 50, 37, channels) as writer:
+        for start in range(0, 37, 10):
+            writer.write(pixels[start:start + 10])
+    with PngBandReader(path) as reader:
+        rows = np.concatenate(list(reader.bands(7)))
+    assert np.array_equal(rows, pixels)
+    assert np.array_equal(load(path).reshape(pixels.shape), pixels)
@@ -0,0 +1,62 @@
+from app.services.websocket.broker import InMemoryBroker, InMemoryBus
+from app.services.websocket.hub import WebSocketHub
+from app.services.websocket.protocol import PROTOCOL_VERSION, ClientFormat
+from support import RecordingSocket, drain
+import asyncio
+
+V2 = ClientFormat(PROTOCOL_VERSION, "json")
+
+def workers(count: int):
+    """Hubs relaying through one shared bus, as separate worker processes would"""
+    bus = InMemoryBus()
+    brokers = [InMemoryBroker(bus) for _ in range(count)]
+    return [WebSocketHub(max_queue_size=16, broker=broker) for broker in brokers]
+
+def running(progress: float):
+    return {"run_id": "1", "status": "running", "progress": progress}
+
+def test_events_reach_subscribers_of_every_worker():
+    async def run():
+        producer, first, second = workers(3)
+        sockets = [RecordingSocket(), RecordingSocket()]
+        await first.subscribe("run:1", sockets[0])
+        await second.subscribe("run:1", sockets[1])
+        for index in range(3):
+            await producer.publish("run:1", {"type": "stage_complete", "index": index})
+        await producer.publish("run:2", {"type": "stage_complete", "index": 99})
+        await drain()
+        return sockets
+
+    for socket in asyncio.run(run()):
+        assert [message["index"] for message in socket.json_messages()] == [0, 1, 2]
+
+def test_worker_joining_mid_run_starts_from_the_stored_snapshot():
+    async def run():
+        producer, early, late = workers(3)
+        await early.subscribe("run:1", RecordingSocket(), V2)
+        for progress in (0.1, 0.5):
+            await producer.publish_state("run:1", running(progress))
+        socket = RecordingSocket()
+        await late.subscribe("run:1", socket, V2)
+        await producer.publish_state("run:1", running(0.7))
+        await drain()
+        return socket
+
+    snapshot, delta = asyncio.run(run()).json_messages()
+    assert snapshot["type"] == "snapshot"
+    assert snapshot["seq"] == 2
+    assert snapshot["data"]["progress"] == 0.5
+    assert delta["type"] == "delta"
+    assert delta["seq"] == 3
+    assert delta["data"] == {"run": {"progress": 0.7}}
+
+def test_topic_is_released_on_the_bus_after_the_last_subscriber():
+    async def run():
+        bus = InMemoryBus()
+        hub = WebSocketHub(max_queue_size=4, broker=InMemoryBroker(bus))
+        subscriber = await hub.subscribe("run:1", RecordingSocket())
+        assert "run:1" in bus.channels
+        await hub.unsubscribe(subscriber)
+        return bus
+
+    assert "run:1" not in asyncio.run(run()).channels
@@ -0,0 +1,74 @@
+from app.services.websocket.connections import (
+    CAPACITY_CLOSE_CODE,
+    IDLE_CLOSE_CODE,
+    ConnectionManager,
+)
+from app.services.websocket.hub import WebSocketHub
+from support import RecordingSocket, drain
+import asyncio
+import json
+
+class ClientSocket(RecordingSocket):
+    """RecordingSocket that also accepts and reads queued client messages"""
+
+    def __init__(self):
+        super().__init__()
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.accepted = False
+
+    async def accept(self):
+        self.accepted = True
+
+    async def receive_text(self) -> str:
+        return await self.incoming.get()
+
+def test_connections_past_the_cap_are_told_to_retry():
+    async def run():
+        manager = ConnectionManager(max_connections=2)
+        sockets = [ClientSocket() for _ in range(3)]
+        admitted = [await manager.admit(socket) for socket in sockets]
+        manager.release()
+        return admitted, sockets, manager, await manager.admit(ClientSocket())
+
+    admitted, sockets, manager, readmitted = asyncio.run(run())
+    assert admitted == [True, True, False]
+    assert sockets[2].close_code == CAPACITY_CLOSE_CODE
+    assert sockets[2].json_messages()[0]["data"]["retry_after"] > 0
+    assert readmitted
+    assert manager.metrics()["rejected"] == 1
+    assert manager.metrics()["peak"] == 2
+
+def test_quiet_sockets_are_pinged_then_reaped():
+    async def run():
+        hub = WebSocketHub(max_queue_size=8)
+        manager = ConnectionManager(heartbeat_interval=0.01, idle_timeout=0.05)
+        socket = ClientSocket()
+        subscriber = await hub.subscribe("run:1", socket)
+        received = [message async for message in manager.messages(socket, subscriber)]
+        await drain()
+        return received, socket, manager
+
+    received, socket, manager = asyncio.run(run())
+    assert received == []
+    assert socket.close_code == IDLE_CLOSE_CODE
+    assert "ping" in [message["type"] for message in socket.json_messages()]
+    assert manager.metrics()["reaped"] == 1
+
+def test_heartbeats_are_answered_and_other_messages_yielded():
+    async def run():
+        hub = WebSocketHub(max_queue_size=8)
+        manager = ConnectionManager(heartbeat_interval=0.01, idle_timeout=0.05)
+        socket = ClientSocket()
+        subscriber = await hub.subscribe("run:1", socket)
+        for message in ({"type": "ping", "data": {"n": 1}}, {"type": "pong"}):
+            socket.incoming.put_nowait(json.dumps(message))
+        socket.incoming.put_nowait("not json")
+        socket.incoming.put_nowait(json.dumps({"type": "cancel"}))
+        messages = manager.messages(socket, subscriber)
+        first = await messages.__anext__()
+        await drain()
+        return first, socket
+
+    first, socket = asyncio.run(run())
+    assert first == {"type": "cancel"}
+    assert socket.json_messages()[0] == {"type": "pong", "data": {"n": 1}}
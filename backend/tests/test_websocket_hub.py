@@ -0,0 +1,69 @@
+from app.services.websocket.hub import SLOW_CONSUMER_CLOSE_CODE, WebSocketHub
+from support import RecordingSocket, drain
+import asyncio
+
+def test_every_subscriber_receives_messages_in_order():
+    async def run():
+        hub = WebSocketHub(max_queue_size=16)
+        sockets = [RecordingSocket() for _ in range(3)]
+        subscribers = [await hub.subscribe("run:1", socket) for socket in sockets]
+        for index in range(5):
+            await hub.publish("run:1", {"type": "stage_complete", "index": index})
+        await drain()
+        for subscriber in subscribers:
+            await hub.unsubscribe(subscriber)
+        return sockets
+
+    for socket in asyncio.run(run()):
+        indexes = [message["index"] for message in socket.json_messages()]
+        assert indexes == [0, 1, 2, 3, 4]
+
+def test_slow_subscriber_drops_progress_but_not_results():
+    async def run():
+        hub = WebSocketHub(max_queue_size=4)
+        fast, slow = RecordingSocket(), RecordingSocket()
+        slow.gate.clear()
+        await hub.subscribe("run:1", fast)
+        await hub.subscribe("run:1", slow)
+        for index in range(20):
+            await hub.publish("run:1", {"type": "progress", "index": index})
+            await drain(2)
+        await hub.publish("run:1", {"type": "generation_complete"})
+        await drain()
+        slow.gate.set()
+        await drain()
+        return hub, fast, slow
+
+    hub, fast, slow = asyncio.run(run())
+    assert len(fast.json_messages()) == 21
+    received = slow.json_messages()
+    assert received[-1]["type"] == "generation_complete"
+    assert len(received) < 21
+    assert hub.metrics()["dropped"] == 21 - len(received)
+
+def test_subscriber_behind_on_undroppable_messages_is_closed():
+    async def run():
+        hub = WebSocketHub(max_queue_size=2)
+        socket = RecordingSocket()
+        socket.gate.clear()
+        subscriber = await hub.subscribe("run:1", socket)
+        for index in range(5):
+            await hub.publish("run:1", {"type": "stage_complete", "index": index})
+        await drain()
+        return subscriber, socket
+
+    subscriber, socket = asyncio.run(run())
+    assert subscriber.closed
+    assert socket.close_code == SLOW_CONSUMER_CLOSE_CODE
+
+def test_unsubscribing_the_last_subscriber_releases_the_topic():
+    async def run():
+        hub = WebSocketHub(max_queue_size=4)
+        subscriber = await hub.subscribe("run:1", RecordingSocket())
+        assert hub.subscriber_count("run:1") == 1
+        await hub.unsubscribe(subscriber)
+        return hub
+
+    hub = asyncio.run(run())
+    assert hub.subscriber_count("run:1") == 0
+    assert "run:1" not in hub.topics
@@ -0,0 +1,42 @@
+from app.services.websocket.hub import WebSocketHub
+from support import RecordingSocket, drain
+import asyncio
+
+def preview(tag: int, count: int):
+    return [memoryview(bytes([tag, index])) for index in range(count)]
+
+def test_slow_subscriber_receives_every_frame_of_a_preview():
+    async def run():
+        hub = WebSocketHub(max_queue_size=64)
+        socket = RecordingSocket()
+        socket.gate.clear()
+        await hub.subscribe("preview:1", socket)
+        await hub.publish_frames("preview:1", preview(1, 95))
+        await drain()
+        socket.gate.set()
+        await drain(200)
+        return socket
+
+    received = asyncio.run(run()).binary_messages()
+    assert received == [bytes([1, index]) for index in range(95)]
+
+def test_newer_preview_supersedes_a_queued_one_whole():
+    async def run():
+        hub = WebSocketHub(max_queue_size=2)
+        socket = RecordingSocket()
+        socket.gate.clear()
+        await hub.subscribe("preview:1", socket)
+        for tag in range(1, 6):
+            await hub.publish_frames("preview:1", preview(tag, 10))
+        await drain()
+        socket.gate.set()
+        await drain(100)
+        return socket
+
+    received = asyncio.run(run()).binary_messages()
+    tags = [message[0] for message in received]
+    assert len(received) % 10 == 0
+    assert tags[-10:] == [5] * 10
+    for start in range(0, len(received), 10):
+        expected = [bytes([tags[start], index]) for index in range(10)]
+        assert received[start:start + 10] == expected
@@ -0,0 +1,115 @@
+from app.services.websocket.hub import WebSocketHub
+from app.services.websocket.protocol import (
+    LEGACY_PROTOCOL_VERSION,
+    PROTOCOL_VERSION,
+    ClientFormat,
+    Envelope,
+    apply_run_delta,
+    diff_run_state,
+    negotiate_format,
+    normalize_run_state,
+)
+from support import RecordingSocket, drain
+import asyncio
+import json
+import pytest
+
+V2 = ClientFormat(PROTOCOL_VERSION, "json")
+
+def run_state(progress: float, stage_progress: float, status: str = "running"):
+    return {
+        "run_id": "1",
+        "status": status,
+        "progress": progress,
+        "current_stage": "mesh",
+        "stages": [{"id": "mesh", "progress": stage_progress}],
+    }
+
+def test_deltas_rebuild_the_published_state():
+    states = [normalize_run_state(run_state(step / 4, step / 2)) for step in range(3)]
+    rebuilt = None
+    for previous, current in zip([None] + states[:-1], states):
+        rebuilt = apply_run_delta(rebuilt, diff_run_state(previous, current))
+        assert rebuilt == current
+    assert diff_run_state(states[-1], states[-1]) == {}
+
+def test_delta_carries_only_changed_fields():
+    before = normalize_run_state(run_state(0.25, 0.5))
+    after = normalize_run_state(run_state(0.5, 0.5))
+    assert diff_run_state(before, after) == {"run": {"progress": 0.5}}
+
+def test_subscriber_gets_a_snapshot_then_consecutive_deltas():
+    async def run():
+        hub = WebSocketHub(max_queue_size=16)
+        assert await hub.publish_state("run:1", run_state(0.1, 0.2)) == 1
+        socket = RecordingSocket()
+        await hub.subscribe("run:1", socket, V2)
+        assert await hub.publish_state("run:1", run_state(0.1, 0.2)) is None
+        await hub.publish_state("run:1", run_state(0.3, 0.6))
+        await hub.publish_state("run:1", run_state(1.0, 1.0, "completed"))
+        await drain()
+        return socket
+
+    messages = asyncio.run(run()).json_messages()
+    assert [message["type"] for message in messages] == ["snapshot", "delta", "delta"]
+    assert [message["seq"] for message in messages] == [1, 2, 3]
+    state = messages[0]["data"]
+    for message in messages[1:]:
+        state = apply_run_delta(state, message["data"])
+    assert state == normalize_run_state(run_state(1.0, 1.0, "completed"))
+
+def test_legacy_client_gets_full_updates():
+    async def run():
+        hub = WebSocketHub(max_queue_size=16)
+        socket = RecordingSocket()
+        await hub.subscribe("run:1", socket)
+        await hub.publish_state("run:1", run_state(0.1, 0.2))
+        await hub.publish_state("run:1", run_state(0.3, 0.2))
+        await drain()
+        return socket
+
+    messages = asyncio.run(run()).json_messages()
+    assert [message["type"] for message in messages] == ["generation_update"] * 2
+    assert messages[-1]["data"] == normalize_run_state(run_state(0.3, 0.2))
+
+def test_binary_encodings_need_the_versioned_protocol():
+    assert negotiate_format({"encoding": "msgpack"}).encoding == "json"
+    assert negotiate_format({"v": "9"}).version == PROTOCOL_VERSION
+    assert negotiate_format({"v": "x"}) == ClientFormat(LEGACY_PROTOCOL_VERSION, "json")
+
+def test_msgpack_payload_decodes_to_the_json_message():
+    msgpack = pytest.importorskip("msgpack")
+    envelope = Envelope.for_state(4, {"run": {"progress": 0.5}}, None)
+    packed = envelope.encode(ClientFormat(PROTOCOL_VERSION, "msgpack"))
+    assert msgpack.unpackb(packed) == json.loads(envelope.encode(V2))
+
+def test_slow_subscriber_collapses_queued_state_for_results():
+    async def run():
+        hub = WebSocketHub(max_queue_size=4)
+        await hub.publish_state("run:1", run_state(0.0, 0.0))
+        socket = RecordingSocket()
+        socket.gate.clear()
+        subscriber = await hub.subscribe("run:1", socket, V2)
+        for step in range(1, 4):
+            await hub.publish_state("run:1", run_state(step / 10, step / 5))
+        await hub.publish("run:1", {"type": "stage_complete", "stage": "mesh"})
+        await hub.publish("run:1", {"type": "generation_complete"})
+        await drain()
+        socket.gate.set()
+        await drain()
+        return subscriber, socket
+
+    subscriber, socket = asyncio.run(run())
+    assert not subscriber.closed
+    messages = socket.json_messages()
+    assert [message["type"] for message in messages][-2:] == [
+        "stage_complete",
+        "generation_complete",
+    ]
+    state = None
+    for message in messages[:-2]:
+        if message["type"] == "snapshot":
+            state = message["data"]
+        else:
+            state = apply_run_delta(state, message["data"])
+    assert state == normalize_run_state(run_state(0.3, 0.6))
@@ -0,0 +1,64 @@
+from app.services.websocket.broker import InMemoryBroker, InMemoryBus
+from app.services.websocket.hub import WebSocketHub
+from app.services.websocket.protocol import PROTOCOL_VERSION, ClientFormat
+from support import RecordingSocket, drain
+import asyncio
+
+V2 = ClientFormat(PROTOCOL_VERSION, "json")
+
+def running(progress: float):
+    return {"run_id": "1", "status": "running", "progress": progress}
+
+async def publish_run(hub: WebSocketHub, steps: int):
+    """Deltas with a stage event in the middle, sharing one sequence"""
+    for step in range(steps):
+        await hub.publish_state("run:1", running(step / 100))
+        if step == steps // 2:
+            await hub.publish("run:1", {"type": "stage_complete"}, sequenced=True)
+
+async def disconnected_client(hub: WebSocketHub, steps: int):
+    """Publish a run while one client is connected for the first step only"""
+    subscriber = await hub.subscribe("run:1", RecordingSocket(), V2)
+    await hub.publish_state("run:1", running(-1.0))
+    await hub.unsubscribe(subscriber)
+    await publish_run(hub, steps)
+
+async def resume(hub: WebSocketHub, last_seq: int):
+    socket = RecordingSocket()
+    await hub.subscribe("run:1", socket, V2, last_seq=last_seq)
+    await drain()
+    return socket.json_messages()
+
+def test_reconnect_replays_only_missed_events():
+    async def run():
+        hub = WebSocketHub(max_queue_size=64, replay_size=32)
+        await disconnected_client(hub, 6)
+        return await resume(hub, 4), hub.metrics()
+
+    messages, metrics = asyncio.run(run())
+    assert [message["seq"] for message in messages] == [5, 6, 7, 8]
+    assert "stage_complete" in [message["type"] for message in messages]
+    assert metrics["replayed"] == 4
+
+def test_gap_past_the_buffer_resyncs_with_a_snapshot():
+    async def run():
+        hub = WebSocketHub(max_queue_size=64, replay_size=4)
+        await disconnected_client(hub, 10)
+        return await resume(hub, 1), hub.metrics()
+
+    messages, metrics = asyncio.run(run())
+    assert [message["type"] for message in messages] == ["snapshot"]
+    assert messages[0]["seq"] == 12
+    assert metrics["resynced"] == 1
+
+def test_replay_comes_from_the_broker_on_another_worker():
+    async def run():
+        bus = InMemoryBus()
+        producer = WebSocketHub(max_queue_size=64, broker=InMemoryBroker(bus))
+        await publish_run(producer, 6)
+        other = WebSocketHub(max_queue_size=64, broker=InMemoryBroker(bus))
+        return await resume(other, 5)
+
+    messages = asyncio.run(run())
+    assert [message["seq"] for message in messages] == [6, 7]
+    assert messages[-1]["data"] == {"run": {"progress": 0.05}}
@@ -59,6 +59,11 @@ export function useWebSocket(options: UseWebSocketOptions): UseWebSocketReturn {
       ws.onmessage = (event) => {
         try {
           const message: WebSocketMessage = JSON.parse(event.data)
+          // Answer server heartbeats so the connection is not reaped as idle
+          if (message.type === 'ping') {
+            ws.send(JSON.stringify({ type: 'pong' }))
+            return
+          }
           setLastMessage(message)
           onMessage?.(message)
         } catch (err) {